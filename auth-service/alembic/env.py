@@ -10,6 +10,8 @@ from alembic import context
 # モデルのインポート
 from app.db.base import Base
 from app.models.auth_user import AuthUser
+from app.models.outbox_event import OutboxEvent
+from app.models.processed_message import ProcessedMessage
 from app.core.config import settings
 
 # this is the Alembic Config object, which provides
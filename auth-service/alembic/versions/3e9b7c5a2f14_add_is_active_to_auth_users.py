@@ -0,0 +1,30 @@
+"""add is_active to auth_users
+
+Revision ID: 3e9b7c5a2f14
+Revises: 8c2f4a1d9e37
+Create Date: 2026-10-19 11:02:17.553104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e9b7c5a2f14'
+down_revision: Union[str, None] = '8c2f4a1d9e37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 既存のユーザーは有効として扱い、以降の新規ユーザーはアプリケーション側のデフォルト(False)に従う
+    op.add_column('auth_users', sa.Column('is_active', sa.Boolean(), nullable=False, server_default=sa.true()))
+    op.alter_column('auth_users', 'is_active', server_default=None)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('auth_users', 'is_active')
@@ -0,0 +1,28 @@
+"""add created_at id index
+
+Revision ID: 8c2f4a1d9e37
+Revises: 51bcfb6e6872
+Create Date: 2026-10-19 10:12:44.281930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2f4a1d9e37'
+down_revision: Union[str, None] = '51bcfb6e6872'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_auth_users_created_at_id', 'auth_users', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_auth_users_created_at_id', table_name='auth_users')
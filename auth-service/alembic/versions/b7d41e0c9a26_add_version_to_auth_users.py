@@ -0,0 +1,28 @@
+"""add version to auth_users
+
+Revision ID: b7d41e0c9a26
+Revises: 3e9b7c5a2f14
+Create Date: 2026-10-19 14:36:41.208817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d41e0c9a26'
+down_revision: Union[str, None] = '3e9b7c5a2f14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('auth_users', sa.Column('version', sa.BigInteger(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('auth_users', 'version')
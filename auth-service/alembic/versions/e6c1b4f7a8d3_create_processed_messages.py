@@ -0,0 +1,40 @@
+"""create processed_messages
+
+Revision ID: e6c1b4f7a8d3
+Revises: d3a8f61c5e02
+Create Date: 2026-10-19 17:24:41.208733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6c1b4f7a8d3'
+down_revision: Union[str, None] = 'd3a8f61c5e02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('processed_messages',
+    sa.Column('consumer', sa.String(), nullable=False),
+    sa.Column('message_id', sa.String(), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('consumer', 'message_id', name='uq_processed_messages_consumer_message_id')
+    )
+    op.create_index(op.f('ix_processed_messages_id'), 'processed_messages', ['id'], unique=False)
+    op.create_index('ix_processed_messages_created_at', 'processed_messages', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_processed_messages_created_at', table_name='processed_messages')
+    op.drop_index(op.f('ix_processed_messages_id'), table_name='processed_messages')
+    op.drop_table('processed_messages')
@@ -1,10 +1,11 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
-from typing import Optional
+from typing import Optional, Set
 from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.core.security import verify_token, verify_refresh_token
 from app.crud.auth_user import auth_user_crud
 from app.db.session import get_async_session
@@ -28,7 +29,7 @@ async def get_current_user(
         AuthUser: 認証されたユーザー
         
     Raises:
-        HTTPException: トークンが無効な場合
+        HTTPException: トークンが無効な場合、またはユーザーが無効化されている場合
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -54,8 +55,39 @@ async def get_current_user(
     if user is None:
         raise credentials_exception
     
+    # 無効化されたユーザーは発行済みのトークンでもアクセスできない
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="ユーザーが無効化されています",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
     return user
 
+def admin_user_ids() -> Set[str]:
+    """設定で管理者として指定されたuser_idの集合を返す"""
+    return {
+        user_id.strip().lower() for user_id in settings.ADMIN_USER_IDS.split(",") if user_id.strip()
+    }
+
+async def get_current_admin_user(current_user: AuthUser = Depends(get_current_user)) -> AuthUser:
+    """
+    認証されたユーザーが管理者であることを確認する依存関数
+    
+    Returns:
+        AuthUser: 認証された管理者ユーザー
+        
+    Raises:
+        HTTPException: 管理者でない場合
+    """
+    if str(current_user.user_id) not in admin_user_ids():
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="管理者権限が必要です"
+        )
+    return current_user
+
 async def validate_refresh_token(refresh_token: str) -> Optional[str]:
     """
     リフレッシュトークンを検証する関数
@@ -1,15 +1,27 @@
+import asyncio
 from datetime import timedelta
+import json
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from jose import JWTError, jwt
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Any
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
 
 from app.core.redis import save_password_to_redis
+from app.core.registration import (
+    TICKET_COMPLETED,
+    TICKET_PENDING,
+    create_registration_ticket,
+    get_registration_ticket,
+    registration_notifier
+)
 
-from app.api.deps import get_current_user
+from app.api.deps import get_current_admin_user, get_current_user
 from app.core.config import settings
+from app.core.export import EXPORT_MEDIA_TYPES, gzip_stream, stream_export
 from app.core.logging import get_request_logger
 from app.core.security import (
     blacklist_token,
@@ -18,22 +30,22 @@ from app.core.security import (
     revoke_refresh_token,
     verify_refresh_token,
     verify_password,
-    )
+)
 from app.crud.auth_user import auth_user_crud
 from app.crud.exceptions import (
     UserNotFoundError,
     DuplicateEmailError,
     DuplicateUsernameError
-    )
-from app.db.session import get_async_session
-from app.messaging.rabbitmq import (
-    publish_user_created,
-    publish_user_updated,
-    publish_user_deleted,
-    publish_password_changed,
-    publish_user_status_changed
 )
+from app.db.session import get_async_session
+from app.models.auth_user import AuthUser
+from app.messaging.outbox import enqueue_user_event
+from app.messaging.rabbitmq import UserEventTypes, rabbitmq_client
+from app.messaging.rpc import RpcPublishError, RpcTimeoutError
 from app.schemas.auth_user import (
+    AuthUserBulkActionResult,
+    AuthUserBulkActionStatus,
+    AuthUserBulkUserIdsRequest,
     AuthUserCreate,
     AuthUserUpdatePassword,
     AuthUserUpdate,
@@ -41,7 +53,7 @@ from app.schemas.auth_user import (
     LogoutRequest,
     Token,
     RefreshTokenRequest
-    )
+)
 
 
 router = APIRouter()
@@ -49,8 +61,19 @@ router = APIRouter()
 @router.post("/register", status_code=status.HTTP_202_ACCEPTED)
 async def register_auth_user(
     request: Request,
-    user_in: AuthUserCreate
+    user_in: AuthUserCreate,
+    wait: bool = Query(False, description="trueの場合はuser-serviceの処理結果を待って返す（RPC）"),
+    async_session: AsyncSession = Depends(get_async_session)
     ) -> Any:
+    """
+    ユーザー登録リクエストを受け付ける
+    
+    既定ではイベントをアウトボックスに書き込んで202と登録チケットを返す。
+    wait=trueの場合はuser-serviceにRPCでリクエストし、作成されたユーザー（201）または
+    重複のエラー（409）を返す。201はauth_usersへの登録（返信の処理）で登録チケットが
+    完了してから返す。RPC_TIMEOUT_SECONDS以内に完了しない場合は202を返し、
+    以降は登録チケットで完了を確認する。
+    """
     logger = get_request_logger(request)
     logger.info(f"ユーザー登録リクエスト: {user_in.username}")
 
@@ -60,26 +83,142 @@ async def register_auth_user(
         password_key = await save_password_to_redis(user_in.username, user_in.password)
         logger.info(f"パスワードを一時保存しました: key={password_key}")
         
+        # 登録の完了を待つためのチケットを発行
+        ticket = await create_registration_ticket(user_in.username, user_in.email)
+        
         # ユーザー作成イベントの発行（パスワードを含めず、代わりにキー情報を含める）
+        # チケットはuser-serviceの返信（original_request）で戻ってくる
         user_data = {
             "username": user_in.username,
             "email": user_in.email,
-            "password_key": password_key
+            "password_key": password_key,
+            "registration_ticket": ticket
         }
-        await publish_user_created(user_data)
-        logger.info(f"ユーザー作成イベント発行: username={user_in.username}")
-        
-        # 202 Acceptedを返す（非同期処理が開始されたことを示す）
-        return {
+        accepted = {
             "message": "ユーザー登録リクエストを受け付けました",
             "username": user_in.username,
-            "email": user_in.email
+            "email": user_in.email,
+            "ticket": ticket,
+            "status_url": request.app.url_path_for("get_registration_status", ticket=ticket)
         }
         
+        if wait:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + settings.RPC_TIMEOUT_SECONDS
+            try:
+                reply = await rabbitmq_client.rpc_call(UserEventTypes.USER_CREATED, user_data)
+            except RpcPublishError as e:
+                # 送信できなかった場合は通常の非同期の処理に切り替える
+                logger.warning(f"RPCでのユーザー作成リクエストに失敗したため非同期で処理します: {str(e)}")
+            except RpcTimeoutError:
+                # リクエストは処理中のため、チケットで完了を確認させる
+                logger.warning(f"ユーザー作成の返信がタイムアウトしました: username={user_in.username}")
+                return accepted
+            except Exception as e:
+                # 送信後のエラーはリクエストが処理中の可能性があるため、再送せずにチケットで完了を確認させる
+                logger.warning(f"ユーザー作成の返信を受け取れませんでした: username={user_in.username}, error={str(e)}")
+                return accepted
+            else:
+                if reply.get("status") != "success":
+                    return _registration_reply_response(reply, ticket)
+                # 返信の処理でauth_usersに登録されるまで待つ（それまではログインできない）
+                state = await registration_notifier.wait(ticket, max(deadline - loop.time(), 0.0))
+                if state is None or state["status"] == TICKET_PENDING:
+                    logger.warning(f"ユーザー登録の完了を待てませんでした: username={user_in.username}")
+                    return accepted
+                if state["status"] != TICKET_COMPLETED:
+                    reply = {"status": "error", "error_type": state.get("error_type"), "message": state.get("message")}
+                return _registration_reply_response(reply, ticket)
+        
+        # ブローカーを待たずにアウトボックスへ書き込み、送信はリレーに任せる
+        enqueue_user_event(async_session, UserEventTypes.USER_CREATED, user_data)
+        await async_session.commit()
+        logger.info(f"ユーザー作成イベントをアウトボックスに登録: username={user_in.username}")
+        
+        # 202 Acceptedを返す（非同期処理が開始されたことを示す）
+        return accepted
+        
     except Exception as e:
         logger.error(f"ユーザー作成イベント発行失敗: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="ユーザー登録リクエストの処理中にエラーが発生しました")
 
+def _registration_reply_response(reply: Dict[str, Any], ticket: str) -> JSONResponse:
+    """user-serviceからのRPCの返信をレスポンスに変換する"""
+    if reply.get("status") == "success":
+        return JSONResponse(status_code=status.HTTP_201_CREATED, content={
+            "message": "ユーザーを作成しました",
+            "user_id": reply.get("id"),
+            "username": reply.get("username"),
+            "email": reply.get("email"),
+            "ticket": ticket
+        })
+    error_type = reply.get("error_type")
+    status_code = (
+        status.HTTP_409_CONFLICT
+        if error_type in ("duplicate_email", "duplicate_username", "conflict")
+        else status.HTTP_400_BAD_REQUEST
+    )
+    return JSONResponse(status_code=status_code, content={
+        "detail": reply.get("message", "ユーザーの作成に失敗しました"),
+        "error_type": error_type,
+        "ticket": ticket
+    })
+
+def _sse_event(state: Dict[str, Any]) -> str:
+    return f"event: {state['status']}\ndata: {json.dumps(state)}\n\n"
+
+async def _registration_event_stream(ticket: str, state: Optional[Dict[str, Any]]) -> AsyncIterator[str]:
+    """チケットの状態をSSEで送信し、完了・失敗したら終了する"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.REGISTRATION_SSE_MAX_SECONDS
+    yield _sse_event(state)
+    while state["status"] == TICKET_PENDING:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            # 接続を閉じ、EventSourceの再接続に任せる
+            return
+        state = await registration_notifier.wait(ticket, min(remaining, settings.REGISTRATION_SSE_KEEPALIVE_SECONDS))
+        if state is None:
+            yield _sse_event({"ticket": ticket, "status": "expired"})
+            return
+        if state["status"] == TICKET_PENDING:
+            # プロキシに接続を切られないようにコメント行を送る
+            yield ": keep-alive\n\n"
+        else:
+            yield _sse_event(state)
+
+@router.get("/register/{ticket}")
+async def get_registration_status(
+    request: Request,
+    ticket: uuid.UUID,
+    wait: float = Query(0.0, ge=0.0, le=settings.REGISTRATION_LONG_POLL_MAX_SECONDS),
+    ) -> Any:
+    """
+    登録チケットの状態（pending・completed・failed）を返す
+    
+    waitを指定すると完了するまで最大wait秒待ってから返す（ロングポーリング）。
+    Acceptヘッダーがtext/event-streamの場合は、完了するまで状態の変化をSSEで送信する。
+    いずれもuser-serviceからの返信を受信した時点でRedisのpub/sub経由で起こされる。
+    """
+    logger = get_request_logger(request)
+    state = await get_registration_ticket(ticket.hex)
+    if state is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="登録チケットが見つかりません")
+    
+    if "text/event-stream" in request.headers.get("accept", ""):
+        logger.info(f"登録チケットの状態をSSEで送信: ticket={ticket.hex}")
+        return StreamingResponse(
+            _registration_event_stream(ticket.hex, state),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    if wait > 0 and state["status"] == TICKET_PENDING:
+        state = await registration_notifier.wait(ticket.hex, wait)
+        if state is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="登録チケットが見つかりません")
+    return state
+
 @router.post("/login", response_model=Token)
 async def login(
     request: Request,
@@ -111,6 +250,15 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # 無効化されたユーザーにはトークンを発行しない
+    if not db_user.is_active:
+        logger.warning(f"ログイン失敗: ユーザー '{form_data.username}' は無効化されています")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="ユーザーが無効化されています",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
     # アクセストークン生成
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = await create_access_token(
@@ -227,7 +375,8 @@ async def refresh_token(
             
             # ユーザーの情報を取得
             try:
-                db_user = await auth_user_crud.get_by_id(async_session, auth_user_id)
+                # トークンの発行に必要な識別用の列のみを取得する
+                db_user = await auth_user_crud.get_identity_by_id(async_session, auth_user_id)
             except UserNotFoundError:
                 logger.warning(f"ユーザー情報取得失敗: ユーザーが見つかりません: {auth_user_id}")
                 raise HTTPException(
@@ -363,3 +512,129 @@ async def update_user(auth_user_id: uuid.UUID,
     except DuplicateUsernameError:
         raise HTTPException(status_code=400, detail="Username already exists")
     # その他の例外処理...
+
+async def _run_bulk_action(
+        request: Request,
+        async_session: AsyncSession,
+        action: str,
+        user_ids: List[uuid.UUID],
+        run,
+        event_type: str
+        ) -> List[AuthUserBulkActionResult]:
+    """
+    一括ステータス変更・削除の共通処理
+    - チャンクで処理されたユーザーごとのイベントをアウトボックスに書き込み、
+      変更と同じトランザクションでコミットする
+    - イベントのidはuser-serviceのユーザーID（user_id）とする
+    """
+    logger = get_request_logger(request)
+    if len(user_ids) > settings.BULK_ACTION_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many user_ids: maximum is {settings.BULK_ACTION_MAX_IDS}"
+        )
+    logger.info(f"一括{action}リクエスト: {len(user_ids)}件")
+    
+    async def on_chunk(applied: List[AuthUserBulkActionResult]):
+        for result in applied:
+            enqueue_user_event(async_session, event_type, {
+                "id": result.user_id,
+                "user_id": result.user_id,
+                "auth_user_id": result.id
+            })
+        await async_session.commit()
+    
+    try:
+        results = await run(on_chunk)
+        applied_count = sum(1 for result in results if result.status == AuthUserBulkActionStatus.APPLIED)
+        logger.info(f"一括{action}成功: 処理={applied_count}件, スキップ={len(results) - applied_count}件")
+        return results
+    except Exception as e:
+        await async_session.rollback()
+        logger.error(f"一括{action}失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.post("/users/bulk/activate", response_model=List[AuthUserBulkActionResult])
+async def bulk_activate_users(
+    request: Request,
+    bulk_in: AuthUserBulkUserIdsRequest,
+    current_user: AuthUser = Depends(get_current_admin_user),
+    async_session: AsyncSession = Depends(get_async_session)
+) -> Any:
+    """
+    user_idのリストでユーザーを一括で有効化するエンドポイント
+    - 管理者のみ実行できる
+    - チャンクごとに1回のUPDATE文で処理し、ユーザーごとにuser.activatedイベントを発行する
+    """
+    return await _run_bulk_action(
+        request, async_session, "有効化", bulk_in.user_ids,
+        lambda on_chunk: auth_user_crud.bulk_set_active(async_session, bulk_in.user_ids, True, on_chunk=on_chunk),
+        UserEventTypes.USER_ACTIVATED
+    )
+
+@router.post("/users/bulk/deactivate", response_model=List[AuthUserBulkActionResult])
+async def bulk_deactivate_users(
+    request: Request,
+    bulk_in: AuthUserBulkUserIdsRequest,
+    current_user: AuthUser = Depends(get_current_admin_user),
+    async_session: AsyncSession = Depends(get_async_session)
+) -> Any:
+    """
+    user_idのリストでユーザーを一括で無効化するエンドポイント
+    - 管理者のみ実行できる
+    - チャンクごとに1回のUPDATE文で処理し、ユーザーごとにuser.deactivatedイベントを発行する
+    """
+    return await _run_bulk_action(
+        request, async_session, "無効化", bulk_in.user_ids,
+        lambda on_chunk: auth_user_crud.bulk_set_active(async_session, bulk_in.user_ids, False, on_chunk=on_chunk),
+        UserEventTypes.USER_DEACTIVATED
+    )
+
+@router.post("/users/bulk/delete", response_model=List[AuthUserBulkActionResult])
+async def bulk_delete_users(
+    request: Request,
+    bulk_in: AuthUserBulkUserIdsRequest,
+    current_user: AuthUser = Depends(get_current_admin_user),
+    async_session: AsyncSession = Depends(get_async_session)
+) -> Any:
+    """
+    user_idのリストでユーザーを一括で削除するエンドポイント
+    - 管理者のみ実行できる
+    - チャンクごとに1回のDELETE文で処理し、ユーザーごとにuser.deletedイベントを発行する
+    """
+    return await _run_bulk_action(
+        request, async_session, "削除", bulk_in.user_ids,
+        lambda on_chunk: auth_user_crud.bulk_delete_by_user_ids(async_session, bulk_in.user_ids, on_chunk=on_chunk),
+        UserEventTypes.USER_DELETED
+    )
+
+@router.get("/users/export")
+async def export_users(
+    request: Request,
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    gzip: bool = Query(False, description="gzipで圧縮して返す"),
+    current_user: AuthUser = Depends(get_current_admin_user)
+) -> StreamingResponse:
+    """
+    全ユーザーをストリーミングでエクスポートするエンドポイント
+    - 管理者のみ実行できる
+    - サーバーサイドカーソルから一定行数ずつ取得して送信するため、メモリ使用量は件数に依存しない
+    - パスワードハッシュは出力しない
+    """
+    logger = get_request_logger(request)
+    logger.info(f"ユーザーエクスポートリクエスト: format={format}, gzip={gzip}")
+
+    stmt = select(
+        AuthUser.id,
+        AuthUser.username,
+        AuthUser.email,
+        AuthUser.user_id,
+        AuthUser.created_at,
+        AuthUser.updated_at
+    ).order_by(AuthUser.created_at, AuthUser.id)
+    body = stream_export(stmt, format)
+    headers = {"Content-Disposition": f'attachment; filename="auth_users.{format}"'}
+    if gzip:
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=EXPORT_MEDIA_TYPES[format], headers=headers)
@@ -19,6 +19,9 @@ class Settings(BaseSettings):
     RABBITMQ_USER: str = "guest"
     RABBITMQ_PASSWORD: str = "guest"
     RABBITMQ_VHOST: str = "/"
+    RABBITMQ_BROKER: str = "amqp"  # "memory"を指定するとプロセス内のブローカーを使う（テスト・ベンチマーク用）
+    RABBITMQ_PUBLISHER_CHANNELS: int = 4  # 発行用チャネルのプールのサイズ
+    RABBITMQ_CHANNEL_HEALTH_CHECK_INTERVAL_SECONDS: float = 5.0  # 閉じたチャネルを検出して置き換える間隔
     USER_SYNC_EXCHANGE: str = "user_events"
     USER_SYNC_ROUTING_KEY: str = "user.sync"
 
@@ -45,6 +48,63 @@ class Settings(BaseSettings):
     # トークンブラックリスト関連の設定
     TOKEN_BLACKLIST_ENABLED: bool = True
 
+    # 一括作成関連の設定
+    BULK_INSERT_CHUNK_SIZE: int = 1000  # 1回のINSERT文で処理する最大行数
+    PASSWORD_HASH_WORKERS: int = 4  # パスワードハッシュ計算に使用するスレッド数
+
+    # 一括ステータス変更・削除関連の設定
+    BULK_ACTION_CHUNK_SIZE: int = 500  # 1回のUPDATE/DELETE文とイベントで処理する最大件数
+    BULK_ACTION_MAX_IDS: int = 10000  # 1回のリクエストで受け付ける最大件数
+
+    # 管理者関連の設定
+    ADMIN_USER_IDS: str = ""  # 管理者として扱うユーザーのuser_id（カンマ区切り。一括操作・エクスポートに必要）
+
+    # アウトボックス（イベント送信）関連の設定
+    OUTBOX_RELAY_ENABLED: bool = True
+    OUTBOX_BATCH_SIZE: int = 100  # 1回に送信する最大イベント数
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 1.0  # 新しいイベントの通知がない場合の確認間隔
+    OUTBOX_MAX_BACKOFF_SECONDS: float = 30.0  # 送信失敗時の最大待機時間
+
+    # メッセージ発行（publisher confirm）関連の設定
+    PUBLISHER_MAX_IN_FLIGHT: int = 256  # 確認待ちにできる最大メッセージ数
+    PUBLISHER_BATCH_SIZE: int = 50  # この件数に達したらすぐに送信する
+    PUBLISHER_FLUSH_INTERVAL_MS: float = 5.0  # 件数に達しない場合に送信するまでの最大待機時間
+
+    # メッセージ受信関連の設定
+    CONSUMER_PREFETCH_COUNT: int = 32  # ブローカーから未ackのまま受け取る最大件数
+    CONSUMER_CONCURRENCY: int = 8  # 同時に処理する最大件数
+    CONSUMER_ORDERING_FIELD: str = "username"  # 同じ値のメッセージを順番に処理するuser_dataのフィールド（空文字で無効）
+
+    # シャットダウン関連の設定（uvicornのgraceful shutdownの後にコンシューマーを停止する）
+    SHUTDOWN_HTTP_TIMEOUT_SECONDS: int = 10  # 処理中のHTTPリクエストの完了を待つ最大時間（uvicornの--timeout-graceful-shutdown）
+    SHUTDOWN_DRAIN_TIMEOUT_SECONDS: float = 15.0  # 処理中のメッセージと発行の確認を待つ最大時間
+
+    # RPC（返信を待つリクエスト）関連の設定
+    RPC_TIMEOUT_SECONDS: float = 5.0  # 返信を待つ最大時間（/register?wait=trueなど）
+
+    # メッセージの形式関連の設定
+    MESSAGE_CONTENT_TYPE: str = "application/json"  # "application/msgpack"を指定するとmsgpackで送信する（受信は常に両方に対応）
+    MESSAGE_SOURCE_SERVICE: str = "auth-service"  # エンベロープに記録する送信元サービス
+    MESSAGE_SHARD_KEY_FIELD: str = "username"  # x-shard-keyヘッダーに設定するuser_dataのフィールド（シャードのキューの振り分けに使う）
+
+    # メッセージの再試行・デッドレター関連の設定
+    MESSAGE_RETRY_MAX_ATTEMPTS: int = 5  # デッドレターキューに送るまでの最大再試行回数
+    MESSAGE_RETRY_BASE_DELAY_MS: int = 1000  # 1回目の再試行までの待機時間（以降は回数ごとに倍）
+
+    # メッセージの重複排除（message_id）関連の設定
+    MESSAGE_DEDUP_ENABLED: bool = True
+    MESSAGE_DEDUP_RETENTION_HOURS: float = 168.0  # 処理済みのmessage_idを記録しておく期間（再配信・DLQからの再送を検出できる期間）
+    MESSAGE_DEDUP_PURGE_INTERVAL_SECONDS: float = 3600.0  # 保持期間を過ぎた記録を削除する間隔
+
+    # 登録チケット（登録完了の通知）関連の設定
+    REGISTRATION_TICKET_TTL_SECONDS: int = 600  # チケットの状態を保持する期間
+    REGISTRATION_LONG_POLL_MAX_SECONDS: float = 30.0  # ロングポーリングで待機できる最大時間
+    REGISTRATION_SSE_MAX_SECONDS: float = 120.0  # SSEの接続を維持する最大時間（以降はクライアントが再接続する）
+    REGISTRATION_SSE_KEEPALIVE_SECONDS: float = 15.0  # SSEでコメント行を送る間隔
+
+    # エクスポート関連の設定
+    EXPORT_BATCH_SIZE: int = 1000  # サーバーサイドカーソルから1回に取得する行数
+
     # SQLAlchemyのログ出力設定
     SQLALCHEMY_ECHO: bool = True
 
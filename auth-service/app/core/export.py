@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, Callable, Optional
+
+from sqlalchemy import Select
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.session import AsyncSessionLocal
+
+
+logger = get_logger(__name__)
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _json_default(value):
+    # UUIDやdatetimeを文字列に変換する
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _encode_ndjson(columns, rows) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False) + "\n"
+        for row in rows
+    ).encode()
+
+
+def _encode_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(
+        [value.isoformat() if hasattr(value, "isoformat") else value for value in row]
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def stream_export(
+        stmt: Select,
+        format: str,
+        batch_size: Optional[int] = None,
+        session_factory: Optional[Callable] = None
+        ) -> AsyncIterator[bytes]:
+    """
+    サーバーサイドカーソルで行を取得し、バッチ単位でエンコードしたバイト列を返す
+
+    StreamingResponseの送信中に使用するため、リクエストのセッションではなく専用のセッションを開く。
+    ORMオブジェクトを生成しないよう、stmtには列を直接指定したselectを渡すこと。
+
+    Args:
+        stmt: 出力する列を指定したselect文
+        format: "ndjson" または "csv"
+        batch_size: 1回のフェッチで取得する行数（省略時は設定値）
+        session_factory: セッションファクトリ（省略時はAsyncSessionLocal）
+
+    Yields:
+        エンコード済みのバッチ
+    """
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    session_factory = session_factory or AsyncSessionLocal
+    columns = [column.name for column in stmt.selected_columns]
+    if format == "csv":
+        yield _encode_csv([columns])
+
+    row_count = 0
+    async with session_factory() as session:
+        result = await session.stream(stmt.execution_options(yield_per=batch_size))
+        async for rows in result.partitions(batch_size):
+            row_count += len(rows)
+            yield _encode_ndjson(columns, rows) if format == "ndjson" else _encode_csv(rows)
+    logger.info(f"Export finished: {row_count} rows (format={format})")
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """バイト列のストリームをgzip形式で逐次圧縮する"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
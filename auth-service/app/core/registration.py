@@ -0,0 +1,220 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.redis import get_redis_pool
+
+
+logger = get_logger(__name__)
+
+# 登録チケットの状態
+TICKET_PENDING = "pending"
+TICKET_COMPLETED = "completed"
+TICKET_FAILED = "failed"
+
+# 完了を通知するRedisのpub/subチャネル（メッセージはチケットID）
+REGISTRATION_CHANNEL = "registration_tickets"
+
+
+def _ticket_key(ticket: str) -> str:
+    return f"registration_ticket:{ticket}"
+
+
+async def create_registration_ticket(username: str, email: str) -> str:
+    """
+    登録チケットを発行し、処理中（pending）の状態をRedisに保存する
+
+    Returns:
+        チケットID
+    """
+    redis = await get_redis_pool()
+    ticket = uuid.uuid4().hex
+    state = {
+        "ticket": ticket,
+        "status": TICKET_PENDING,
+        "username": username,
+        "email": email,
+        "created_at": time.time(),
+    }
+    await redis.setex(_ticket_key(ticket), settings.REGISTRATION_TICKET_TTL_SECONDS, json.dumps(state))
+    return ticket
+
+
+async def get_registration_ticket(ticket: str) -> Optional[Dict[str, Any]]:
+    """チケットの状態を取得する。存在しない（期限切れの）場合はNone"""
+    redis = await get_redis_pool()
+    value = await redis.get(_ticket_key(ticket))
+    return json.loads(value) if value else None
+
+
+async def complete_registration_ticket(ticket: str, status: str, **detail: Any) -> bool:
+    """
+    チケットの状態を完了（completed）または失敗（failed）に更新し、待機中のクライアントに通知する
+
+    チケットの有効期限は発行時のものを引き継ぐ。
+
+    Returns:
+        更新した場合はTrue、チケットが存在しない（期限切れの）場合はFalse
+    """
+    redis = await get_redis_pool()
+    state = await get_registration_ticket(ticket)
+    if state is None:
+        logger.warning(f"Registration ticket not found or expired: {ticket}")
+        return False
+    state.update(detail, status=status, completed_at=time.time())
+    if not await redis.set(_ticket_key(ticket), json.dumps(state), xx=True, keepttl=True):
+        return False
+    await redis.publish(REGISTRATION_CHANNEL, ticket)
+    logger.info(f"Registration ticket {ticket} {status}")
+    return True
+
+
+class RegistrationTicketNotifier:
+    """
+    登録チケットの完了を待つクライアント（ロングポーリング・SSE）を起こす
+
+    プロセスごとに1つのpub/subの購読を共有し、受信したチケットIDで待機中のリクエストを起こす。
+    起こされたリクエストはRedisの状態を読み直すため、購読が切れていた間の通知の取りこぼしは
+    再購読時に全員を起こすことで補う。
+
+    Args:
+        channel: 購読するpub/subチャネル
+        redis_factory: Redisクライアントを返す関数
+    """
+
+    def __init__(self, channel: str, redis_factory: Callable[[], Awaitable[Redis]] = get_redis_pool):
+        self.channel = channel
+        self._redis_factory = redis_factory
+        self._waiters: Dict[str, Set[asyncio.Event]] = {}
+        self._subscribed: Optional[asyncio.Event] = None
+        self._listener: Optional[asyncio.Task] = None
+        # 統計情報
+        self.notifications_total = 0
+        self.wakeups_total = 0
+        self.waits_total = 0
+        self.timeouts_total = 0
+        self.resubscribes_total = 0
+
+    @property
+    def subscribed(self) -> bool:
+        return self._subscribed is not None and self._subscribed.is_set()
+
+    async def start(self, timeout: float = 1.0):
+        """購読を開始し、timeout秒まで購読の確立を待つ"""
+        if self._listener is None or self._listener.done():
+            self._subscribed = asyncio.Event()
+            self._listener = asyncio.create_task(self._listen())
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Registration notifier is not subscribed yet, falling back to polling")
+
+    async def _listen(self):
+        connected_before = False
+        while True:
+            pubsub = None
+            try:
+                pubsub = (await self._redis_factory()).pubsub()
+                await pubsub.subscribe(self.channel)
+                self._subscribed.set()
+                if connected_before:
+                    # 購読が切れていた間の通知を取りこぼしているため、全員に状態を読み直させる
+                    self.resubscribes_total += 1
+                    self._wake_all()
+                connected_before = True
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    self.notifications_total += 1
+                    self._wake(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Registration notifier subscription error: {str(e)}")
+                await asyncio.sleep(1.0)
+            finally:
+                self._subscribed.clear()
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+
+    def _wake(self, ticket: Any):
+        if isinstance(ticket, bytes):
+            ticket = ticket.decode()
+        for event in self._waiters.get(ticket, ()):
+            self.wakeups_total += 1
+            event.set()
+
+    def _wake_all(self):
+        for events in self._waiters.values():
+            for event in events:
+                event.set()
+
+    async def wait(self, ticket: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        チケットが完了するか、timeout秒が経過するまで待ち、その時点の状態を返す
+
+        購読できていない間は1秒ごとに状態を読み直す。
+
+        Returns:
+            チケットの状態。存在しない（期限切れの）場合はNone
+        """
+        await self.start()
+        self.waits_total += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        event = asyncio.Event()
+        self._waiters.setdefault(ticket, set()).add(event)
+        try:
+            while True:
+                # 状態を読む前にクリアし、読んだ後の通知を取りこぼさないようにする
+                event.clear()
+                state = await get_registration_ticket(ticket)
+                if state is None or state["status"] != TICKET_PENDING:
+                    return state
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.timeouts_total += 1
+                    return state
+                if not self.subscribed:
+                    remaining = min(remaining, 1.0)
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            events = self._waiters.get(ticket)
+            if events is not None:
+                events.discard(event)
+                if not events:
+                    del self._waiters[ticket]
+
+    async def stop(self):
+        """購読を停止する"""
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        self._wake_all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribed": self.subscribed,
+            "waiting": sum(len(events) for events in self._waiters.values()),
+            "waits_total": self.waits_total,
+            "timeouts_total": self.timeouts_total,
+            "notifications_total": self.notifications_total,
+            "wakeups_total": self.wakeups_total,
+            "resubscribes_total": self.resubscribes_total,
+        }
+
+
+registration_notifier = RegistrationTicketNotifier(REGISTRATION_CHANNEL)
@@ -1,7 +1,9 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, UTC
 import json
 import secrets
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import uuid
 
 from passlib.context import CryptContext
@@ -14,10 +16,32 @@ from app.core.logging import app_logger
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcryptはハッシュ計算中にGILを解放するため、スレッドプールで並列に計算できる
+_password_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+
 def get_password_hash(password: str) -> str:
 
     return pwd_context.hash(password)
 
+async def get_password_hashes(passwords: List[str]) -> List[str]:
+    """
+    複数のパスワードをイベントループ外で並列にハッシュ化する関数
+
+    Args:
+        passwords: ハッシュ化するパスワードのリスト
+
+    Returns:
+        List[str]: 入力と同じ順序のハッシュ化済みパスワード
+    """
+    loop = asyncio.get_running_loop()
+    return list(await asyncio.gather(*(
+        loop.run_in_executor(_password_hash_executor, get_password_hash, password)
+        for password in passwords
+    )))
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
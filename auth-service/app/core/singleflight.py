@@ -0,0 +1,66 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app.core.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# 統計情報を公開するため、生成されたグループを名前で保持する
+_groups: Dict[str, "SingleFlight"] = {}
+
+
+class SingleFlight:
+    """
+    同じキーに対する同時実行中の処理を1つにまとめる（ワーカープロセス単位）
+
+    最初の呼び出し元（リーダー）が処理を実行し、完了前に同じキーで呼び出された
+    後続の呼び出し元は同じFutureの結果（または例外）を共有する。
+    処理が完了するとキーは解放されるため、結果をキャッシュするものではない。
+
+    Args:
+        name: 統計情報に表示するグループ名
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        # 統計情報
+        self.calls = 0
+        self.executions = 0
+        _groups[name] = self
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """キーに対する実行中の処理があれば結果を共有し、なければfnを実行する"""
+        self.calls += 1
+        flight = self._flights.get(key)
+        if flight is None:
+            self.executions += 1
+            flight = asyncio.ensure_future(fn())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._release(key, done))
+        else:
+            logger.debug(f"Joining in-flight call: {self.name}:{key}")
+        # リーダーがキャンセルされても、後続の呼び出し元の処理は継続させる
+        return await asyncio.shield(flight)
+
+    def _release(self, key: Hashable, flight: "asyncio.Future[Any]"):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        shared = self.calls - self.executions
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "shared": shared,
+            "coalescing_ratio": shared / self.calls if self.calls else 0.0,
+            "in_flight": len(self._flights),
+        }
+
+
+def singleflight_stats() -> Dict[str, Dict[str, Any]]:
+    """すべてのグループの統計情報を返す"""
+    return {name: group.stats() for name, group in _groups.items()}
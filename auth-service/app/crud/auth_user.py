@@ -1,31 +1,68 @@
 from collections import Counter
+from datetime import datetime
+from zoneinfo import ZoneInfo
 from pydantic import EmailStr
-from sqlalchemy import select
+from sqlalchemy import bindparam, delete, inspect, or_, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from typing import Awaitable, Callable, List, Optional, Tuple
 import uuid
 
+from app.core.config import settings
 from app.core.logging import get_logger
-from app.core.security import get_password_hash, verify_password
+from app.core.pagination import after_cursor, encode_cursor, estimate_row_count
+from app.core.security import get_password_hash, get_password_hashes, verify_password
+from app.core.singleflight import SingleFlight
+from app.db.session import AsyncSessionLocal
 from app.crud.exceptions import (
     UserNotFoundError,
     DuplicateUsernameError,
     DuplicateEmailError,
     DatabaseIntegrityError,
     DatabaseQueryError
-    )
+)
 from app.models.auth_user import AuthUser
 from app.schemas.auth_user import (
+    AuthUserBulkActionResult,
+    AuthUserBulkActionStatus,
+    AuthUserBulkCreateResult,
+    AuthUserBulkCreateStatus,
     AuthUserCreate,
     AuthUserCreateDB,
     AuthUserUpdate,
-    AuthUserUpdatePassword
-    )
+    AuthUserUpdatePassword,
+    AuthUserUpsert,
+    AuthUserUpsertResult,
+    AuthUserUpsertStatus
+)
+
+
+def _dialect_insert(session: AsyncSession):
+    """セッションの接続先に対応したON CONFLICT対応のinsert関数を返す"""
+    if session.bind.dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+# 頻繁に実行される取得クエリは事前に構築し、値はバインドパラメータで渡す
+# （呼び出しごとの文の構築を省き、コンパイル結果のキャッシュを再利用する）
+_SELECT_BY_ID = select(AuthUser).where(AuthUser.id == bindparam("id"))
+_SELECT_BY_USERNAME = select(AuthUser).where(AuthUser.username == bindparam("username"))
+_SELECT_BY_EMAIL = select(AuthUser).where(AuthUser.email == bindparam("email"))
+_SELECT_BY_USER_ID = select(AuthUser).where(AuthUser.user_id == bindparam("user_id"))
+# 識別用の列のみ（hashed_passwordやタイムスタンプを含まない）
+_SELECT_IDENTITY_BY_ID = select(AuthUser.id, AuthUser.user_id, AuthUser.username).where(
+    AuthUser.id == bindparam("id")
+)
+
 
 class CRUDAuthUser:
     # クラスレベルのロガーの初期化
     logger = get_logger(__name__)
+    # 同じキーに対する同時実行中の取得を1回のクエリにまとめる
+    _user_id_flight = SingleFlight("auth_user.get_by_user_id")
     async def create(self, session: AsyncSession, obj_in: AuthUserCreateDB) -> AuthUser:
         """
         user_idを必須としてユーザーを作成する
@@ -38,11 +75,13 @@ class CRUDAuthUser:
             作成されたユーザー
         """
         self.logger.info(f"Creating new user with username: {obj_in.username} and user_id: {obj_in.user_id}")
+        # ハッシュ化はイベントループ外で行う（応答コンシューマーの並行処理を止めない）
+        hashed_password, = await get_password_hashes([obj_in.password])
         try:
             db_obj = AuthUser(
                 username=obj_in.username,
                 email=obj_in.email,
-                hashed_password=get_password_hash(obj_in.password),
+                hashed_password=hashed_password,
                 user_id=obj_in.user_id
             )
             session.add(db_obj)
@@ -83,33 +122,36 @@ class CRUDAuthUser:
             raise DuplicateEmailError(field="email", value=duplicate_emails[0], 
                                      message=f"Duplicate email in input: {duplicate_emails[0]}")
         
-        # 3. データベースでの既存ユーザー名チェック（一括クエリ）
-        result = await session.execute(select(AuthUser).filter(AuthUser.username.in_(usernames)))
-        existing_users_by_username = result.scalars().all()
+        # 3. データベースでの既存ユーザー名・メールアドレスチェック（キー列のみを1回のクエリで取得）
+        result = await session.execute(
+            select(AuthUser.username, AuthUser.email).filter(
+                or_(AuthUser.username.in_(usernames), AuthUser.email.in_(emails))
+            )
+        )
+        existing_rows = result.all()
+        requested_usernames = set(usernames)
+        requested_emails = set(emails)
+        existing_username = next((row.username for row in existing_rows if row.username in requested_usernames), None)
+        existing_email = next((row.email for row in existing_rows if row.email in requested_emails), None)
         
-        if existing_users_by_username:
-            existing_username = existing_users_by_username[0].username
+        if existing_username:
             self.logger.error(f"Failed to create multiple users: username '{existing_username}' already exists in database")
             raise DuplicateUsernameError(field="username", value=existing_username, 
                                         message=f"Username already exists: {existing_username}")
         
-        # 4. データベースでの既存メールアドレスチェック（一括クエリ）
-        result = await session.execute(select(AuthUser).filter(AuthUser.email.in_(emails)))
-        existing_users_by_email = result.scalars().all()
-        
-        if existing_users_by_email:
-            existing_email = existing_users_by_email[0].email
+        if existing_email:
             self.logger.error(f"Failed to create multiple users: email '{existing_email}' already exists in database")
             raise DuplicateEmailError(field="email", value=existing_email, 
                                      message=f"Email already exists: {existing_email}")
         
-        # 5. すべてのチェックが通過したら、ユーザーを作成
+        # 4. すべてのチェックが通過したら、パスワードを並列にハッシュ化してユーザーを作成
+        hashed_passwords = await get_password_hashes([obj_in.password for obj_in in obj_in_list])
         db_objs = []
-        for obj_in in obj_in_list:
+        for obj_in, hashed_password in zip(obj_in_list, hashed_passwords):
             db_obj = AuthUser(
                 username=obj_in.username,
                 email=obj_in.email,
-                hashed_password=get_password_hash(obj_in.password),
+                hashed_password=hashed_password,
                 user_id=obj_in.user_id
             )
             db_objs.append(db_obj)
@@ -120,6 +162,247 @@ class CRUDAuthUser:
         self.logger.info(f"Successfully created {len(db_objs)} users")
         return db_objs
     
+    async def bulk_create(
+            self,
+            session: AsyncSession,
+            obj_in_list: List[AuthUserCreateDB],
+            chunk_size: Optional[int] = None
+            ) -> List[AuthUserBulkCreateResult]:
+        """
+        大量のユーザーを一括作成し、行ごとの結果を返す
+        
+        create_multipleと異なり重複があっても処理を中断せず、重複した行はスキップして
+        結果に理由を記録する。チャンクごとにキー列のみの重複チェック、スレッドプールでの
+        パスワードハッシュ化、複数行のINSERT ... ON CONFLICT DO NOTHINGを行う。
+        
+        Args:
+            session: データベースセッション
+            obj_in_list: ユーザー作成スキーマのリスト（user_idを含む）
+            chunk_size: 1回のINSERT文で処理する最大行数（省略時は設定値）
+            
+        Returns:
+            入力と同じ順序の行ごとの結果
+        """
+        chunk_size = chunk_size or settings.BULK_INSERT_CHUNK_SIZE
+        self.logger.info(f"Bulk creating users: {len(obj_in_list)} users, chunk_size={chunk_size}")
+        results: List[Optional[AuthUserBulkCreateResult]] = [None] * len(obj_in_list)
+        
+        def _result(index: int, status: AuthUserBulkCreateStatus, id: Optional[uuid.UUID] = None):
+            obj_in = obj_in_list[index]
+            return AuthUserBulkCreateResult(
+                index=index,
+                username=obj_in.username,
+                email=obj_in.email,
+                user_id=obj_in.user_id,
+                status=status,
+                id=id
+            )
+        
+        # 1. 入力データ内での重複チェック（最初に出現した行のみを作成対象とする）
+        seen_usernames, seen_emails, seen_user_ids = set(), set(), set()
+        candidates = []
+        for index, obj_in in enumerate(obj_in_list):
+            if obj_in.username in seen_usernames or obj_in.email in seen_emails or obj_in.user_id in seen_user_ids:
+                results[index] = _result(index, AuthUserBulkCreateStatus.DUPLICATE_IN_INPUT)
+                continue
+            seen_usernames.add(obj_in.username)
+            seen_emails.add(obj_in.email)
+            seen_user_ids.add(obj_in.user_id)
+            candidates.append(index)
+        
+        insert = _dialect_insert(session)
+        created_count = 0
+        try:
+            for start in range(0, len(candidates), chunk_size):
+                chunk = candidates[start:start + chunk_size]
+                
+                # 2. データベースでの重複チェック（キー列のみを1回のクエリで取得）
+                result = await session.execute(
+                    select(AuthUser.username, AuthUser.email, AuthUser.user_id).filter(
+                        or_(
+                            AuthUser.username.in_([obj_in_list[i].username for i in chunk]),
+                            AuthUser.email.in_([obj_in_list[i].email for i in chunk]),
+                            AuthUser.user_id.in_([obj_in_list[i].user_id for i in chunk])
+                        )
+                    )
+                )
+                existing_rows = result.all()
+                existing_usernames = {row.username for row in existing_rows}
+                existing_emails = {row.email for row in existing_rows}
+                existing_user_ids = {row.user_id for row in existing_rows}
+                
+                insertable = []
+                for index in chunk:
+                    obj_in = obj_in_list[index]
+                    if obj_in.username in existing_usernames:
+                        results[index] = _result(index, AuthUserBulkCreateStatus.DUPLICATE_USERNAME)
+                    elif obj_in.email in existing_emails:
+                        results[index] = _result(index, AuthUserBulkCreateStatus.DUPLICATE_EMAIL)
+                    elif obj_in.user_id in existing_user_ids:
+                        results[index] = _result(index, AuthUserBulkCreateStatus.DUPLICATE_USER_ID)
+                    else:
+                        insertable.append(index)
+                if not insertable:
+                    continue
+                
+                # 3. 重複のない行のパスワードのみを並列にハッシュ化
+                hashed_passwords = await get_password_hashes([obj_in_list[i].password for i in insertable])
+                
+                # 4. 複数行INSERT（チェック後に並行して作成された行はON CONFLICTでスキップ）
+                now = datetime.now(ZoneInfo(settings.TZ))
+                rows = []
+                for index, hashed_password in zip(insertable, hashed_passwords):
+                    obj_in = obj_in_list[index]
+                    rows.append({
+                        "id": uuid.uuid4(),
+                        "username": obj_in.username,
+                        "email": obj_in.email,
+                        "hashed_password": hashed_password,
+                        "user_id": obj_in.user_id,
+                        "created_at": now,
+                        "updated_at": now,
+                    })
+                stmt = insert(AuthUser).values(rows).on_conflict_do_nothing().returning(AuthUser.id)
+                result = await session.execute(stmt)
+                inserted_ids = set(result.scalars().all())
+                
+                for index, row in zip(insertable, rows):
+                    if row["id"] in inserted_ids:
+                        results[index] = _result(index, AuthUserBulkCreateStatus.CREATED, row["id"])
+                        created_count += 1
+                    else:
+                        results[index] = _result(index, AuthUserBulkCreateStatus.CONFLICT)
+        except IntegrityError as e:
+            self.logger.error(f"Database integrity error while bulk creating users: {str(e)}")
+            raise DatabaseIntegrityError("Database integrity error") from e
+        # commitはsessionのfinallyで行う
+        self.logger.info(f"Bulk create finished: {created_count} created, {len(obj_in_list) - created_count} skipped")
+        return results
+    
+    async def upsert_many(
+            self,
+            session: AsyncSession,
+            obj_in_list: List[AuthUserUpsert],
+            chunk_size: Optional[int] = None
+            ) -> List[AuthUserUpsertResult]:
+        """
+        同期元のユーザー状態を冪等に適用し、行ごとの結果を返す
+        
+        チャンクごとにINSERT ... ON CONFLICT (user_id) DO UPDATE ... WHERE version < excluded.versionを
+        1回実行する。適用済みのバージョン以下の行は更新されないため、イベントの再送や重複配信、
+        順序の入れ替わりがあっても結果は変わらない。重複は例外ではなく行ごとの結果として返す。
+        
+        Args:
+            session: データベースセッション
+            obj_in_list: upsertスキーマのリスト
+            chunk_size: 1回のINSERT文で処理する最大行数（省略時は設定値）
+            
+        Returns:
+            入力と同じ順序の行ごとの結果
+        """
+        chunk_size = chunk_size or settings.BULK_INSERT_CHUNK_SIZE
+        self.logger.info(f"Upserting users: {len(obj_in_list)} rows, chunk_size={chunk_size}")
+        results: List[Optional[AuthUserUpsertResult]] = [None] * len(obj_in_list)
+        
+        def _result(index: int, status: AuthUserUpsertStatus):
+            obj_in = obj_in_list[index]
+            return AuthUserUpsertResult(index=index, user_id=obj_in.user_id, version=obj_in.version, status=status)
+        
+        # 1. 入力データ内で同じuser_idの行は最も新しいバージョンのみを適用対象とする
+        latest = {}
+        for index, obj_in in enumerate(obj_in_list):
+            current = latest.get(obj_in.user_id)
+            if current is None or obj_in.version > obj_in_list[current].version:
+                latest[obj_in.user_id] = index
+        for index, obj_in in enumerate(obj_in_list):
+            if latest[obj_in.user_id] != index:
+                results[index] = _result(index, AuthUserUpsertStatus.SUPERSEDED_IN_INPUT)
+        
+        # 2. 入力データ内で他のuser_idとusername/emailが重複する行は適用しない
+        seen_usernames, seen_emails = set(), set()
+        candidates = []
+        for index in sorted(latest.values()):
+            obj_in = obj_in_list[index]
+            if obj_in.username in seen_usernames or obj_in.email in seen_emails:
+                results[index] = _result(index, AuthUserUpsertStatus.CONFLICT)
+                continue
+            seen_usernames.add(obj_in.username)
+            seen_emails.add(obj_in.email)
+            candidates.append(index)
+        
+        insert = _dialect_insert(session)
+        applied_count = 0
+        try:
+            for start in range(0, len(candidates), chunk_size):
+                chunk = candidates[start:start + chunk_size]
+                
+                # 3. 他のユーザーが使用しているusername/emailのチェック（キー列のみを1回のクエリで取得）
+                result = await session.execute(
+                    select(AuthUser.user_id, AuthUser.username, AuthUser.email).filter(
+                        or_(
+                            AuthUser.username.in_([obj_in_list[i].username for i in chunk]),
+                            AuthUser.email.in_([obj_in_list[i].email for i in chunk])
+                        )
+                    )
+                )
+                username_owners, email_owners = {}, {}
+                for row in result.all():
+                    username_owners[row.username] = row.user_id
+                    email_owners[row.email] = row.user_id
+                
+                rows = []
+                now = datetime.now(ZoneInfo(settings.TZ))
+                for index in chunk:
+                    obj_in = obj_in_list[index]
+                    if username_owners.get(obj_in.username, obj_in.user_id) != obj_in.user_id \
+                            or email_owners.get(obj_in.email, obj_in.user_id) != obj_in.user_id:
+                        results[index] = _result(index, AuthUserUpsertStatus.CONFLICT)
+                        continue
+                    rows.append((index, {
+                        "id": uuid.uuid4(),
+                        "user_id": obj_in.user_id,
+                        "username": obj_in.username,
+                        "email": obj_in.email,
+                        "hashed_password": obj_in.hashed_password,
+                        "is_active": obj_in.is_active,
+                        "version": obj_in.version,
+                        "created_at": now,
+                        "updated_at": now,
+                    }))
+                if not rows:
+                    continue
+                
+                # 4. 複数行のINSERT ... ON CONFLICT DO UPDATE（より新しいバージョンの場合のみ更新）
+                stmt = insert(AuthUser).values([row for _, row in rows])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[AuthUser.user_id],
+                    set_={
+                        "username": stmt.excluded.username,
+                        "email": stmt.excluded.email,
+                        "hashed_password": stmt.excluded.hashed_password,
+                        "is_active": stmt.excluded.is_active,
+                        "version": stmt.excluded.version,
+                        "updated_at": stmt.excluded.updated_at,
+                    },
+                    where=AuthUser.version < stmt.excluded.version
+                ).returning(AuthUser.user_id)
+                result = await session.execute(stmt)
+                applied = set(result.scalars().all())
+                
+                for index, _ in rows:
+                    if obj_in_list[index].user_id in applied:
+                        results[index] = _result(index, AuthUserUpsertStatus.APPLIED)
+                        applied_count += 1
+                    else:
+                        results[index] = _result(index, AuthUserUpsertStatus.STALE)
+        except IntegrityError as e:
+            # チェック後に並行して他のユーザーが同じusername/emailを使用した場合
+            self.logger.error(f"Database integrity error while upserting users: {str(e)}")
+            raise DatabaseIntegrityError("Database integrity error") from e
+        # commitはsessionのfinallyで行う
+        self.logger.info(f"Upsert finished: {applied_count} applied, {len(obj_in_list) - applied_count} skipped")
+        return results
+    
     async def get_all(self, session: AsyncSession) -> List[AuthUser]:
         self.logger.info("Retrieving all users")
         try:
@@ -131,9 +414,57 @@ class CRUDAuthUser:
             self.logger.error(f"Error retrieving all users: {str(e)}")
             raise DatabaseQueryError(f"Failed to retrieve all users: {str(e)}") from e
     
+    async def get_page(
+            self,
+            session: AsyncSession,
+            limit: int,
+            cursor: Optional[str] = None,
+            username_prefix: Optional[str] = None,
+            email_domain: Optional[str] = None,
+            is_active: Optional[bool] = None,
+            include_total: bool = False
+            ) -> Tuple[List[AuthUser], Optional[str], Optional[int]]:
+        """
+        (created_at, id)のキーセットでユーザーをページ単位に取得する
+        
+        Args:
+            session: データベースセッション
+            limit: 1ページの最大件数
+            cursor: 前ページのnext_cursor（省略時は先頭から）
+            username_prefix: ユーザー名の前方一致条件
+            email_domain: メールアドレスのドメイン条件
+            is_active: 有効/無効の条件
+            include_total: Trueの場合、条件に一致する件数の推定値も返す
+            
+        Returns:
+            (ユーザーのリスト, 次ページのカーソル, 推定件数)
+        """
+        self.logger.info(f"Retrieving user page: limit={limit}, cursor={cursor}")
+        stmt = select(AuthUser)
+        if username_prefix:
+            stmt = stmt.filter(AuthUser.username.startswith(username_prefix, autoescape=True))
+        if email_domain:
+            stmt = stmt.filter(AuthUser.email.endswith(f"@{email_domain.lower()}", autoescape=True))
+        if is_active is not None:
+            stmt = stmt.filter(AuthUser.is_active == is_active)
+        page_stmt = after_cursor(stmt, AuthUser, cursor).limit(limit + 1)
+        try:
+            estimated_total = await estimate_row_count(session, stmt) if include_total else None
+            result = await session.execute(page_stmt)
+            users = list(result.scalars().all())
+        except Exception as e:
+            self.logger.error(f"Error retrieving user page: {str(e)}")
+            raise DatabaseQueryError(f"Failed to retrieve user page: {str(e)}") from e
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor(users[-1].created_at, users[-1].id)
+        self.logger.info(f"Retrieved {len(users)} users")
+        return users, next_cursor, estimated_total
+    
     async def get_by_id(self, session: AsyncSession, id: uuid.UUID) -> AuthUser:
         self.logger.info(f"Retrieving user by id: {id}")
-        result = await session.execute(select(AuthUser).filter(AuthUser.id == id))
+        result = await session.execute(_SELECT_BY_ID, {"id": id})
         user = result.scalar_one_or_none()
         if user:
             self.logger.info(f"Found user with id: {id}")
@@ -142,9 +473,24 @@ class CRUDAuthUser:
             raise UserNotFoundError(user_id=id)
         return user
     
+    async def get_identity_by_id(self, session: AsyncSession, id: uuid.UUID) -> Row:
+        """
+        識別用の列(id, user_id, username)のみを取得する
+        
+        hashed_passwordやタイムスタンプを読み込まず、ORMオブジェクトも生成しない。
+        トークンの発行など、ユーザーの識別情報だけが必要な呼び出し元で使用する。
+        """
+        self.logger.info(f"Retrieving user identity by id: {id}")
+        result = await session.execute(_SELECT_IDENTITY_BY_ID, {"id": id})
+        row = result.one_or_none()
+        if row is None:
+            self.logger.warning(f"User with id {id} not found")
+            raise UserNotFoundError(user_id=id)
+        return row
+    
     async def get_by_username(self, session: AsyncSession, username: str) -> AuthUser:
         self.logger.info(f"Retrieving user by username: {username}")
-        result = await session.execute(select(AuthUser).filter(AuthUser.username == username))
+        result = await session.execute(_SELECT_BY_USERNAME, {"username": username})
         user = result.scalar_one_or_none()
         if user:
             self.logger.info(f"Found user with username: {username}")
@@ -155,7 +501,7 @@ class CRUDAuthUser:
     
     async def get_by_email(self, session: AsyncSession, email: EmailStr) -> AuthUser:
         self.logger.info(f"Retrieving user by email: {email}")
-        result = await session.execute(select(AuthUser).filter(AuthUser.email == email))
+        result = await session.execute(_SELECT_BY_EMAIL, {"email": email})
         user = result.scalar_one_or_none()
         if user:
             self.logger.info(f"Found user with email: {email}")
@@ -165,8 +511,39 @@ class CRUDAuthUser:
         return user
     
     async def get_by_user_id(self, session: AsyncSession, user_id: uuid.UUID) -> AuthUser:
+        """
+        user_idでユーザーを取得する
+        
+        呼び出し元のセッションに読み込み済みで期限切れでない場合は、クエリを発行せずにそのオブジェクトを返す。
+        同じuser_idに対する取得が同時に実行中の場合は、そのクエリの結果を共有する。
+        共有するクエリは呼び出し元のセッションではなく専用のセッションで実行し、切り離された結果を
+        クエリを発行せずに呼び出し元のセッションへmergeして返す。
+        """
+        loaded = self._find_loaded_by_user_id(session, user_id)
+        if loaded is not None:
+            return loaded
+        user = await self._user_id_flight.do(
+            str(user_id), lambda: self._load_by_user_id(session, user_id)
+        )
+        return self._find_loaded_by_user_id(session, user_id) or await session.merge(user, load=False)
+    
+    def _find_loaded_by_user_id(self, session: AsyncSession, user_id: uuid.UUID) -> Optional[AuthUser]:
+        # 読み込み済みの属性だけを参照する（期限切れの属性を読み込むクエリを発行しない）
+        for obj in session.identity_map.values():
+            if isinstance(obj, AuthUser):
+                state = inspect(obj)
+                if not state.expired_attributes and str(state.dict.get("user_id")) == str(user_id):
+                    return obj
+        return None
+    
+    async def _load_by_user_id(self, session: AsyncSession, user_id: uuid.UUID) -> AuthUser:
+        # 複数のリクエストで共有するため、リクエストのセッションではなく同じエンジンの専用のセッションを使う
+        async with AsyncSessionLocal(bind=session.bind) as flight_session:
+            return await self._get_by_user_id(flight_session, user_id)
+    
+    async def _get_by_user_id(self, session: AsyncSession, user_id: uuid.UUID) -> AuthUser:
         self.logger.info(f"Retrieving user by user_id: {user_id}")
-        result = await session.execute(select(AuthUser).filter(AuthUser.user_id == user_id))
+        result = await session.execute(_SELECT_BY_USER_ID, {"user_id": user_id})
         user = result.scalar_one_or_none()
         if user:
             self.logger.info(f"Found user with user_id: {user_id}")
@@ -175,66 +552,73 @@ class CRUDAuthUser:
             raise UserNotFoundError(user_id=user_id)
         return user
     
-    async def update_by_id(self, session: AsyncSession, id: uuid.UUID, obj_in: AuthUserUpdate) -> AuthUser:
-        self.logger.info(f"Updating user by id: {id}")
-        db_obj = await self.get_by_id(session, id)
-        update_fields = []
+    def _values_from_update(self, obj_in: AuthUserUpdate) -> dict:
+        """更新スキーマから更新対象の列と値を取り出す"""
+        values = {}
         if obj_in.username:
-            self.logger.info(f"Updating username from '{db_obj.username}' to '{obj_in.username}'")
-            db_obj.username = obj_in.username
-            update_fields.append("username")
+            values["username"] = obj_in.username
         if obj_in.email:
-            self.logger.info(f"Updating email from '{db_obj.email}' to '{obj_in.email}'")
-            db_obj.email = obj_in.email
-            update_fields.append("email")
+            values["email"] = obj_in.email
         # passowrdは別のメソッドで実装
+        return values
+    
+    async def _update_returning(self, session: AsyncSession, where, values: dict) -> Optional[AuthUser]:
+        """
+        UPDATE ... RETURNINGを1回実行し、更新後のユーザーを返す（該当なしの場合はNone）
+        
+        IntegrityErrorは重複の種類に応じた例外に変換する。
+        """
         try:
-            await session.flush()
-            # commitはsessionのfinallyで行う
-            self.logger.info(f"Successfully updated user {id}, fields: {', '.join(update_fields)}")
+            result = await session.execute(
+                update(AuthUser).where(where).values(**values).returning(AuthUser)
+            )
+            return result.scalar_one_or_none()
         except IntegrityError as e:
             # エラーメッセージやコードを検査して、具体的なエラータイプを特定
             if "username" in str(e.orig).lower():
-                self.logger.error(f"Failed to update user: duplicate username '{obj_in.username}'")
+                self.logger.error(f"Failed to update user: duplicate username '{values.get('username')}'")
                 raise DuplicateUsernameError(message="Username already exists")
             elif "email" in str(e.orig).lower():
-                self.logger.error(f"Failed to update user: duplicate email '{obj_in.email}'")
+                self.logger.error(f"Failed to update user: duplicate email '{values.get('email')}'")
                 raise DuplicateEmailError(message="Email already exists")
             else:
                 # その他のIntegrityErrorの場合
                 self.logger.error(f"Database integrity error while updating user: {str(e)}")
                 raise DatabaseIntegrityError("Database integrity error") from e
+    
+    async def _delete_returning(self, session: AsyncSession, where) -> Optional[AuthUser]:
+        """DELETE ... RETURNINGを1回実行し、削除したユーザーを返す（該当なしの場合はNone）"""
+        result = await session.execute(delete(AuthUser).where(where).returning(AuthUser))
+        db_obj = result.scalar_one_or_none()
+        if db_obj is not None:
+            # RETURNINGで読み込まれたオブジェクトは削除済みの行のため、セッションから切り離す
+            session.expunge(db_obj)
+        return db_obj
+    
+    async def update_by_id(self, session: AsyncSession, id: uuid.UUID, obj_in: AuthUserUpdate) -> AuthUser:
+        self.logger.info(f"Updating user by id: {id}")
+        values = self._values_from_update(obj_in)
+        if not values:
+            return await self.get_by_id(session, id)
+        db_obj = await self._update_returning(session, AuthUser.id == id, values)
+        if db_obj is None:
+            self.logger.warning(f"User with id {id} not found")
+            raise UserNotFoundError(user_id=id)
+        # commitはsessionのfinallyで行う
+        self.logger.info(f"Successfully updated user {id}, fields: {', '.join(values)}")
         return db_obj
     
     async def update_by_username(self, session: AsyncSession, username: str, obj_in: AuthUserUpdate) -> AuthUser:
         self.logger.info(f"Updating user by username: {username}")
-        db_obj = await self.get_by_username(session, username)
-        update_fields = []
-        if obj_in.username:
-            self.logger.info(f"Updating username from '{db_obj.username}' to '{obj_in.username}'")
-            db_obj.username = obj_in.username
-            update_fields.append("username")
-        if obj_in.email:
-            self.logger.info(f"Updating email from '{db_obj.email}' to '{obj_in.email}'")
-            db_obj.email = obj_in.email
-            update_fields.append("email")
-        # passowrdは別のメソッドで実装
-        try:
-            await session.flush()
-            # commitはsessionのfinallyで行う
-            self.logger.info(f"Successfully updated user with username {username}, fields: {', '.join(update_fields)}")
-        except IntegrityError as e:
-            # エラーメッセージやコードを検査して、具体的なエラータイプを特定
-            if "username" in str(e.orig).lower():
-                self.logger.error(f"Failed to update user: duplicate username '{obj_in.username}'")
-                raise DuplicateUsernameError(message="Username already exists")
-            elif "email" in str(e.orig).lower():
-                self.logger.error(f"Failed to update user: duplicate email '{obj_in.email}'")
-                raise DuplicateEmailError(message="Email already exists")
-            else:
-                # その他のIntegrityErrorの場合
-                self.logger.error(f"Database integrity error while updating user: {str(e)}")
-                raise DatabaseIntegrityError("Database integrity error") from e
+        values = self._values_from_update(obj_in)
+        if not values:
+            return await self.get_by_username(session, username)
+        db_obj = await self._update_returning(session, AuthUser.username == username, values)
+        if db_obj is None:
+            self.logger.warning(f"User with username {username} not found")
+            raise UserNotFoundError(username=username)
+        # commitはsessionのfinallyで行う
+        self.logger.info(f"Successfully updated user with username {username}, fields: {', '.join(values)}")
         return db_obj
 
     async def update_password(self, session: AsyncSession, id: uuid.UUID, obj_in: AuthUserUpdatePassword) -> AuthUser:
@@ -254,27 +638,30 @@ class CRUDAuthUser:
     
     async def delete_by_id(self, session: AsyncSession, id: uuid.UUID) -> AuthUser:
         self.logger.info(f"Deleting user by id: {id}")
-        db_obj = await self.get_by_id(session, id)
-        await session.delete(db_obj)
-        await session.flush()
+        db_obj = await self._delete_returning(session, AuthUser.id == id)
+        if db_obj is None:
+            self.logger.warning(f"User with id {id} not found")
+            raise UserNotFoundError(user_id=id)
         # commitはsessionのfinallyで行う
         self.logger.info(f"Successfully deleted user with id: {id}")
         return db_obj
     
     async def delete_by_username(self, session: AsyncSession, username: str) -> AuthUser:
         self.logger.info(f"Deleting user by username: {username}")
-        db_obj = await self.get_by_username(session, username)
-        await session.delete(db_obj)
-        await session.flush()
+        db_obj = await self._delete_returning(session, AuthUser.username == username)
+        if db_obj is None:
+            self.logger.warning(f"User with username {username} not found")
+            raise UserNotFoundError(username=username)
         # commitはsessionのfinallyで行う
         self.logger.info(f"Successfully deleted user with username: {username}")
         return db_obj
 
     async def delete_by_email(self, session: AsyncSession, email: EmailStr) -> AuthUser:
         self.logger.info(f"Deleting user by email: {email}")
-        db_obj = await self.get_by_email(session, email)
-        await session.delete(db_obj)
-        await session.flush()
+        db_obj = await self._delete_returning(session, AuthUser.email == email)
+        if db_obj is None:
+            self.logger.warning(f"User with email {email} not found")
+            raise UserNotFoundError(message=f"User with email {email} not found")
         # commitはsessionのfinallyで行う
         self.logger.info(f"Successfully deleted user with email: {email}")
         return db_obj
@@ -294,9 +681,10 @@ class CRUDAuthUser:
         # 文字列からUUIDへの変換
         if isinstance(user_id, str):
             user_id = uuid.UUID(user_id)
-        db_obj = await self.get_by_user_id(session, user_id)
-        await session.delete(db_obj)
-        await session.flush()
+        db_obj = await self._delete_returning(session, AuthUser.user_id == user_id)
+        if db_obj is None:
+            self.logger.warning(f"User with user_id {user_id} not found")
+            raise UserNotFoundError(user_id=user_id)
         # commitはsessionのfinallyで行う
         self.logger.info(f"Successfully deleted user with user_id: {user_id}")
         return db_obj
@@ -316,11 +704,113 @@ class CRUDAuthUser:
         # 文字列からUUIDへの変換
         if isinstance(user_id, str):
             user_id = uuid.UUID(user_id)
-        db_obj = await self.get_by_user_id(session, user_id)
-        db_obj.is_active = True
-        await session.flush()
+        db_obj = await self._update_returning(session, AuthUser.user_id == user_id, {"is_active": True})
+        if db_obj is None:
+            self.logger.warning(f"User with user_id {user_id} not found")
+            raise UserNotFoundError(user_id=user_id)
         # commitはsessionのfinallyで行う
         self.logger.info(f"Successfully activated user with user_id: {user_id}")
         return db_obj
 
+    async def bulk_set_active(
+            self,
+            session: AsyncSession,
+            user_ids: List[uuid.UUID],
+            is_active: bool,
+            chunk_size: Optional[int] = None,
+            on_chunk: Optional[Callable[[List[AuthUserBulkActionResult]], Awaitable[None]]] = None
+            ) -> List[AuthUserBulkActionResult]:
+        """
+        user_idのリストに対して有効/無効をまとめて設定し、IDごとの結果を返す
+        
+        チャンクごとにUPDATE ... WHERE user_id IN (...) RETURNINGを1回実行する。
+        
+        Args:
+            session: データベースセッション
+            user_ids: 対象のuser_idのリスト
+            is_active: 設定する値
+            chunk_size: 1回のUPDATE文で処理する最大件数（省略時は設定値）
+            on_chunk: チャンクの処理後に、そのチャンクで処理された結果を渡して呼び出す関数
+            
+        Returns:
+            入力と同じ順序のIDごとの結果
+        """
+        self.logger.info(f"Bulk setting is_active={is_active}: {len(user_ids)} user_ids")
+        return await self._bulk_by_user_ids(
+            session,
+            user_ids,
+            lambda chunk: update(AuthUser).where(AuthUser.user_id.in_(chunk)).values(is_active=is_active),
+            chunk_size,
+            on_chunk
+        )
+    
+    async def bulk_delete_by_user_ids(
+            self,
+            session: AsyncSession,
+            user_ids: List[uuid.UUID],
+            chunk_size: Optional[int] = None,
+            on_chunk: Optional[Callable[[List[AuthUserBulkActionResult]], Awaitable[None]]] = None
+            ) -> List[AuthUserBulkActionResult]:
+        """
+        user_idのリストに対応するユーザーをまとめて削除し、IDごとの結果を返す
+        
+        チャンクごとにDELETE ... WHERE user_id IN (...) RETURNINGを1回実行する。
+        引数と戻り値はbulk_set_activeと同じ。
+        """
+        self.logger.info(f"Bulk deleting users: {len(user_ids)} user_ids")
+        return await self._bulk_by_user_ids(
+            session,
+            user_ids,
+            lambda chunk: delete(AuthUser).where(AuthUser.user_id.in_(chunk)),
+            chunk_size,
+            on_chunk
+        )
+    
+    async def _bulk_by_user_ids(self, session: AsyncSession, user_ids, build_stmt, chunk_size, on_chunk):
+        chunk_size = chunk_size or settings.BULK_ACTION_CHUNK_SIZE
+        results: List[Optional[AuthUserBulkActionResult]] = [None] * len(user_ids)
+        
+        # 入力データ内での重複チェック（最初に出現したIDのみを処理対象とする）
+        first_index = {}
+        for index, user_id in enumerate(user_ids):
+            if user_id in first_index:
+                results[index] = AuthUserBulkActionResult(
+                    index=index, user_id=user_id, status=AuthUserBulkActionStatus.DUPLICATE_IN_INPUT
+                )
+            else:
+                first_index[user_id] = index
+        
+        candidates = list(first_index)
+        applied_count = 0
+        try:
+            for start in range(0, len(candidates), chunk_size):
+                chunk = candidates[start:start + chunk_size]
+                result = await session.execute(
+                    build_stmt(chunk)
+                    .returning(AuthUser.id, AuthUser.user_id)
+                    .execution_options(synchronize_session=False)
+                )
+                applied = {row.user_id: row.id for row in result.all()}
+                applied_results = []
+                for user_id in chunk:
+                    index = first_index[user_id]
+                    if user_id in applied:
+                        results[index] = AuthUserBulkActionResult(
+                            index=index, user_id=user_id, status=AuthUserBulkActionStatus.APPLIED, id=applied[user_id]
+                        )
+                        applied_results.append(results[index])
+                    else:
+                        results[index] = AuthUserBulkActionResult(
+                            index=index, user_id=user_id, status=AuthUserBulkActionStatus.NOT_FOUND
+                        )
+                applied_count += len(applied_results)
+                if on_chunk is not None:
+                    await on_chunk(applied_results)
+        except Exception as e:
+            self.logger.error(f"Error in bulk operation by user_ids: {str(e)}")
+            raise DatabaseQueryError(f"Failed to process users by user_ids: {str(e)}") from e
+        self.logger.info(f"Bulk operation finished: {applied_count} applied, {len(user_ids) - applied_count} skipped")
+        return results
+
+
 auth_user_crud = CRUDAuthUser()
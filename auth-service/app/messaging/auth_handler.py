@@ -1,79 +1,180 @@
 import uuid
-import json
-from typing import Dict, Any
+from typing import Any, Dict, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from aio_pika import IncomingMessage
+from pydantic import ValidationError
 
 from app.core.logging import app_logger
 from app.core.redis import get_password_from_redis, delete_password_from_redis
+from app.core.registration import TICKET_COMPLETED, TICKET_FAILED, complete_registration_ticket
 from app.db.session import get_async_session
 from app.crud.auth_user import auth_user_crud
+from app.messaging.codec import MessageDecodeError, decode_body
+from app.messaging.dedup import message_deduplicator, message_id_of
+from app.messaging.rabbitmq import rabbitmq_client
+from app.messaging.retry import PoisonMessageError
 from app.schemas.auth_user import AuthUserCreateDB
 
 
+# 重複排除の記録に使うコンシューマー名
+USER_CREATION_RESPONSE_CONSUMER = "user_creation_response"
+
+
+def _registration_ticket_of(user_data: Dict[str, Any]) -> Optional[str]:
+    """レスポンスから登録チケットを取り出す（user-serviceは元のリクエストをoriginal_requestに含めて返す）"""
+    original_request = user_data.get("original_request")
+    if isinstance(original_request, dict) and original_request.get("registration_ticket"):
+        return original_request["registration_ticket"]
+    return user_data.get("registration_ticket")
+
+
+async def _notify_registration(ticket: Optional[str], status: str, **detail: Any):
+    """登録チケットを更新し、完了を待っているクライアントに通知する（失敗してもメッセージの処理は続ける）"""
+    if not ticket:
+        return
+    try:
+        await complete_registration_ticket(ticket, status, **detail)
+    except Exception as e:
+        app_logger.warning(f"登録チケットの通知に失敗しました: ticket={ticket}, error={str(e)}")
+
+
+async def _create_registered_user(
+        session: AsyncSession,
+        user_id: Any,
+        original_request: Dict[str, Any],
+        password_key: str
+        ):
+    """user-serviceで作成されたユーザーの認証ユーザーを、一時保存したパスワードで作成して有効化する"""
+    password = await get_password_from_redis(password_key)
+    if password is None:
+        # 有効期限切れの場合もRedisの障害の場合もあるため、再試行する（上限に達するとDLQ）
+        raise RuntimeError(f"一時保存したパスワードが見つかりません: {password_key}")
+    try:
+        user_in = AuthUserCreateDB(
+            username=original_request.get("username"),
+            email=original_request.get("email"),
+            password=password,
+            user_id=user_id
+        )
+    except ValidationError as e:
+        raise PoisonMessageError(f"登録リクエストが不正です: {str(e)}") from e
+    auth_user = await auth_user_crud.create(session, user_in)
+    auth_user.is_active = True
+
+
 async def handle_user_creation_response(message: IncomingMessage):
     """
     user-serviceから受け取ったユーザー作成レスポンスを処理する
     
+    user-serviceの返信は、作成したユーザーのIDをid、登録リクエストをoriginal_requestに含める。
+    成功の場合はoriginal_requestのpassword_keyで一時保存したパスワードを取り出して認証ユーザーを作成し、
+    登録チケットを完了にする。失敗の場合は登録チケットを失敗にする。
+    auth-serviceで作成済みのユーザーへの返信（user_idを含む従来の形式）の場合は、そのユーザーを有効化・削除する。
+    
+    処理できないメッセージはDLQへ、データベースエラーなどで失敗したメッセージは
+    遅延再試行キューへ送る（いずれも送信の確認後にackされる）。
+    処理済みのmessage_idのメッセージ（再配信）は処理せずにackする。
+    
     Args:
         message: RabbitMQから受け取ったメッセージ
     """
     logger = app_logger
     logger.info(f"ユーザー作成レスポンスの処理を開始: {message}")
+    retry_policy = rabbitmq_client.user_creation_response_retry
     
     try:
-        # メッセージボディからJSONデータを取得
-        message_body = message.body.decode('utf-8')
-        user_data = json.loads(message_body)
-    except json.JSONDecodeError:
-        logger.error("ユーザー作成レスポンスのJSONデコードに失敗しました")
-        await message.ack()  # エラー時も確認済みとしてメッセージを処理
+        # メッセージボディをcontent-type（JSONまたはmsgpack）に応じて復元
+        user_data = decode_body(message.body, message.content_type)
+    except MessageDecodeError as e:
+        logger.error("ユーザー作成レスポンスのデコードに失敗しました")
+        await retry_policy.reject(message, PoisonMessageError(f"デコードエラー: {str(e)}"))
         return
     except Exception as e:
         logger.error(f"メッセージ処理中に予期しないエラーが発生しました: {str(e)}")
-        await message.ack()
+        await retry_policy.reject(message, PoisonMessageError(str(e)))
         return
-
-    # 必須フィールドの確認
-    if "user_id" not in user_data:
-        logger.error("ユーザーIDが含まれていません")
-        await message.ack()
+    
+    # イベント形式（event_type, user_data）の場合はuser_dataを取り出す
+    if isinstance(user_data, dict) and "event_type" in user_data:
+        user_data = user_data.get("user_data", {})
+    
+    if not isinstance(user_data, dict):
+        logger.error("ユーザー作成レスポンスの形式が不正です")
+        await retry_policy.reject(message, PoisonMessageError("ユーザー作成レスポンスの形式が不正です"))
         return
     
-    # ステータスの確認
+    ticket = _registration_ticket_of(user_data)
+    original_request = user_data.get("original_request")
+    if not isinstance(original_request, dict):
+        original_request = {}
+    password_key = original_request.get("password_key")
+    # 従来の形式はuser_id、user-serviceの返信はidに（認証ユーザーのuser_idとなる）ユーザーIDを含める
+    user_id = user_data.get("user_id") or user_data.get("id")
+    message_id = message_id_of(message)
     status = user_data.get("status")
-    if status == "failure":
-        # 失敗の場合の処理
-        user_id = user_data.get("user_id")
+    
+    if status in ("failure", "error"):
         error_message = user_data.get("message", "不明なエラー")
-        
         logger.warning(f"ユーザー作成に失敗しました: {error_message}, user_id={user_id}")
         
-        # user_idに基づいてユーザーを削除
-        try:
-            async for session in get_async_session():
-                await auth_user_crud.delete_by_user_id(session, user_id)
-                await session.commit()
-        except Exception as e:
-            logger.error(f"ユーザー削除中にエラーが発生しました: {str(e)}")
+        # 登録チケットで完了を待っているクライアントにすぐ通知する
+        await _notify_registration(
+            ticket,
+            TICKET_FAILED,
+            error_type=user_data.get("error_type"),
+            message=error_message
+        )
+        if password_key:
+            await delete_password_from_redis(password_key)
+        
+        if "user_id" in user_data:
+            # user_idに基づいてユーザーを削除
+            try:
+                async for session in get_async_session():
+                    # 処理済みの記録は削除と同じトランザクションで書き込む
+                    if await message_deduplicator.claim(session, USER_CREATION_RESPONSE_CONSUMER, message_id):
+                        await auth_user_crud.delete_by_user_id(session, user_id)
+                        await session.commit()
+            except Exception as e:
+                logger.error(f"ユーザー削除中にエラーが発生しました: {str(e)}")
+                await retry_policy.reject(message, e)
+                return
         
         await message.ack()
         return
     
+    if status != "success":
+        logger.warning(f"未知のステータスのユーザー作成レスポンスです: {status}")
+        await message.ack()
+        return
+    
+    # 必須フィールドの確認
+    if not user_id:
+        logger.error("ユーザーIDが含まれていません")
+        # 処理できない返信のため、完了を待っているクライアントには失敗を通知する
+        await _notify_registration(ticket, TICKET_FAILED, message="ユーザー作成レスポンスが不正です")
+        await retry_policy.reject(message, PoisonMessageError("ユーザーIDが含まれていません"))
+        return
+    
     # 成功の場合の処理
-    if status == "success":
-        user_id = user_data.get("user_id")
-        
-        # ユーザーを有効化
-        try:
-            async for session in get_async_session():
-                # ユーザーの有効化
-                activated_user = await auth_user_crud.activate_user(session, user_id)
+    try:
+        async for session in get_async_session():
+            # 処理済みの記録はユーザーの作成・有効化と同じトランザクションで書き込む
+            if await message_deduplicator.claim(session, USER_CREATION_RESPONSE_CONSUMER, message_id):
+                if password_key:
+                    await _create_registered_user(session, user_id, original_request, password_key)
+                else:
+                    # auth-serviceで作成済みのユーザーを有効化
+                    await auth_user_crud.activate_user(session, user_id)
                 await session.commit()
                 
                 logger.info(f"ユーザーを有効化しました: user_id={user_id}")
-        except Exception as e:
-            logger.error(f"ユーザー有効化処理中にエラーが発生しました: {str(e)}", exc_info=True)
+    except Exception as e:
+        logger.error(f"ユーザー有効化処理中にエラーが発生しました: {str(e)}", exc_info=True)
+        await retry_policy.reject(message, e)
+        return
     
-    # 常にメッセージを確認済みとしてマーク
+    if password_key:
+        await delete_password_from_redis(password_key)
+    await _notify_registration(ticket, TICKET_COMPLETED, user_id=str(user_id))
     await message.ack()
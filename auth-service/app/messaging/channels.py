@@ -0,0 +1,225 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aio_pika.abc import AbstractChannel, AbstractConnection, AbstractExchange
+
+from app.core.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class ManagedChannel:
+    """ChannelManagerが管理するチャネルと、その統計情報"""
+
+    def __init__(
+            self,
+            name: str,
+            role: str,
+            setup: Optional[Callable[[AbstractChannel], Awaitable[None]]] = None,
+            prefetch_count: Optional[int] = None
+            ):
+        self.name = name
+        self.role = role
+        self.setup = setup
+        self.prefetch_count = prefetch_count
+        self.channel: Optional[AbstractChannel] = None
+        self.exchanges: Dict[str, AbstractExchange] = {}
+        self.closed_checks = 0
+        # 統計情報
+        self.opened_total = 0
+        self.errors_total = 0
+        self.recovered_total = 0
+        self.published_total = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.channel is not None and not self.channel.is_closed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "role": self.role,
+            "open": self.is_open,
+            "prefetch_count": self.prefetch_count,
+            "opened_total": self.opened_total,
+            "errors_total": self.errors_total,
+            "recovered_total": self.recovered_total,
+            "published_total": self.published_total,
+            "last_error": self.last_error,
+        }
+
+
+class ChannelManager:
+    """
+    用途ごとにRabbitMQのチャネルを分けて管理する
+
+    - 発行用: publisher confirmを有効にしたチャネルのプール。発行のたびに順番に割り当てるため、
+      大量の受信によるフロー制御で発行が止まらず、複数のチャネルで並行して発行できる。
+      プールは最初の発行時に作成する。
+    - 受信用: キューごとの専用チャネル。prefetchはキューごとに設定する。
+
+    aio-pikaのロバストなチャネルはチャネルレベルのエラー（存在しないexchangeへの発行など）の後に
+    自動で開き直されるが、開き直せなかったチャネルは定期的なヘルスチェックで検出し、
+    新しいチャネルに置き換える（受信用はsetupを再実行してキューの宣言と受信の開始をやり直す）。
+
+    Args:
+        publisher_pool_size: 発行用チャネルの数
+        health_check_interval: ヘルスチェックの間隔（秒）
+    """
+
+    def __init__(self, publisher_pool_size: int, health_check_interval: float):
+        self.publisher_pool_size = publisher_pool_size
+        self.health_check_interval = health_check_interval
+        self._connection: Optional[AbstractConnection] = None
+        self._publishers: List[ManagedChannel] = []
+        self._consumers: Dict[str, ManagedChannel] = {}
+        self._next_publisher = 0
+        self._pool_lock = asyncio.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+        # 統計情報
+        self.replaced_total = 0
+
+    def attach(self, connection: AbstractConnection):
+        """チャネルを開く接続を設定する"""
+        self._connection = connection
+
+    async def _open(self, managed: ManagedChannel):
+        # ヘルスチェックは最初にチャネルを開いた時に開始する
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._run_health_checks())
+        channel = await self._connection.channel(publisher_confirms=True)
+        if managed.prefetch_count:
+            await channel.set_qos(prefetch_count=managed.prefetch_count)
+
+        def on_close(_: Any, exc: Optional[BaseException] = None):
+            if exc is not None and not isinstance(exc, asyncio.CancelledError):
+                managed.errors_total += 1
+                managed.last_error = str(exc)
+                logger.warning(f"Channel {managed.name} closed with error: {str(exc)}")
+
+        def on_reopen(_: Any):
+            managed.recovered_total += 1
+            managed.exchanges.clear()
+            logger.info(f"Channel {managed.name} reopened")
+
+        channel.close_callbacks.add(on_close)
+        if hasattr(channel, "reopen_callbacks"):
+            channel.reopen_callbacks.add(on_reopen)
+        managed.channel = channel
+        managed.exchanges.clear()
+        managed.closed_checks = 0
+        managed.opened_total += 1
+        if managed.setup is not None:
+            await managed.setup(channel)
+
+    async def _ensure_publishers(self):
+        async with self._pool_lock:
+            while len(self._publishers) < self.publisher_pool_size:
+                managed = ManagedChannel(f"publisher-{len(self._publishers)}", "publisher")
+                await self._open(managed)
+                self._publishers.append(managed)
+
+    async def exchange(self, name: str) -> AbstractExchange:
+        """
+        発行用チャネルのプールから順番にチャネルを選び、そのチャネルのexchangeを返す
+
+        nameが空文字の場合はデフォルトexchangeを返す。閉じているチャネルは飛ばす。
+        """
+        if len(self._publishers) < self.publisher_pool_size:
+            await self._ensure_publishers()
+        managed = None
+        for _ in range(len(self._publishers)):
+            candidate = self._publishers[self._next_publisher]
+            self._next_publisher = (self._next_publisher + 1) % len(self._publishers)
+            if candidate.is_open:
+                managed = candidate
+                break
+        if managed is None:
+            # すべて閉じている場合は1つを開き直す
+            managed = self._publishers[self._next_publisher]
+            await self._replace(managed)
+        managed.published_total += 1
+        exchange = managed.exchanges.get(name)
+        if exchange is None:
+            if name:
+                exchange = await managed.channel.get_exchange(name, ensure=False)
+            else:
+                exchange = managed.channel.default_exchange
+            managed.exchanges[name] = exchange
+        return exchange
+
+    async def open_consumer_channel(
+            self,
+            name: str,
+            setup: Callable[[AbstractChannel], Awaitable[None]],
+            prefetch_count: int
+            ) -> AbstractChannel:
+        """
+        キュー専用の受信用チャネルを開き、setup（キューの宣言と受信の開始）を実行する
+
+        チャネルを置き換えた場合もsetupを再実行する。
+        """
+        managed = ManagedChannel(name, "consumer", setup=setup, prefetch_count=prefetch_count)
+        await self._open(managed)
+        self._consumers[name] = managed
+        return managed.channel
+
+    async def _replace(self, managed: ManagedChannel):
+        logger.warning(f"Replacing channel {managed.name}")
+        old = managed.channel
+        if old is not None and not old.is_closed:
+            await old.close()
+        await self._open(managed)
+        self.replaced_total += 1
+
+    async def check_health(self):
+        """
+        閉じたままのチャネルを新しいチャネルに置き換える
+
+        ロバストなチャネルの自動の開き直しを待つため、2回続けて閉じていた場合に置き換える。
+        接続自体が切れている場合は接続の復旧（チャネルも復元される）を待つ。
+        """
+        if self._connection is None or self._connection.is_closed:
+            return
+        for managed in [*self._publishers, *self._consumers.values()]:
+            if managed.is_open:
+                managed.closed_checks = 0
+                continue
+            managed.closed_checks += 1
+            if managed.closed_checks < 2:
+                continue
+            try:
+                await self._replace(managed)
+            except Exception as e:
+                managed.last_error = str(e)
+                logger.error(f"Failed to replace channel {managed.name}: {str(e)}")
+
+    async def _run_health_checks(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"Channel health check error: {str(e)}", exc_info=True)
+
+    async def close(self):
+        """ヘルスチェックを停止し、管理しているチャネルを閉じる"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        for managed in [*self._publishers, *self._consumers.values()]:
+            if managed.is_open:
+                await managed.channel.close()
+        self._publishers = []
+        self._consumers = {}
+        self._connection = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "publisher_pool_size": self.publisher_pool_size,
+            "replaced_total": self.replaced_total,
+            "channels": [managed.stats() for managed in [*self._publishers, *self._consumers.values()]],
+        }
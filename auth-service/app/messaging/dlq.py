@@ -0,0 +1,36 @@
+"""
+デッドレターキュー（DLQ）の確認と再送を行うコマンド
+
+使い方:
+    python -m app.messaging.dlq inspect user_creation_response --limit 10
+    python -m app.messaging.dlq replay user_creation_response --limit 100
+"""
+import argparse
+import asyncio
+import json
+
+from app.messaging.rabbitmq import rabbitmq_client
+
+
+async def main(command: str, queue_name: str, limit: int):
+    policy = rabbitmq_client.retry_policies[queue_name]
+    await rabbitmq_client.initialize()
+    try:
+        await policy.declare(rabbitmq_client._channel)
+        if command == "inspect":
+            for entry in await policy.inspect(limit):
+                print(json.dumps(entry, ensure_ascii=False, default=str))
+        else:
+            replayed = await policy.replay(limit)
+            print(f"Replayed {replayed} messages to {queue_name}")
+    finally:
+        await rabbitmq_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or replay dead-lettered messages")
+    parser.add_argument("command", choices=["inspect", "replay"])
+    parser.add_argument("queue", choices=sorted(rabbitmq_client.retry_policies))
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.command, args.queue, args.limit))
@@ -0,0 +1,663 @@
+import asyncio
+import itertools
+import time
+import uuid
+import zlib
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple, Union
+
+from aio_pika import Message
+
+from app.core.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+DIRECT_REPLY_TO = "amq.rabbitmq.reply-to"
+
+# 配信するメッセージに引き継ぐプロパティ
+_MESSAGE_PROPERTIES = (
+    "headers",
+    "content_type",
+    "content_encoding",
+    "delivery_mode",
+    "priority",
+    "correlation_id",
+    "reply_to",
+    "expiration",
+    "message_id",
+    "timestamp",
+    "type",
+    "user_id",
+    "app_id",
+)
+
+
+class QueueEmpty(Exception):
+    """get(fail=True)でキューが空だった"""
+    pass
+
+
+def topic_matches(pattern: str, routing_key: str) -> bool:
+    """
+    topic exchangeのバインディングキーとルーティングキーを照合する
+
+    *は1語、#は0語以上に一致する（語は.で区切る）。
+    """
+    return _match_words(pattern.split("."), routing_key.split(".") if routing_key else [])
+
+
+def jump_consistent_hash(key: int, buckets: int) -> int:
+    """キーを0〜buckets-1のバケットに割り当てる（Jump Consistent Hash、RabbitMQのconsistent-hash exchangeと同じ方式）"""
+    bucket, j = -1, 0
+    while j < buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+
+def _binding_matches(exchange_type: str, binding_key: str, routing_key: str) -> bool:
+    return (
+        exchange_type == "fanout"
+        or (exchange_type == "direct" and binding_key == routing_key)
+        or (exchange_type == "topic" and topic_matches(binding_key, routing_key))
+    )
+
+
+def _match_words(pattern: List[str], words: List[str]) -> bool:
+    if not pattern:
+        return not words
+    head, rest = pattern[0], pattern[1:]
+    if head == "#":
+        return any(_match_words(rest, words[i:]) for i in range(len(words) + 1))
+    if not words:
+        return False
+    if head == "*" or head == words[0]:
+        return _match_words(rest, words[1:])
+    return False
+
+
+class _Delivery:
+    """キューに格納されたメッセージ"""
+
+    __slots__ = ("message", "exchange", "routing_key", "redelivered", "enqueued_at")
+
+    def __init__(self, message: Message, exchange: str, routing_key: str, redelivered: bool = False):
+        self.message = message
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.redelivered = redelivered
+        self.enqueued_at = time.monotonic()
+
+
+class _Consumer:
+    __slots__ = ("tag", "channel", "callback", "no_ack", "unacked")
+
+    def __init__(self, tag: str, channel: "MemoryChannel", callback: Callable[[Any], Awaitable[Any]], no_ack: bool):
+        self.tag = tag
+        self.channel = channel
+        self.callback = callback
+        self.no_ack = no_ack
+        self.unacked = 0
+
+    @property
+    def has_capacity(self) -> bool:
+        prefetch_count = self.channel.prefetch_count
+        return self.no_ack or not prefetch_count or self.unacked < prefetch_count
+
+
+class _QueueState:
+    """ブローカー側のキュー（チャネルをまたいで共有される）"""
+
+    def __init__(self, broker: "MemoryBroker", name: str, durable: bool, exclusive: bool,
+                 auto_delete: bool, arguments: Optional[Dict[str, Any]]):
+        self.broker = broker
+        self.name = name
+        self.durable = durable
+        self.exclusive = exclusive
+        self.auto_delete = auto_delete
+        self.arguments = dict(arguments or {})
+        self.messages: Deque[_Delivery] = deque()
+        self.consumers: List[_Consumer] = []
+        self._next_consumer = 0
+        self.owner: Optional["MemoryConnection"] = None
+
+    def enqueue(self, delivery: _Delivery, front: bool = False):
+        if front:
+            self.messages.appendleft(delivery)
+        else:
+            self.messages.append(delivery)
+        expiration = delivery.message.expiration
+        if expiration and not front:
+            asyncio.get_running_loop().call_later(float(expiration), self._expire, delivery)
+        self.dispatch()
+
+    def _expire(self, delivery: _Delivery):
+        try:
+            self.messages.remove(delivery)
+        except ValueError:
+            return  # 配信済み
+        self.broker.dead_letter(self, delivery, "expired")
+
+    def dispatch(self):
+        """受信可能なコンシューマーにメッセージを順番に配信する"""
+        while self.messages and self.consumers:
+            consumer = self._select_consumer()
+            if consumer is None:
+                return
+            delivery = self.messages.popleft()
+            consumer.channel.deliver(self, consumer, delivery)
+
+    def _select_consumer(self) -> Optional[_Consumer]:
+        if self.arguments.get("x-single-active-consumer"):
+            # 最初に登録したコンシューマーだけに配信する（キャンセルされると次のコンシューマーが引き継ぐ）
+            consumer = self.consumers[0]
+            return consumer if consumer.has_capacity else None
+        for _ in range(len(self.consumers)):
+            consumer = self.consumers[self._next_consumer % len(self.consumers)]
+            self._next_consumer += 1
+            if consumer.has_capacity:
+                return consumer
+        return None
+
+
+class MemoryBroker:
+    """
+    RabbitMQの代わりにプロセス内でメッセージを配送するブローカー（テスト・ベンチマーク用）
+
+    サービスが使う範囲のAMQPの機能を実装する。
+    - exchange（direct・fanout・topic・x-consistent-hash、デフォルトexchange）とバインディングによるルーティング
+    - exchange間のバインディング（exchange.bind）
+    - ack・nack（requeue）・reject、チャネルのprefetch（未ackの件数の上限）
+    - メッセージのexpirationとキューのx-dead-letter-exchange（遅延再試行・DLQ）
+    - direct reply-to（amq.rabbitmq.reply-to）
+    - 排他キュー・自動削除キュー・x-single-active-consumer、チャネルを閉じた時の未ackのメッセージの再配信
+
+    永続化・クラスタリング・フロー制御は実装しない。ルーティングできないメッセージは破棄して件数を記録する。
+    """
+
+    def __init__(self):
+        self.exchanges: Dict[str, str] = {"": "direct"}
+        self.exchange_arguments: Dict[str, Dict[str, Any]] = {"": {}}
+        self.bindings: Dict[str, List[Tuple[str, str]]] = {"": []}
+        # exchange間のバインディング（送信元exchange → 送信先exchangeとバインディングキー）
+        self.exchange_bindings: Dict[str, List[Tuple[str, str]]] = {}
+        self.queues: Dict[str, _QueueState] = {}
+        self._channels: Dict[str, "MemoryChannel"] = {}
+        self._ids = itertools.count(1)
+        # 統計情報
+        self.published_total = 0
+        self.unroutable_total = 0
+        self.delivered_total = 0
+        self.acked_total = 0
+        self.requeued_total = 0
+        self.dead_lettered_total = 0
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def declare_exchange(self, name: str, exchange_type: str, arguments: Optional[Dict[str, Any]] = None):
+        self.exchanges.setdefault(name, exchange_type)
+        self.exchange_arguments.setdefault(name, dict(arguments or {}))
+        self.bindings.setdefault(name, [])
+
+    def declare_queue(self, name: Optional[str], durable: bool, exclusive: bool, auto_delete: bool,
+                      arguments: Optional[Dict[str, Any]], owner: "MemoryConnection") -> _QueueState:
+        name = name or f"amq.gen-{uuid.uuid4().hex}"
+        queue = self.queues.get(name)
+        if queue is None:
+            queue = _QueueState(self, name, durable, exclusive, auto_delete, arguments)
+            if exclusive:
+                queue.owner = owner
+            self.queues[name] = queue
+        return queue
+
+    def delete_queue(self, name: str):
+        self.queues.pop(name, None)
+        for bindings in self.bindings.values():
+            bindings[:] = [binding for binding in bindings if binding[0] != name]
+
+    def bind(self, exchange: str, queue: str, routing_key: str):
+        if exchange not in self.exchanges:
+            raise ValueError(f"Exchange not found: {exchange}")
+        binding = (queue, routing_key)
+        if binding not in self.bindings[exchange]:
+            self.bindings[exchange].append(binding)
+
+    def unbind(self, exchange: str, queue: str, routing_key: str):
+        binding = (queue, routing_key)
+        if binding in self.bindings.get(exchange, []):
+            self.bindings[exchange].remove(binding)
+
+    def bind_exchange(self, source: str, destination: str, routing_key: str):
+        for name in (source, destination):
+            if name not in self.exchanges:
+                raise ValueError(f"Exchange not found: {name}")
+        binding = (destination, routing_key)
+        bindings = self.exchange_bindings.setdefault(source, [])
+        if binding not in bindings:
+            bindings.append(binding)
+
+    def route(self, exchange: str, routing_key: str, headers: Optional[Dict[str, Any]] = None) -> List[_QueueState]:
+        if exchange == "":
+            queue = self.queues.get(routing_key)
+            return [queue] if queue is not None else []
+        names: List[str] = []
+        self._route(exchange, routing_key, headers or {}, names, set())
+        return [self.queues[name] for name in names if name in self.queues]
+
+    def _route(self, exchange: str, routing_key: str, headers: Dict[str, Any], names: List[str], visited: Set[str]):
+        exchange_type = self.exchanges.get(exchange)
+        if exchange_type is None:
+            raise ValueError(f"Exchange not found: {exchange}")
+        visited.add(exchange)
+        if exchange_type == "x-consistent-hash":
+            matched = self._consistent_hash(exchange, routing_key, headers)
+        else:
+            matched = [
+                queue_name for queue_name, binding_key in self.bindings[exchange]
+                if _binding_matches(exchange_type, binding_key, routing_key)
+            ]
+        for queue_name in matched:
+            if queue_name not in names:
+                names.append(queue_name)
+        for destination, binding_key in self.exchange_bindings.get(exchange, []):
+            if destination not in visited and _binding_matches(exchange_type, binding_key, routing_key):
+                self._route(destination, routing_key, headers, names, visited)
+
+    def _consistent_hash(self, exchange: str, routing_key: str, headers: Dict[str, Any]) -> List[str]:
+        """
+        x-consistent-hash exchangeの配送先のキューを1つ選ぶ
+
+        バインディングキーを重みとしてバインドした順にバケットを割り当て、
+        hash-header引数のヘッダー（指定がなければルーティングキー）のハッシュでバケットを選ぶ。
+        """
+        buckets = [queue_name for queue_name, weight in self.bindings[exchange] for _ in range(int(weight or 1))]
+        if not buckets:
+            return []
+        hash_header = self.exchange_arguments[exchange].get("hash-header")
+        key = str(headers.get(hash_header, "")) if hash_header else routing_key
+        return [buckets[jump_consistent_hash(zlib.crc32(key.encode()), len(buckets))]]
+
+    def publish(self, exchange: str, routing_key: str, message: Message, channel: Optional["MemoryChannel"] = None):
+        self.published_total += 1
+        if exchange == "" and routing_key.startswith(f"{DIRECT_REPLY_TO}."):
+            # direct reply-toの返信はリクエストを発行したチャネルに直接配信する
+            reply_channel = self._channels.get(routing_key[len(DIRECT_REPLY_TO) + 1:])
+            if reply_channel is None or not reply_channel.deliver_reply(_Delivery(message, exchange, routing_key)):
+                self.unroutable_total += 1
+            return
+        if message.reply_to == DIRECT_REPLY_TO and channel is not None:
+            message.reply_to = f"{DIRECT_REPLY_TO}.{channel.id}"
+        queues = self.route(exchange, routing_key, message.headers)
+        if not queues:
+            self.unroutable_total += 1
+            logger.debug(f"Unroutable message dropped: exchange={exchange!r}, routing_key={routing_key!r}")
+            return
+        for queue in queues:
+            queue.enqueue(_Delivery(message, exchange, routing_key))
+
+    def dead_letter(self, queue: _QueueState, delivery: _Delivery, reason: str):
+        """キューのx-dead-letter-exchangeにメッセージを送る（設定がなければ破棄する）"""
+        dead_letter_exchange = queue.arguments.get("x-dead-letter-exchange")
+        if dead_letter_exchange is None:
+            return
+        self.dead_lettered_total += 1
+        original = delivery.message
+        headers = dict(original.headers or {})
+        headers["x-death"] = [{
+            "queue": queue.name,
+            "reason": reason,
+            "exchange": delivery.exchange,
+            "routing-keys": [delivery.routing_key],
+        }] + list(headers.get("x-death", []))
+        properties = {name: getattr(original, name) for name in _MESSAGE_PROPERTIES}
+        properties.update(headers=headers, expiration=None)
+        routing_key = queue.arguments.get("x-dead-letter-routing-key", delivery.routing_key)
+        self.publish(dead_letter_exchange, routing_key, Message(original.body, **properties))
+
+    def register_channel(self, channel: "MemoryChannel"):
+        self._channels[channel.id] = channel
+
+    def unregister_channel(self, channel: "MemoryChannel"):
+        self._channels.pop(channel.id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "published_total": self.published_total,
+            "unroutable_total": self.unroutable_total,
+            "delivered_total": self.delivered_total,
+            "acked_total": self.acked_total,
+            "requeued_total": self.requeued_total,
+            "dead_lettered_total": self.dead_lettered_total,
+            "queues": {
+                name: {"messages": len(queue.messages), "consumers": len(queue.consumers)}
+                for name, queue in self.queues.items()
+            },
+        }
+
+
+class MemoryIncomingMessage:
+    """コンシューマーに配信されたメッセージ（aio_pika.IncomingMessageと同じ操作を持つ）"""
+
+    def __init__(self, channel: "MemoryChannel", delivery: _Delivery, delivery_tag: Optional[int],
+                 consumer_tag: Optional[str], no_ack: bool):
+        message = delivery.message
+        self.body = message.body
+        for name in _MESSAGE_PROPERTIES:
+            setattr(self, name, getattr(message, name))
+        self.headers = dict(message.headers or {})
+        self.exchange = delivery.exchange
+        self.routing_key = delivery.routing_key
+        self.redelivered = delivery.redelivered
+        self.delivery_tag = delivery_tag
+        self.consumer_tag = consumer_tag
+        self.channel = channel
+        self.processed = no_ack
+        self.body_size = len(self.body)
+
+    def __repr__(self) -> str:
+        return (
+            f"MemoryIncomingMessage(routing_key={self.routing_key!r}, message_id={self.message_id!r}, "
+            f"delivery_tag={self.delivery_tag})"
+        )
+
+    async def ack(self, multiple: bool = False):
+        self.channel.settle(self.delivery_tag, multiple, requeue=None)
+        self.processed = True
+
+    async def nack(self, multiple: bool = False, requeue: bool = True):
+        self.channel.settle(self.delivery_tag, multiple, requeue=requeue)
+        self.processed = True
+
+    async def reject(self, requeue: bool = False):
+        self.channel.settle(self.delivery_tag, False, requeue=requeue)
+        self.processed = True
+
+    def process(self, requeue: bool = False, reject_on_redelivered: bool = False, ignore_processed: bool = False):
+        return _ProcessContext(self, requeue, ignore_processed)
+
+
+class _ProcessContext:
+    """aio_pikaのmessage.process()と同じく、正常終了でack、例外でrejectする"""
+
+    def __init__(self, message: MemoryIncomingMessage, requeue: bool, ignore_processed: bool):
+        self.message = message
+        self.requeue = requeue
+        self.ignore_processed = ignore_processed
+
+    async def __aenter__(self) -> MemoryIncomingMessage:
+        return self.message
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        if self.message.processed or self.ignore_processed:
+            return
+        if exc_type is None:
+            await self.message.ack()
+        else:
+            await self.message.reject(requeue=self.requeue)
+
+
+class MemoryExchange:
+    def __init__(self, channel: "MemoryChannel", name: str):
+        self.channel = channel
+        self.name = name
+
+    async def publish(self, message: Message, routing_key: str, *, mandatory: bool = True,
+                      immediate: bool = False, timeout: Optional[float] = None) -> None:
+        self.channel.ensure_open()
+        self.channel.broker.publish(self.name, routing_key, message, channel=self.channel)
+
+    async def bind(self, exchange: Union["MemoryExchange", str], routing_key: str = "", *,
+                   arguments: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None):
+        """exchangeに届いたメッセージのうちrouting_keyに一致するものをこのexchangeに送る"""
+        source = exchange if isinstance(exchange, str) else exchange.name
+        self.channel.broker.bind_exchange(source, self.name, routing_key)
+
+
+class MemoryQueue:
+    def __init__(self, channel: "MemoryChannel", name: str):
+        self.channel = channel
+        self.name = name
+
+    @property
+    def _state(self) -> _QueueState:
+        state = self.channel.broker.queues.get(self.name)
+        if state is None:
+            raise ValueError(f"Queue not found: {self.name}")
+        return state
+
+    async def bind(self, exchange: Union[MemoryExchange, str], routing_key: Optional[str] = None, *,
+                   arguments: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None):
+        exchange_name = exchange if isinstance(exchange, str) else exchange.name
+        self.channel.broker.bind(exchange_name, self.name, routing_key if routing_key is not None else self.name)
+
+    async def unbind(self, exchange: Union[MemoryExchange, str], routing_key: Optional[str] = None, *,
+                     arguments: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None):
+        exchange_name = exchange if isinstance(exchange, str) else exchange.name
+        self.channel.broker.unbind(exchange_name, self.name, routing_key if routing_key is not None else self.name)
+
+    async def consume(self, callback: Callable[[Any], Awaitable[Any]], no_ack: bool = False,
+                      exclusive: bool = False, arguments: Optional[Dict[str, Any]] = None,
+                      consumer_tag: Optional[str] = None, timeout: Optional[float] = None) -> str:
+        self.channel.ensure_open()
+        tag = consumer_tag or f"ctag-{self.channel.broker.next_id()}"
+        if self.name == DIRECT_REPLY_TO:
+            self.channel.reply_consumer = _Consumer(tag, self.channel, callback, no_ack=True)
+            return tag
+        state = self._state
+        consumer = _Consumer(tag, self.channel, callback, no_ack)
+        state.consumers.append(consumer)
+        self.channel.consumers[tag] = (state, consumer)
+        state.dispatch()
+        return tag
+
+    async def cancel(self, consumer_tag: str, timeout: Optional[float] = None, nowait: bool = False):
+        self.channel.cancel(consumer_tag)
+
+    async def get(self, *, no_ack: bool = False, fail: bool = True, timeout: Optional[float] = 5):
+        state = self._state
+        if not state.messages:
+            if fail:
+                raise QueueEmpty(self.name)
+            return None
+        delivery = state.messages.popleft()
+        return self.channel.deliver_get(state, delivery, no_ack)
+
+    async def delete(self, *, if_unused: bool = False, if_empty: bool = False, timeout: Optional[float] = None):
+        self.channel.broker.delete_queue(self.name)
+
+
+class MemoryChannel:
+    """aio_pikaのチャネルと同じ操作を持つチャネル。未ackのメッセージとprefetchはチャネルごとに管理する"""
+
+    def __init__(self, connection: "MemoryConnection"):
+        self.connection = connection
+        self.broker = connection.broker
+        self.id = str(self.broker.next_id())
+        self.prefetch_count = 0
+        self.is_closed = False
+        self.close_callbacks: Set[Callable[..., Any]] = set()
+        self.consumers: Dict[str, Tuple[_QueueState, _Consumer]] = {}
+        self.reply_consumer: Optional[_Consumer] = None
+        self._unacked: Dict[int, Tuple[_QueueState, Optional[_Consumer], _Delivery]] = {}
+        self._delivery_tags = itertools.count(1)
+        self.broker.register_channel(self)
+
+    def ensure_open(self):
+        if self.is_closed:
+            raise RuntimeError(f"Channel {self.id} is closed")
+
+    @property
+    def default_exchange(self) -> MemoryExchange:
+        return MemoryExchange(self, "")
+
+    async def set_qos(self, prefetch_count: int = 0, prefetch_size: int = 0, global_: bool = False,
+                      timeout: Optional[float] = None):
+        self.prefetch_count = prefetch_count
+
+    async def declare_exchange(self, name: str, type: Any = "direct", *, durable: bool = False,
+                               auto_delete: bool = False, internal: bool = False, passive: bool = False,
+                               arguments: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> MemoryExchange:
+        self.ensure_open()
+        self.broker.declare_exchange(name, getattr(type, "value", type), arguments)
+        return MemoryExchange(self, name)
+
+    async def get_exchange(self, name: str, *, ensure: bool = True) -> MemoryExchange:
+        if ensure and name not in self.broker.exchanges:
+            raise ValueError(f"Exchange not found: {name}")
+        return MemoryExchange(self, name)
+
+    async def declare_queue(self, name: Optional[str] = None, *, durable: bool = False, exclusive: bool = False,
+                            passive: bool = False, auto_delete: bool = False,
+                            arguments: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> MemoryQueue:
+        self.ensure_open()
+        if passive:
+            if name not in self.broker.queues:
+                raise ValueError(f"Queue not found: {name}")
+            state = self.broker.queues[name]
+        else:
+            state = self.broker.declare_queue(name, durable, exclusive, auto_delete, arguments, self.connection)
+        queue = MemoryQueue(self, state.name)
+        # aio_pikaと同じく宣言時点のメッセージ数・コンシューマー数を返す
+        queue.declaration_result = SimpleNamespace(
+            queue=state.name, message_count=len(state.messages), consumer_count=len(state.consumers)
+        )
+        return queue
+
+    async def get_queue(self, name: str, *, ensure: bool = True) -> MemoryQueue:
+        if ensure and name != DIRECT_REPLY_TO and name not in self.broker.queues:
+            raise ValueError(f"Queue not found: {name}")
+        return MemoryQueue(self, name)
+
+    def deliver(self, state: _QueueState, consumer: _Consumer, delivery: _Delivery):
+        """コンシューマーのコールバックを別のタスクで呼び出す"""
+        self.broker.delivered_total += 1
+        delivery_tag = None
+        if not consumer.no_ack:
+            delivery_tag = next(self._delivery_tags)
+            self._unacked[delivery_tag] = (state, consumer, delivery)
+            consumer.unacked += 1
+        message = MemoryIncomingMessage(self, delivery, delivery_tag, consumer.tag, consumer.no_ack)
+        asyncio.ensure_future(self._invoke(consumer, message))
+
+    def deliver_get(self, state: _QueueState, delivery: _Delivery, no_ack: bool) -> MemoryIncomingMessage:
+        self.broker.delivered_total += 1
+        delivery_tag = None
+        if not no_ack:
+            delivery_tag = next(self._delivery_tags)
+            self._unacked[delivery_tag] = (state, None, delivery)
+        return MemoryIncomingMessage(self, delivery, delivery_tag, None, no_ack)
+
+    def deliver_reply(self, delivery: _Delivery) -> bool:
+        if self.is_closed or self.reply_consumer is None:
+            return False
+        self.broker.delivered_total += 1
+        message = MemoryIncomingMessage(self, delivery, None, self.reply_consumer.tag, True)
+        asyncio.ensure_future(self._invoke(self.reply_consumer, message))
+        return True
+
+    async def _invoke(self, consumer: _Consumer, message: MemoryIncomingMessage):
+        try:
+            await consumer.callback(message)
+        except Exception as e:
+            logger.error(f"Memory broker consumer {consumer.tag} callback error: {str(e)}", exc_info=True)
+
+    def settle(self, delivery_tag: Optional[int], multiple: bool, requeue: Optional[bool]):
+        """
+        ack（requeue=None）・nack・rejectを処理する
+
+        multiple=Trueの場合はdelivery_tag以下の未ackのメッセージをまとめて処理する。
+        """
+        if delivery_tag is None:
+            return
+        if multiple:
+            tags = [tag for tag in self._unacked if tag <= delivery_tag]
+        else:
+            tags = [delivery_tag] if delivery_tag in self._unacked else []
+        touched: List[_QueueState] = []
+        for tag in tags:
+            state, consumer, delivery = self._unacked.pop(tag)
+            if consumer is not None:
+                consumer.unacked -= 1
+            if requeue is None:
+                self.broker.acked_total += 1
+            elif requeue:
+                self.broker.requeued_total += 1
+                delivery.redelivered = True
+                state.enqueue(delivery, front=True)
+            else:
+                self.broker.dead_letter(state, delivery, "rejected")
+            if state not in touched:
+                touched.append(state)
+        # 未ackの件数が減ったため、待っていたメッセージを配信する
+        for state in touched:
+            state.dispatch()
+
+    def cancel(self, consumer_tag: str):
+        entry = self.consumers.pop(consumer_tag, None)
+        if entry is None:
+            return
+        state, consumer = entry
+        if consumer in state.consumers:
+            state.consumers.remove(consumer)
+        if state.auto_delete and not state.consumers:
+            self.broker.delete_queue(state.name)
+
+    async def close(self, exc: Optional[BaseException] = None):
+        if self.is_closed:
+            return
+        self.is_closed = True
+        for consumer_tag in list(self.consumers):
+            self.cancel(consumer_tag)
+        self.reply_consumer = None
+        # 未ackのメッセージはキューに戻して再配信する
+        unacked, self._unacked = self._unacked, {}
+        for state, _, delivery in sorted(unacked.values(), key=lambda entry: entry[2].enqueued_at, reverse=True):
+            if state.name in self.broker.queues:
+                delivery.redelivered = True
+                state.enqueue(delivery, front=True)
+        self.broker.unregister_channel(self)
+        self.connection.channels.discard(self)
+        for callback in list(self.close_callbacks):
+            callback(self, exc)
+
+
+class MemoryConnection:
+    def __init__(self, broker: MemoryBroker):
+        self.broker = broker
+        self.is_closed = False
+        self.channels: Set[MemoryChannel] = set()
+        self.close_callbacks: Set[Callable[..., Any]] = set()
+
+    async def channel(self, channel_number: Optional[int] = None, publisher_confirms: bool = True,
+                      on_return_raises: bool = False) -> MemoryChannel:
+        if self.is_closed:
+            raise RuntimeError("Connection is closed")
+        channel = MemoryChannel(self)
+        self.channels.add(channel)
+        return channel
+
+    async def close(self, exc: Optional[BaseException] = None):
+        if self.is_closed:
+            return
+        for channel in list(self.channels):
+            await channel.close()
+        # 排他キューは接続を閉じると削除される
+        for name, queue in list(self.broker.queues.items()):
+            if queue.owner is self:
+                self.broker.delete_queue(name)
+        self.is_closed = True
+        for callback in list(self.close_callbacks):
+            callback(self, exc)
+
+
+# プロセス内で共有するブローカー（RABBITMQ_BROKER=memoryの場合に使う）
+default_broker = MemoryBroker()
+
+
+async def connect(broker: Optional[MemoryBroker] = None) -> MemoryConnection:
+    """インメモリのブローカーに接続する（aio_pika.connect_robustの代わり）"""
+    return MemoryConnection(broker or default_broker)
@@ -0,0 +1,310 @@
+import bisect
+import contextvars
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from aio_pika import IncomingMessage
+from aio_pika.abc import AbstractChannel
+
+from app.core.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# ヒストグラムのバケットの上限（ミリ秒）
+HISTOGRAM_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# 処理中のメッセージの処理開始時刻（コンシューマーのワーカーごとに設定する）
+_processing_started: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "processing_started", default=None
+)
+
+
+def processing_time_ms() -> Optional[float]:
+    """処理中のメッセージの受信（処理開始）からの経過時間を返す（コンシューマーのハンドラー外ではNone）"""
+    started = _processing_started.get()
+    if started is None:
+        return None
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def event_type_of(message: IncomingMessage) -> str:
+    """メッセージのイベントタイプ（AMQPのtypeプロパティ、なければルーティングキー）を返す"""
+    return message.type or message.routing_key or "unknown"
+
+
+class Histogram:
+    """固定のバケットで値（ミリ秒）の分布を記録する"""
+
+    def __init__(self, buckets: Tuple[float, ...] = HISTOGRAM_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """q（0〜1）の分位点が含まれるバケットの上限を返す（最後のバケットの場合は最大値）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def stats(self) -> Dict[str, Any]:
+        # バケットはPrometheusと同じく上限以下の累積件数で表す
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "avg_ms": self.sum / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max,
+            "buckets": buckets,
+        }
+
+
+class RateMeter:
+    """直近window秒間の1秒あたりの件数を計算する"""
+
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        self._seconds: Deque[List[int]] = deque()
+
+    def mark(self, count: int = 1):
+        second = int(time.monotonic())
+        if self._seconds and self._seconds[-1][0] == second:
+            self._seconds[-1][1] += count
+        else:
+            self._seconds.append([second, count])
+        self._trim(second)
+
+    def _trim(self, now: int):
+        while self._seconds and self._seconds[0][0] <= now - self.window:
+            self._seconds.popleft()
+
+    def rate(self) -> float:
+        self._trim(int(time.monotonic()))
+        return sum(count for _, count in self._seconds) / self.window
+
+
+class ExchangeMetrics:
+    def __init__(self):
+        self.published_total = 0
+        self.failed_total = 0
+        self.rate = RateMeter()
+        self.latency = Histogram()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "published_total": self.published_total,
+            "failed_total": self.failed_total,
+            "publish_rate_per_sec": self.rate.rate(),
+            "confirm_latency": self.latency.stats(),
+        }
+
+
+class QueueMetrics:
+    def __init__(self, queue_name: Optional[str] = None):
+        self.queue_name = queue_name
+        self.received_total = 0
+        self.redelivered_total = 0
+        self.acked_total = 0
+        self.nacked_total = 0
+        self.rejected_total = 0
+        self.ack_rate = RateMeter()
+        self.unacked: Set[int] = set()
+        # passive宣言で取得したキューの状態
+        self.messages: Optional[int] = None
+        self.consumers: Optional[int] = None
+        self.checked_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def settle(self, delivery_tag: Optional[int], multiple: bool) -> int:
+        """ack/nackしたメッセージを未確認の記録から外し、件数を返す（multipleの場合はdelivery_tag以前をすべて外す）"""
+        if delivery_tag is None:
+            return 1
+        if not multiple:
+            self.unacked.discard(delivery_tag)
+            return 1
+        settled = {tag for tag in self.unacked if tag <= delivery_tag}
+        self.unacked -= settled
+        return max(len(settled), 1)
+
+    def stats(self) -> Dict[str, Any]:
+        ack_rate = self.ack_rate.rate()
+        return {
+            "received_total": self.received_total,
+            "redelivered_total": self.redelivered_total,
+            "acked_total": self.acked_total,
+            "nacked_total": self.nacked_total,
+            "rejected_total": self.rejected_total,
+            "unacked": len(self.unacked),
+            "ack_rate_per_sec": ack_rate,
+            "messages": self.messages,
+            "consumers": self.consumers,
+            # 滞留しているメッセージを現在のack速度で処理し終えるまでの目安（秒）
+            "lag_seconds": self.messages / ack_rate if self.messages and ack_rate else None,
+            "checked_at": self.checked_at,
+            "last_error": self.last_error,
+        }
+
+
+class TrackedMessage:
+    """
+    受信したメッセージのack・nack・rejectを記録するラッパー
+
+    それ以外の属性・メソッドは元のメッセージのものをそのまま使う。
+    """
+
+    def __init__(self, message: IncomingMessage, queue: QueueMetrics):
+        self._message = message
+        self._queue = queue
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._message, name)
+
+    async def ack(self, multiple: bool = False):
+        await self._message.ack(multiple=multiple)
+        count = self._queue.settle(self._message.delivery_tag, multiple)
+        self._queue.acked_total += count
+        self._queue.ack_rate.mark(count)
+
+    async def nack(self, multiple: bool = False, requeue: bool = True):
+        await self._message.nack(multiple=multiple, requeue=requeue)
+        self._queue.nacked_total += self._queue.settle(self._message.delivery_tag, multiple)
+
+    async def reject(self, requeue: bool = False):
+        await self._message.reject(requeue=requeue)
+        self._queue.settle(self._message.delivery_tag, False)
+        self._queue.rejected_total += 1
+
+    @asynccontextmanager
+    async def process(self, requeue: bool = False):
+        """
+        aio_pikaのprocess()と同じく、例外なく終了した場合はack、例外の場合はrejectする
+        （ブロック内でack等を済ませた場合は何もしない）
+        """
+        try:
+            yield self
+        except BaseException:
+            if not self._message.processed:
+                await self.reject(requeue=requeue)
+            raise
+        if not self._message.processed:
+            await self.ack()
+
+
+class MessagingMetrics:
+    """
+    メッセージングの計測値をまとめて保持する
+
+    - exchangeごとの発行数・発行レート・確認までの時間
+    - キュー（コンシューマー）ごとの受信数・再配信数・ack/nack/reject数と、passive宣言で取得した滞留件数
+    - イベントタイプごとのハンドラーの処理時間
+    """
+
+    def __init__(self):
+        self.exchanges: Dict[str, ExchangeMetrics] = {}
+        self.queues: Dict[str, QueueMetrics] = {}
+        self.handlers: Dict[str, Histogram] = {}
+        self.handler_failures: Dict[str, int] = {}
+
+    def record_publish(self, exchange: str, latency_ms: float, failed: bool = False):
+        metrics = self.exchanges.setdefault(exchange or "(default)", ExchangeMetrics())
+        if failed:
+            metrics.failed_total += 1
+            return
+        metrics.published_total += 1
+        metrics.rate.mark()
+        metrics.latency.observe(latency_ms)
+
+    def watch_queue(self, name: str, queue_name: Optional[str] = None):
+        """滞留件数を取得するキューを登録する（nameと実際のキュー名が異なる場合はqueue_nameを指定する）"""
+        self.queues.setdefault(name, QueueMetrics()).queue_name = queue_name or name
+
+    def track(self, name: str, message: IncomingMessage) -> TrackedMessage:
+        """受信したメッセージを記録し、ack・nack・rejectを記録するラッパーを返す"""
+        queue = self.queues.setdefault(name, QueueMetrics())
+        queue.received_total += 1
+        if message.redelivered:
+            queue.redelivered_total += 1
+        if message.delivery_tag is not None:
+            queue.unacked.add(message.delivery_tag)
+        return TrackedMessage(message, queue)
+
+    def record_handler(self, event_type: str, elapsed_ms: float, failed: bool = False):
+        self.handlers.setdefault(event_type, Histogram()).observe(elapsed_ms)
+        if failed:
+            self.handler_failures[event_type] = self.handler_failures.get(event_type, 0) + 1
+
+    @asynccontextmanager
+    async def processing(self, event_type: str):
+        """ブロック内の処理時間をevent_typeのハンドラーの処理時間として記録し、processing_time_ms()で参照できるようにする"""
+        started = time.perf_counter()
+        token = _processing_started.set(started)
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            _processing_started.reset(token)
+            self.record_handler(event_type, (time.perf_counter() - started) * 1000, failed)
+
+    def instrument(
+            self,
+            name: str,
+            callback: Callable[[IncomingMessage], Awaitable[None]]
+            ) -> Callable[[IncomingMessage], Awaitable[None]]:
+        """queue.consumeに直接渡すコールバックを、受信・ack・処理時間を記録するコールバックにする"""
+        async def consume(message: IncomingMessage):
+            async with self.processing(event_type_of(message)):
+                await callback(self.track(name, message))
+        return consume
+
+    async def refresh_queue_depths(self, channel: AbstractChannel):
+        """登録したキューをpassive宣言し、滞留件数とコンシューマー数を更新する"""
+        for name, queue in list(self.queues.items()):
+            if queue.queue_name is None:
+                continue
+            try:
+                declared = await channel.declare_queue(queue.queue_name, passive=True)
+                result = declared.declaration_result
+                queue.messages = result.message_count
+                queue.consumers = result.consumer_count
+                queue.checked_at = time.time()
+                queue.last_error = None
+            except Exception as e:
+                queue.last_error = str(e)
+                logger.warning(f"Could not inspect queue {queue.queue_name}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "exchanges": {name: metrics.stats() for name, metrics in self.exchanges.items()},
+            "queues": {name: metrics.stats() for name, metrics in self.queues.items()},
+            "handlers": {
+                event_type: {**histogram.stats(), "failed_total": self.handler_failures.get(event_type, 0)}
+                for event_type, histogram in self.handlers.items()
+            },
+        }
+
+
+messaging_metrics = MessagingMetrics()
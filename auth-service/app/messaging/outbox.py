@@ -0,0 +1,229 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import delete, event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.session import AsyncSessionLocal
+from app.messaging.rabbitmq import rabbitmq_client
+from app.models.outbox_event import OutboxEvent
+
+
+logger = get_logger(__name__)
+
+# コミット後にリレーを起こすためのセッション情報のキー
+_PENDING_KEY = "outbox_pending"
+
+
+def enqueue_event(
+        session: AsyncSession,
+        exchange: str,
+        routing_key: str,
+        event_type: str,
+        user_data: Dict[str, Any]
+        ) -> OutboxEvent:
+    """
+    送信するイベントをアウトボックスに追加する
+
+    呼び出し元のトランザクションに含まれるため、業務データの変更と同時にコミットされ、
+    ロールバックされた場合は送信されない。コミット後にリレーが送信する。
+    """
+    body = {
+        "event_type": event_type,
+        # UUIDやdatetimeを含むデータをJSON列に保存できる形に変換する
+        "user_data": json.loads(json.dumps(user_data, default=str)),
+    }
+    outbox_event = OutboxEvent(exchange=exchange, routing_key=routing_key, event_type=event_type, body=body)
+    session.add(outbox_event)
+    session.info[_PENDING_KEY] = True
+    return outbox_event
+
+
+def enqueue_user_event(session: AsyncSession, event_type: str, user_data: Dict[str, Any]) -> OutboxEvent:
+    """ユーザーイベントをアウトボックスに追加する（publish_user_eventと同じ宛先）"""
+    return enqueue_event(
+        session, settings.USER_SYNC_EXCHANGE, settings.USER_SYNC_ROUTING_KEY, event_type, user_data
+    )
+
+
+def _as_aware(value: datetime) -> datetime:
+    # SQLiteではタイムゾーン情報が失われるため、設定のタイムゾーンとして扱う
+    return value if value.tzinfo else value.replace(tzinfo=ZoneInfo(settings.TZ))
+
+
+class OutboxRelay:
+    """
+    アウトボックスのイベントをバッチ単位でRabbitMQに送信するバックグラウンドタスク
+
+    作成順に取得したバッチをまとめて発行し、publisher confirmで確認されたイベントのみを
+    削除する。確認されなかったイベントは次回以降に再送する（at-least-once）。
+    PostgreSQLではFOR UPDATE SKIP LOCKEDにより、複数のワーカーが同じイベントを送信しない。
+    """
+
+    def __init__(
+            self,
+            session_factory: Optional[Callable] = None,
+            publisher: Optional[Callable[[OutboxEvent], Awaitable[None]]] = None,
+            batch_size: Optional[int] = None,
+            poll_interval: Optional[float] = None
+            ):
+        self._session_factory = session_factory
+        self._publisher = publisher
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.poll_interval = poll_interval or settings.OUTBOX_POLL_INTERVAL_SECONDS
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        # 統計情報
+        self.published_total = 0
+        self.failed_total = 0
+        self.batches_total = 0
+        self.last_batch_size = 0
+        self.lag_seconds = 0.0  # 直近のバッチで最も古いイベントの作成からの経過時間
+        self.max_lag_seconds = 0.0
+
+    async def _publish(self, outbox_event: OutboxEvent):
+        if self._publisher is not None:
+            await self._publisher(outbox_event)
+            return
+        await rabbitmq_client.publish_message(
+            outbox_event.exchange,
+            outbox_event.routing_key,
+            outbox_event.body,
+            message_id=str(outbox_event.id)
+        )
+
+    async def relay_once(self) -> int:
+        """
+        1バッチ分のイベントを送信する
+
+        Returns:
+            取得したイベント数
+        """
+        session_factory = self._session_factory or AsyncSessionLocal
+        async with session_factory() as session:
+            result = await session.execute(
+                select(OutboxEvent)
+                .order_by(OutboxEvent.created_at, OutboxEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            events = result.scalars().all()
+            if not events:
+                self.lag_seconds = 0.0
+                await session.commit()
+                return 0
+
+            now = datetime.now(ZoneInfo(settings.TZ))
+            self.lag_seconds = (now - _as_aware(events[0].created_at)).total_seconds()
+            self.max_lag_seconds = max(self.max_lag_seconds, self.lag_seconds)
+
+            # 確認を1件ずつ待たずにまとめて発行する
+            outcomes = await asyncio.gather(
+                *(self._publish(outbox_event) for outbox_event in events),
+                return_exceptions=True
+            )
+            confirmed = []
+            for outbox_event, outcome in zip(events, outcomes):
+                if isinstance(outcome, BaseException):
+                    outbox_event.attempts += 1
+                    outbox_event.last_error = str(outcome)[:500]
+                    self.failed_total += 1
+                    logger.warning(
+                        f"Outbox event {outbox_event.id} ({outbox_event.event_type}) not confirmed "
+                        f"(attempt {outbox_event.attempts}): {str(outcome)}"
+                    )
+                else:
+                    confirmed.append(outbox_event.id)
+            if confirmed:
+                await session.execute(
+                    delete(OutboxEvent)
+                    .where(OutboxEvent.id.in_(confirmed))
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+
+        self.published_total += len(confirmed)
+        self.batches_total += 1
+        self.last_batch_size = len(events)
+        logger.debug(f"Outbox batch relayed: {len(confirmed)} confirmed, {len(events) - len(confirmed)} failed")
+        return len(events)
+
+    async def _run(self):
+        logger.info("Outbox relay started")
+        backoff = self.poll_interval
+        while not self._stopping:
+            try:
+                failed_before = self.failed_total
+                fetched = await self.relay_once()
+                if fetched >= self.batch_size and self.failed_total == failed_before:
+                    # 未送信のイベントが残っている可能性があるため、待たずに次のバッチを処理する
+                    continue
+                backoff = self.poll_interval
+            except Exception as e:
+                logger.error(f"Outbox relay error: {str(e)}", exc_info=True)
+                # ブローカーやデータベースの障害時は待機時間を延ばす
+                backoff = min(backoff * 2, settings.OUTBOX_MAX_BACKOFF_SECONDS)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+        logger.info("Outbox relay stopped")
+
+    def start(self):
+        """リレーを開始する"""
+        if self._task is not None and not self._task.done():
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def notify(self):
+        """新しいイベントがコミットされたことを通知し、待機中のリレーを起こす"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self, timeout: float = 10.0):
+        """リレーを停止する（処理中のバッチは完了を待つ）"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self.notify()
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            logger.warning("Outbox relay did not stop in time and was cancelled")
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "published_total": self.published_total,
+            "failed_total": self.failed_total,
+            "batches_total": self.batches_total,
+            "last_batch_size": self.last_batch_size,
+            "lag_seconds": self.lag_seconds,
+            "max_lag_seconds": self.max_lag_seconds,
+        }
+
+
+outbox_relay = OutboxRelay()
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_relay_after_commit(session: Session):
+    if session.info.pop(_PENDING_KEY, False):
+        outbox_relay.notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_pending_after_rollback(session: Session):
+    session.info.pop(_PENDING_KEY, None)
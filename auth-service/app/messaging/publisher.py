@@ -0,0 +1,146 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from aio_pika import Message
+from aio_pika.abc import AbstractExchange
+from aiormq.exceptions import DeliveryError
+
+from app.core.logging import get_logger
+from app.messaging.metrics import messaging_metrics
+
+
+logger = get_logger(__name__)
+
+_Pending = Tuple[AbstractExchange, Message, str, "asyncio.Future[None]"]
+
+
+class BufferedPublisher:
+    """
+    publisher confirmを待つ発行処理をまとめて送信するパブリッシャー
+
+    publish()はメッセージをバッファに追加し、ブローカーの確認結果を表すFutureを返す。
+    バッファは件数（batch_size）または経過時間（flush_interval_ms）のどちらかに達した
+    時点で送信する。確認を1件ずつ待たずに次のメッセージを送信し（パイプライン化）、
+    確認待ちのメッセージがmax_in_flightを超える場合は空きが出るまで送信を待機する。
+    送信順はpublish()の呼び出し順と同じになる。
+    exchangeごとの発行数と確認までの時間はmessaging_metricsに記録する。
+
+    Args:
+        max_in_flight: 確認待ちにできる最大メッセージ数
+        batch_size: この件数に達したらすぐに送信する
+        flush_interval_ms: 最初のメッセージの追加からこの時間が経過したら送信する
+    """
+
+    def __init__(self, max_in_flight: int, batch_size: int, flush_interval_ms: float):
+        self.max_in_flight = max_in_flight
+        self.batch_size = batch_size
+        self.flush_interval_ms = flush_interval_ms
+        self._buffer: List[_Pending] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set["asyncio.Task[None]"] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._send_lock: Optional[asyncio.Lock] = None
+        # 統計情報
+        self.in_flight = 0
+        self.published_total = 0
+        self.confirmed_total = 0
+        self.nacked_total = 0
+        self.failed_total = 0
+        self.flushes_total = 0
+        self.confirm_latency_ms_total = 0.0
+        self.confirm_latency_ms_max = 0.0
+
+    def publish(self, exchange: AbstractExchange, message: Message, routing_key: str) -> "asyncio.Future[None]":
+        """
+        メッセージをバッファに追加する
+
+        Returns:
+            確認されたら完了するFuture（nackや送信エラーの場合は例外が設定される）
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._buffer.append((exchange, message, routing_key, future))
+        if len(self._buffer) >= self.batch_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_interval_ms / 1000, self._start_flush)
+        return future
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        task = asyncio.ensure_future(self._send_batch(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _send_batch(self, batch: List[_Pending]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._send_lock = asyncio.Lock()
+        self.flushes_total += 1
+        sends = []
+        # 後続のバッチが割り込んで送信順が入れ替わらないよう、送信の開始はバッチ単位で直列化する
+        async with self._send_lock:
+            for exchange, message, routing_key, future in batch:
+                await self._semaphore.acquire()
+                self.in_flight += 1
+                self.published_total += 1
+                sends.append(asyncio.ensure_future(self._send(exchange, message, routing_key, future)))
+        await asyncio.gather(*sends)
+
+    async def _send(self, exchange: AbstractExchange, message: Message, routing_key: str, future: "asyncio.Future[None]"):
+        started = time.perf_counter()
+        try:
+            # チャネルはpublisher confirmが有効なため、確認（ack）を受け取るまで待機する
+            await exchange.publish(message, routing_key=routing_key)
+        except DeliveryError as e:
+            self.nacked_total += 1
+            messaging_metrics.record_publish(exchange.name, 0.0, failed=True)
+            if not future.done():
+                future.set_exception(e)
+        except Exception as e:
+            self.failed_total += 1
+            messaging_metrics.record_publish(exchange.name, 0.0, failed=True)
+            if not future.done():
+                future.set_exception(e)
+        else:
+            latency_ms = (time.perf_counter() - started) * 1000
+            self.confirmed_total += 1
+            self.confirm_latency_ms_total += latency_ms
+            self.confirm_latency_ms_max = max(self.confirm_latency_ms_max, latency_ms)
+            messaging_metrics.record_publish(exchange.name, latency_ms)
+            if not future.done():
+                future.set_result(None)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def flush(self):
+        """バッファ内のメッセージを送信し、送信済みのメッセージの確認をすべて待つ"""
+        self._start_flush()
+        while self._flushes:
+            await asyncio.gather(*list(self._flushes))
+
+    async def close(self):
+        """シャットダウン時に未送信・確認待ちのメッセージを処理する"""
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "in_flight": self.in_flight,
+            "published_total": self.published_total,
+            "confirmed_total": self.confirmed_total,
+            "nacked_total": self.nacked_total,
+            "failed_total": self.failed_total,
+            "flushes_total": self.flushes_total,
+            "confirm_latency_ms_avg": (
+                self.confirm_latency_ms_total / self.confirmed_total if self.confirmed_total else 0.0
+            ),
+            "confirm_latency_ms_max": self.confirm_latency_ms_max,
+        }
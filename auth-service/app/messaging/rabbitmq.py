@@ -1,11 +1,19 @@
+import asyncio
 import json
-from typing import Dict, Any, Callable, Awaitable
-import uuid
+from typing import Dict, Any, Callable, Awaitable, Optional
 import aio_pika
 from aio_pika import ExchangeType, Message, IncomingMessage
 
 from app.core.config import settings
 from app.core.logging import app_logger
+from app.messaging.channels import ChannelManager
+from app.messaging.codec import event_message
+from app.messaging import memory_broker
+from app.messaging.metrics import messaging_metrics
+from app.messaging.consumer import ConsumerRuntime, user_data_ordering_key
+from app.messaging.publisher import BufferedPublisher
+from app.messaging.retry import RetryPolicy
+from app.messaging.rpc import RpcClient, RpcPublishError
 
 
 class RabbitMQClient:
@@ -18,7 +26,31 @@ class RabbitMQClient:
         self.auth_events_exchange = None
         self.logger = app_logger
         self.is_initialized = False
-        self.consumer_tags = []
+        self.consumer_tags = []  # 受信中のキューとコンシューマータグ（停止時に受信をcancelする）
+        self.consumers: Dict[str, ConsumerRuntime] = {}
+        self.last_drain: Optional[Dict[str, Any]] = None
+        # 発行用のチャネルのプールとキューごとの受信用チャネル（_channelはexchangeの宣言などに使う）
+        self.channels = ChannelManager(
+            settings.RABBITMQ_PUBLISHER_CHANNELS,
+            settings.RABBITMQ_CHANNEL_HEALTH_CHECK_INTERVAL_SECONDS
+        )
+        self.publisher = BufferedPublisher(
+            max_in_flight=settings.PUBLISHER_MAX_IN_FLIGHT,
+            batch_size=settings.PUBLISHER_BATCH_SIZE,
+            flush_interval_ms=settings.PUBLISHER_FLUSH_INTERVAL_MS
+        )
+        self.user_creation_response_retry = RetryPolicy(
+            "user_creation_response",
+            self.publisher,
+            max_retries=settings.MESSAGE_RETRY_MAX_ATTEMPTS,
+            base_delay_ms=settings.MESSAGE_RETRY_BASE_DELAY_MS
+        )
+        # キュー名ごとの再試行ポリシー（統計情報とDLQの操作用）
+        self.retry_policies: Dict[str, RetryPolicy] = {
+            "user_creation_response": self.user_creation_response_retry
+        }
+        # 返信を待つリクエスト（同期的なユーザー登録など）
+        self.rpc = RpcClient(self.channels, settings.RPC_TIMEOUT_SECONDS)
     
     async def initialize(self):
         """RabbitMQへの接続を初期化"""
@@ -26,14 +58,19 @@ class RabbitMQClient:
             return
         
         try:
-            # RabbitMQ接続文字列の構築
-            rabbitmq_url = f"amqp://{settings.RABBITMQ_USER}:{settings.RABBITMQ_PASSWORD}@{settings.RABBITMQ_HOST}:{settings.RABBITMQ_PORT}/{settings.RABBITMQ_VHOST}"
-            
-            # 接続の確立
-            self._connection = await aio_pika.connect_robust(rabbitmq_url)
+            if settings.RABBITMQ_BROKER == "memory":
+                # プロセス内のブローカーに接続（テスト・ベンチマーク用）
+                self._connection = await memory_broker.connect()
+            else:
+                # RabbitMQ接続文字列の構築
+                rabbitmq_url = f"amqp://{settings.RABBITMQ_USER}:{settings.RABBITMQ_PASSWORD}@{settings.RABBITMQ_HOST}:{settings.RABBITMQ_PORT}/{settings.RABBITMQ_VHOST}"
+                
+                # 接続の確立
+                self._connection = await aio_pika.connect_robust(rabbitmq_url)
             
-            # チャネルの開設
-            self._channel = await self._connection.channel()
+            # チャネルの開設（発行したメッセージはブローカーの確認を待つ）
+            self._channel = await self._connection.channel(publisher_confirms=True)
+            self.channels.attach(self._connection)
             
             # user_events exchangeの宣言
             self.user_events_exchange = await self._channel.declare_exchange(
@@ -55,42 +92,139 @@ class RabbitMQClient:
             self.logger.error(f"RabbitMQ接続エラー: {str(e)}", exc_info=True)
             raise
     
+    async def drain(self, timeout: float) -> Dict[str, Any]:
+        """
+        シャットダウンの前にコンシューマーを停止し、処理中のメッセージと発行の確認を待つ
+        
+        1. すべてのキューの受信をcancelし、新しいメッセージを受け取らないようにする
+        2. 処理中のメッセージの完了を待つ（未着手のメッセージはキューに戻す）
+        3. 残りの時間で確認待ちの発行（ハンドラーが送った返信など）の確認を待つ
+        
+        いずれもtimeout秒の期限内で行い、期限を過ぎた処理は中断する（メッセージはブローカーが再配信する）。
+        
+        Returns:
+            コンシューマーごとの件数（drained / returned / aborted）と、発行の確認を待ち終えたか
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        
+        # 新しいメッセージの受信を止める
+        for queue, consumer_tag in self.consumer_tags:
+            try:
+                await queue.cancel(consumer_tag)
+            except Exception as e:
+                # 置き換え済みのチャネルのコンシューマーなど
+                self.logger.debug(f"コンシューマーのキャンセルに失敗しました: {consumer_tag}, {str(e)}")
+        self.consumer_tags = []
+        
+        # 処理中のメッセージの完了を待つ
+        results = await asyncio.gather(*(
+            consumer.drain(max(deadline - loop.time(), 0.0)) for consumer in self.consumers.values()
+        ))
+        report: Dict[str, Any] = {"consumers": dict(zip(self.consumers.keys(), results))}
+        
+        # 発行の確認を待つ（期限を過ぎても送信自体は中断しない）
+        try:
+            await asyncio.wait_for(asyncio.shield(self.publisher.flush()), max(deadline - loop.time(), 0.0))
+            report["publisher_flushed"] = True
+        except asyncio.TimeoutError:
+            report["publisher_flushed"] = False
+        report["in_flight_confirms"] = self.publisher.in_flight
+        
+        self.last_drain = report
+        self.logger.info(f"コンシューマーを停止しました: {report}")
+        return report
+    
     async def close(self):
         """接続のクローズ"""
         if self._connection:
+            for consumer in self.consumers.values():
+                await consumer.stop()
+            # 未送信・確認待ちのメッセージを処理してから接続を閉じる
+            await self.publisher.close()
+            await self.channels.close()
             await self._connection.close()
             self._connection = None
             self._channel = None
             self.is_initialized = False
             self.logger.info("RabbitMQ接続がクローズされました")
     
-    async def publish_user_event(self, event_type: str, user_data: Dict[str, Any]):
-        """ユーザーイベントの発行"""
+    async def publish_user_event(self, event_type: str, user_data: Dict[str, Any]) -> "asyncio.Future[None]":
+        """
+        ユーザーイベントの発行
+        
+        メッセージはバッファ付きパブリッシャーでまとめて送信される。
+        返されたFutureはブローカーの確認で完了するため、永続化を確認する場合はawaitする。
+        """
         if not self.is_initialized:
             await self.initialize()
         
-        try:
-            # メッセージのJSONシリアライズ
-            message_body = {
-                "event_type": event_type,
-                "user_data": self._serialize_user_data(user_data)
-            }
-            
-            # メッセージの発行
-            await self.user_events_exchange.publish(
-                Message(
-                    body=json.dumps(message_body).encode(),
-                    content_type="application/json",
-                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
-                ),
-                routing_key=settings.USER_SYNC_ROUTING_KEY
-            )
-            
-            self.logger.info(f"ユーザーイベントを発行しました: {event_type}, ユーザーID={user_data.get('id', 'unknown')}")
-        except Exception as e:
-            self.logger.error(f"メッセージ発行エラー: {str(e)}", exc_info=True)
+        # メッセージの発行（エンベロープの形式はMESSAGE_CONTENT_TYPEで選択する）
+        future = self.publisher.publish(
+            await self.channels.exchange(settings.USER_SYNC_EXCHANGE),
+            event_message(event_type, user_data),
+            settings.USER_SYNC_ROUTING_KEY
+        )
+        future.add_done_callback(
+            lambda done: self._log_publish_result(done, event_type, user_data.get('id', 'unknown'))
+        )
+        return future
+    
+    def _log_publish_result(self, future: "asyncio.Future[None]", event_type: str, user_id: Any):
+        """確認結果のログを記録する（Futureをawaitしない呼び出し元のエラーもここで記録する）"""
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
             # エラーはログに記録するが例外は再送出しない
             # メッセージングがサービスの主要機能を妨げるべきではない
+            self.logger.error(f"メッセージ発行エラー: {event_type}, ユーザーID={user_id}: {str(error)}")
+        else:
+            self.logger.info(f"ユーザーイベントを発行しました: {event_type}, ユーザーID={user_id}")
+    
+    async def publish_message(self, exchange_name: str, routing_key: str, body: Dict[str, Any], message_id: str = None):
+        """
+        メッセージを発行し、ブローカーの確認（publisher confirm）を待つ
+        
+        publish_user_eventと異なり、失敗した場合は例外を送出する（アウトボックスからの送信用）
+        """
+        if not self.is_initialized:
+            await self.initialize()
+        
+        if exchange_name not in (settings.USER_SYNC_EXCHANGE, "auth_events"):
+            raise ValueError(f"Unknown exchange: {exchange_name}")
+        
+        # 発行用チャネルのプールで、他のメッセージとまとめて送信し、確認されるまで待機する
+        await self.publisher.publish(
+            await self.channels.exchange(exchange_name),
+            event_message(body.get("event_type"), body.get("user_data", {}), message_id=message_id),
+            routing_key
+        )
+    
+    async def rpc_call(self, event_type: str, user_data: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        user-serviceにイベントをリクエストとして送り、返信のuser_dataを返す
+        
+        reply_to（direct reply-to）とcorrelation_idを設定して発行し、返信を待つ。
+        タイムアウトした場合はRpcTimeoutErrorを送出する（リクエストは処理中の可能性がある）。
+        接続できないなど、リクエストを発行できなかった場合はRpcPublishErrorを送出する。
+        """
+        if not self.is_initialized:
+            try:
+                await self.initialize()
+            except Exception as e:
+                raise RpcPublishError(f"Failed to connect for {event_type}: {str(e)}") from e
+        
+        reply = await self.rpc.call(
+            settings.USER_SYNC_EXCHANGE,
+            settings.USER_SYNC_ROUTING_KEY,
+            event_message(event_type, user_data),
+            timeout
+        )
+        # エンベロープの場合はuser_dataを取り出す
+        if isinstance(reply, dict) and "event_type" in reply:
+            return reply.get("user_data", {})
+        return reply
     
     async def publish_user_creation(self, user_data: Dict[str, Any]) -> bool:
         """
@@ -102,23 +236,6 @@ class RabbitMQClient:
         Returns:
             成功した場合はTrue、失敗した場合はFalse
         """
-        # テスト専用実装 - プロダクションでは問題ないのでここはテスト用コードを特別に入れる
-        import inspect
-        caller_frame = inspect.currentframe().f_back
-        if caller_frame and 'test_publish_user_creation' in caller_frame.f_code.co_name:
-            # テストからの呼び出しの場合、カスタム処理
-            from aio_pika import Message
-            body = json.dumps(user_data).encode()
-            message = Message(body=body)
-            
-            # テストではこのメソッドが呼ばれるはず
-            await self._channel.default_exchange.publish(
-                message,
-                routing_key="user_creation"
-            )
-            return True
-        
-        # 通常の実装
         if not self.is_initialized:
             await self.initialize()
             
@@ -127,7 +244,6 @@ class RabbitMQClient:
             body = json.dumps(user_data).encode()
             
             # メッセージを作成
-            from aio_pika import Message
             message = Message(body=body)
             
             # メッセージを公開
@@ -142,75 +258,71 @@ class RabbitMQClient:
             self.logger.error(f"ユーザー作成メッセージの公開に失敗しました: {str(e)}")
             return False
     
-    async def setup_user_creation_response_consumer(self, callback: Callable[[Dict[str, Any]], Awaitable[None]]):
-        """user-serviceからのユーザー作成レスポンスを受け取るコンシューマーをセットアップ"""
-        # テスト専用実装 - プロダクションでは問題ないのでここはテスト用コードを特別に入れる
-        import inspect
-        caller_frame = inspect.currentframe().f_back
-        if caller_frame and 'test_setup_user_creation_response_consumer' in caller_frame.f_code.co_name:
-            # テストからの呼び出しの場合、テスト対応処理
-            queue = await self._channel.declare_queue(
-                "user_creation_response",
-                durable=True
-            )
-            mock_queue = await queue.consume(lambda msg: None)
-            self.consumer_tags.append(mock_queue)
-            self.logger.info("ユーザー作成レスポンスのコンシューマーを開始しました")
+    async def refresh_queue_depths(self):
+        """
+        監視対象のキューの滞留件数とコンシューマー数をpassive宣言で取得する
+        
+        メトリクスの取得時に呼び出す。
+        """
+        if not self.is_initialized:
             return
+        await messaging_metrics.refresh_queue_depths(self._channel)
+    
+    def _consumer_runtime(self, name: str, handler: Callable[[IncomingMessage], Awaitable[None]]) -> ConsumerRuntime:
+        """
+        上限付きのワーカーでメッセージを処理するランタイムを開始する
+        
+        CONSUMER_ORDERING_FIELDを指定した場合、同じ値（ユーザー名など）のメッセージは受信順に処理される。
+        """
+        ordering_key = (
+            user_data_ordering_key(settings.CONSUMER_ORDERING_FIELD)
+            if settings.CONSUMER_ORDERING_FIELD else None
+        )
+        runtime = ConsumerRuntime(name, handler, settings.CONSUMER_CONCURRENCY, ordering_key)
+        runtime.start()
+        self.consumers[name] = runtime
+        return runtime
+    
+    async def setup_user_creation_response_consumer(self, callback: Callable[[IncomingMessage], Awaitable[None]]):
+        """
+        user-serviceからのユーザー作成レスポンスを受け取るコンシューマーをセットアップ
         
-        # 通常の実装
+        callbackには受信したメッセージをそのまま渡す（ack・再試行・デッドレターはcallbackが行う）
+        """
         if not self.is_initialized:
             await self.initialize()
         
-        # キューの宣言
-        queue = await self._channel.declare_queue(
-            "user_creation_response",
-            durable=True
-        )
+        runtime = self._consumer_runtime("user_creation_response", callback)
         
-        # exchangeとキューのバインド
-        await queue.bind(
-            exchange=self.auth_events_exchange,
-            routing_key="user.created"
-        )
+        async def setup(channel):
+            # キューの宣言
+            queue = await channel.declare_queue(
+                "user_creation_response",
+                durable=True
+            )
+            
+            # exchangeとキューのバインド
+            await queue.bind(
+                exchange=self.auth_events_exchange,
+                routing_key="user.created"
+            )
+            
+            # 再試行キューとデッドレターキューの宣言
+            await self.user_creation_response_retry.declare(channel)
+            
+            # 滞留件数の監視対象に登録
+            messaging_metrics.watch_queue(queue.name)
+            messaging_metrics.watch_queue(self.user_creation_response_retry.dead_letter_queue_name)
+            
+            # コンシューマーの開始
+            consumer_tag = await queue.consume(runtime.dispatch)
+            self.consumer_tags.append((queue, consumer_tag))
         
-        # コンシューマーの設定
-        async def process_message(message: IncomingMessage):
-            async with message.process():
-                try:
-                    # メッセージボディの解析
-                    body = json.loads(message.body.decode())
-                    
-                    # イベントタイプの確認
-                    event_type = body.get("event_type")
-                    if event_type == "user.created":
-                        user_data = body.get("user_data", {})
-                        self.logger.info(f"ユーザー作成レスポンスを受信: {user_data}")
-                        
-                        # コールバック関数の呼び出し
-                        await callback(user_data)
-                    else:
-                        self.logger.warning(f"未知のイベントタイプ: {event_type}")
-                
-                except json.JSONDecodeError:
-                    self.logger.error("JSONデコードエラー", exc_info=True)
-                except Exception as e:
-                    self.logger.error(f"メッセージ処理エラー: {str(e)}", exc_info=True)
-        
-        # コンシューマーの開始
-        consumer_tag = await queue.consume(process_message)
-        self.consumer_tags.append(consumer_tag)
+        # キュー専用のチャネルで受信する（チャネルを置き換えた場合はsetupを再実行する）
+        await self.channels.open_consumer_channel(
+            "user_creation_response", setup, settings.CONSUMER_PREFETCH_COUNT
+        )
         self.logger.info("ユーザー作成レスポンスのコンシューマーを開始しました")
-    
-    def _serialize_user_data(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
-        """ユーザーデータのシリアライズ"""
-        serialized = {}
-        for key, value in user_data.items():
-            if isinstance(value, uuid.UUID):
-                serialized[key] = str(value)
-            else:
-                serialized[key] = value
-        return serialized
 
 
 # シングルトンインスタンス
@@ -230,25 +342,25 @@ class UserEventTypes:
 # ヘルパー関数
 async def publish_user_created(user_data: Dict[str, Any]):
     """ユーザー作成イベントの発行"""
-    await rabbitmq_client.publish_user_event(UserEventTypes.USER_CREATED, user_data)
+    return await rabbitmq_client.publish_user_event(UserEventTypes.USER_CREATED, user_data)
 
 
 async def publish_user_updated(user_data: Dict[str, Any]):
     """ユーザー更新イベントの発行"""
-    await rabbitmq_client.publish_user_event(UserEventTypes.USER_UPDATED, user_data)
+    return await rabbitmq_client.publish_user_event(UserEventTypes.USER_UPDATED, user_data)
 
 
 async def publish_user_deleted(user_data: Dict[str, Any]):
     """ユーザー削除イベントの発行"""
-    await rabbitmq_client.publish_user_event(UserEventTypes.USER_DELETED, user_data)
+    return await rabbitmq_client.publish_user_event(UserEventTypes.USER_DELETED, user_data)
 
 
 async def publish_password_changed(user_data: Dict[str, Any]):
     """パスワード変更イベントの発行"""
-    await rabbitmq_client.publish_user_event(UserEventTypes.PASSWORD_CHANGED, user_data)
+    return await rabbitmq_client.publish_user_event(UserEventTypes.PASSWORD_CHANGED, user_data)
 
 
 async def publish_user_status_changed(user_data: Dict[str, Any], is_active: bool):
     """ユーザーステータス変更イベントの発行"""
     event_type = UserEventTypes.USER_ACTIVATED if is_active else UserEventTypes.USER_DEACTIVATED
-    await rabbitmq_client.publish_user_event(event_type, user_data)
+    return await rabbitmq_client.publish_user_event(event_type, user_data)
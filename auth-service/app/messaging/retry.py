@@ -0,0 +1,257 @@
+from typing import Any, Dict, List, Optional
+
+import aio_pika
+from aio_pika import ExchangeType, IncomingMessage, Message
+from aio_pika.abc import AbstractChannel, AbstractExchange
+
+from app.core.logging import get_logger
+from app.messaging.codec import MessageDecodeError, decode_body, encode_body
+from app.messaging.publisher import BufferedPublisher
+
+
+logger = get_logger(__name__)
+
+RETRY_COUNT_HEADER = "x-retry-count"
+
+
+class PoisonMessageError(Exception):
+    """再試行しても処理できないメッセージ（不正なJSONなど）。再試行せずにDLQへ送る"""
+    pass
+
+
+class RetryPolicy:
+    """
+    処理に失敗したメッセージの遅延再試行とデッドレターを管理する
+
+    キューごとに次のトポロジーを宣言する。
+    - <queue>.retry.<n>: n回目の再試行を待つキュー。メッセージごとのTTL（expiration）が
+      切れるとデフォルトexchange経由で元のキューに戻る。待機時間は回数ごとに倍になる
+      （base_delay_ms * 2^(n-1)）。回数ごとにキューを分けるため、先頭のメッセージの
+      TTLが後続のメッセージを待たせることはない。
+    - <queue>.dlx / <queue>.dlq: 再試行の上限に達したメッセージ、または処理できない
+      メッセージを保管するデッドレターexchangeとキュー
+
+    再試行回数はヘッダー（x-retry-count）とメッセージ本文のretry_countに記録する。
+    本文はcontent-type（JSON・msgpack）に応じて復元し、同じ形式で書き戻す。
+    再試行・デッドレターのメッセージが確認されてから元のメッセージをackするため、
+    メッセージは失われず、待機はブローカー側で行われるためコンシューマーを止めない。
+
+    Args:
+        queue_name: 対象のキュー名
+        publisher: 再試行・デッドレターのメッセージを送信するパブリッシャー
+        max_retries: デッドレターに送るまでの最大再試行回数
+        base_delay_ms: 1回目の再試行までの待機時間
+    """
+
+    def __init__(self, queue_name: str, publisher: BufferedPublisher, max_retries: int, base_delay_ms: int):
+        self.queue_name = queue_name
+        self.max_retries = max_retries
+        self.base_delay_ms = base_delay_ms
+        self._publisher = publisher
+        self._channel: Optional[AbstractChannel] = None
+        self._dead_letter_exchange: Optional[AbstractExchange] = None
+        # 統計情報
+        self.retried_total = 0
+        self.dead_lettered_total = 0
+        self.replayed_total = 0
+
+    @property
+    def dead_letter_queue_name(self) -> str:
+        return f"{self.queue_name}.dlq"
+
+    def retry_queue_name(self, attempt: int) -> str:
+        return f"{self.queue_name}.retry.{attempt}"
+
+    def delay_ms(self, attempt: int) -> int:
+        return self.base_delay_ms * 2 ** (attempt - 1)
+
+    async def declare(self, channel: AbstractChannel):
+        """再試行キューとデッドレターのトポロジーを宣言する"""
+        self._channel = channel
+        for attempt in range(1, self.max_retries + 1):
+            await channel.declare_queue(
+                self.retry_queue_name(attempt),
+                durable=True,
+                arguments={
+                    # TTLが切れたメッセージを元のキューに戻す
+                    "x-dead-letter-exchange": "",
+                    "x-dead-letter-routing-key": self.queue_name,
+                }
+            )
+        self._dead_letter_exchange = await channel.declare_exchange(
+            f"{self.queue_name}.dlx",
+            ExchangeType.FANOUT,
+            durable=True
+        )
+        dead_letter_queue = await channel.declare_queue(self.dead_letter_queue_name, durable=True)
+        await dead_letter_queue.bind(self._dead_letter_exchange)
+
+    @staticmethod
+    def retry_count(message: IncomingMessage) -> int:
+        """ヘッダー、なければ本文のretry_countから再試行回数を取得する"""
+        headers = message.headers or {}
+        if RETRY_COUNT_HEADER in headers:
+            return int(headers[RETRY_COUNT_HEADER])
+        try:
+            body = decode_body(message.body, message.content_type)
+        except MessageDecodeError:
+            return 0
+        if isinstance(body, dict):
+            user_data = body.get("user_data")
+            if isinstance(user_data, dict) and "retry_count" in user_data:
+                return int(user_data["retry_count"])
+            return int(body.get("retry_count", 0))
+        return 0
+
+    @staticmethod
+    def _with_retry_count(body: bytes, content_type: Optional[str], retry_count: int) -> bytes:
+        """本文のretry_countを更新する（復元できない場合はそのまま）"""
+        try:
+            data = decode_body(body, content_type)
+        except MessageDecodeError:
+            return body
+        if not isinstance(data, dict):
+            return body
+        if isinstance(data.get("user_data"), dict):
+            data["user_data"]["retry_count"] = retry_count
+        else:
+            data["retry_count"] = retry_count
+        return encode_body(data, content_type)
+
+    def _copy(self, message: IncomingMessage, body: bytes, headers: Dict[str, Any], **kwargs) -> Message:
+        return Message(
+            body=body,
+            headers={**(message.headers or {}), **headers},
+            content_type=message.content_type or "application/json",
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            message_id=message.message_id,
+            correlation_id=message.correlation_id,
+            reply_to=message.reply_to,
+            type=message.type,
+            **kwargs
+        )
+
+    async def reject(self, message: IncomingMessage, error: Exception):
+        """
+        処理に失敗したメッセージを再試行キューまたはデッドレターに送り、元のメッセージをackする
+
+        PoisonMessageErrorの場合と再試行の上限に達した場合はデッドレターに送る。
+        送信に失敗した場合は元のメッセージをnack（requeue）し、ブローカーに再配信させる。
+        """
+        attempts = self.retry_count(message)
+        try:
+            if isinstance(error, PoisonMessageError) or attempts >= self.max_retries:
+                await self._dead_letter(message, error, attempts)
+            else:
+                await self._retry(message, error, attempts + 1)
+        except Exception as e:
+            logger.error(f"Failed to reroute message from {self.queue_name}, requeueing: {str(e)}")
+            await message.nack(requeue=True)
+            return
+        await message.ack()
+
+    async def _retry(self, message: IncomingMessage, error: Exception, attempt: int):
+        delay_ms = self.delay_ms(attempt)
+        await self._publisher.publish(
+            self._channel.default_exchange,
+            self._copy(
+                message,
+                self._with_retry_count(message.body, message.content_type, attempt),
+                {RETRY_COUNT_HEADER: attempt, "x-last-error": str(error)[:500]},
+                expiration=delay_ms / 1000
+            ),
+            self.retry_queue_name(attempt)
+        )
+        self.retried_total += 1
+        logger.warning(
+            f"Message from {self.queue_name} scheduled for retry {attempt}/{self.max_retries} "
+            f"in {delay_ms}ms: {str(error)}"
+        )
+
+    async def _dead_letter(self, message: IncomingMessage, error: Exception, attempts: int):
+        await self._publisher.publish(
+            self._dead_letter_exchange,
+            self._copy(
+                message,
+                message.body,
+                {
+                    RETRY_COUNT_HEADER: attempts,
+                    "x-last-error": str(error)[:500],
+                    "x-death-reason": "poison" if isinstance(error, PoisonMessageError) else "max_retries",
+                    "x-original-queue": self.queue_name,
+                }
+            ),
+            self.queue_name
+        )
+        self.dead_lettered_total += 1
+        logger.error(f"Message from {self.queue_name} dead-lettered after {attempts} retries: {str(error)}")
+
+    @staticmethod
+    def _describe_body(message: IncomingMessage) -> Any:
+        """DLQの確認用に本文を復元する（復元できない場合は文字列として返す）"""
+        try:
+            return decode_body(message.body, message.content_type)
+        except MessageDecodeError:
+            return message.body.decode(errors="replace")
+
+    async def inspect(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        DLQの先頭のメッセージを取得して内容を返す（メッセージはDLQに戻す）
+        """
+        queue = await self._channel.declare_queue(self.dead_letter_queue_name, durable=True)
+        fetched: List[IncomingMessage] = []
+        try:
+            for _ in range(limit):
+                message = await queue.get(no_ack=False, fail=False)
+                if message is None:
+                    break
+                fetched.append(message)
+            return [
+                {
+                    "message_id": message.message_id,
+                    "retry_count": (message.headers or {}).get(RETRY_COUNT_HEADER),
+                    "reason": (message.headers or {}).get("x-death-reason"),
+                    "last_error": (message.headers or {}).get("x-last-error"),
+                    "body": self._describe_body(message),
+                }
+                for message in fetched
+            ]
+        finally:
+            for message in fetched:
+                await message.nack(requeue=True)
+
+    async def replay(self, limit: int = 100) -> int:
+        """
+        DLQのメッセージを再試行回数を0に戻して元のキューに送り直す
+
+        Returns:
+            送り直したメッセージ数
+        """
+        queue = await self._channel.declare_queue(self.dead_letter_queue_name, durable=True)
+        replayed = 0
+        for _ in range(limit):
+            message = await queue.get(no_ack=False, fail=False)
+            if message is None:
+                break
+            try:
+                await self._publisher.publish(
+                    self._channel.default_exchange,
+                    self._copy(message, self._with_retry_count(message.body, message.content_type, 0), {RETRY_COUNT_HEADER: 0}),
+                    self.queue_name
+                )
+            except Exception:
+                await message.nack(requeue=True)
+                raise
+            await message.ack()
+            replayed += 1
+        self.replayed_total += replayed
+        logger.info(f"Replayed {replayed} messages from {self.dead_letter_queue_name}")
+        return replayed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_retries": self.max_retries,
+            "retried_total": self.retried_total,
+            "dead_lettered_total": self.dead_lettered_total,
+            "replayed_total": self.replayed_total,
+        }
@@ -0,0 +1,125 @@
+import asyncio
+import uuid
+from typing import Any, Dict, Optional
+
+from aio_pika import IncomingMessage, Message
+from aio_pika.abc import AbstractChannel
+
+from app.core.logging import get_logger
+from app.messaging.channels import ChannelManager
+from app.messaging.codec import MessageDecodeError, decode_body
+
+
+logger = get_logger(__name__)
+
+# RabbitMQのdirect reply-to（返信用のキューを宣言せずに返信を受け取る疑似キュー）
+DIRECT_REPLY_TO = "amq.rabbitmq.reply-to"
+
+
+class RpcTimeoutError(Exception):
+    """タイムアウトまでに返信が届かなかった（リクエストは処理中の可能性がある）"""
+    pass
+
+
+class RpcPublishError(Exception):
+    """リクエストを発行できなかった（リクエストはブローカーに届いていない）"""
+    pass
+
+
+class RpcClient:
+    """
+    RabbitMQ上のリクエスト・リプライ（RPC）を行う
+
+    リクエストにはreply_to（direct reply-to）とcorrelation_idを設定し、返信はcorrelation_idで
+    待機中のFutureに振り分ける。direct reply-toは返信を受け取るチャネルからリクエストを
+    発行する必要があるため、RPC専用のチャネルで受信・発行する。
+
+    タイムアウトした呼び出しのFutureは破棄するため、その後に届いた返信は件数だけを記録して捨てる。
+
+    Args:
+        channels: RPC専用のチャネルを開くChannelManager
+        timeout: 返信を待つ既定の時間（秒）
+    """
+
+    def __init__(self, channels: ChannelManager, timeout: float):
+        self.timeout = timeout
+        self._channels = channels
+        self._channel: Optional[AbstractChannel] = None
+        self._channel_lock = asyncio.Lock()
+        self._pending: Dict[str, "asyncio.Future[Any]"] = {}
+        # 統計情報
+        self.calls_total = 0
+        self.replies_total = 0
+        self.timeouts_total = 0
+        self.late_replies_total = 0
+
+    async def _setup(self, channel: AbstractChannel):
+        # direct reply-toはno_ackで受信する必要がある
+        queue = await channel.get_queue(DIRECT_REPLY_TO, ensure=False)
+        await queue.consume(self._on_reply, no_ack=True)
+        self._channel = channel
+
+    def _needs_channel(self) -> bool:
+        return self._channel is None or self._channel.is_closed
+
+    async def _ensure_channel(self) -> AbstractChannel:
+        if self._needs_channel():
+            async with self._channel_lock:
+                # 待機中に他の呼び出しが開き直した場合はそのチャネルを使う
+                if self._needs_channel():
+                    await self._channels.open_consumer_channel("rpc_replies", self._setup, prefetch_count=0)
+        return self._channel
+
+    async def _on_reply(self, message: IncomingMessage):
+        future = self._pending.get(message.correlation_id)
+        if future is None or future.done():
+            self.late_replies_total += 1
+            logger.warning(f"Discarding RPC reply without a pending call: correlation_id={message.correlation_id}")
+            return
+        self.replies_total += 1
+        try:
+            future.set_result(decode_body(message.body, message.content_type))
+        except MessageDecodeError as e:
+            future.set_exception(e)
+
+    async def call(self, exchange_name: str, routing_key: str, message: Message, timeout: Optional[float] = None) -> Any:
+        """
+        リクエストを発行し、返信の本文（復元したもの）を返す
+
+        correlation_idが設定されていない場合はmessage_id（なければ新しいID）を使う。
+
+        Raises:
+            RpcPublishError: リクエストを発行できなかった場合
+            RpcTimeoutError: timeout秒以内に返信が届かなかった場合
+        """
+        correlation_id = message.correlation_id or message.message_id or uuid.uuid4().hex
+        message.correlation_id = correlation_id
+        message.reply_to = DIRECT_REPLY_TO
+        future = asyncio.get_running_loop().create_future()
+        self._pending[correlation_id] = future
+        self.calls_total += 1
+        try:
+            try:
+                channel = await self._ensure_channel()
+                if exchange_name:
+                    exchange = await channel.get_exchange(exchange_name, ensure=False)
+                else:
+                    exchange = channel.default_exchange
+                await exchange.publish(message, routing_key)
+            except Exception as e:
+                raise RpcPublishError(f"Failed to publish {routing_key}: {str(e)}") from e
+            return await asyncio.wait_for(future, timeout if timeout is not None else self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts_total += 1
+            raise RpcTimeoutError(f"No reply for {routing_key} within {timeout or self.timeout}s: correlation_id={correlation_id}")
+        finally:
+            self._pending.pop(correlation_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "calls_total": self.calls_total,
+            "replies_total": self.replies_total,
+            "timeouts_total": self.timeouts_total,
+            "late_replies_total": self.late_replies_total,
+        }
@@ -1,4 +1,4 @@
-from sqlalchemy import String, Uuid
+from sqlalchemy import BigInteger, Boolean, Index, String, Uuid
 from sqlalchemy.orm import Mapped, mapped_column
 import uuid
 
@@ -7,8 +7,16 @@ from app.db.base import Base
 
 class AuthUser(Base):
     __tablename__ = "auth_users"
+    __table_args__ = (
+        # キーセットページネーション用
+        Index("ix_auth_users_created_at_id", "created_at", "id"),
+    )
 
     username: Mapped[str] = mapped_column(String, nullable=False, unique=True, index=True)
     email: Mapped[str] = mapped_column(String, unique=True, nullable=False, index=True)
     hashed_password: Mapped[str] = mapped_column(String, nullable=False)
     user_id: Mapped[uuid.UUID] = mapped_column(Uuid, nullable=False, unique=True, index=True)
+    # user-serviceでのユーザー作成完了後に有効化される
+    is_active: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    # サービス間同期で適用済みのバージョン（upsert_manyでこれより新しい場合のみ更新する）
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, server_default="0")
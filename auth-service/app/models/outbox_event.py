@@ -0,0 +1,27 @@
+from typing import Any, Dict, Optional
+
+from sqlalchemy import JSON, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class OutboxEvent(Base):
+    """
+    送信待ちのイベント（トランザクショナルアウトボックス）
+
+    業務データの変更と同じトランザクションで書き込み、OutboxRelayがRabbitMQへの
+    送信を確認した後に削除する。
+    """
+    __tablename__ = "outbox_events"
+    __table_args__ = (
+        # 送信順（作成順）での取得用
+        Index("ix_outbox_events_created_at_id", "created_at", "id"),
+    )
+
+    exchange: Mapped[str] = mapped_column(String, nullable=False)
+    routing_key: Mapped[str] = mapped_column(String, nullable=False)
+    event_type: Mapped[str] = mapped_column(String, nullable=False)
+    body: Mapped[Dict[str, Any]] = mapped_column(JSON, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(String, nullable=True)
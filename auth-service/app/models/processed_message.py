@@ -0,0 +1,22 @@
+from sqlalchemy import Index, String, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class ProcessedMessage(Base):
+    """
+    処理済みのメッセージ（メッセージIDによる重複排除）
+
+    メッセージの処理結果と同じトランザクションで書き込むため、コミットされていれば処理済み、
+    ロールバックされていれば未処理となる。再配信されたメッセージは一意制約で検出する。
+    """
+    __tablename__ = "processed_messages"
+    __table_args__ = (
+        UniqueConstraint("consumer", "message_id", name="uq_processed_messages_consumer_message_id"),
+        # 保持期間を過ぎた記録の削除用
+        Index("ix_processed_messages_created_at", "created_at"),
+    )
+
+    consumer: Mapped[str] = mapped_column(String, nullable=False)
+    message_id: Mapped[str] = mapped_column(String, nullable=False)
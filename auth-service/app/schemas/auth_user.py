@@ -1,4 +1,5 @@
-from typing import Optional
+from enum import Enum
+from typing import List, Optional
 import uuid
 from pydantic import BaseModel, EmailStr, Field, field_validator
 import re
@@ -70,6 +71,71 @@ class AuthUserResponse(AuthUserInDBBase):
     pass
 
 
+# 一括作成の行ごとの結果
+class AuthUserBulkCreateStatus(str, Enum):
+    """一括作成における各行の処理結果"""
+    CREATED = "created"
+    DUPLICATE_IN_INPUT = "duplicate_in_input"
+    DUPLICATE_USERNAME = "duplicate_username"
+    DUPLICATE_EMAIL = "duplicate_email"
+    DUPLICATE_USER_ID = "duplicate_user_id"
+    CONFLICT = "conflict"  # 事前チェック後に並行して作成された場合
+
+
+class AuthUserBulkCreateResult(BaseModel):
+    index: int  # 入力リスト内の位置
+    username: str
+    email: EmailStr
+    user_id: uuid.UUID
+    status: AuthUserBulkCreateStatus
+    id: Optional[uuid.UUID] = None  # 作成された場合のみ
+
+
+# サービス間同期のupsert
+class AuthUserUpsert(BaseModel):
+    """同期元の状態をそのまま適用するためのスキーマ（パスワードはハッシュ済みの値）"""
+    user_id: uuid.UUID
+    username: str
+    email: EmailStr
+    hashed_password: str
+    is_active: bool = False
+    version: int = Field(..., ge=0)  # 同期元で単調増加するバージョン
+
+
+class AuthUserUpsertStatus(str, Enum):
+    """upsertにおける各行の処理結果"""
+    APPLIED = "applied"  # 作成または更新された
+    STALE = "stale"  # 適用済みのバージョン以下のためスキップされた
+    SUPERSEDED_IN_INPUT = "superseded_in_input"  # 入力内に同じuser_idのより新しい行がある
+    CONFLICT = "conflict"  # usernameまたはemailが他のユーザーで使用されている
+
+
+class AuthUserUpsertResult(BaseModel):
+    index: int  # 入力リスト内の位置
+    user_id: uuid.UUID
+    version: int
+    status: AuthUserUpsertStatus
+
+
+# user_id指定の一括ステータス変更・削除
+class AuthUserBulkUserIdsRequest(BaseModel):
+    user_ids: List[uuid.UUID] = Field(..., min_length=1)
+
+
+class AuthUserBulkActionStatus(str, Enum):
+    """一括ステータス変更・削除における各IDの処理結果"""
+    APPLIED = "applied"
+    NOT_FOUND = "not_found"
+    DUPLICATE_IN_INPUT = "duplicate_in_input"
+
+
+class AuthUserBulkActionResult(BaseModel):
+    index: int  # 入力リスト内の位置
+    user_id: uuid.UUID
+    status: AuthUserBulkActionStatus
+    id: Optional[uuid.UUID] = None  # 処理された場合のみ
+
+
 # トークン関連のスキーマ
 class Token(BaseModel):
     access_token: str
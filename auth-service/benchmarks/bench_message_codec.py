@@ -0,0 +1,102 @@
+"""
+メッセージ本文のシリアライズ・デシリアライズの処理時間とサイズを計測するベンチマーク
+
+user_dataの値を1つずつ変換してからjson.dumpsする従来の方式と、エンベロープを
+pydantic-coreで直接JSONに変換する方式、msgpackに変換する方式を比較する。
+
+実行方法（auth-serviceディレクトリで実行）:
+    python -m benchmarks.bench_message_codec
+    python -m benchmarks.bench_message_codec -n 50000
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime
+
+from app.messaging import codec
+from app.messaging.codec import JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE, decode_body, encode_envelope
+from app.schemas.message import MessageEnvelope
+
+
+def legacy_serialize_user_data(user_data):
+    serialized = {}
+    for key, value in user_data.items():
+        if isinstance(value, uuid.UUID):
+            serialized[key] = str(value)
+        else:
+            serialized[key] = value
+    return serialized
+
+
+def legacy_encode(event_type, user_data) -> bytes:
+    # datetimeはjson.dumpsで変換できないため、従来の呼び出し元は事前に文字列にしていた
+    return json.dumps({
+        "event_type": event_type,
+        "user_data": legacy_serialize_user_data(user_data)
+    }, default=str).encode()
+
+
+def envelope_encode(event_type, user_data, content_type) -> bytes:
+    # aio_pikaのMessageの作成はどの方式でも同じため計測に含めない
+    envelope = MessageEnvelope(source_service="auth-service", event_type=event_type, user_data=user_data)
+    return encode_envelope(envelope, content_type)[0]
+
+
+def measure(function, items) -> float:
+    """3回計測し、最も速かった回の1件あたりの時間（マイクロ秒）を返す"""
+    best = None
+    for _ in range(3):
+        started = time.perf_counter()
+        for item in items:
+            function(item)
+        elapsed = (time.perf_counter() - started) / len(items) * 1_000_000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(count: int):
+    user_data_list = [
+        {
+            "id": uuid.uuid4(),
+            "user_id": uuid.uuid4(),
+            "username": f"bench{i}",
+            "email": f"bench_{i}@example.com",
+            "is_active": True,
+            "created_at": datetime(2025, 5, 6, 3, 0, i % 60),
+            "retry_count": 0,
+        } for i in range(count)
+    ]
+
+    cases = [("legacy json.dumps", lambda user_data: legacy_encode("user.created", user_data), JSON_CONTENT_TYPE)]
+    cases.append((
+        "envelope json",
+        lambda user_data: envelope_encode("user.created", user_data, JSON_CONTENT_TYPE),
+        JSON_CONTENT_TYPE
+    ))
+    if codec.msgpack is not None:
+        cases.append((
+            "envelope msgpack",
+            lambda user_data: envelope_encode("user.created", user_data, MSGPACK_CONTENT_TYPE),
+            MSGPACK_CONTENT_TYPE
+        ))
+    else:
+        print("msgpack is not installed; skipping the msgpack case")
+
+    print(f"{'case':<24}{'encode us':>12}{'decode us':>12}{'bytes':>8}")
+    for name, encode, content_type in cases:
+        bodies = [encode(user_data) for user_data in user_data_list]
+        encode_us = measure(encode, user_data_list)
+        if name.startswith("legacy"):
+            decode_us = measure(json.loads, bodies)
+        else:
+            decode_us = measure(lambda body: decode_body(body, content_type), bodies)
+        size = sum(len(body) for body in bodies) / len(bodies)
+        print(f"{name:<24}{encode_us:>12.2f}{decode_us:>12.2f}{size:>8.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--count", type=int, default=20000, help="1ケースあたりのメッセージ数")
+    args = parser.parse_args()
+    main(args.count)
@@ -0,0 +1,278 @@
+"""
+auth-serviceとuser-serviceのメッセージ処理を1プロセスで動かし、ユーザー登録のスループットを計測するベンチマーク
+
+RabbitMQの代わりにプロセス内のブローカー（RABBITMQ_BROKER=memory）を使い、
+両サービスのRabbitMQClient・コンシューマー・ハンドラー・アウトボックスのリレーをそのまま動かす。
+データベースは既定では一時ファイルのSQLiteを使う（--auth-url / --user-urlで変更できる）。
+/registerがRedisに一時保存するパスワードはプロセス内の辞書に保存する。
+計測後に全件の認証ユーザーが有効な状態で作成され、DLQが空であることを確認し、
+確認できない場合はスループットを表示せずにエラーで終了する。
+
+- async: auth-serviceがuser.createdイベントを発行し、user-serviceがユーザーを作成して返信を
+  アウトボックスに書き込み、auth-serviceの応答コンシューマーが認証ユーザーを作成し終えるまでを1件とする
+  （パスワードのハッシュ化を含むため、CPU数とPASSWORD_HASH_WORKERSに律速される）
+- rpc: auth-serviceのrpc_call（/register?wait=true）で返信を受け取るまでを1件とする
+
+--instancesでuser-serviceのコンシューマーを複数のインスタンス（RabbitMQClient）で動かす。
+--shardsを指定した場合はuser.syncをシャードのキューに振り分け、シャードをインスタンスに順番に割り当てる
+（指定しない場合は全インスタンスがuser_creation_queueを共有する）。
+
+両サービスのパッケージ名はどちらもappのため、auth-serviceのモジュールを読み込んだ後に
+sys.modulesから外してuser-serviceのモジュールを読み込む。
+両サービスの設定（環境変数）が必要。
+
+実行方法（auth-serviceディレクトリで実行）:
+    python -m benchmarks.bench_registration_e2e
+    python -m benchmarks.bench_registration_e2e --mode rpc -n 2000 -c 50
+    python -m benchmarks.bench_registration_e2e --shards 8 --instances 4
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+import uuid
+from types import ModuleType
+from typing import Dict
+
+os.environ["RABBITMQ_BROKER"] = "memory"
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+USER_SERVICE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "..", "user-service")
+
+
+def _import_service(module_names) -> Dict[str, ModuleType]:
+    """モジュールを読み込み、読み込まれたappパッケージのモジュールをsys.modulesから外して返す"""
+    for module_name in module_names:
+        __import__(module_name)
+    modules = {name: module for name, module in sys.modules.items() if name == "app" or name.startswith("app.")}
+    for name in modules:
+        del sys.modules[name]
+    return modules
+
+
+SERVICE_MODULES = [
+    "app.core.config",
+    "app.db.base",
+    "app.db.session",
+    "app.models.outbox_event",
+    "app.models.processed_message",
+    "app.messaging.memory_broker",
+    "app.messaging.outbox",
+    "app.messaging.dedup",
+    "app.messaging.rabbitmq",
+]
+
+auth = _import_service(SERVICE_MODULES + ["app.models.auth_user", "app.messaging.auth_handler"])
+sys.path.insert(0, os.path.abspath(USER_SERVICE_DIR))
+try:
+    user = _import_service(SERVICE_MODULES + ["app.models.user", "app.messaging.user_handler"])
+finally:
+    sys.path.pop(0)
+# 以降のimportはauth-serviceのモジュールを参照する
+sys.modules.update(auth)
+
+
+async def use_database(service: Dict[str, ModuleType], url: str):
+    """サービスのセッションファクトリをベンチマーク用のデータベースに置き換え、テーブルを作成する"""
+    engine = create_async_engine(url, future=True)
+    async with engine.begin() as connection:
+        await connection.run_sync(service["app.db.base"].Base.metadata.create_all)
+    session_factory = sessionmaker(engine, class_=AsyncSession, autocommit=False)
+    # AsyncSessionLocalを直接importしているモジュールも置き換える
+    for module in service.values():
+        if hasattr(module, "AsyncSessionLocal"):
+            module.AsyncSessionLocal = session_factory
+    return engine
+
+
+# /registerがRedisに一時保存するパスワード（パスワードのキー → パスワード）
+passwords: Dict[str, str] = {}
+
+
+async def get_password(key: str):
+    return passwords.get(key)
+
+
+async def delete_password(key: str) -> bool:
+    return passwords.pop(key, None) is not None
+
+
+async def start_services(shards: int, instances: int):
+    auth["app.messaging.auth_handler"].get_password_from_redis = get_password
+    auth["app.messaging.auth_handler"].delete_password_from_redis = delete_password
+    broker = auth["app.messaging.memory_broker"].MemoryBroker()
+    auth["app.messaging.memory_broker"].default_broker = broker
+    user["app.messaging.memory_broker"].default_broker = broker
+
+    user_rabbitmq = user["app.messaging.rabbitmq"]
+    user_settings = user["app.core.config"].settings
+    user_handler = user["app.messaging.user_handler"]
+    # 返信はアウトボックスのリレーがシングルトンのクライアントで送る
+    await user_rabbitmq.rabbitmq_client.initialize()
+    user_settings.USER_CREATION_SHARDS = shards
+    user_clients = []
+    for instance in range(instances):
+        user_settings.USER_CREATION_OWNED_SHARDS = ",".join(str(shard) for shard in range(instance, shards, instances))
+        user_client = user_rabbitmq.RabbitMQClient()
+        await user_client.initialize()
+        await user_client.setup_user_creation_consumer(
+            user_handler.handle_user_creation_request,
+            batch_callback=user_handler.handle_user_creation_batch
+        )
+        user_clients.append(user_client)
+    user["app.messaging.outbox"].outbox_relay.start()
+
+    auth_client = auth["app.messaging.rabbitmq"].rabbitmq_client
+    await auth_client.initialize()
+    await auth_client.setup_user_creation_response_consumer(
+        auth["app.messaging.auth_handler"].handle_user_creation_response
+    )
+    return broker, auth_client, user_clients
+
+
+async def stop_services(auth_client, user_clients):
+    await user["app.messaging.outbox"].outbox_relay.stop()
+    await auth_client.close()
+    for user_client in user_clients:
+        await user_client.close()
+    await user["app.messaging.rabbitmq"].rabbitmq_client.close()
+
+
+def registration(run_id: str, i: int):
+    """/registerと同じ形式のユーザー作成リクエスト（パスワードを一時保存してキーを渡す）"""
+    username = f"bench{run_id}{i}"
+    password_key = f"temp_password:{username}:0"
+    passwords[password_key] = "benchpass1"
+    return {"username": username, "email": f"bench_{run_id}_{i}@example.com", "password_key": password_key}
+
+
+async def wait_for_registrations(timeout: float = 300.0):
+    """
+    auth-serviceの応答コンシューマーが全件の返信を処理し終えるまで待つ
+
+    返信を処理し終えると一時保存したパスワードが削除される（再試行待ちの返信はパスワードが残る）。
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while passwords and loop.time() < deadline:
+        await asyncio.sleep(0.001)
+
+
+async def verify_registrations(broker, expected: int) -> int:
+    """全件の認証ユーザーが有効な状態で作成され、DLQが空であることを確認し、有効な認証ユーザー数を返す"""
+    auth_user = auth["app.models.auth_user"].AuthUser
+    async with auth["app.db.session"].AsyncSessionLocal() as session:
+        activated = await session.scalar(
+            select(func.count()).select_from(auth_user).where(auth_user.is_active.is_(True))
+        )
+    dead_lettered = {
+        name: queue["messages"] for name, queue in broker.stats()["queues"].items()
+        if name.endswith(".dlq") and queue["messages"]
+    }
+    if activated != expected or dead_lettered or passwords:
+        raise SystemExit(
+            f"Registrations did not complete: activated={activated}/{expected}, "
+            f"dead-lettered={dead_lettered}, pending={len(passwords)}"
+        )
+    return activated
+
+
+async def run_async(auth_client, count: int, run_id: str):
+    """イベントを発行し、auth-serviceの応答コンシューマーが全件の認証ユーザーを作成し終えるまでの時間を返す"""
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        auth_client.publish_user_event("user.created", registration(run_id, i)) for i in range(count)
+    ])
+    await wait_for_registrations()
+    return time.perf_counter() - started, []
+
+
+async def run_rpc(auth_client, count: int, run_id: str, concurrency: int):
+    """rpc_callを並行して呼び出し、全件の返信を受け取るまでの時間と各呼び出しの応答時間を返す"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def call(i: int):
+        async with semaphore:
+            call_started = time.perf_counter()
+            await auth_client.rpc_call("user.created", registration(run_id, i))
+            latencies.append((time.perf_counter() - call_started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[call(i) for i in range(count)])
+    return time.perf_counter() - started, latencies
+
+
+async def measure(mode: str, count: int, concurrency: int, shards: int, instances: int, auth_url: str, user_url: str):
+    engines = [await use_database(auth, auth_url), await use_database(user, user_url)]
+    broker, auth_client, user_clients = await start_services(shards, instances)
+    try:
+        # ウォームアップ（コンシューマー・チャネルの準備を計測に含めない）
+        run_id = uuid.uuid4().hex[:8]
+        if mode == "rpc":
+            await run_rpc(auth_client, 10, f"w{run_id}", concurrency)
+            elapsed, latencies = await run_rpc(auth_client, count, run_id, concurrency)
+        else:
+            await run_async(auth_client, 10, f"w{run_id}")
+            elapsed, latencies = await run_async(auth_client, count, run_id)
+        # rpcモードでもアウトボックス経由の返信で認証ユーザーが作成される
+        await wait_for_registrations()
+        activated = await verify_registrations(broker, count + 10)
+    finally:
+        await stop_services(auth_client, user_clients)
+        for engine in engines:
+            await engine.dispose()
+
+    print(
+        f"mode={mode} registrations={count} concurrency={concurrency if mode == 'rpc' else '-'} "
+        f"shards={shards or '-'} instances={instances}"
+    )
+    print(f"{'elapsed (s)':<40}{elapsed:>12.3f}")
+    print(f"{'registrations/sec':<40}{count / elapsed:>12.1f}")
+    print(f"{'activated auth users (incl. warm-up)':<40}{activated:>12}")
+    if latencies:
+        latencies.sort()
+        print(f"{'latency p50 (ms)':<40}{latencies[len(latencies) // 2]:>12.2f}")
+        print(f"{'latency p99 (ms)':<40}{latencies[int(len(latencies) * 0.99) - 1]:>12.2f}")
+    # インスタンスごとの受信件数（シャードの偏り）
+    for instance, user_client in enumerate(user_clients):
+        received = sum(consumer.received_total for consumer in user_client.consumers.values())
+        print(f"{f'received by instance {instance}':<40}{received:>12}")
+    stats = broker.stats()
+    for key in ("published_total", "delivered_total", "acked_total", "requeued_total", "dead_lettered_total"):
+        print(f"{key:<40}{stats[key]:>12}")
+    # キューに残ったメッセージ（再試行待ちの返信など）
+    for name, queue in stats["queues"].items():
+        if queue["messages"]:
+            print(f"{'left in ' + name:<40}{queue['messages']:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["async", "rpc"], default="async")
+    parser.add_argument("-n", type=int, default=1000, help="登録件数")
+    parser.add_argument("-c", type=int, default=20, help="rpcモードの同時呼び出し数")
+    parser.add_argument("--shards", type=int, default=0, help="user.syncを振り分けるシャードの数（0で振り分けない）")
+    parser.add_argument("--instances", type=int, default=1, help="user-serviceのコンシューマーのインスタンス数")
+    parser.add_argument("--auth-url", default=None, help="auth-serviceのデータベースURL（省略時は一時ファイルのSQLite）")
+    parser.add_argument("--user-url", default=None, help="user-serviceのデータベースURL（省略時は一時ファイルのSQLite）")
+    args = parser.parse_args()
+    if args.shards and args.instances > args.shards:
+        parser.error("--instances must not exceed --shards")
+    # メッセージごとのログ出力を計測に含めない（処理できなかったメッセージはキューの残数で確認する）
+    logging.disable(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as directory:
+        auth_url = args.auth_url or f"sqlite+aiosqlite:///{os.path.join(directory, 'auth.db')}"
+        user_url = args.user_url or f"sqlite+aiosqlite:///{os.path.join(directory, 'user.db')}"
+        asyncio.run(measure(args.mode, args.n, args.c, args.shards, args.instances, auth_url, user_url))
+
+
+if __name__ == "__main__":
+    main()
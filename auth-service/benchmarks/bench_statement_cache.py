@@ -0,0 +1,118 @@
+"""
+CRUDの取得クエリにおける文の構築コストと列の絞り込みの効果を計測するベンチマーク
+
+呼び出しごとにselect(...).filter(...)を構築する従来の方式、lambda_stmtを使う方式、
+事前に構築した文にバインドパラメータで値を渡す現在の方式を、文の構築のみと
+実行まで含めた場合の1回あたりの時間で比較する。
+あわせてエンティティ全体の読み込みと識別用の列のみの読み込みを比較する。
+
+実行方法（auth-serviceディレクトリで実行）:
+    python -m benchmarks.bench_statement_cache
+    python -m benchmarks.bench_statement_cache -n 20000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import bindparam, lambda_stmt, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.security import get_password_hash
+from app.crud.auth_user import auth_user_crud
+from app.db.base import Base
+from app.models.auth_user import AuthUser
+
+
+def build_plain(username: str):
+    return select(AuthUser).filter(AuthUser.username == username)
+
+
+def build_lambda(username: str):
+    return lambda_stmt(lambda: select(AuthUser).where(AuthUser.username == username))
+
+
+PRECOMPILED = select(AuthUser).where(AuthUser.username == bindparam("username"))
+
+
+def build_precompiled(username: str):
+    return PRECOMPILED, {"username": username}
+
+
+def measure_build(builder, usernames) -> float:
+    started = time.perf_counter()
+    for username in usernames:
+        builder(username)
+    return (time.perf_counter() - started) / len(usernames) * 1_000_000
+
+
+async def measure_execute(session_factory, operation, keys, repeat: int = 3) -> float:
+    """repeat回計測し、最も速かった回の1回あたりの時間を返す（aiosqliteのスレッド切り替えによるぶれを抑える）"""
+    best = None
+    async with session_factory() as session:
+        # 初回のコンパイルを計測から除外する
+        await operation(session, keys[0])
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for key in keys:
+                await operation(session, key)
+                # 同一セッション内のアイデンティティマップによる再利用を避ける
+                session.expunge_all()
+            elapsed = (time.perf_counter() - started) / len(keys) * 1_000_000
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+async def main(count: int):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    hashed_password = get_password_hash("password123")
+    users = [
+        AuthUser(
+            username=f"bench{i}",
+            email=f"bench_{i}@example.com",
+            hashed_password=hashed_password,
+            user_id=uuid.uuid4()
+        ) for i in range(1000)
+    ]
+    async with session_factory() as session:
+        session.add_all(users)
+        await session.commit()
+    usernames = [users[i % len(users)].username for i in range(count)]
+    ids = [users[i % len(users)].id for i in range(count)]
+
+    async def execute_plain(session, username):
+        return (await session.execute(build_plain(username))).scalar_one()
+
+    async def execute_lambda(session, username):
+        return (await session.execute(build_lambda(username))).scalar_one()
+
+    async def execute_precompiled(session, username):
+        return (await session.execute(*build_precompiled(username))).scalar_one()
+
+    results = [
+        ("build select().filter()", measure_build(build_plain, usernames)),
+        ("build lambda_stmt()", measure_build(build_lambda, usernames)),
+        ("build precompiled", measure_build(build_precompiled, usernames)),
+        ("execute select().filter()", await measure_execute(session_factory, execute_plain, usernames)),
+        ("execute lambda_stmt()", await measure_execute(session_factory, execute_lambda, usernames)),
+        ("execute precompiled", await measure_execute(session_factory, execute_precompiled, usernames)),
+        ("get_by_id (entity)", await measure_execute(session_factory, auth_user_crud.get_by_id, ids)),
+        ("get_identity_by_id (columns)", await measure_execute(session_factory, auth_user_crud.get_identity_by_id, ids)),
+    ]
+    print(f"{'case':<32}{'us/call':>10}")
+    for name, microseconds in results:
+        print(f"{name:<32}{microseconds:>10.1f}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--count", type=int, default=5000, help="1ケースあたりの呼び出し回数")
+    args = parser.parse_args()
+    asyncio.run(main(args.count))
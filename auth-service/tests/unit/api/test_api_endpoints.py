@@ -57,7 +57,7 @@ def mock_user():
 
 # ユーザー登録エンドポイントのテスト
 @patch("app.crud.auth_user.auth_user_crud.create")
-@patch("app.api.v1.auth.publish_user_created")
+@patch("app.api.v1.auth.enqueue_user_event")
 def test_register_endpoint(mock_publish, mock_create, test_app):
     """
     ユーザー登録エンドポイントが正しく機能するかテスト
@@ -125,6 +125,87 @@ def test_register_endpoint_validation_error(test_app):
     assert "detail" in response_data
 
 
+# wait=trueのユーザー登録（RPC）のテスト
+REGISTER_DATA = {"username": "newuser", "email": "newuser@example.com", "password": "Password123"}
+
+
+def _register_with_rpc(test_app, rpc_call, ticket_state=None):
+    """RPCとチケットの完了待ちをモックしてwait=trueで登録する"""
+    from app.db.session import get_async_session
+    session = MagicMock()
+    session.commit = AsyncMock()
+    app.dependency_overrides[get_async_session] = lambda: session
+    try:
+        with patch("app.api.v1.auth.save_password_to_redis", AsyncMock(return_value="password:key")), \
+             patch("app.api.v1.auth.create_registration_ticket", AsyncMock(return_value="ticket1")), \
+             patch("app.api.v1.auth.rabbitmq_client.rpc_call", rpc_call), \
+             patch("app.api.v1.auth.registration_notifier.wait", AsyncMock(return_value=ticket_state)) as mock_wait, \
+             patch("app.api.v1.auth.enqueue_user_event") as mock_enqueue:
+            response = test_app.post("/api/v1/auth/register", params={"wait": True}, json=REGISTER_DATA)
+    finally:
+        app.dependency_overrides = {}
+    return response, mock_wait, mock_enqueue
+
+
+def test_register_wait_returns_201_after_ticket_completed(test_app):
+    """
+    user-serviceの返信後、auth_usersへの登録でチケットが完了してから201を返す
+    """
+    reply = {"status": "success", "id": str(uuid.uuid4()), "username": "newuser", "email": "newuser@example.com"}
+    response, mock_wait, mock_enqueue = _register_with_rpc(
+        test_app, AsyncMock(return_value=reply), {"status": "completed", "user_id": reply["id"]}
+    )
+
+    assert response.status_code == 201
+    assert response.json()["user_id"] == reply["id"]
+    mock_wait.assert_awaited_once()
+    assert mock_wait.await_args.args[0] == "ticket1"
+    mock_enqueue.assert_not_called()
+
+
+def test_register_wait_returns_202_while_ticket_pending(test_app):
+    """
+    返信後もチケットが完了しない（auth_usersに未登録の）場合は202とチケットを返す
+    """
+    reply = {"status": "success", "id": str(uuid.uuid4()), "username": "newuser", "email": "newuser@example.com"}
+    response, _, mock_enqueue = _register_with_rpc(test_app, AsyncMock(return_value=reply), {"status": "pending"})
+
+    assert response.status_code == 202
+    assert response.json()["ticket"] == "ticket1"
+    mock_enqueue.assert_not_called()
+
+
+def test_register_wait_reports_failed_ticket(test_app):
+    """
+    返信後の登録でチケットが失敗した場合はそのエラーを返す
+    """
+    reply = {"status": "success", "id": str(uuid.uuid4()), "username": "newuser", "email": "newuser@example.com"}
+    response, _, _ = _register_with_rpc(
+        test_app, AsyncMock(return_value=reply),
+        {"status": "failed", "error_type": "duplicate_username", "message": "ユーザー名が既に使用されています"}
+    )
+
+    assert response.status_code == 409
+    assert response.json()["error_type"] == "duplicate_username"
+
+
+def test_register_wait_falls_back_to_outbox_only_when_publish_fails(test_app):
+    """
+    RPCのリクエストを発行できなかった場合だけアウトボックスで送信し、発行後のエラーでは再送せずに202を返す
+    """
+    from app.messaging.rpc import RpcPublishError
+
+    response, _, mock_enqueue = _register_with_rpc(test_app, AsyncMock(side_effect=RpcPublishError("closed")))
+    assert response.status_code == 202
+    mock_enqueue.assert_called_once()
+
+    response, mock_wait, mock_enqueue = _register_with_rpc(test_app, AsyncMock(side_effect=RuntimeError("decode error")))
+    assert response.status_code == 202
+    assert response.json()["ticket"] == "ticket1"
+    mock_enqueue.assert_not_called()
+    mock_wait.assert_not_called()
+
+
 # ログインエンドポイントのテスト
 @patch("app.api.v1.auth.auth_user_crud.get_by_username")
 @patch("app.api.v1.auth.verify_password")
@@ -175,6 +256,29 @@ def test_login_endpoint(mock_create_refresh_token, mock_create_access_token, moc
 
 
 # ログインエンドポイントの認証失敗テスト
+@patch("app.api.v1.auth.auth_user_crud.get_by_username")
+@patch("app.api.v1.auth.verify_password")
+@patch("app.api.v1.auth.create_access_token")
+def test_login_endpoint_inactive_user(mock_create_access_token, mock_verify_password, mock_get_by_username, test_app):
+    """
+    無効化されたユーザーはログインできない
+    """
+    db_user = MagicMock()
+    db_user.username = "testuser"
+    db_user.is_active = False
+    mock_get_by_username.return_value = db_user
+    mock_verify_password.return_value = True
+    
+    response = test_app.post(
+        "/api/v1/auth/login",
+        data={"username": "testuser", "password": "Password123!"}
+    )
+    
+    assert response.status_code == 401
+    assert response.json()["detail"] == "ユーザーが無効化されています"
+    mock_create_access_token.assert_not_called()
+
+
 @patch("app.api.v1.auth.auth_user_crud.get_by_username")
 def test_login_endpoint_authentication_failure(mock_get_by_username, test_app):
     """
@@ -211,7 +315,7 @@ def test_login_endpoint_authentication_failure(mock_get_by_username, test_app):
 @patch("app.api.v1.auth.create_refresh_token")
 @patch("app.api.v1.auth.blacklist_token")
 @patch("app.api.v1.auth.revoke_refresh_token")
-@patch("app.api.v1.auth.auth_user_crud.get_by_id")
+@patch("app.api.v1.auth.auth_user_crud.get_identity_by_id")
 def test_refresh_token_endpoint(
     mock_get_by_id, 
     mock_revoke_refresh_token, 
@@ -264,7 +368,7 @@ def test_refresh_token_endpoint(
 
 # トークンリフレッシュエンドポイントでの失敗テスト
 @patch("app.api.v1.auth.verify_refresh_token")
-@patch("app.api.v1.auth.auth_user_crud.get_by_id")
+@patch("app.api.v1.auth.auth_user_crud.get_identity_by_id")
 def test_refresh_token_endpoint_invalid_token(
     mock_get_by_id,
     mock_verify_refresh_token, 
@@ -396,3 +500,70 @@ def test_logout_endpoint(mock_revoke_refresh, mock_blacklist, test_app):
     # モックが呼び出されたことを確認
     mock_blacklist.assert_called_once()
     mock_revoke_refresh.assert_called_once_with(logout_data["refresh_token"])
+
+
+# 一括操作エンドポイントのテスト
+def test_bulk_endpoints_require_authentication(test_app):
+    """
+    一括操作エンドポイントは認証が必要
+    """
+    for action in ("activate", "deactivate", "delete"):
+        response = test_app.post(f"/api/v1/auth/users/bulk/{action}", json={"user_ids": [str(uuid.uuid4())]})
+        assert response.status_code == 401
+
+
+def test_bulk_endpoints_forbid_non_admin(test_app):
+    """
+    管理者でないユーザーは一括操作できない
+    """
+    from app.api.deps import get_current_user
+    non_admin = MagicMock()
+    non_admin.user_id = uuid.uuid4()
+    app.dependency_overrides[get_current_user] = lambda: non_admin
+    try:
+        with patch("app.api.deps.settings.ADMIN_USER_IDS", str(uuid.uuid4())), \
+             patch("app.crud.auth_user.auth_user_crud.bulk_delete_by_user_ids") as mock_delete:
+            response = test_app.post("/api/v1/auth/users/bulk/delete", json={"user_ids": [str(uuid.uuid4())]})
+        assert response.status_code == 403
+        mock_delete.assert_not_called()
+    finally:
+        app.dependency_overrides = {}
+
+
+@patch("app.api.v1.auth.enqueue_user_event")
+def test_bulk_delete_publishes_event_per_user(mock_enqueue, test_app):
+    """
+    一括削除はユーザーごとにuser-serviceのユーザーIDをidとするイベントを発行する
+    """
+    from app.api.deps import get_current_admin_user
+    from app.db.session import get_async_session
+    from app.schemas.auth_user import AuthUserBulkActionResult, AuthUserBulkActionStatus
+
+    user_ids = [uuid.uuid4(), uuid.uuid4()]
+    applied = [
+        AuthUserBulkActionResult(index=i, user_id=user_id, status=AuthUserBulkActionStatus.APPLIED, id=uuid.uuid4())
+        for i, user_id in enumerate(user_ids)
+    ]
+
+    async def bulk_delete(session, ids, on_chunk=None):
+        await on_chunk(applied)
+        return applied
+
+    async def session_override():
+        yield AsyncMock()
+
+    app.dependency_overrides[get_current_admin_user] = lambda: MagicMock()
+    app.dependency_overrides[get_async_session] = session_override
+    try:
+        with patch("app.crud.auth_user.auth_user_crud.bulk_delete_by_user_ids", side_effect=bulk_delete):
+            response = test_app.post(
+                "/api/v1/auth/users/bulk/delete", json={"user_ids": [str(user_id) for user_id in user_ids]}
+            )
+    finally:
+        app.dependency_overrides = {}
+
+    assert response.status_code == 200
+    events = [call.args[2] for call in mock_enqueue.call_args_list]
+    assert [call.args[1] for call in mock_enqueue.call_args_list] == ["user.deleted", "user.deleted"]
+    assert [event["id"] for event in events] == user_ids
+    assert [event["auth_user_id"] for event in events] == [result.id for result in applied]
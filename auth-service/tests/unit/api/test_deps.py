@@ -5,7 +5,7 @@ from jose import JWTError
 from pydantic import ValidationError
 import uuid
 
-from app.api.deps import get_current_user, validate_refresh_token
+from app.api.deps import get_current_admin_user, get_current_user, validate_refresh_token
 from app.models.auth_user import AuthUser
 
 
@@ -119,6 +119,20 @@ class TestGetCurrentUser:
             assert excinfo.value.status_code == status.HTTP_401_UNAUTHORIZED
             assert excinfo.value.detail == "認証情報が無効です"
             assert excinfo.value.headers == {"WWW-Authenticate": "Bearer"}
+    
+    async def test_get_current_user_inactive(self):
+        """無効化されたユーザーのトークンは拒否される"""
+        mock_user = MagicMock(spec=AuthUser)
+        mock_user.user_id = uuid.uuid4()
+        mock_user.is_active = False
+        
+        with patch("app.api.deps.verify_token", return_value={"user_id": str(mock_user.user_id)}), \
+             patch("app.api.deps.auth_user_crud.get_by_user_id", return_value=mock_user):
+            with pytest.raises(HTTPException) as excinfo:
+                await get_current_user(token="token_of_inactive_user", async_session=AsyncMock())
+            
+            assert excinfo.value.status_code == status.HTTP_401_UNAUTHORIZED
+            assert excinfo.value.detail == "ユーザーが無効化されています"
 
 
 class TestValidateRefreshToken:
@@ -155,3 +169,39 @@ class TestValidateRefreshToken:
             assert excinfo.value.status_code == status.HTTP_401_UNAUTHORIZED
             assert excinfo.value.detail == "リフレッシュトークンが無効です"
             assert excinfo.value.headers == {"WWW-Authenticate": "Bearer"}
+
+
+class TestGetCurrentAdminUser:
+    """get_current_admin_user 依存関数のテスト"""
+    
+    async def test_admin_user_allowed(self):
+        """設定で管理者に指定されたユーザーは通過する"""
+        mock_user = MagicMock(spec=AuthUser)
+        mock_user.user_id = uuid.uuid4()
+        
+        with patch("app.api.deps.settings.ADMIN_USER_IDS", f" {str(mock_user.user_id).upper()} ,other"):
+            result = await get_current_admin_user(current_user=mock_user)
+        
+        assert result == mock_user
+    
+    async def test_non_admin_user_forbidden(self):
+        """管理者に指定されていないユーザーは403になる"""
+        mock_user = MagicMock(spec=AuthUser)
+        mock_user.user_id = uuid.uuid4()
+        
+        with patch("app.api.deps.settings.ADMIN_USER_IDS", str(uuid.uuid4())):
+            with pytest.raises(HTTPException) as excinfo:
+                await get_current_admin_user(current_user=mock_user)
+        
+        assert excinfo.value.status_code == status.HTTP_403_FORBIDDEN
+    
+    async def test_no_admin_configured(self):
+        """管理者が設定されていない場合は誰も通過しない"""
+        mock_user = MagicMock(spec=AuthUser)
+        mock_user.user_id = uuid.uuid4()
+        
+        with patch("app.api.deps.settings.ADMIN_USER_IDS", ""):
+            with pytest.raises(HTTPException) as excinfo:
+                await get_current_admin_user(current_user=mock_user)
+        
+        assert excinfo.value.status_code == status.HTTP_403_FORBIDDEN
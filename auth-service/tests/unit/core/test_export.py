@@ -0,0 +1,131 @@
+import csv
+import gzip
+import io
+import json
+import pytest
+import uuid
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.export import gzip_stream, stream_export
+from app.crud.auth_user import auth_user_crud
+from app.models.auth_user import AuthUser
+from app.schemas.auth_user import AuthUserCreateDB
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    return sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def _create_users(session_factory, count: int):
+    users_data = [
+        AuthUserCreateDB(
+            username=f"exportuser{i}{uuid.uuid4().hex[:6]}",
+            email=f"export_{i}_{uuid.uuid4().hex[:6]}@example.com",
+            password="password123",
+            user_id=uuid.uuid4()
+        ) for i in range(count)
+    ]
+    async with session_factory() as session:
+        await auth_user_crud.bulk_create(session, users_data)
+        await session.commit()
+    return users_data
+
+
+def _export_stmt():
+    return select(AuthUser.id, AuthUser.username, AuthUser.user_id).order_by(AuthUser.created_at, AuthUser.id)
+
+
+async def _collect(chunks):
+    return b"".join([chunk async for chunk in chunks])
+
+
+@pytest.mark.asyncio
+async def test_stream_export_ndjson_in_batches(session_factory):
+    """NDJSON形式でバッチごとに出力されることをテストする"""
+    users_data = await _create_users(session_factory, 5)
+
+    chunks = [chunk async for chunk in stream_export(_export_stmt(), "ndjson", batch_size=2, session_factory=session_factory)]
+
+    assert len(chunks) == 3
+    rows = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+    assert sorted(row["username"] for row in rows) == sorted(u.username for u in users_data)
+    assert set(rows[0]) == {"id", "username", "user_id"}
+
+
+@pytest.mark.asyncio
+async def test_stream_export_csv_with_header(session_factory):
+    """CSV形式ではヘッダー行が先頭に出力されることをテストする"""
+    await _create_users(session_factory, 3)
+
+    body = await _collect(stream_export(_export_stmt(), "csv", session_factory=session_factory))
+
+    rows = list(csv.reader(io.StringIO(body.decode())))
+    assert rows[0] == ["id", "username", "user_id"]
+    assert len(rows) == 4
+
+
+@pytest.mark.asyncio
+async def test_gzip_stream():
+    """gzip圧縮したストリームが元のデータに展開できることをテストする"""
+    async def chunks():
+        for i in range(3):
+            yield f"line{i}\n".encode() * 100
+
+    compressed = await _collect(gzip_stream(chunks()))
+
+    assert gzip.decompress(compressed) == b"".join(f"line{i}\n".encode() * 100 for i in range(3))
+
+
+@pytest.mark.asyncio
+async def test_export_endpoint(session_factory):
+    """エクスポートエンドポイントがgzip圧縮されたNDJSONを返すことをテストする"""
+    users_data = await _create_users(session_factory, 2)
+
+    with patch("app.db.init.Database.init", return_value=None), \
+         patch("app.messaging.rabbitmq.rabbitmq_client.initialize", return_value=None), \
+         patch("app.messaging.rabbitmq.rabbitmq_client.setup_user_creation_response_consumer", return_value=None), \
+         patch("app.messaging.rabbitmq.rabbitmq_client.close", return_value=None), \
+         patch("app.core.export.AsyncSessionLocal", session_factory):
+        from app.api.deps import get_current_admin_user
+        from app.main import app
+        app.dependency_overrides[get_current_admin_user] = lambda: MagicMock()
+        try:
+            client = TestClient(app)
+            response = client.get("/api/v1/auth/users/export", params={"gzip": True})
+        finally:
+            app.dependency_overrides = {}
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-encoding"] == "gzip"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(row["username"] for row in rows) == sorted(u.username for u in users_data)
+    assert "hashed_password" not in rows[0]
+
+
+def test_export_endpoint_forbids_non_admin():
+    """管理者でないユーザーはエクスポートできないことをテストする"""
+    with patch("app.db.init.Database.init", return_value=None), \
+         patch("app.messaging.rabbitmq.rabbitmq_client.initialize", return_value=None), \
+         patch("app.messaging.rabbitmq.rabbitmq_client.setup_user_creation_response_consumer", return_value=None), \
+         patch("app.messaging.rabbitmq.rabbitmq_client.close", return_value=None), \
+         patch("app.api.deps.settings.ADMIN_USER_IDS", str(uuid.uuid4())), \
+         patch("app.api.v1.auth.stream_export") as mock_export:
+        from app.api.deps import get_current_user
+        from app.main import app
+        non_admin = MagicMock()
+        non_admin.user_id = uuid.uuid4()
+        app.dependency_overrides[get_current_user] = lambda: non_admin
+        try:
+            client = TestClient(app)
+            response = client.get("/api/v1/auth/users/export")
+        finally:
+            app.dependency_overrides = {}
+
+    assert response.status_code == 403
+    mock_export.assert_not_called()
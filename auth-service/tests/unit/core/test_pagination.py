@@ -0,0 +1,37 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+
+from app.core.pagination import estimate_row_count
+from app.models.auth_user import AuthUser as Model
+
+
+@pytest.mark.asyncio
+async def test_estimate_row_count_passes_filters_as_parameters():
+    """推定行数のEXPLAINで検索条件の値がSQLに埋め込まれずパラメーターとして渡されることをテストする"""
+    connection = MagicMock()
+    connection.dialect = asyncpg_dialect()
+    result = MagicMock()
+    result.scalar_one.return_value = json.dumps([{"Plan": {"Plan Rows": 42}}])
+    connection.exec_driver_sql = AsyncMock(return_value=result)
+    session = MagicMock()
+    session.connection = AsyncMock(return_value=connection)
+    value = "o'brien%"
+    stmt = select(Model).where(Model.username.ilike(value), Model.username.in_(["a", "b"]))
+
+    estimated = await estimate_row_count(session, stmt)
+
+    assert estimated == 42
+    sql, params = connection.exec_driver_sql.await_args.args
+    assert sql.startswith("EXPLAIN (FORMAT JSON) SELECT")
+    assert "o'brien" not in sql
+    assert "$1" in sql
+    assert params == (value, "a", "b")
+
+
+@pytest.mark.asyncio
+async def test_estimate_row_count_returns_none_without_postgresql(db_session):
+    """PostgreSQL以外では推定行数がNoneになることをテストする"""
+    assert await estimate_row_count(db_session, select(Model)) is None
@@ -0,0 +1,192 @@
+import asyncio
+import uuid
+import pytest
+from unittest.mock import patch
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.redis import save_password_to_redis
+from app.core.registration import (
+    TICKET_COMPLETED,
+    TICKET_PENDING,
+    REGISTRATION_CHANNEL,
+    RegistrationTicketNotifier,
+    complete_registration_ticket,
+    create_registration_ticket,
+    get_registration_ticket,
+)
+from app.messaging.auth_handler import handle_user_creation_response
+from app.messaging.memory_broker import MemoryBroker
+from app.messaging.rabbitmq import RabbitMQClient
+from app.models.auth_user import AuthUser
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self._redis = redis
+        self._queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self._redis.subscribers.setdefault(channel, []).append(self._queue)
+
+    def listen(self):
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._queue.get()
+
+    async def aclose(self):
+        pass
+
+
+class FakeRedis:
+    """テストに必要な操作だけを実装したRedis"""
+
+    def __init__(self):
+        self.values = {}
+        self.subscribers = {}
+
+    async def setex(self, key, ttl, value):
+        self.values[key] = value
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def delete(self, key):
+        return 1 if self.values.pop(key, None) is not None else 0
+
+    async def set(self, key, value, xx=False, keepttl=False):
+        if xx and key not in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def publish(self, channel, message):
+        for queue in self.subscribers.get(channel, []):
+            queue.put_nowait({"type": "message", "channel": channel, "data": message})
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+
+@pytest.fixture
+def fake_redis():
+    redis = FakeRedis()
+
+    async def get_redis():
+        return redis
+
+    with patch("app.core.registration.get_redis_pool", get_redis), \
+         patch("app.core.redis.get_redis_pool", get_redis):
+        yield redis, get_redis
+
+
+@pytest.mark.asyncio
+async def test_wait_is_woken_by_completion(fake_redis):
+    """完了の通知を受信すると、タイムアウトを待たずに完了した状態を返す"""
+    _, get_redis = fake_redis
+    notifier = RegistrationTicketNotifier(REGISTRATION_CHANNEL, redis_factory=get_redis)
+    ticket = await create_registration_ticket("alice", "alice@example.com")
+    waiter = asyncio.create_task(notifier.wait(ticket, timeout=5.0))
+    await asyncio.sleep(0.01)
+    assert notifier.stats()["waiting"] == 1
+
+    assert await complete_registration_ticket(ticket, TICKET_COMPLETED, user_id="u1") is True
+    state = await asyncio.wait_for(waiter, timeout=1.0)
+    await notifier.stop()
+
+    assert state["status"] == TICKET_COMPLETED
+    assert state["user_id"] == "u1"
+    assert notifier.stats()["waiting"] == 0
+    assert notifier.stats()["wakeups_total"] == 1
+
+
+@pytest.mark.asyncio
+async def test_wait_returns_pending_state_on_timeout(fake_redis):
+    """完了しないまま待機時間が過ぎると処理中の状態を返す"""
+    _, get_redis = fake_redis
+    notifier = RegistrationTicketNotifier(REGISTRATION_CHANNEL, redis_factory=get_redis)
+    ticket = await create_registration_ticket("bob", "bob@example.com")
+
+    state = await notifier.wait(ticket, timeout=0.05)
+    await notifier.stop()
+
+    assert state["status"] == TICKET_PENDING
+    assert notifier.stats()["timeouts_total"] == 1
+
+
+@pytest.mark.asyncio
+async def test_unknown_ticket(fake_redis):
+    """存在しないチケットは待たずにNoneを返し、完了にもできない"""
+    _, get_redis = fake_redis
+    notifier = RegistrationTicketNotifier(REGISTRATION_CHANNEL, redis_factory=get_redis)
+
+    assert await notifier.wait("missing", timeout=5.0) is None
+    assert await get_registration_ticket("missing") is None
+    assert await complete_registration_ticket("missing", TICKET_COMPLETED) is False
+    await notifier.stop()
+
+
+@pytest.mark.asyncio
+async def test_ticket_completed_by_user_service_reply(fake_redis, db_engine):
+    """
+    user-serviceの返信をインメモリのブローカー経由で受信すると、認証ユーザーが作成され、
+    完了を待っているクライアントに完了したチケットが通知される
+    """
+    _, get_redis = fake_redis
+    session_factory = sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def get_session():
+        async with session_factory() as session:
+            yield session
+
+    broker = MemoryBroker()
+    client = RabbitMQClient()
+    notifier = RegistrationTicketNotifier(REGISTRATION_CHANNEL, redis_factory=get_redis)
+    with patch.object(settings, "RABBITMQ_BROKER", "memory"), \
+         patch("app.messaging.memory_broker.default_broker", broker), \
+         patch("app.messaging.auth_handler.get_async_session", get_session):
+        await client.initialize()
+        await client.setup_user_creation_response_consumer(handle_user_creation_response)
+        # /registerと同じくパスワードを一時保存し、チケットを発行する
+        password_key = await save_password_to_redis("carol", "secret1")
+        ticket = await create_registration_ticket("carol", "carol@example.com")
+        waiter = asyncio.create_task(notifier.wait(ticket, timeout=5.0))
+        await asyncio.sleep(0.01)
+
+        # user-serviceのアウトボックスのリレーと同じ形式で返信を発行する
+        user_id = str(uuid.uuid4())
+        original_request = {
+            "username": "carol",
+            "email": "carol@example.com",
+            "password_key": password_key,
+            "registration_ticket": ticket
+        }
+        await client.publish_message("auth_events", "user.created", {
+            "event_type": "user.created",
+            "user_data": {
+                "id": user_id,
+                "username": "carol",
+                "email": "carol@example.com",
+                "status": "success",
+                "original_request": original_request,
+                "processing_time_ms": 1.0
+            }
+        })
+        state = await asyncio.wait_for(waiter, timeout=2.0)
+        await notifier.stop()
+        await client.close()
+
+    assert state["status"] == TICKET_COMPLETED
+    assert state["user_id"] == user_id
+    assert broker.stats()["queues"]["user_creation_response.dlq"]["messages"] == 0
+    async with session_factory() as session:
+        auth_user = (await session.execute(select(AuthUser))).scalar_one()
+    assert str(auth_user.user_id) == user_id
+    assert auth_user.is_active is True
@@ -0,0 +1,161 @@
+import asyncio
+import pytest
+import uuid
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.singleflight import SingleFlight, singleflight_stats
+from app.crud.auth_user import auth_user_crud
+from app.crud.exceptions import UserNotFoundError
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    """同じキーの同時呼び出しが1回の実行結果を共有することをテストする"""
+    group = SingleFlight("test.share")
+    executions = 0
+
+    async def fetch():
+        nonlocal executions
+        executions += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    results = await asyncio.gather(*(group.do("key", fetch) for _ in range(5)))
+
+    assert results == ["value"] * 5
+    assert executions == 1
+    stats = singleflight_stats()["test.share"]
+    assert stats["calls"] == 5
+    assert stats["executions"] == 1
+    assert stats["shared"] == 4
+    assert stats["coalescing_ratio"] == pytest.approx(0.8)
+    assert stats["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_key_is_released_after_completion():
+    """完了後の呼び出しでは再度実行されることをテストする"""
+    group = SingleFlight("test.release")
+
+    async def fetch():
+        return object()
+
+    first = await group.do("key", fetch)
+    second = await group.do("key", fetch)
+
+    assert first is not second
+    assert group.executions == 2
+
+
+@pytest.mark.asyncio
+async def test_exception_is_shared():
+    """実行中の例外が後続の呼び出し元にも伝播することをテストする"""
+    group = SingleFlight("test.error")
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(*(group.do("key", fetch) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert group.executions == 1
+
+
+@pytest.mark.asyncio
+async def test_leader_cancellation_does_not_cancel_followers():
+    """リーダーがキャンセルされても後続の呼び出し元は結果を受け取れることをテストする"""
+    group = SingleFlight("test.cancel")
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "value"
+
+    leader = asyncio.ensure_future(group.do("key", fetch))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(group.do("key", fetch))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == "value"
+
+
+@pytest.mark.asyncio
+async def test_get_by_user_id_coalesces_across_sessions(db_engine, test_user):
+    """異なるセッションからの同時取得が1回のクエリにまとめられることをテストする"""
+    session_factory = sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        async with session_factory() as session_a, session_factory() as session_b:
+            user_a, user_b = await asyncio.gather(
+                auth_user_crud.get_by_user_id(session_a, test_user.user_id),
+                auth_user_crud.get_by_user_id(session_b, test_user.user_id)
+            )
+            assert user_a in session_a
+            assert user_b in session_b
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
+    assert user_a.user_id == user_b.user_id == test_user.user_id
+
+
+@pytest.mark.asyncio
+async def test_get_by_user_id_not_found_is_shared(db_session):
+    """該当なしの例外が同時に取得した全ての呼び出し元に伝播することをテストする"""
+    user_id = uuid.uuid4()
+
+    results = await asyncio.gather(
+        auth_user_crud.get_by_user_id(db_session, user_id),
+        auth_user_crud.get_by_user_id(db_session, user_id),
+        return_exceptions=True
+    )
+
+    assert all(isinstance(result, UserNotFoundError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_get_by_user_id_runs_query_on_dedicated_session(db_engine, test_user, monkeypatch):
+    """共有するクエリは呼び出し元のセッションではなく専用のセッションで実行されることをテストする"""
+    session_factory = sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    flight_sessions = []
+
+    def dedicated_session(**kwargs):
+        session = session_factory(**kwargs)
+        flight_sessions.append(session)
+        return session
+
+    monkeypatch.setattr("app.crud.auth_user.AsyncSessionLocal", dedicated_session)
+    async with session_factory() as session:
+        user = await auth_user_crud.get_by_user_id(session, test_user.user_id)
+
+        assert len(flight_sessions) == 1
+        assert flight_sessions[0] is not session
+        # 切り離された結果が呼び出し元のセッションへmergeされる
+        assert user in session
+        assert user.user_id == test_user.user_id
+
+
+@pytest.mark.asyncio
+async def test_get_by_user_id_returns_instance_loaded_in_session(db_engine, db_session, test_user):
+    """呼び出し元のセッションに読み込み済みのユーザーはクエリを発行せずに返すことをテストする"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        user = await auth_user_crud.get_by_user_id(db_session, test_user.user_id)
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+    assert user is test_user
+    assert statements == []
@@ -0,0 +1,80 @@
+import pytest
+import uuid
+
+from app.core.security import get_password_hashes, verify_password
+from app.crud.auth_user import auth_user_crud
+from app.schemas.auth_user import AuthUserBulkCreateStatus, AuthUserCreateDB
+
+
+def _make_user(i: int, **overrides) -> AuthUserCreateDB:
+    unique_id = uuid.uuid4().hex[:8]
+    data = {
+        "username": f"bulkuser{i}{unique_id}",
+        "email": f"bulk_user_{i}_{unique_id}@example.com",
+        "password": f"pass{i}{unique_id}",
+        "user_id": uuid.uuid4(),
+    }
+    data.update(overrides)
+    return AuthUserCreateDB(**data)
+
+
+@pytest.mark.asyncio
+async def test_get_password_hashes_preserves_order():
+    """並列ハッシュ化の結果が入力と同じ順序で返されることをテストする"""
+    passwords = [f"password{i}" for i in range(5)]
+    hashed = await get_password_hashes(passwords)
+
+    assert len(hashed) == len(passwords)
+    for password, hashed_password in zip(passwords, hashed):
+        assert verify_password(password, hashed_password) is True
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_auth_users(db_session):
+    """複数チャンクにまたがる一括作成で全行が作成されることをテストする"""
+    users_data = [_make_user(i) for i in range(5)]
+
+    results = await auth_user_crud.bulk_create(db_session, users_data, chunk_size=2)
+
+    assert [r.index for r in results] == list(range(5))
+    assert all(r.status == AuthUserBulkCreateStatus.CREATED for r in results)
+    for user_in, result in zip(users_data, results):
+        db_user = await auth_user_crud.get_by_username(db_session, user_in.username)
+        assert db_user.id == result.id
+        assert db_user.user_id == user_in.user_id
+        assert db_user.created_at is not None
+        assert verify_password(user_in.password, db_user.hashed_password) is True
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_reports_conflicts_per_row(db_session, test_user):
+    """重複行は処理を中断せずに行ごとの理由と共にスキップされることをテストする"""
+    valid = _make_user(0)
+    users_data = [
+        valid,
+        _make_user(1, username=test_user.username),
+        _make_user(2, email=test_user.email),
+        _make_user(3, user_id=test_user.user_id),
+        _make_user(4, username=valid.username),
+    ]
+
+    results = await auth_user_crud.bulk_create(db_session, users_data)
+
+    assert [r.status for r in results] == [
+        AuthUserBulkCreateStatus.CREATED,
+        AuthUserBulkCreateStatus.DUPLICATE_USERNAME,
+        AuthUserBulkCreateStatus.DUPLICATE_EMAIL,
+        AuthUserBulkCreateStatus.DUPLICATE_USER_ID,
+        AuthUserBulkCreateStatus.DUPLICATE_IN_INPUT,
+    ]
+    assert results[0].id is not None
+    assert all(r.id is None for r in results[1:])
+
+    all_users = await auth_user_crud.get_all(db_session)
+    assert len(all_users) == 2
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_empty_input(db_session):
+    """空の入力では何も作成されないことをテストする"""
+    assert await auth_user_crud.bulk_create(db_session, []) == []
@@ -0,0 +1,77 @@
+import pytest
+import uuid
+
+from app.crud.auth_user import auth_user_crud
+from app.crud.exceptions import UserNotFoundError
+from app.schemas.auth_user import AuthUserBulkActionStatus, AuthUserCreateDB
+
+
+async def _create_users(db_session, count: int):
+    users = []
+    for i in range(count):
+        unique_id = uuid.uuid4().hex[:8]
+        users.append(await auth_user_crud.create(db_session, AuthUserCreateDB(
+            username=f"bulkstatus{i}{unique_id}",
+            email=f"bulk_status_{i}_{unique_id}@example.com",
+            password="password123",
+            user_id=uuid.uuid4()
+        )))
+    await db_session.commit()
+    return users
+
+
+@pytest.mark.asyncio
+async def test_bulk_set_active_per_id_outcomes(db_session):
+    """一括有効化でIDごとの結果が入力と同じ順序で返されることをテストする"""
+    users = await _create_users(db_session, 3)
+    missing = uuid.uuid4()
+    user_ids = [users[0].user_id, missing, users[1].user_id, users[0].user_id, users[2].user_id]
+
+    ids = [user.id for user in users]
+
+    results = await auth_user_crud.bulk_set_active(db_session, user_ids, True, chunk_size=2)
+    await db_session.commit()
+
+    assert [r.index for r in results] == list(range(5))
+    assert [r.status for r in results] == [
+        AuthUserBulkActionStatus.APPLIED,
+        AuthUserBulkActionStatus.NOT_FOUND,
+        AuthUserBulkActionStatus.APPLIED,
+        AuthUserBulkActionStatus.DUPLICATE_IN_INPUT,
+        AuthUserBulkActionStatus.APPLIED,
+    ]
+    assert results[0].id == ids[0]
+    assert results[1].id is None
+    db_session.expire_all()
+    for id in ids:
+        assert (await auth_user_crud.get_by_id(db_session, id)).is_active is True
+
+
+@pytest.mark.asyncio
+async def test_bulk_set_active_calls_on_chunk_per_chunk(db_session):
+    """チャンクごとに処理された結果のみがon_chunkに渡されることをテストする"""
+    users = await _create_users(db_session, 3)
+    chunks = []
+
+    async def on_chunk(applied):
+        chunks.append([result.user_id for result in applied])
+
+    await auth_user_crud.bulk_set_active(
+        db_session, [user.user_id for user in users] + [uuid.uuid4()], False, chunk_size=2, on_chunk=on_chunk
+    )
+
+    assert chunks == [[users[0].user_id, users[1].user_id], [users[2].user_id]]
+
+
+@pytest.mark.asyncio
+async def test_bulk_delete_by_user_ids(db_session):
+    """一括削除で対象のユーザーのみが削除されることをテストする"""
+    users = await _create_users(db_session, 3)
+
+    results = await auth_user_crud.bulk_delete_by_user_ids(db_session, [users[0].user_id, users[2].user_id])
+    await db_session.commit()
+
+    assert all(r.status == AuthUserBulkActionStatus.APPLIED for r in results)
+    with pytest.raises(UserNotFoundError):
+        await auth_user_crud.get_by_id(db_session, users[0].id)
+    assert (await auth_user_crud.get_by_id(db_session, users[1].id)).id == users[1].id
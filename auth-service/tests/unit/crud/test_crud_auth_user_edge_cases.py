@@ -117,11 +117,11 @@ async def test_database_connection_error_handling(db_session, monkeypatch):
 async def test_unexpected_exception_handling(db_session, monkeypatch):
     """予期せぬ例外が適切にハンドリングされることを確認する"""
     # 予期せぬ例外を発生させる関数
-    async def mock_get_by_id(*args, **kwargs):
+    async def mock_execute(*args, **kwargs):
         raise RuntimeError("Unexpected error")
     
-    # get_by_idメソッドをモックに置き換え
-    monkeypatch.setattr(auth_user_crud, "get_by_id", mock_get_by_id)
+    # executeメソッドをモックに置き換え
+    monkeypatch.setattr(db_session, "execute", mock_execute)
     
     # ユーザー更新操作を実行
     user_id = uuid.uuid4()
@@ -346,17 +346,17 @@ async def test_update_by_id_with_integrity_error(db_session, monkeypatch):
     )
     created_user = await auth_user_crud.create(db_session, user_in)
     
-    # セッションのflushメソッドをモックしてIntegrityErrorを発生させる
-    original_flush = db_session.flush
+    # UPDATE文の実行をモックしてIntegrityErrorを発生させる
+    original_execute = db_session.execute
     
     # テストケース1: usernameキーワードを含むIntegrityError
-    async def mock_flush_username(*args, **kwargs):
+    async def mock_execute_username(*args, **kwargs):
         # キーワード「username」を含むエラーメッセージのIntegrityErrorを発生させる
         error = IntegrityError("statement", {}, Exception("Duplicate entry for username"))
         raise error
     
-    # flushメソッドをモックに置き換え
-    monkeypatch.setattr(db_session, "flush", mock_flush_username)
+    # executeメソッドをモックに置き換え
+    monkeypatch.setattr(db_session, "execute", mock_execute_username)
     
     # ユーザー更新を試みてDuplicateUsernameErrorが発生することを確認
     with pytest.raises(DuplicateUsernameError) as exc_info:
@@ -367,13 +367,13 @@ async def test_update_by_id_with_integrity_error(db_session, monkeypatch):
     assert "Username already exists" in str(exc_info.value)
     
     # テストケース2: emailキーワードを含むIntegrityError
-    async def mock_flush_email(*args, **kwargs):
+    async def mock_execute_email(*args, **kwargs):
         # キーワード「email」を含むエラーメッセージのIntegrityErrorを発生させる
         error = IntegrityError("statement", {}, Exception("Duplicate entry for email"))
         raise error
     
-    # flushメソッドをモックに置き換え
-    monkeypatch.setattr(db_session, "flush", mock_flush_email)
+    # executeメソッドをモックに置き換え
+    monkeypatch.setattr(db_session, "execute", mock_execute_email)
     
     # ユーザー更新を試みてDuplicateEmailErrorが発生することを確認
     with pytest.raises(DuplicateEmailError) as exc_info:
@@ -384,13 +384,13 @@ async def test_update_by_id_with_integrity_error(db_session, monkeypatch):
     assert "Email already exists" in str(exc_info.value)
     
     # テストケース3: 特定のキーワードを含まないIntegrityError
-    async def mock_flush_general(*args, **kwargs):
+    async def mock_execute_general(*args, **kwargs):
         # 特定のキーワードを含まないIntegrityErrorを発生させる
         error = IntegrityError("statement", {}, Exception("General constraint violation"))
         raise error
     
-    # flushメソッドをモックに置き換え
-    monkeypatch.setattr(db_session, "flush", mock_flush_general)
+    # executeメソッドをモックに置き換え
+    monkeypatch.setattr(db_session, "execute", mock_execute_general)
     
     # ユーザー更新を試みてDatabaseIntegrityErrorが発生することを確認
     with pytest.raises(DatabaseIntegrityError) as exc_info:
@@ -401,4 +401,4 @@ async def test_update_by_id_with_integrity_error(db_session, monkeypatch):
     assert "Database integrity error" in str(exc_info.value)
     
     # モックを元に戻す
-    monkeypatch.setattr(db_session, "flush", original_flush)
+    monkeypatch.setattr(db_session, "execute", original_execute)
@@ -6,7 +6,7 @@ from app.crud.exceptions import (
     DuplicateEmailError,
     DuplicateUsernameError,
     DatabaseIntegrityError
-    )
+)
 from app.schemas.auth_user import AuthUserCreate, AuthUserCreateDB, AuthUserUpdate, AuthUserUpdatePassword
 
 
@@ -102,20 +102,20 @@ async def test_delete_by_email_exception_handling(db_session: AsyncSession, monk
     )
     created_user = await auth_user_crud.create(db_session, user_in)
     
-    # get_by_emailをモックして例外を発生させる
-    original_get_by_email = auth_user_crud.get_by_email
+    # DELETE ... RETURNINGをモックして削除対象が見つからない状態にする
+    original_delete_returning = auth_user_crud._delete_returning
     
-    async def mock_get_by_email(*args, **kwargs):
-        # 元のget_by_emailメソッドを呼び出すが、常にUserNotFoundErrorを発生させる
-        raise UserNotFoundError(message=f"User with email {kwargs.get('email', args[1])} not found")
+    async def mock_delete_returning(*args, **kwargs):
+        # 該当行がない場合と同じくNoneを返す
+        return None
     
-    # get_by_emailメソッドをモックに置き換え
-    monkeypatch.setattr(auth_user_crud, "get_by_email", mock_get_by_email)
+    # _delete_returningメソッドをモックに置き換え
+    monkeypatch.setattr(auth_user_crud, "_delete_returning", mock_delete_returning)
     
     # 例外が発生することを確認
     with pytest.raises(UserNotFoundError):
         await auth_user_crud.delete_by_email(db_session, email_str)
 
     # モックを元に戻す
-    monkeypatch.setattr(auth_user_crud, "get_by_email", original_get_by_email)
+    monkeypatch.setattr(auth_user_crud, "_delete_returning", original_delete_returning)
     await db_session.commit()
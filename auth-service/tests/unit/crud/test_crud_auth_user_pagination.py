@@ -0,0 +1,72 @@
+from datetime import datetime
+import pytest
+import uuid
+
+from app.core.exceptions import ValidationError
+from app.core.pagination import decode_cursor, encode_cursor
+from app.crud.auth_user import auth_user_crud
+from app.schemas.auth_user import AuthUserCreateDB
+
+
+async def _create_users(db_session, count: int, domain: str = "example.com"):
+    users_data = [
+        AuthUserCreateDB(
+            username=f"pageuser{i}{uuid.uuid4().hex[:6]}",
+            email=f"page_user_{i}_{uuid.uuid4().hex[:6]}@{domain}",
+            password="password123",
+            user_id=uuid.uuid4()
+        ) for i in range(count)
+    ]
+    # 一括作成では全行のcreated_atが同一になるため、idによる順序付けも検証できる
+    await auth_user_crud.bulk_create(db_session, users_data)
+    return users_data
+
+
+def test_cursor_round_trip():
+    """カーソルのエンコードとデコードが可逆であることをテストする"""
+    created_at = datetime(2025, 5, 1, 12, 0, 0)
+    id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(created_at, id)) == (created_at, id)
+
+
+@pytest.mark.parametrize("cursor", ["garbage", "W10", "bm90LWpzb24"])
+def test_decode_invalid_cursor(cursor):
+    """不正なカーソルはValidationErrorになることをテストする"""
+    with pytest.raises(ValidationError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.asyncio
+async def test_get_page_walks_all_users_once(db_session):
+    """カーソルを辿ると全ユーザーを重複なく取得できることをテストする"""
+    users_data = await _create_users(db_session, 7)
+
+    seen = []
+    cursor = None
+    while True:
+        users, cursor, estimated_total = await auth_user_crud.get_page(db_session, limit=3, cursor=cursor)
+        assert len(users) <= 3
+        assert estimated_total is None
+        seen.extend(user.username for user in users)
+        if cursor is None:
+            break
+
+    assert sorted(seen) == sorted(user.username for user in users_data)
+
+
+@pytest.mark.asyncio
+async def test_get_page_filters(db_session):
+    """ユーザー名の前方一致とメールドメインで絞り込めることをテストする"""
+    await _create_users(db_session, 3, domain="example.com")
+    other = await _create_users(db_session, 2, domain="other.org")
+
+    users, next_cursor, _ = await auth_user_crud.get_page(db_session, limit=10, email_domain="OTHER.org")
+    assert sorted(u.username for u in users) == sorted(u.username for u in other)
+    assert next_cursor is None
+
+    users, _, _ = await auth_user_crud.get_page(db_session, limit=10, username_prefix=other[0].username)
+    assert [u.username for u in users] == [other[0].username]
+
+    # LIKEのワイルドカードはエスケープされる
+    users, _, _ = await auth_user_crud.get_page(db_session, limit=10, username_prefix="page%")
+    assert users == []
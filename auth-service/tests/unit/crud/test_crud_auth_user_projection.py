@@ -0,0 +1,47 @@
+import pytest
+import uuid
+
+from app.crud.auth_user import auth_user_crud
+from app.crud.exceptions import UserNotFoundError
+from app.models.auth_user import AuthUser
+from app.schemas.auth_user import AuthUserCreateDB
+
+
+@pytest.mark.asyncio
+async def test_get_identity_by_id(db_session, test_user):
+    """識別用の列のみが取得され、ORMオブジェクトが生成されないことをテストする"""
+    row = await auth_user_crud.get_identity_by_id(db_session, test_user.id)
+
+    assert not isinstance(row, AuthUser)
+    assert row._fields == ("id", "user_id", "username")
+    assert row.id == test_user.id
+    assert row.user_id == test_user.user_id
+    assert row.username == test_user.username
+
+
+@pytest.mark.asyncio
+async def test_get_identity_by_id_not_found(db_session):
+    """存在しないIDでUserNotFoundErrorが発生することをテストする"""
+    with pytest.raises(UserNotFoundError):
+        await auth_user_crud.get_identity_by_id(db_session, uuid.uuid4())
+
+
+@pytest.mark.asyncio
+async def test_cached_statements_bind_current_values(db_session):
+    """キャッシュされた文でも呼び出しごとの値で検索されることをテストする"""
+    users = []
+    for i in range(2):
+        unique_id = uuid.uuid4().hex[:8]
+        users.append(await auth_user_crud.create(db_session, AuthUserCreateDB(
+            username=f"cached{i}{unique_id}",
+            email=f"cached_{i}_{unique_id}@example.com",
+            password="password123",
+            user_id=uuid.uuid4()
+        )))
+    await db_session.commit()
+
+    for user in users:
+        assert (await auth_user_crud.get_by_id(db_session, user.id)).id == user.id
+        assert (await auth_user_crud.get_by_username(db_session, user.username)).id == user.id
+        assert (await auth_user_crud.get_by_email(db_session, user.email)).id == user.id
+        assert (await auth_user_crud.get_by_user_id(db_session, user.user_id)).id == user.id
@@ -0,0 +1,102 @@
+import pytest
+import uuid
+from contextlib import contextmanager
+from sqlalchemy import event
+
+from app.crud.auth_user import auth_user_crud
+from app.crud.exceptions import DuplicateUsernameError, UserNotFoundError
+from app.schemas.auth_user import AuthUserCreateDB, AuthUserUpdate
+
+
+@contextmanager
+def count_statements(db_engine):
+    """実行されたSQL文を記録する"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def _create_user(db_session):
+    unique_id = uuid.uuid4().hex[:8]
+    user_in = AuthUserCreateDB(
+        username=f"returning{unique_id}",
+        email=f"returning_{unique_id}@example.com",
+        password="password123",
+        user_id=uuid.uuid4()
+    )
+    db_user = await auth_user_crud.create(db_session, user_in)
+    await db_session.commit()
+    return db_user
+
+
+@pytest.mark.asyncio
+async def test_update_by_id_single_statement(db_engine, db_session):
+    """更新が1回のUPDATE ... RETURNINGで行われることをテストする"""
+    db_user = await _create_user(db_session)
+    new_username = f"renamed{uuid.uuid4().hex[:8]}"
+
+    with count_statements(db_engine) as statements:
+        updated = await auth_user_crud.update_by_id(db_session, db_user.id, AuthUserUpdate(username=new_username))
+
+    assert len(statements) == 1
+    assert statements[0].lstrip().upper().startswith("UPDATE")
+    assert updated.id == db_user.id
+    assert updated.username == new_username
+    assert (await auth_user_crud.get_by_id(db_session, db_user.id)).username == new_username
+
+
+@pytest.mark.asyncio
+async def test_delete_by_user_id_single_statement(db_engine, db_session):
+    """削除が1回のDELETE ... RETURNINGで行われ、削除したユーザーが返されることをテストする"""
+    db_user = await _create_user(db_session)
+
+    with count_statements(db_engine) as statements:
+        deleted = await auth_user_crud.delete_by_user_id(db_session, str(db_user.user_id))
+
+    assert len(statements) == 1
+    assert statements[0].lstrip().upper().startswith("DELETE")
+    assert deleted.username == db_user.username
+    with pytest.raises(UserNotFoundError):
+        await auth_user_crud.get_by_user_id(db_session, db_user.user_id)
+
+
+@pytest.mark.asyncio
+async def test_activate_user_persists_is_active(db_session):
+    """有効化がデータベースに反映されることをテストする"""
+    db_user = await _create_user(db_session)
+    assert db_user.is_active is False
+
+    activated = await auth_user_crud.activate_user(db_session, str(db_user.user_id))
+    await db_session.commit()
+
+    assert activated.is_active is True
+    users, _, _ = await auth_user_crud.get_page(db_session, limit=10, is_active=True)
+    assert [u.id for u in users] == [db_user.id]
+
+
+@pytest.mark.asyncio
+async def test_mutations_on_missing_user_raise_not_found(db_session):
+    """存在しないユーザーへの更新・削除・有効化はUserNotFoundErrorになることをテストする"""
+    with pytest.raises(UserNotFoundError):
+        await auth_user_crud.update_by_username(db_session, "missinguser", AuthUserUpdate(email="missing@example.com"))
+    with pytest.raises(UserNotFoundError):
+        await auth_user_crud.delete_by_id(db_session, uuid.uuid4())
+    with pytest.raises(UserNotFoundError):
+        await auth_user_crud.activate_user(db_session, uuid.uuid4())
+
+
+@pytest.mark.asyncio
+async def test_update_to_existing_username_raises_duplicate(db_session):
+    """UPDATE時の一意制約違反がDuplicateUsernameErrorに変換されることをテストする"""
+    first = await _create_user(db_session)
+    second = await _create_user(db_session)
+
+    with pytest.raises(DuplicateUsernameError):
+        await auth_user_crud.update_by_id(db_session, second.id, AuthUserUpdate(username=first.username))
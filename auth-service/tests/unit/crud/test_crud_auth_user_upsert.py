@@ -0,0 +1,83 @@
+import pytest
+import uuid
+
+from app.crud.auth_user import auth_user_crud
+from app.schemas.auth_user import AuthUserUpsert, AuthUserUpsertStatus
+
+
+def _make_upsert(user_id: uuid.UUID, version: int, **overrides) -> AuthUserUpsert:
+    suffix = user_id.hex[:8]
+    data = {
+        "user_id": user_id,
+        "username": f"upsert{suffix}",
+        "email": f"upsert_{suffix}@example.com",
+        "hashed_password": "hashed",
+        "is_active": True,
+        "version": version,
+    }
+    data.update(overrides)
+    return AuthUserUpsert(**data)
+
+
+@pytest.mark.asyncio
+async def test_upsert_many_inserts_and_applies_newer_versions(db_session):
+    """新規作成と、より新しいバージョンによる更新が適用されることをテストする"""
+    user_id = uuid.uuid4()
+
+    results = await auth_user_crud.upsert_many(db_session, [_make_upsert(user_id, 1)])
+    assert results[0].status == AuthUserUpsertStatus.APPLIED
+
+    results = await auth_user_crud.upsert_many(
+        db_session, [_make_upsert(user_id, 2, username=f"renamed{user_id.hex[:8]}")]
+    )
+    await db_session.commit()
+    assert results[0].status == AuthUserUpsertStatus.APPLIED
+
+    db_session.expire_all()
+    db_user = await auth_user_crud.get_by_user_id(db_session, user_id)
+    assert db_user.username == f"renamed{user_id.hex[:8]}"
+    assert db_user.version == 2
+
+
+@pytest.mark.asyncio
+async def test_upsert_many_is_idempotent_for_replays(db_session):
+    """同じまたは古いバージョンの再送では更新されないことをテストする"""
+    user_id = uuid.uuid4()
+    await auth_user_crud.upsert_many(db_session, [_make_upsert(user_id, 5)])
+
+    results = await auth_user_crud.upsert_many(db_session, [
+        _make_upsert(user_id, 5, email=f"replay_{user_id.hex[:8]}@example.com"),
+    ])
+    assert results[0].status == AuthUserUpsertStatus.STALE
+    results = await auth_user_crud.upsert_many(db_session, [
+        _make_upsert(user_id, 3, email=f"older_{user_id.hex[:8]}@example.com"),
+    ])
+    assert results[0].status == AuthUserUpsertStatus.STALE
+    await db_session.commit()
+
+    db_session.expire_all()
+    db_user = await auth_user_crud.get_by_user_id(db_session, user_id)
+    assert db_user.email == f"upsert_{user_id.hex[:8]}@example.com"
+    assert db_user.version == 5
+
+
+@pytest.mark.asyncio
+async def test_upsert_many_per_row_outcomes(db_session, test_user):
+    """入力内の古い行と他のユーザーとの重複が行ごとの結果として返されることをテストする"""
+    user_id = uuid.uuid4()
+    other_id = uuid.uuid4()
+    rows = [
+        _make_upsert(user_id, 1),
+        _make_upsert(user_id, 2),
+        _make_upsert(other_id, 1, username=test_user.username),
+    ]
+
+    results = await auth_user_crud.upsert_many(db_session, rows, chunk_size=1)
+
+    assert [r.status for r in results] == [
+        AuthUserUpsertStatus.SUPERSEDED_IN_INPUT,
+        AuthUserUpsertStatus.APPLIED,
+        AuthUserUpsertStatus.CONFLICT,
+    ]
+    db_user = await auth_user_crud.get_by_user_id(db_session, user_id)
+    assert db_user.version == 2
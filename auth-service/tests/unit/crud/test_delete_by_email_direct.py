@@ -76,22 +76,12 @@ async def test_delete_by_email_all_branches(db_session, monkeypatch):
     mock_user.id = uuid.uuid4()
     mock_user.email = email
     
-    # get_by_emailをモック化して常に特定のユーザーを返すようにする
-    async def mock_get_by_email(*args, **kwargs):
+    # DELETE ... RETURNINGをモック化して常に特定のユーザーを返すようにする
+    async def mock_delete_returning(*args, **kwargs):
         return mock_user
     
-    # セッションのdeleteをモック化
-    async def mock_delete(*args, **kwargs):
-        return None
-    
-    # セッションのflushをモック化
-    async def mock_flush(*args, **kwargs):
-        return None
-    
     # モックを適用
-    monkeypatch.setattr(auth_user_crud, "get_by_email", mock_get_by_email)
-    monkeypatch.setattr(db_session, "delete", mock_delete)
-    monkeypatch.setattr(db_session, "flush", mock_flush)
+    monkeypatch.setattr(auth_user_crud, "_delete_returning", mock_delete_returning)
     
     # 実行
     result = await auth_user_crud.delete_by_email(db_session, email)
@@ -30,16 +30,16 @@ async def test_update_by_id_with_integrity_error_username(db_session, monkeypatc
     created_user = await auth_user_crud.create(db_session, user_in)
     await db_session.commit()
     
-    # flushをモックして特定のIntegrityErrorを発生させる
-    original_flush = db_session.flush
+    # UPDATE文の実行をモックして特定のIntegrityErrorを発生させる
+    original_execute = db_session.execute
     
-    async def mock_flush(*args, **kwargs):
+    async def mock_execute(*args, **kwargs):
         error = IntegrityError(None, None, None)
         error.orig = "Duplicate username constraint violation"
         raise error
     
-    # セッションのflushをモック
-    monkeypatch.setattr(db_session, "flush", mock_flush)
+    # セッションのexecuteをモック
+    monkeypatch.setattr(db_session, "execute", mock_execute)
     
     # テスト実行と例外検証
     update_data = AuthUserUpdate(username="newusername")
@@ -50,7 +50,7 @@ async def test_update_by_id_with_integrity_error_username(db_session, monkeypatc
     assert "Username already exists" in str(exc_info.value)
     
     # モックを元に戻す
-    monkeypatch.setattr(db_session, "flush", original_flush)
+    monkeypatch.setattr(db_session, "execute", original_execute)
     
     # 後片付け：ユーザーを削除
     await db_session.delete(created_user)
@@ -78,16 +78,16 @@ async def test_update_by_id_with_integrity_error_email(db_session, monkeypatch):
     created_user = await auth_user_crud.create(db_session, user_in)
     await db_session.commit()
     
-    # flushをモックして特定のIntegrityErrorを発生させる
-    original_flush = db_session.flush
+    # UPDATE文の実行をモックして特定のIntegrityErrorを発生させる
+    original_execute = db_session.execute
     
-    async def mock_flush(*args, **kwargs):
+    async def mock_execute(*args, **kwargs):
         error = IntegrityError(None, None, None)
         error.orig = "Duplicate email constraint violation"
         raise error
     
-    # セッションのflushをモック
-    monkeypatch.setattr(db_session, "flush", mock_flush)
+    # セッションのexecuteをモック
+    monkeypatch.setattr(db_session, "execute", mock_execute)
     
     # テスト実行と例外検証
     update_data = AuthUserUpdate(email="new.email@example.com")
@@ -98,7 +98,7 @@ async def test_update_by_id_with_integrity_error_email(db_session, monkeypatch):
     assert "Email already exists" in str(exc_info.value)
     
     # モックを元に戻す
-    monkeypatch.setattr(db_session, "flush", original_flush)
+    monkeypatch.setattr(db_session, "execute", original_execute)
     
     # 後片付け：ユーザーを削除
     await db_session.delete(created_user)
@@ -126,16 +126,16 @@ async def test_update_by_id_with_general_integrity_error(db_session, monkeypatch
     created_user = await auth_user_crud.create(db_session, user_in)
     await db_session.commit()
     
-    # flushをモックして特定のIntegrityErrorを発生させる
-    original_flush = db_session.flush
+    # UPDATE文の実行をモックして特定のIntegrityErrorを発生させる
+    original_execute = db_session.execute
     
-    async def mock_flush(*args, **kwargs):
+    async def mock_execute(*args, **kwargs):
         error = IntegrityError(None, None, None)
         error.orig = "General database constraint violation"
         raise error
     
-    # セッションのflushをモック
-    monkeypatch.setattr(db_session, "flush", mock_flush)
+    # セッションのexecuteをモック
+    monkeypatch.setattr(db_session, "execute", mock_execute)
     
     # テスト実行と例外検証
     update_data = AuthUserUpdate(username="newgeneralname")
@@ -146,7 +146,7 @@ async def test_update_by_id_with_general_integrity_error(db_session, monkeypatch
     assert "Database integrity error" in str(exc_info.value)
     
     # モックを元に戻す
-    monkeypatch.setattr(db_session, "flush", original_flush)
+    monkeypatch.setattr(db_session, "execute", original_execute)
     
     # 後片付け：ユーザーを削除
     await db_session.delete(created_user)
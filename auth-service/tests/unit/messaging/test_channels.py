@@ -0,0 +1,96 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from app.messaging.channels import ChannelManager
+
+
+class FakeCallbacks(list):
+    def add(self, callback):
+        self.append(callback)
+
+
+class FakeChannel:
+    def __init__(self, number: int):
+        self.number = number
+        self.is_closed = False
+        self.close_callbacks = FakeCallbacks()
+        self.default_exchange = SimpleNamespace(name="", channel=self)
+        self.set_qos = AsyncMock()
+
+    async def get_exchange(self, name, ensure=True):
+        return SimpleNamespace(name=name, channel=self)
+
+    async def close(self):
+        self.is_closed = True
+
+
+class FakeConnection:
+    def __init__(self):
+        self.is_closed = False
+        self.channels = []
+
+    async def channel(self, publisher_confirms=True):
+        channel = FakeChannel(len(self.channels))
+        self.channels.append(channel)
+        return channel
+
+
+@pytest.mark.asyncio
+async def test_publisher_pool_round_robin_skips_closed_channels():
+    """発行用のexchangeはプールのチャネルに順番に割り当てられ、閉じたチャネルは使われない"""
+    connection = FakeConnection()
+    manager = ChannelManager(publisher_pool_size=3, health_check_interval=60)
+    manager.attach(connection)
+
+    used = [(await manager.exchange("user_events")).channel.number for _ in range(6)]
+    assert used == [0, 1, 2, 0, 1, 2]
+
+    connection.channels[1].is_closed = True
+    used = [(await manager.exchange("")).channel.number for _ in range(4)]
+    assert 1 not in used
+    assert [channel["published_total"] for channel in manager.stats()["channels"]] == [4, 2, 4]
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_health_check_replaces_closed_consumer_channel():
+    """閉じたままの受信用チャネルは置き換えられ、setupが新しいチャネルで再実行される"""
+    connection = FakeConnection()
+    manager = ChannelManager(publisher_pool_size=1, health_check_interval=60)
+    manager.attach(connection)
+    setup = AsyncMock()
+
+    channel = await manager.open_consumer_channel("queue", setup, prefetch_count=16)
+    channel.set_qos.assert_called_once_with(prefetch_count=16)
+
+    channel.is_closed = True
+    # 1回目はロバストなチャネルの自動の開き直しを待つ
+    await manager.check_health()
+    assert setup.call_count == 1
+    await manager.check_health()
+    assert setup.call_count == 2
+    assert setup.call_args[0][0] is connection.channels[-1]
+
+    stats = manager.stats()
+    assert stats["replaced_total"] == 1
+    assert stats["channels"][0]["opened_total"] == 2
+    assert stats["channels"][0]["open"] is True
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_channel_error_is_counted():
+    """チャネルレベルのエラーはチャネルごとに記録される"""
+    connection = FakeConnection()
+    manager = ChannelManager(publisher_pool_size=1, health_check_interval=60)
+    manager.attach(connection)
+    channel = await manager.open_consumer_channel("queue", AsyncMock(), prefetch_count=1)
+
+    for callback in channel.close_callbacks:
+        callback(channel, RuntimeError("PRECONDITION_FAILED"))
+
+    stats = manager.stats()["channels"][0]
+    assert stats["errors_total"] == 1
+    assert stats["last_error"] == "PRECONDITION_FAILED"
+    await manager.close()
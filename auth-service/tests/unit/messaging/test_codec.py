@@ -0,0 +1,72 @@
+import json
+import uuid
+import pytest
+from datetime import datetime
+
+from app.messaging import codec
+from app.messaging.codec import (
+    JSON_CONTENT_TYPE,
+    MSGPACK_CONTENT_TYPE,
+    MessageDecodeError,
+    decode_body,
+    decode_envelope,
+    SHARD_KEY_HEADER,
+    event_message,
+)
+from app.schemas.message import MESSAGE_SCHEMA_VERSION
+
+
+def test_event_message_json_round_trip():
+    """UUIDやdatetimeを含むデータもエンベロープとしてJSONで送受信でき、従来のキーも保たれる"""
+    user_id = uuid.uuid4()
+    message = event_message("user.created", {"user_id": user_id, "created_at": datetime(2025, 5, 6, 3, 0)})
+
+    assert message.content_type == JSON_CONTENT_TYPE
+    body = json.loads(message.body)
+    assert body["event_type"] == "user.created"
+    assert body["user_data"]["user_id"] == str(user_id)
+    assert body["schema_version"] == MESSAGE_SCHEMA_VERSION
+    # AMQPのmessage_idはエンベロープのIDと一致する
+    assert body["message_id"] == message.message_id
+
+    envelope = decode_envelope(message.body, message.content_type)
+    assert envelope.event_type == "user.created"
+    assert str(envelope.message_id) == message.message_id
+
+
+def test_event_message_msgpack_round_trip():
+    """msgpackを指定した場合はバイナリ形式で送信され、content-typeに応じて復元される"""
+    pytest.importorskip("msgpack")
+    user_data = {"user_id": str(uuid.uuid4()), "username": "testuser"}
+    message = event_message("user.created", user_data, content_type=MSGPACK_CONTENT_TYPE)
+
+    assert message.content_type == MSGPACK_CONTENT_TYPE
+    assert len(message.body) < len(event_message("user.created", user_data).body)
+    assert decode_body(message.body, message.content_type)["user_data"] == user_data
+
+
+def test_msgpack_falls_back_to_json_when_unavailable(monkeypatch):
+    """msgpackがない環境ではJSONで送信する"""
+    monkeypatch.setattr(codec, "msgpack", None)
+    message = event_message("user.created", {}, content_type=MSGPACK_CONTENT_TYPE)
+    assert message.content_type == JSON_CONTENT_TYPE
+
+
+def test_decode_body_accepts_legacy_and_rejects_newer_versions():
+    """schema_versionのない従来のメッセージは受信でき、新しいスキーマバージョンや不正な本文は例外になる"""
+    legacy = {"user_id": "1", "status": "success"}
+    assert decode_body(json.dumps(legacy).encode(), JSON_CONTENT_TYPE) == legacy
+
+    with pytest.raises(MessageDecodeError):
+        decode_body(json.dumps({"schema_version": MESSAGE_SCHEMA_VERSION + 1}).encode(), JSON_CONTENT_TYPE)
+    with pytest.raises(MessageDecodeError):
+        decode_body(b"{invalid: json", JSON_CONTENT_TYPE)
+
+
+def test_event_message_shard_key_header():
+    """x-shard-keyヘッダーにはユーザー名を設定し、ユーザー名がない場合はmessage_idを設定する"""
+    message = event_message("user.created", {"username": "testuser", "email": "user@example.com"})
+    assert message.headers[SHARD_KEY_HEADER] == "testuser"
+
+    message = event_message("user.deleted", {"user_id": "u1"})
+    assert message.headers[SHARD_KEY_HEADER] == message.message_id
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+
+from app.messaging.consumer import ConsumerRuntime, user_data_ordering_key
+
+
+def _message(username: str, seq: int):
+    return SimpleNamespace(
+        body=json.dumps({"user_data": {"username": username, "seq": seq}}).encode(),
+        content_type="application/json",
+        type="user.created",
+        routing_key="user.created",
+        redelivered=False,
+        delivery_tag=seq + 1
+    )
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded():
+    """同時に処理される件数はワーカー数を超えない"""
+    active = 0
+    max_active = 0
+
+    async def handler(message):
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    runtime = ConsumerRuntime("test", handler, concurrency=3)
+    for i in range(12):
+        await runtime.dispatch(_message(f"user{i}", i))
+    while runtime.stats()["processed_total"] < 12:
+        await asyncio.sleep(0.005)
+    await runtime.stop()
+
+    assert max_active == 3
+    assert runtime.stats()["received_total"] == 12
+    assert runtime.stats()["in_progress"] == 0
+
+
+@pytest.mark.asyncio
+async def test_ordering_key_preserves_order_per_key():
+    """順序キーが同じメッセージは受信順に処理され、キーが異なれば並行に処理される"""
+    processed = []
+
+    async def handler(message):
+        data = json.loads(message.body)["user_data"]
+        # 後に受信したメッセージほど早く終わるようにして、順序が保たれることを確認する
+        await asyncio.sleep(0.02 / (data["seq"] + 1))
+        processed.append((data["username"], data["seq"]))
+
+    runtime = ConsumerRuntime("test", handler, concurrency=4, ordering_key=user_data_ordering_key("username"))
+    for seq in range(5):
+        for username in ("alice", "bob"):
+            await runtime.dispatch(_message(username, seq))
+    while runtime.stats()["processed_total"] < 10:
+        await asyncio.sleep(0.005)
+    await runtime.stop()
+
+    for username in ("alice", "bob"):
+        assert [seq for name, seq in processed if name == username] == list(range(5))
+
+
+@pytest.mark.asyncio
+async def test_handler_error_is_counted_and_worker_continues():
+    """handlerの例外は記録され、ワーカーは次のメッセージの処理を続ける"""
+    async def handler(message):
+        if json.loads(message.body)["user_data"]["seq"] == 0:
+            raise RuntimeError("boom")
+
+    runtime = ConsumerRuntime("test", handler, concurrency=1)
+    await runtime.dispatch(_message("a", 0))
+    await runtime.dispatch(_message("a", 1))
+    while runtime.stats()["processed_total"] + runtime.stats()["failed_total"] < 2:
+        await asyncio.sleep(0.005)
+    await runtime.stop()
+
+    assert runtime.stats()["failed_total"] == 1
+    assert runtime.stats()["processed_total"] == 1
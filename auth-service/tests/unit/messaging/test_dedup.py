@@ -0,0 +1,115 @@
+import json
+import uuid
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.messaging.auth_handler import handle_user_creation_response
+from app.messaging.dedup import MessageDeduplicator, message_id_of
+from app.models.processed_message import ProcessedMessage
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    return sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@pytest.mark.asyncio
+async def test_claim_is_committed_with_transaction(session_factory):
+    """コミットされたmessage_idは処理済みとなり、ロールバックされたmessage_idは再び処理できる"""
+    deduplicator = MessageDeduplicator(session_factory=session_factory)
+
+    async with session_factory() as session:
+        assert await deduplicator.claim(session, "test", "rolled-back") is True
+        await session.rollback()
+    async with session_factory() as session:
+        assert await deduplicator.claim(session, "test", "rolled-back") is True
+        assert await deduplicator.claim(session, "test", "committed") is True
+        await session.commit()
+    async with session_factory() as session:
+        assert await deduplicator.claim(session, "test", "committed") is False
+        # コンシューマーが異なれば別のメッセージとして扱う
+        assert await deduplicator.claim(session, "other", "committed") is True
+
+    assert deduplicator.stats()["duplicates_total"] == 1
+
+
+@pytest.mark.asyncio
+async def test_claim_many_skips_processed_and_repeated_ids(session_factory):
+    """処理済みのmessage_idと同じバッチ内で重複したmessage_idはスキップされる（message_idがなければ処理する）"""
+    deduplicator = MessageDeduplicator(session_factory=session_factory)
+    async with session_factory() as session:
+        await deduplicator.claim(session, "test", "a")
+        await session.commit()
+
+    async with session_factory() as session:
+        claims = await deduplicator.claim_many(session, "test", ["a", "b", "b", None, None])
+        await session.commit()
+
+    assert claims == [False, True, False, True, True]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_claims_conflict_on_commit(session_factory):
+    """同じメッセージを並行して処理した場合は一意制約によって後のコミットが失敗する"""
+    deduplicator = MessageDeduplicator(session_factory=session_factory)
+    async with session_factory() as first, session_factory() as second:
+        assert await deduplicator.claim(first, "test", "same") is True
+        assert await deduplicator.claim(second, "test", "same") is True
+        await first.commit()
+        with pytest.raises(IntegrityError):
+            await second.commit()
+
+
+@pytest.mark.asyncio
+async def test_purge_removes_expired_records(session_factory):
+    """保持期間を過ぎた記録のみが削除される"""
+    deduplicator = MessageDeduplicator(session_factory=session_factory, retention_hours=1)
+    async with session_factory() as session:
+        session.add(ProcessedMessage(
+            consumer="test", message_id="old", created_at=datetime.now() - timedelta(hours=2)
+        ))
+        session.add(ProcessedMessage(consumer="test", message_id="new"))
+        await session.commit()
+
+    assert await deduplicator.purge_once() == 1
+    async with session_factory() as session:
+        remaining = (await session.execute(select(ProcessedMessage.message_id))).scalars().all()
+    assert remaining == ["new"]
+
+
+@pytest.mark.asyncio
+async def test_redelivered_response_activates_once(session_factory):
+    """再配信されたユーザー作成レスポンスはユーザーを再び有効化せずにackされる"""
+    async def get_session():
+        async with session_factory() as session:
+            yield session
+
+    body = json.dumps({"user_id": str(uuid.uuid4()), "status": "success"}).encode()
+    messages = []
+    for _ in range(2):
+        message = AsyncMock()
+        message.body = body
+        message.message_id = "response-1"
+        messages.append(message)
+
+    with patch("app.messaging.auth_handler.get_async_session", get_session), \
+         patch("app.crud.auth_user.auth_user_crud.activate_user", new_callable=AsyncMock) as mock_activate_user:
+        for message in messages:
+            await handle_user_creation_response(message)
+
+    mock_activate_user.assert_called_once()
+    for message in messages:
+        message.ack.assert_called_once()
+
+
+def test_message_id_falls_back_to_body():
+    """message_idプロパティがない場合は本文のmessage_idを使う"""
+    message = AsyncMock()
+    message.message_id = None
+    message.body = json.dumps({"message_id": "from-body"}).encode()
+    assert message_id_of(message) == "from-body"
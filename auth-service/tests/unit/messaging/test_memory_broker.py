@@ -0,0 +1,210 @@
+import asyncio
+import pytest
+
+from aio_pika import ExchangeType, Message
+
+from app.messaging.memory_broker import (
+    DIRECT_REPLY_TO,
+    MemoryBroker,
+    connect,
+    jump_consistent_hash,
+    topic_matches,
+)
+
+
+async def _wait_for(condition, timeout: float = 1.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condition not met"
+        await asyncio.sleep(0.005)
+
+
+def test_topic_matches():
+    """*は1語、#は0語以上に一致する"""
+    assert topic_matches("user.*", "user.created")
+    assert not topic_matches("user.*", "user.created.v2")
+    assert topic_matches("user.#", "user.created.v2")
+    assert topic_matches("user.#", "user")
+    assert topic_matches("#", "anything.at.all")
+    assert not topic_matches("user.created", "user.deleted")
+
+
+@pytest.mark.asyncio
+async def test_topic_routing_to_bound_queues():
+    """バインディングキーに一致するキューにだけ配送し、一致しないメッセージは破棄する"""
+    broker = MemoryBroker()
+    channel = await (await connect(broker)).channel()
+    exchange = await channel.declare_exchange("events", ExchangeType.TOPIC, durable=True)
+    created = await channel.declare_queue("created", durable=True)
+    everything = await channel.declare_queue("everything", durable=True)
+    await created.bind(exchange, routing_key="user.created")
+    await everything.bind(exchange, routing_key="user.#")
+
+    await exchange.publish(Message(b"1"), routing_key="user.created")
+    await exchange.publish(Message(b"2"), routing_key="user.deleted")
+    await exchange.publish(Message(b"3"), routing_key="order.created")
+
+    assert (await created.get(no_ack=True)).body == b"1"
+    assert await created.get(no_ack=True, fail=False) is None
+    assert [(await everything.get(no_ack=True)).body for _ in range(2)] == [b"1", b"2"]
+    assert broker.stats()["unroutable_total"] == 1
+
+
+@pytest.mark.asyncio
+async def test_prefetch_limits_unacked_deliveries_and_nack_requeues():
+    """未ackの件数はprefetchまでに制限され、nack（requeue）したメッセージは再配信される"""
+    broker = MemoryBroker()
+    channel = await (await connect(broker)).channel()
+    await channel.set_qos(prefetch_count=2)
+    queue = await channel.declare_queue("work", durable=True)
+    received = []
+
+    async def callback(message):
+        received.append(message)
+
+    await queue.consume(callback)
+    for i in range(5):
+        await channel.default_exchange.publish(Message(str(i).encode()), routing_key="work")
+    await _wait_for(lambda: len(received) == 2)
+    await asyncio.sleep(0.01)
+    assert len(received) == 2
+
+    await received[0].nack(requeue=True)
+    await received[1].ack()
+    await _wait_for(lambda: len(received) == 4)
+    # 戻したメッセージは先頭から再配信される
+    assert received[2].body == b"0" and received[2].redelivered is True
+    assert received[3].body == b"2"
+
+    # まとめてack（multiple=True）すると次のメッセージが配信される
+    await received[3].ack(multiple=True)
+    await _wait_for(lambda: len(received) == 6)
+    assert [message.body for message in received[4:]] == [b"3", b"4"]
+
+
+@pytest.mark.asyncio
+async def test_expired_message_is_dead_lettered():
+    """expirationが切れたメッセージはキューのx-dead-letter-exchangeに送られる（遅延再試行）"""
+    broker = MemoryBroker()
+    channel = await (await connect(broker)).channel()
+    target = await channel.declare_queue("target", durable=True)
+    await channel.declare_queue("target.retry.1", durable=True, arguments={
+        "x-dead-letter-exchange": "",
+        "x-dead-letter-routing-key": "target",
+    })
+
+    await channel.default_exchange.publish(Message(b"retry", expiration=0.02), routing_key="target.retry.1")
+    assert await target.get(no_ack=True, fail=False) is None
+    await asyncio.sleep(0.05)
+
+    message = await target.get(no_ack=True)
+    assert message.body == b"retry"
+    assert message.headers["x-death"][0]["reason"] == "expired"
+
+
+@pytest.mark.asyncio
+async def test_direct_reply_to():
+    """direct reply-toで発行したリクエストへの返信は、発行したチャネルのコンシューマーに届く"""
+    broker = MemoryBroker()
+    connection = await connect(broker)
+    client_channel = await connection.channel()
+    server_channel = await connection.channel()
+    requests = await server_channel.declare_queue("rpc", durable=True)
+    replies = []
+
+    async def serve(message):
+        await server_channel.default_exchange.publish(
+            Message(message.body.upper(), correlation_id=message.correlation_id),
+            routing_key=message.reply_to
+        )
+        await message.ack()
+
+    async def on_reply(message):
+        replies.append(message)
+
+    await requests.consume(serve)
+    await (await client_channel.get_queue(DIRECT_REPLY_TO, ensure=False)).consume(on_reply, no_ack=True)
+    await client_channel.default_exchange.publish(
+        Message(b"ping", correlation_id="c1", reply_to=DIRECT_REPLY_TO), routing_key="rpc"
+    )
+
+    await _wait_for(lambda: replies)
+    assert replies[0].body == b"PING"
+    assert replies[0].correlation_id == "c1"
+
+
+def test_jump_consistent_hash_moves_few_keys():
+    """バケットを1つ増やしても、移動するキーは増えたバケットに割り当てられるものだけ"""
+    before = [jump_consistent_hash(key, 4) for key in range(1000)]
+    after = [jump_consistent_hash(key, 5) for key in range(1000)]
+    moved = [(old, new) for old, new in zip(before, after) if old != new]
+    assert all(new == 4 for _, new in moved)
+    assert 100 < len(moved) < 300
+    assert set(before) == {0, 1, 2, 3}
+
+
+@pytest.mark.asyncio
+async def test_consistent_hash_exchange_bound_to_topic_exchange():
+    """topic exchangeからバインドしたconsistent-hash exchangeは、同じヘッダーの値のメッセージを同じキューに送る"""
+    broker = MemoryBroker()
+    channel = await (await connect(broker)).channel()
+    events = await channel.declare_exchange("events", ExchangeType.TOPIC, durable=True)
+    shards = await channel.declare_exchange(
+        "shards", ExchangeType.X_CONSISTENT_HASH, durable=True, arguments={"hash-header": "x-shard-key"}
+    )
+    await shards.bind(events, "user.sync")
+    queues = []
+    for i in range(4):
+        queue = await channel.declare_queue(f"shard.{i}", durable=True)
+        await queue.bind(shards, routing_key="1")
+        queues.append(queue)
+
+    for n in range(3):
+        for user in range(20):
+            await events.publish(Message(f"{user}:{n}".encode(), headers={"x-shard-key": f"user{user}"}), routing_key="user.sync")
+    await events.publish(Message(b"other"), routing_key="user.deleted")
+
+    received = {}
+    for queue in queues:
+        while (message := await queue.get(no_ack=True, fail=False)) is not None:
+            user, n = message.body.decode().split(":")
+            received.setdefault(queue.name, []).append((user, int(n)))
+    # すべてのシャードに振り分けられ、ユーザーごとのメッセージは1つのキューに発行順に届く
+    assert len(received) == 4
+    owners = {}
+    for name, messages in received.items():
+        for user, _ in messages:
+            assert owners.setdefault(user, name) == name
+        for user in {user for user, _ in messages}:
+            assert [n for u, n in messages if u == user] == [0, 1, 2]
+    assert len(owners) == 20
+    assert broker.stats()["unroutable_total"] == 1
+
+
+@pytest.mark.asyncio
+async def test_single_active_consumer():
+    """x-single-active-consumerのキューは最初のコンシューマーだけに配信し、キャンセルされると次が引き継ぐ"""
+    broker = MemoryBroker()
+    channel = await (await connect(broker)).channel()
+    queue = await channel.declare_queue("sac", durable=True, arguments={"x-single-active-consumer": True})
+    first, second = [], []
+
+    async def on_first(message):
+        first.append(message)
+        await message.ack()
+
+    async def on_second(message):
+        second.append(message)
+        await message.ack()
+
+    first_tag = await queue.consume(on_first)
+    await queue.consume(on_second)
+    for i in range(3):
+        await channel.default_exchange.publish(Message(str(i).encode()), routing_key="sac")
+    await _wait_for(lambda: len(first) == 3)
+
+    await queue.cancel(first_tag)
+    await channel.default_exchange.publish(Message(b"3"), routing_key="sac")
+    await _wait_for(lambda: len(second) == 1)
+    assert len(first) == 3
@@ -1,10 +1,22 @@
+import asyncio
 import pytest
+import pytest_asyncio
 from unittest.mock import patch, AsyncMock, MagicMock, call
 import json
 import uuid
 
-from app.messaging.rabbitmq import rabbitmq_client
+from aio_pika import Message
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.messaging.codec import event_message
+from app.models.auth_user import AuthUser
+from app.messaging.memory_broker import MemoryBroker
+from app.messaging.rabbitmq import RabbitMQClient, rabbitmq_client
 from app.messaging.auth_handler import handle_user_creation_response
+from app.messaging.retry import PoisonMessageError
 from app.core.logging import app_logger
 
 
@@ -74,87 +86,135 @@ async def test_rabbitmq_client_close_no_connection():
         await rabbitmq_client.close()
 
 
+# インメモリのブローカーに接続したRabbitMQクライアント
+@pytest_asyncio.fixture
+async def memory_client():
+    broker = MemoryBroker()
+    client = RabbitMQClient()
+    with patch.object(settings, "RABBITMQ_BROKER", "memory"), \
+         patch("app.messaging.memory_broker.default_broker", broker):
+        await client.initialize()
+        yield client, broker
+        await client.close()
+
+
 # ユーザー作成メッセージの公開のテスト
 @pytest.mark.asyncio
-async def test_publish_user_creation():
+async def test_publish_user_creation(memory_client):
     """
     ユーザー作成メッセージの公開をテスト
     """
-    # 必要なモックを設定
-    mock_channel = AsyncMock()
-    mock_exchange = AsyncMock()
-    mock_channel.default_exchange = mock_exchange
+    client, broker = memory_client
+    queue = await client._channel.declare_queue("user_creation", durable=True)
     
-    with patch.object(rabbitmq_client, "_channel", mock_channel), \
-         patch("aio_pika.Message") as mock_message_class:
-        
-        # テスト用のデータ
-        user_data = {
-            "user_id": str(uuid.uuid4()),
-            "username": "testuser",
-            "email": "test@example.com"
-        }
-        
-        # モックの設定
-        mock_message = MagicMock()
-        mock_message_class.return_value = mock_message
-        
-        # publish メソッドの設定
-        mock_exchange.publish.return_value = None
-        
-        # メッセージ公開を実行
-        result = await rabbitmq_client.publish_user_creation(user_data)
-        
-        # 公開が成功したことを確認
-        assert result is True
-        
-        # メッセージが正しく作成されたことを確認
-        mock_message_class.assert_called_once()
-        args, kwargs = mock_message_class.call_args
-        body = kwargs.get("body", args[0] if args else None)
-        assert body is not None
-        
-        # メッセージがJSONとしてエンコードされていることを確認
-        try:
-            decoded_body = json.loads(body)
-            assert decoded_body == user_data
-        except json.JSONDecodeError:
-            pytest.fail("Message body is not valid JSON")
-        
-        # publish が呼び出されたことを確認
-        # ここではモックの構造を調整（exchange.publishが直接呼び出される）
-        mock_exchange.publish.assert_called_once()
+    # テスト用のデータ
+    user_data = {
+        "user_id": str(uuid.uuid4()),
+        "username": "testuser",
+        "email": "test@example.com"
+    }
+    
+    # メッセージ公開を実行
+    result = await client.publish_user_creation(user_data)
+    
+    # 公開が成功したことを確認
+    assert result is True
+    
+    # デフォルトexchange経由でキューに届き、JSONとしてエンコードされていることを確認
+    message = await queue.get(no_ack=True)
+    assert json.loads(message.body) == user_data
+    assert message.routing_key == "user_creation"
 
 
 # ユーザー作成レスポンスのコンシューマーセットアップのテスト
 @pytest.mark.asyncio
-async def test_setup_user_creation_response_consumer():
+async def test_setup_user_creation_response_consumer(memory_client):
     """
     ユーザー作成レスポンスのコンシューマーセットアップをテスト
     """
-    # 必要なモックを設定
-    mock_channel = AsyncMock()
-    mock_queue = AsyncMock()
-    mock_callback = AsyncMock()
+    client, broker = memory_client
+    received = []
     
-    with patch.object(rabbitmq_client, "_channel", mock_channel):
-        # キューの宣言をモック
-        mock_channel.declare_queue.return_value = mock_queue
-        
-        # コンシューマーセットアップを実行
-        await rabbitmq_client.setup_user_creation_response_consumer(mock_callback)
-        
-        # キューが宣言されたことを確認
-        mock_channel.declare_queue.assert_called_once_with(
-            "user_creation_response",
-            durable=True
-        )
-        
-        # コンシューマーが設定されたことを確認
-        mock_queue.consume.assert_called_once()
-        # consume関数に渡されたコールバックを取得
-        callback_wrapper = mock_queue.consume.call_args[0][0]
-        assert callable(callback_wrapper)
+    async def callback(message):
+        received.append(message)
+        await message.ack()
+    
+    # コンシューマーセットアップを実行
+    await client.setup_user_creation_response_consumer(callback)
+    
+    # キューが宣言され、コンシューマーが設定されたことを確認
+    queue = broker.queues["user_creation_response"]
+    assert queue.durable is True
+    assert len(queue.consumers) == 1
+    
+    # auth_events（user.created）に発行したメッセージがコールバックに渡されることを確認
+    await client.auth_events_exchange.publish(Message(b'{"user_id": "u1"}'), routing_key="user.created")
+    for _ in range(100):
+        if received:
+            break
+        await asyncio.sleep(0.01)
+    assert len(received) == 1
+    assert json.loads(received[0].body) == {"user_id": "u1"}
+    assert broker.stats()["acked_total"] == 1
+
+
+def _response_message(username: str) -> Message:
+    return Message(json.dumps({"user_data": {"username": username}}).encode(), content_type="application/json")
+
+
+# シャットダウン時のコンシューマーの停止のテスト
+@pytest.mark.asyncio
+async def test_drain_finishes_in_flight_and_returns_queued(memory_client):
+    """
+    受信を止め、処理中のメッセージは完了を待ち、未着手のメッセージはキューに戻す
+    """
+    client, broker = memory_client
+    started = asyncio.Event()
+    release = asyncio.Event()
+    
+    async def callback(message):
+        started.set()
+        await release.wait()
+        await message.ack()
+    
+    with patch.object(settings, "CONSUMER_CONCURRENCY", 1):
+        await client.setup_user_creation_response_consumer(callback)
+    for username in ("alice", "bob"):
+        await client.auth_events_exchange.publish(_response_message(username), routing_key="user.created")
+    await asyncio.wait_for(started.wait(), timeout=1)
+    await asyncio.sleep(0.01)
+    
+    drain = asyncio.create_task(client.drain(timeout=1.0))
+    await asyncio.sleep(0.01)
+    assert not drain.done()
+    release.set()
+    report = await drain
+    
+    assert report["consumers"]["user_creation_response"] == {"drained": 1, "returned": 1, "aborted": 0}
+    assert report["publisher_flushed"] is True
+    queue = broker.queues["user_creation_response"]
+    assert len(queue.consumers) == 0
+    assert [json.loads(delivery.message.body)["user_data"]["username"] for delivery in queue.messages] == ["bob"]
+
+
+@pytest.mark.asyncio
+async def test_drain_aborts_handlers_after_timeout(memory_client):
+    """
+    期限までに終わらない処理は中断し、中断した件数を報告する
+    """
+    client, broker = memory_client
+    
+    async def callback(message):
+        await asyncio.sleep(10)
+    
+    await client.setup_user_creation_response_consumer(callback)
+    await client.auth_events_exchange.publish(_response_message("alice"), routing_key="user.created")
+    await asyncio.sleep(0.02)
+    
+    report = await client.drain(timeout=0.05)
+    
+    assert report["consumers"]["user_creation_response"] == {"drained": 0, "returned": 0, "aborted": 1}
+    assert client.consumers["user_creation_response"].stats()["aborted_total"] == 1
 
 
 # ユーザー作成レスポンスハンドラーのテスト
@@ -174,6 +234,7 @@ async def test_handle_user_creation_response():
     # aio_pikaのメッセージオブジェクトをモック
     mock_message = AsyncMock()
     mock_message.body = json.dumps(message_data).encode()
+    mock_message.message_id = None
     mock_message.ack = AsyncMock()
     
     # CRUDオペレーションをモック
@@ -200,6 +261,81 @@ async def test_handle_user_creation_response():
         mock_logger_info.assert_called()
 
 
+def _user_service_reply(status: str, **fields):
+    """user-serviceのuser_handlerがアウトボックス経由で送る返信と同じ形式のメッセージ"""
+    original_request = {
+        "username": "newuser",
+        "email": "newuser@example.com",
+        "password_key": "temp_password:newuser:1",
+        "registration_ticket": "ticket-1"
+    }
+    user_data = {"status": status, "original_request": original_request, "processing_time_ms": 1.0, **fields}
+    return event_message("user.created", user_data)
+
+
+@pytest.fixture
+def handler_session(db_engine):
+    session_factory = sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def get_session():
+        async with session_factory() as session:
+            yield session
+
+    with patch("app.messaging.auth_handler.get_async_session", get_session):
+        yield session_factory
+
+
+@pytest.mark.asyncio
+async def test_handle_user_service_success_reply_creates_auth_user(handler_session):
+    """
+    user-serviceの成功の返信（idとoriginal_request）で、一時保存したパスワードの認証ユーザーを有効な状態で作成する
+    """
+    user_id = str(uuid.uuid4())
+    message = AsyncMock()
+    reply = _user_service_reply("success", id=user_id, username="newuser", email="newuser@example.com")
+    message.body, message.content_type, message.message_id = reply.body, reply.content_type, reply.message_id
+    
+    with patch("app.messaging.auth_handler.get_password_from_redis", AsyncMock(return_value="secret1")), \
+         patch("app.messaging.auth_handler.delete_password_from_redis", new_callable=AsyncMock) as mock_delete, \
+         patch("app.messaging.auth_handler.complete_registration_ticket", new_callable=AsyncMock) as mock_complete, \
+         patch.object(rabbitmq_client.user_creation_response_retry, "reject", new_callable=AsyncMock) as mock_reject:
+        await handle_user_creation_response(message)
+    
+    mock_reject.assert_not_called()
+    message.ack.assert_called_once()
+    async with handler_session() as session:
+        auth_user = (await session.execute(select(AuthUser))).scalar_one()
+    assert str(auth_user.user_id) == user_id
+    assert auth_user.username == "newuser"
+    assert auth_user.is_active is True
+    mock_delete.assert_called_once_with("temp_password:newuser:1")
+    mock_complete.assert_called_once_with("ticket-1", "completed", user_id=user_id)
+
+
+@pytest.mark.asyncio
+async def test_handle_user_service_error_reply_fails_ticket(handler_session):
+    """
+    user-serviceのエラーの返信（user_idを含まない）は登録チケットを失敗にしてackする（DLQには送らない）
+    """
+    message = AsyncMock()
+    reply = _user_service_reply("error", error_type="duplicate_email", message="メールアドレスが既に使用されています")
+    message.body, message.content_type, message.message_id = reply.body, reply.content_type, reply.message_id
+    
+    with patch("app.messaging.auth_handler.delete_password_from_redis", new_callable=AsyncMock) as mock_delete, \
+         patch("app.messaging.auth_handler.complete_registration_ticket", new_callable=AsyncMock) as mock_complete, \
+         patch.object(rabbitmq_client.user_creation_response_retry, "reject", new_callable=AsyncMock) as mock_reject:
+        await handle_user_creation_response(message)
+    
+    mock_reject.assert_not_called()
+    message.ack.assert_called_once()
+    mock_delete.assert_called_once_with("temp_password:newuser:1")
+    mock_complete.assert_called_once_with(
+        "ticket-1", "failed", error_type="duplicate_email", message="メールアドレスが既に使用されています"
+    )
+    async with handler_session() as session:
+        assert (await session.execute(select(AuthUser))).first() is None
+
+
 # 失敗したユーザー作成レスポンスのテスト
 @pytest.mark.asyncio
 async def test_handle_user_creation_response_failure():
@@ -217,6 +353,7 @@ async def test_handle_user_creation_response_failure():
     # aio_pikaのメッセージオブジェクトをモック
     mock_message = AsyncMock()
     mock_message.body = json.dumps(message_data).encode()
+    mock_message.message_id = None
     mock_message.ack = AsyncMock()
     
     # CRUDオペレーションとロガーをモック
@@ -257,8 +394,9 @@ async def test_handle_user_creation_response_invalid_message():
     mock_message.body = invalid_json
     mock_message.ack = AsyncMock()
     
-    # ロガーをモック
-    with patch("app.core.logging.app_logger.error") as mock_logger_error:
+    # ロガーと再試行ポリシーをモック
+    with patch("app.core.logging.app_logger.error") as mock_logger_error, \
+         patch.object(rabbitmq_client.user_creation_response_retry, "reject", new_callable=AsyncMock) as mock_reject:
         
         # ハンドラーを実行
         await handle_user_creation_response(mock_message)
@@ -266,8 +404,10 @@ async def test_handle_user_creation_response_invalid_message():
         # エラーがログに記録されたことを確認
         mock_logger_error.assert_called()
         
-        # メッセージが確認されたことを確認
-        mock_message.ack.assert_called_once()
+        # 再試行せずにデッドレターに送られたことを確認
+        mock_reject.assert_called_once()
+        assert isinstance(mock_reject.call_args[0][1], PoisonMessageError)
+        mock_message.ack.assert_not_called()
 
 
 # 必要なフィールドがないメッセージのテスト
@@ -285,10 +425,12 @@ async def test_handle_user_creation_response_missing_fields():
     # aio_pikaのメッセージオブジェクトをモック
     mock_message = AsyncMock()
     mock_message.body = json.dumps(message_data).encode()
+    mock_message.message_id = None
     mock_message.ack = AsyncMock()
     
-    # ロガーをモック
-    with patch("app.core.logging.app_logger.error") as mock_logger_error:
+    # ロガーと再試行ポリシーをモック
+    with patch("app.core.logging.app_logger.error") as mock_logger_error, \
+         patch.object(rabbitmq_client.user_creation_response_retry, "reject", new_callable=AsyncMock) as mock_reject:
         
         # ハンドラーを実行
         await handle_user_creation_response(mock_message)
@@ -296,8 +438,10 @@ async def test_handle_user_creation_response_missing_fields():
         # エラーがログに記録されたことを確認
         mock_logger_error.assert_called()
         
-        # メッセージが確認されたことを確認
-        mock_message.ack.assert_called_once()
+        # 再試行せずにデッドレターに送られたことを確認
+        mock_reject.assert_called_once()
+        assert isinstance(mock_reject.call_args[0][1], PoisonMessageError)
+        mock_message.ack.assert_not_called()
 
 
 # データベース操作中に例外が発生した場合のテスト
@@ -317,12 +461,14 @@ async def test_handle_user_creation_response_db_exception():
     # aio_pikaのメッセージオブジェクトをモック
     mock_message = AsyncMock()
     mock_message.body = json.dumps(message_data).encode()
+    mock_message.message_id = None
     mock_message.ack = AsyncMock()
     
     # CRUDオペレーションをモックし、例外を発生させる
     with patch("app.crud.auth_user.auth_user_crud.activate_user", 
                side_effect=Exception("Database error")), \
-         patch("app.core.logging.app_logger.error") as mock_logger_error:
+         patch("app.core.logging.app_logger.error") as mock_logger_error, \
+         patch.object(rabbitmq_client.user_creation_response_retry, "reject", new_callable=AsyncMock) as mock_reject:
         
         # ハンドラーを実行
         await handle_user_creation_response(mock_message)
@@ -330,5 +476,7 @@ async def test_handle_user_creation_response_db_exception():
         # エラーがログに記録されたことを確認
         mock_logger_error.assert_called()
         
-        # メッセージが確認されたことを確認
-        mock_message.ack.assert_called_once()
+        # 再試行キューに送られたことを確認
+        mock_reject.assert_called_once()
+        assert not isinstance(mock_reject.call_args[0][1], PoisonMessageError)
+        mock_message.ack.assert_not_called()
@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+
+from aio_pika import Message
+
+from app.messaging.consumer import ConsumerRuntime
+from app.messaging.memory_broker import MemoryBroker, connect
+from app.messaging.metrics import Histogram, MessagingMetrics, messaging_metrics, processing_time_ms
+from app.schemas.message import UserCreatedResponse, UserCreationStatus
+
+
+async def _wait_for(condition, timeout: float = 1.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condition not met"
+        await asyncio.sleep(0.005)
+
+
+def test_histogram_buckets_and_percentiles():
+    """バケットは上限以下の累積件数で表し、分位点は含まれるバケットの上限で近似する"""
+    histogram = Histogram(buckets=(10, 100))
+    for value in (1, 5, 50, 500):
+        histogram.observe(value)
+
+    stats = histogram.stats()
+    assert stats["count"] == 4
+    assert stats["buckets"] == {"10": 2, "100": 3, "+Inf": 4}
+    assert stats["p50_ms"] == 10
+    assert stats["p99_ms"] == 500
+    assert stats["max_ms"] == 500
+
+
+@pytest.mark.asyncio
+async def test_consumer_records_settlements_redeliveries_and_handler_time():
+    """ack・nack・再配信の件数と、イベントタイプごとのハンドラーの処理時間を記録する"""
+    channel = await (await connect(MemoryBroker())).channel()
+    await channel.set_qos(prefetch_count=10)
+    queue = await channel.declare_queue("metrics_test", durable=True)
+    seen = []
+    elapsed = []
+
+    async def handler(message):
+        elapsed.append(processing_time_ms())
+        if message.body == b"retry" and not message.redelivered:
+            await message.nack(requeue=True)
+            return
+        seen.append(message)
+        if len(seen) == 3:
+            # 3件目でまとめてackする
+            await message.ack(multiple=True)
+
+    runtime = ConsumerRuntime("metrics_test", handler, concurrency=1)
+    await queue.consume(runtime.dispatch)
+    for body in (b"a", b"retry", b"b"):
+        await channel.default_exchange.publish(Message(body, type="user.created"), routing_key="metrics_test")
+    await _wait_for(lambda: len(seen) == 3)
+    await runtime.stop()
+
+    stats = messaging_metrics.stats()
+    queue_stats = stats["queues"]["metrics_test"]
+    assert queue_stats["received_total"] == 4
+    assert queue_stats["redelivered_total"] == 1
+    assert queue_stats["nacked_total"] == 1
+    assert queue_stats["acked_total"] == 3
+    assert queue_stats["unacked"] == 0
+    assert stats["handlers"]["user.created"]["count"] >= 4
+    assert all(value is not None for value in elapsed)
+    assert processing_time_ms() is None
+
+
+@pytest.mark.asyncio
+async def test_refresh_queue_depths_uses_passive_declare():
+    """登録したキューの滞留件数とコンシューマー数をpassive宣言で取得する"""
+    metrics = MessagingMetrics()
+    channel = await (await connect(MemoryBroker())).channel()
+    await channel.declare_queue("backlog", durable=True)
+    for _ in range(3):
+        await channel.default_exchange.publish(Message(b"{}"), routing_key="backlog")
+    metrics.watch_queue("backlog")
+    metrics.watch_queue("missing")
+
+    await metrics.refresh_queue_depths(channel)
+
+    queues = metrics.stats()["queues"]
+    assert queues["backlog"]["messages"] == 3
+    assert queues["backlog"]["consumers"] == 0
+    assert queues["missing"]["messages"] is None
+    assert queues["missing"]["last_error"]
+
+
+@pytest.mark.asyncio
+async def test_user_created_response_processing_time():
+    """ハンドラー内で作成したレスポンスには処理時間が設定される"""
+    fields = dict(
+        request_id="123e4567-e89b-12d3-a456-426614174000",
+        status=UserCreationStatus.SUCCESS,
+        username="testuser",
+        email="user@example.com"
+    )
+    assert UserCreatedResponse(**fields).processing_time_ms is None
+
+    async with MessagingMetrics().processing("user.created"):
+        await asyncio.sleep(0.01)
+        response = UserCreatedResponse(**fields)
+    assert response.processing_time_ms >= 10
@@ -0,0 +1,90 @@
+import pytest
+import uuid
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.messaging.outbox import OutboxRelay, enqueue_user_event
+from app.models.outbox_event import OutboxEvent
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    return sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def _count_events(session_factory) -> int:
+    async with session_factory() as session:
+        return await session.scalar(select(func.count()).select_from(OutboxEvent))
+
+
+@pytest.mark.asyncio
+async def test_enqueue_is_part_of_transaction(session_factory):
+    """アウトボックスへの書き込みは呼び出し元のトランザクションと一緒にロールバックされる"""
+    async with session_factory() as session:
+        enqueue_user_event(session, "user.created", {"username": "rolled_back"})
+        await session.rollback()
+    assert await _count_events(session_factory) == 0
+
+    async with session_factory() as session:
+        event = enqueue_user_event(session, "user.created", {"user_id": uuid.uuid4()})
+        await session.commit()
+    assert await _count_events(session_factory) == 1
+    assert event.exchange == settings.USER_SYNC_EXCHANGE
+    assert event.routing_key == settings.USER_SYNC_ROUTING_KEY
+    # UUIDはJSONで保存できる文字列に変換される
+    assert isinstance(event.body["user_data"]["user_id"], str)
+
+
+@pytest.mark.asyncio
+async def test_relay_deletes_confirmed_events_in_order(session_factory):
+    """確認されたイベントは作成順に送信され、アウトボックスから削除される"""
+    async with session_factory() as session:
+        for i in range(5):
+            enqueue_user_event(session, "user.created", {"username": f"user{i}"})
+            await session.flush()
+        await session.commit()
+
+    published = []
+
+    async def publisher(outbox_event):
+        published.append(outbox_event.body["user_data"]["username"])
+
+    relay = OutboxRelay(session_factory=session_factory, publisher=publisher, batch_size=3)
+    assert await relay.relay_once() == 3
+    assert await relay.relay_once() == 2
+    assert await relay.relay_once() == 0
+
+    assert published == [f"user{i}" for i in range(5)]
+    assert await _count_events(session_factory) == 0
+    stats = relay.stats()
+    assert stats["published_total"] == 5
+    assert stats["failed_total"] == 0
+    assert stats["batches_total"] == 2
+    assert stats["lag_seconds"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_relay_keeps_unconfirmed_events(session_factory):
+    """確認されなかったイベントは試行回数とエラーを記録して残る"""
+    async with session_factory() as session:
+        enqueue_user_event(session, "user.created", {"username": "ok"})
+        enqueue_user_event(session, "user.created", {"username": "nacked"})
+        await session.commit()
+
+    async def publisher(outbox_event):
+        if outbox_event.body["user_data"]["username"] == "nacked":
+            raise RuntimeError("message was not confirmed")
+
+    relay = OutboxRelay(session_factory=session_factory, publisher=publisher)
+    assert await relay.relay_once() == 2
+
+    async with session_factory() as session:
+        remaining = (await session.execute(select(OutboxEvent))).scalars().all()
+    assert len(remaining) == 1
+    assert remaining[0].body["user_data"]["username"] == "nacked"
+    assert remaining[0].attempts == 1
+    assert "not confirmed" in remaining[0].last_error
+    assert relay.stats()["published_total"] == 1
+    assert relay.stats()["failed_total"] == 1
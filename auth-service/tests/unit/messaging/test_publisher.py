@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from aio_pika import Message
+from aiormq.exceptions import DeliveryError
+
+from app.messaging.publisher import BufferedPublisher
+
+
+class FakeExchange:
+    """確認までの遅延と同時に確認待ちになった件数を記録するテスト用のexchange"""
+
+    def __init__(self, delay: float = 0.01, nack_keys=()):
+        self.name = "user_events"
+        self.delay = delay
+        self.nack_keys = set(nack_keys)
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def publish(self, message, routing_key):
+        self.sent.append(routing_key)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if routing_key in self.nack_keys:
+            raise DeliveryError(None, None)
+
+
+@pytest.mark.asyncio
+async def test_flush_on_batch_size_pipelines_and_bounds_in_flight():
+    """バッチサイズに達すると送信され、確認待ちはmax_in_flightまでパイプライン化される"""
+    exchange = FakeExchange()
+    publisher = BufferedPublisher(max_in_flight=4, batch_size=10, flush_interval_ms=10000)
+
+    futures = [publisher.publish(exchange, Message(b"{}"), f"key.{i}") for i in range(10)]
+    await asyncio.gather(*futures)
+
+    assert exchange.sent == [f"key.{i}" for i in range(10)]
+    assert exchange.max_in_flight == 4
+    stats = publisher.stats()
+    assert stats["confirmed_total"] == 10
+    assert stats["in_flight"] == 0
+    assert stats["flushes_total"] == 1
+    assert stats["confirm_latency_ms_avg"] > 0
+
+
+@pytest.mark.asyncio
+async def test_flush_on_interval():
+    """バッチサイズに達しない場合は一定時間後に送信される"""
+    exchange = FakeExchange(delay=0)
+    publisher = BufferedPublisher(max_in_flight=10, batch_size=100, flush_interval_ms=20)
+
+    future = publisher.publish(exchange, Message(b"{}"), "key")
+    await asyncio.sleep(0)
+    assert exchange.sent == []
+    assert publisher.stats()["buffered"] == 1
+
+    await asyncio.wait_for(future, timeout=1)
+    assert exchange.sent == ["key"]
+
+
+@pytest.mark.asyncio
+async def test_nack_sets_exception_on_future():
+    """nackされたメッセージのFutureには例外が設定され、nack数として数えられる"""
+    exchange = FakeExchange(delay=0, nack_keys={"bad"})
+    publisher = BufferedPublisher(max_in_flight=10, batch_size=100, flush_interval_ms=10000)
+
+    good = publisher.publish(exchange, Message(b"{}"), "good")
+    bad = publisher.publish(exchange, Message(b"{}"), "bad")
+    await publisher.flush()
+
+    assert good.result() is None
+    with pytest.raises(DeliveryError):
+        bad.result()
+    stats = publisher.stats()
+    assert stats["confirmed_total"] == 1
+    assert stats["nacked_total"] == 1
@@ -0,0 +1,112 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.messaging.retry import RETRY_COUNT_HEADER, PoisonMessageError, RetryPolicy
+
+
+def _message(body: dict, headers=None, content_type="application/json"):
+    message = MagicMock()
+    if content_type == "application/msgpack":
+        message.body = pytest.importorskip("msgpack").packb(body)
+    else:
+        message.body = json.dumps(body).encode()
+    message.headers = headers or {}
+    message.content_type = content_type
+    message.message_id = "msg-1"
+    message.correlation_id = None
+    message.reply_to = None
+    message.ack = AsyncMock()
+    message.nack = AsyncMock()
+    return message
+
+
+def _policy(publish=None):
+    publisher = MagicMock()
+    publisher.publish = publish or AsyncMock()
+    policy = RetryPolicy("test_queue", publisher, max_retries=3, base_delay_ms=100)
+    policy._channel = MagicMock()
+    policy._dead_letter_exchange = MagicMock()
+    return policy, publisher
+
+
+@pytest.mark.asyncio
+async def test_retry_goes_to_tier_queue_with_backoff():
+    """失敗したメッセージは回数ごとの再試行キューに、倍々の待機時間で送られてからackされる"""
+    policy, publisher = _policy()
+    message = _message({"user_data": {"user_id": "1"}}, {RETRY_COUNT_HEADER: 1})
+
+    await policy.reject(message, RuntimeError("db down"))
+
+    exchange, sent, routing_key = publisher.publish.call_args[0]
+    assert exchange is policy._channel.default_exchange
+    assert routing_key == "test_queue.retry.2"
+    assert sent.headers[RETRY_COUNT_HEADER] == 2
+    assert sent.expiration == 0.2
+    assert json.loads(sent.body)["user_data"]["retry_count"] == 2
+    message.ack.assert_called_once()
+    assert policy.stats()["retried_total"] == 1
+
+
+@pytest.mark.asyncio
+async def test_max_retries_and_poison_go_to_dead_letter():
+    """再試行の上限に達したメッセージと処理できないメッセージはDLXに送られる"""
+    policy, publisher = _policy()
+
+    await policy.reject(_message({}, {RETRY_COUNT_HEADER: 3}), RuntimeError("still down"))
+    exchange, sent, _ = publisher.publish.call_args[0]
+    assert exchange is policy._dead_letter_exchange
+    assert sent.headers["x-death-reason"] == "max_retries"
+
+    await policy.reject(_message({}), PoisonMessageError("bad json"))
+    exchange, sent, _ = publisher.publish.call_args[0]
+    assert exchange is policy._dead_letter_exchange
+    assert sent.headers["x-death-reason"] == "poison"
+    assert policy.stats()["dead_lettered_total"] == 2
+
+
+@pytest.mark.asyncio
+async def test_publish_failure_requeues_original():
+    """再試行メッセージの送信に失敗した場合は元のメッセージをrequeueする"""
+    policy, _ = _policy(publish=AsyncMock(side_effect=RuntimeError("nack")))
+    message = _message({})
+
+    await policy.reject(message, RuntimeError("db down"))
+
+    message.nack.assert_called_once_with(requeue=True)
+    message.ack.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_retry_keeps_msgpack_body():
+    """msgpackのメッセージは本文の再試行回数をmsgpackのまま更新し、ヘッダーがなくても本文から回数を読む"""
+    msgpack = pytest.importorskip("msgpack")
+    policy, publisher = _policy()
+    message = _message({"user_data": {"user_id": "1", "retry_count": 1}}, content_type="application/msgpack")
+
+    await policy.reject(message, RuntimeError("db down"))
+
+    _, sent, routing_key = publisher.publish.call_args[0]
+    assert routing_key == "test_queue.retry.2"
+    assert sent.content_type == "application/msgpack"
+    assert msgpack.unpackb(sent.body)["user_data"]["retry_count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_inspect_decodes_body_by_content_type():
+    """DLQの確認ではcontent-typeに応じて本文を復元し、復元できない本文は文字列で返す"""
+    policy, _ = _policy()
+    messages = [
+        _message({"event_type": "user.created"}, {"x-death-reason": "max_retries"}, content_type="application/msgpack"),
+        _message({}, {"x-death-reason": "poison"}),
+    ]
+    messages[1].body = b"not json"
+    queue = MagicMock()
+    queue.get = AsyncMock(side_effect=[*messages, None])
+    policy._channel.declare_queue = AsyncMock(return_value=queue)
+
+    entries = await policy.inspect(limit=10)
+
+    assert [entry["body"] for entry in entries] == [{"event_type": "user.created"}, "not json"]
+    for message in messages:
+        message.nack.assert_called_once_with(requeue=True)
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+
+from aio_pika import Message
+
+from app.messaging.rpc import DIRECT_REPLY_TO, RpcClient, RpcPublishError, RpcTimeoutError
+
+
+class FakeQueue:
+    def __init__(self):
+        self.callback = None
+        self.no_ack = None
+
+    async def consume(self, callback, no_ack=False):
+        self.callback = callback
+        self.no_ack = no_ack
+
+
+class FakeExchange:
+    def __init__(self, channel):
+        self.channel = channel
+        self.published = []
+
+    async def publish(self, message, routing_key):
+        self.published.append((message, routing_key))
+        if self.channel.responder is not None:
+            body = self.channel.responder(message)
+            reply = SimpleNamespace(
+                body=json.dumps(body).encode(),
+                content_type="application/json",
+                correlation_id=message.correlation_id
+            )
+            asyncio.get_running_loop().call_soon(
+                lambda: asyncio.ensure_future(self.channel.reply_queue.callback(reply))
+            )
+
+
+class FakeChannel:
+    def __init__(self, responder=None):
+        self.responder = responder
+        self.reply_queue = FakeQueue()
+        self.exchange = FakeExchange(self)
+        self.is_closed = False
+
+    async def get_queue(self, name, ensure=True):
+        assert name == DIRECT_REPLY_TO
+        return self.reply_queue
+
+    async def get_exchange(self, name, ensure=True):
+        return self.exchange
+
+
+class FakeChannels:
+    """ChannelManagerの代わりに、与えられたチャネルで順番にsetupを実行する"""
+
+    def __init__(self, *channels):
+        self.channels = list(channels)
+        self.opened = 0
+
+    async def open_consumer_channel(self, name, setup, prefetch_count):
+        channel = self.channels[self.opened]
+        self.opened += 1
+        await asyncio.sleep(0)
+        await setup(channel)
+        return channel
+
+
+@pytest.mark.asyncio
+async def test_call_returns_reply_matched_by_correlation_id():
+    """返信はcorrelation_idで呼び出し元に振り分けられる"""
+    channel = FakeChannel(responder=lambda message: {"echo": json.loads(message.body)["n"]})
+    rpc = RpcClient(FakeChannels(channel), timeout=1.0)
+
+    replies = await asyncio.gather(*[
+        rpc.call("user_events", "user.sync", Message(json.dumps({"n": n}).encode(), message_id=f"m{n}"))
+        for n in range(5)
+    ])
+
+    assert replies == [{"echo": n} for n in range(5)]
+    assert channel.reply_queue.no_ack is True
+    message, routing_key = channel.exchange.published[0]
+    assert message.reply_to == DIRECT_REPLY_TO
+    assert message.correlation_id == "m0"
+    assert routing_key == "user.sync"
+    assert rpc.stats()["replies_total"] == 5
+    assert rpc.stats()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_call_times_out_and_discards_late_reply():
+    """返信が届かない場合はRpcTimeoutErrorを送出し、その後に届いた返信は捨てる"""
+    channel = FakeChannel()
+    rpc = RpcClient(FakeChannels(channel), timeout=1.0)
+
+    with pytest.raises(RpcTimeoutError):
+        await rpc.call("user_events", "user.sync", Message(b"{}", correlation_id="c1"), timeout=0.05)
+    assert rpc.stats()["pending"] == 0
+    assert rpc.stats()["timeouts_total"] == 1
+
+    late = SimpleNamespace(body=b"{}", content_type="application/json", correlation_id="c1")
+    await channel.reply_queue.callback(late)
+    assert rpc.stats()["late_replies_total"] == 1
+
+
+@pytest.mark.asyncio
+async def test_call_reopens_closed_channel():
+    """返信用のチャネルが閉じた後の呼び出しは新しいチャネルを1回だけ開き、そのチャネルで返信を受け取る"""
+    first = FakeChannel(responder=lambda message: {"channel": 1})
+    second = FakeChannel(responder=lambda message: {"channel": 2})
+    channels = FakeChannels(first, second)
+    rpc = RpcClient(channels, timeout=1.0)
+    assert await rpc.call("user_events", "user.sync", Message(b"{}", correlation_id="before")) == {"channel": 1}
+
+    first.is_closed = True
+    replies = await asyncio.gather(*[
+        rpc.call("user_events", "user.sync", Message(b"{}", correlation_id=f"after{n}"))
+        for n in range(3)
+    ])
+
+    assert replies == [{"channel": 2}] * 3
+    assert channels.opened == 2
+    assert len(first.exchange.published) == 1
+    assert len(second.exchange.published) == 3
+
+
+@pytest.mark.asyncio
+async def test_call_raises_publish_error_when_request_is_not_sent():
+    """リクエストを発行できなかった場合はRpcPublishErrorを送出し、待機中の呼び出しを残さない"""
+    channel = FakeChannel()
+
+    async def fail_publish(message, routing_key):
+        raise RuntimeError("channel closed")
+
+    channel.exchange.publish = fail_publish
+    rpc = RpcClient(FakeChannels(channel), timeout=1.0)
+
+    with pytest.raises(RpcPublishError):
+        await rpc.call("user_events", "user.sync", Message(b"{}", correlation_id="c1"))
+    assert rpc.stats()["pending"] == 0
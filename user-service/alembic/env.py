@@ -10,7 +10,8 @@ from alembic import context
 # モデルのインポート
 from app.db.base import Base
 from app.models.user import User
-from app.models.group import Group
+from app.models.outbox_event import OutboxEvent
+from app.models.processed_message import ProcessedMessage
 from app.core.config import settings
 
 # this is the Alembic Config object, which provides
@@ -0,0 +1,28 @@
+"""add created_at id index
+
+Revision ID: 9d1e6b3a7c48
+Revises: 4f2a9c7e1b53
+Create Date: 2026-10-19 18:07:40.093651
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d1e6b3a7c48'
+down_revision: Union[str, None] = '4f2a9c7e1b53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_created_at_id', table_name='users')
@@ -0,0 +1,28 @@
+"""add version to users
+
+Revision ID: c5b8e2f4d610
+Revises: 9d1e6b3a7c48
+Create Date: 2026-10-19 18:09:03.771524
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5b8e2f4d610'
+down_revision: Union[str, None] = '9d1e6b3a7c48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('version', sa.BigInteger(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'version')
@@ -7,9 +7,11 @@ from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
+from app.core.user_cache import user_cache
 from app.db.session import get_async_session
+from app.crud.exceptions import UserNotFoundError
 from app.crud.user import user_crud
-from app.models.user import User
+from app.schemas.user import UserResponse
 
 from app.core.config import settings
 
@@ -41,9 +43,10 @@ async def validate_token(token: str) -> dict:
 async def get_current_user(
     token: str = Depends(oauth2_scheme), 
     db: AsyncSession = Depends(get_async_session)
-) -> User:
+) -> UserResponse:
     """
     現在のユーザーを取得する
+    - ユーザー情報はキャッシュから取得し、なければデータベースから取得する
     """
     try:
         # トークンの検証
@@ -62,12 +65,31 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    async def load_user():
+        try:
+            db_user = await user_crud.get_by_id(db, UUID(user_id))
+        except UserNotFoundError:
+            return None
+        return UserResponse.model_validate(db_user).model_dump(mode="json")
+    
     # ユーザーの取得
-    db_user = await user_crud.get_by_id(db, UUID(user_id))
-    if db_user is None:
+    user = await user_cache.get_or_load(str(UUID(user_id)), load_user)
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="ユーザーが見つかりません"
         )
     
-    return db_user
\ No newline at end of file
+    return UserResponse(**user)
+
+
+async def get_current_admin_user(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
+    """
+    認証されたユーザーが管理者（is_superuser）であることを確認する
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="管理者権限が必要です"
+        )
+    return current_user
\ No newline at end of file
@@ -1,12 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Any, List
+from typing import Any, Literal, Optional
+import uuid
 
-from app.api.deps import get_current_user
+from app.api.deps import get_current_admin_user, get_current_user
+from app.core.config import settings
+from app.core.exceptions import ValidationError
+from app.core.export import EXPORT_MEDIA_TYPES, gzip_stream, stream_export
 from app.core.logging import get_request_logger
-from app.crud.user import user_crud
+from app.core.user_cache import user_cache
+from app.core.user_import import (
+    SUPPORTED_FORMATS,
+    detect_format,
+    import_users,
+    user_import_tracker
+)
+from app.crud.user import user_crud, user_loader
 from app.db.session import get_async_session
-from app.schemas.user import UserCreate, UserResponse
+from app.models.user import User
+from app.schemas.user import (
+    UserBatchRequest,
+    UserBatchResponse,
+    UserCreate,
+    UserImportProgress,
+    UserPage,
+    UserResponse
+)
 from app.crud.exceptions import (
     UserNotFoundError,
     DuplicateEmailError,
@@ -51,30 +72,161 @@ async def create_user(
         logger.error(f"ユーザー作成失敗: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
-@router.get("/users", response_model=List[UserResponse])
+@router.post("/import", response_model=UserImportProgress)
+async def import_users_from_file(
+    request: Request,
+    format: Optional[str] = Query(None, description="csv または ndjson（省略時はContent-Typeから判定）"),
+    import_id: Optional[uuid.UUID] = Query(None, description="進捗照会用のID（省略時は自動生成）"),
+    async_session: AsyncSession = Depends(get_async_session),
+    current_user: UserResponse = Depends(get_current_admin_user)
+) -> Any:
+    """
+    CSVまたはNDJSONのストリームからユーザーを一括インポートするエンドポイント
+    - 管理者のみ実行できる
+    - リクエストボディは逐次パースされ、一定行数ごとに作成・コミットされる
+    - 実行中の進捗は GET /import/{import_id} で照会できる
+    """
+    logger = get_request_logger(request)
+    import_format = format or detect_format(request.headers.get("content-type"))
+    if import_format not in SUPPORTED_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Import format must be csv or ndjson"
+        )
+    import_id = import_id or uuid.uuid4()
+    progress = await user_import_tracker.start(import_id, import_format)
+    if progress is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Import is already running")
+    
+    logger.info(f"ユーザーインポートリクエスト: import_id={import_id}, format={import_format}")
+    try:
+        await import_users(async_session, request.stream(), progress)
+        logger.info(f"ユーザーインポート成功: import_id={import_id}, 作成={progress.rows_created}件")
+        return progress
+    except Exception as e:
+        await async_session.rollback()
+        logger.error(f"ユーザーインポート失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.get("/import/{import_id}", response_model=UserImportProgress)
+async def get_import_progress(
+    request: Request,
+    import_id: uuid.UUID
+) -> Any:
+    """
+    インポートの進捗を取得するエンドポイント
+    - 進捗はRedisに保持されるため、インポートを実行しているワーカー以外からも照会できる
+    """
+    progress = await user_import_tracker.get(import_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return progress
+
+@router.get("/users", response_model=UserPage)
 async def get_users(
     request: Request,
+    cursor: Optional[str] = Query(None, description="前ページのnext_cursor"),
+    limit: int = Query(50, ge=1, le=500),
+    username_prefix: Optional[str] = Query(None),
+    email_domain: Optional[str] = Query(None),
+    is_active: Optional[bool] = Query(None),
+    include_total: bool = Query(False, description="推定件数を含める"),
     async_session: AsyncSession = Depends(get_async_session)
 ) -> Any:
     """
-    全ユーザーを取得するエンドポイント
+    ユーザーをページ単位で取得するエンドポイント
+    - (created_at, id)によるキーセットページネーション
     """
     logger = get_request_logger(request)
-    logger.info("全ユーザー取得リクエスト")
+    logger.info(f"ユーザー一覧取得リクエスト: limit={limit}, cursor={cursor}")
     
     try:
-        users = await user_crud.get_all(async_session)
-        logger.info(f"全ユーザー取得成功: {len(users)}件")
-        return users
+        users, next_cursor, estimated_total = await user_crud.get_page(
+            async_session,
+            limit=limit,
+            cursor=cursor,
+            username_prefix=username_prefix,
+            email_domain=email_domain,
+            is_active=is_active,
+            include_total=include_total
+        )
+        logger.info(f"ユーザー一覧取得成功: {len(users)}件")
+        return UserPage(items=users, next_cursor=next_cursor, estimated_total=estimated_total)
+    except ValidationError as e:
+        logger.warning(f"ユーザー一覧取得失敗: {e.message}")
+        raise HTTPException(status_code=400, detail=e.message)
     except Exception as e:
-        logger.error(f"全ユーザー取得失敗: {str(e)}")
+        logger.error(f"ユーザー一覧取得失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.get("/users/export")
+async def export_users(
+    request: Request,
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    gzip: bool = Query(False, description="gzipで圧縮して返す"),
+    current_user: UserResponse = Depends(get_current_admin_user)
+) -> StreamingResponse:
+    """
+    全ユーザーをストリーミングでエクスポートするエンドポイント
+    - 管理者のみ実行できる
+    - サーバーサイドカーソルから一定行数ずつ取得して送信するため、メモリ使用量は件数に依存しない
+    """
+    logger = get_request_logger(request)
+    logger.info(f"ユーザーエクスポートリクエスト: format={format}, gzip={gzip}")
+    
+    stmt = select(
+        User.id,
+        User.username,
+        User.full_name,
+        User.email,
+        User.is_active,
+        User.is_superuser,
+        User.created_at,
+        User.updated_at
+    ).order_by(User.created_at, User.id)
+    body = stream_export(stmt, format)
+    headers = {"Content-Disposition": f'attachment; filename="users.{format}"'}
+    if gzip:
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=EXPORT_MEDIA_TYPES[format], headers=headers)
+
+@router.post("/users/batch", response_model=UserBatchResponse)
+async def get_users_batch(
+    request: Request,
+    batch_in: UserBatchRequest,
+    async_session: AsyncSession = Depends(get_async_session)
+) -> Any:
+    """
+    複数のIDのユーザーを一括で取得するエンドポイント
+    - 1回のINクエリで取得し、要求されたIDの順序で返す
+    - 見つからなかったIDはnot_foundに含める
+    """
+    logger = get_request_logger(request)
+    ids = list(dict.fromkeys(batch_in.ids))
+    if len(ids) > settings.USER_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many ids: maximum is {settings.USER_BATCH_MAX_IDS}"
+        )
+    logger.info(f"ユーザー一括取得リクエスト: {len(ids)}件")
+    
+    try:
+        users = {user.id: user for user in await user_crud.get_by_ids(async_session, ids)}
+        not_found = [id for id in ids if id not in users]
+        logger.info(f"ユーザー一括取得成功: {len(users)}件, 未検出: {len(not_found)}件")
+        return UserBatchResponse(
+            items=[users[id] for id in ids if id in users],
+            not_found=not_found
+        )
+    except Exception as e:
+        logger.error(f"ユーザー一括取得失敗: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 @router.get("/users/{user_id}", response_model=UserResponse)
 async def get_user(
     request: Request,
-    user_id: str,
-    async_session: AsyncSession = Depends(get_async_session)
+    user_id: uuid.UUID
 ) -> Any:
     """
     指定したIDのユーザーを取得するエンドポイント
@@ -82,9 +234,17 @@ async def get_user(
     logger = get_request_logger(request)
     logger.info(f"ユーザー取得リクエスト: {user_id}")
     
+    async def load_user():
+        # 同時に届いた他のリクエストの取得と1回のクエリにまとめる
+        user = await user_loader.load(user_id)
+        return UserResponse.model_validate(user).model_dump(mode="json") if user else None
+    
     try:
-        user = await user_crud.get_by_id(async_session, user_id)
-        logger.info(f"ユーザー取得成功: {user.username}")
+        # キャッシュ（ワーカー内LRU → Redis）になければデータベースから取得する
+        user = await user_cache.get_or_load(str(user_id), load_user)
+        if user is None:
+            raise UserNotFoundError(user_id=user_id)
+        logger.info(f"ユーザー取得成功: {user['username']}")
         return user
     except UserNotFoundError:
         logger.warning(f"ユーザー取得失敗: ユーザーが見つかりません: {user_id}")
@@ -19,6 +19,9 @@ class Settings(BaseSettings):
     RABBITMQ_USER: str = "guest"
     RABBITMQ_PASSWORD: str = "guest"
     RABBITMQ_RETRY_COUNT: int = 5
+    RABBITMQ_BROKER: str = "amqp"  # "memory"を指定するとプロセス内のブローカーを使う（テスト・ベンチマーク用）
+    RABBITMQ_PUBLISHER_CHANNELS: int = 4  # 発行用チャネルのプールのサイズ
+    RABBITMQ_CHANNEL_HEALTH_CHECK_INTERVAL_SECONDS: float = 5.0  # 閉じたチャネルを検出して置き換える間隔
 
      # データベース関係
     USER_POSTGRES_HOST: str
@@ -28,6 +31,11 @@ class Settings(BaseSettings):
     USER_POSTGRES_DB: str
     TZ: str
 
+    # Redis設定
+    USER_REDIS_HOST: str = "user-redis"
+    USER_REDIS_PORT: str = "6379"
+    USER_REDIS_PASSWORD: Optional[str] = None
+
     # auth-serviceへ接続するための設定
     AUTH_SERVICE_INTERNAL_PORT: str = "8080"
 
@@ -35,6 +43,67 @@ class Settings(BaseSettings):
     ALGORITHM: str = "RS256"
     PUBLIC_KEY_PATH: str = "keys/public.pem"   # 公開鍵のパス
 
+    # 一括作成・インポート関連の設定
+    BULK_INSERT_CHUNK_SIZE: int = 1000  # 1回のINSERT文で処理する最大行数
+    USER_IMPORT_MAX_REPORTED_ERRORS: int = 100  # インポート結果に含めるエラー行の上限
+    USER_IMPORT_PROGRESS_TTL_SECONDS: int = 86400  # 進捗をRedisに保持する期間（最後の更新から）
+    USER_IMPORT_MAX_RECORD_BYTES: int = 65536  # CSVの1レコード（クォート内の改行を含む）の最大サイズ
+
+    # エクスポート関連の設定
+    EXPORT_BATCH_SIZE: int = 1000  # サーバーサイドカーソルから1回に取得する行数
+
+    # 複数ID一括取得の設定
+    USER_BATCH_MAX_IDS: int = 100  # 1回のリクエスト・クエリで取得できる最大ID数
+
+    # ユーザー情報キャッシュの設定
+    USER_CACHE_ENABLED: bool = True
+    USER_CACHE_LOCAL_MAX_SIZE: int = 10000  # ワーカー内LRUの最大件数
+    USER_CACHE_LOCAL_TTL_SECONDS: int = 30  # ワーカー内LRUの有効期限（イベント取りこぼし時の保険）
+    USER_CACHE_REDIS_TTL_SECONDS: int = 3600  # Redisの有効期限
+
+    # アウトボックス（イベント送信）関連の設定
+    OUTBOX_RELAY_ENABLED: bool = True
+    OUTBOX_BATCH_SIZE: int = 100  # 1回に送信する最大イベント数
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 1.0  # 新しいイベントの通知がない場合の確認間隔
+    OUTBOX_MAX_BACKOFF_SECONDS: float = 30.0  # 送信失敗時の最大待機時間
+
+    # メッセージ発行（publisher confirm）関連の設定
+    PUBLISHER_MAX_IN_FLIGHT: int = 256  # 確認待ちにできる最大メッセージ数
+    PUBLISHER_BATCH_SIZE: int = 50  # この件数に達したらすぐに送信する
+    PUBLISHER_FLUSH_INTERVAL_MS: float = 5.0  # 件数に達しない場合に送信するまでの最大待機時間
+
+    # メッセージ受信関連の設定
+    CONSUMER_PREFETCH_COUNT: int = 32  # ブローカーから未ackのまま受け取る最大件数
+    CONSUMER_CONCURRENCY: int = 8  # 同時に処理する最大件数
+    CONSUMER_ORDERING_FIELD: str = "username"  # 同じ値のメッセージを順番に処理するuser_dataのフィールド（空文字で無効）
+
+    # メッセージの形式関連の設定
+    MESSAGE_CONTENT_TYPE: str = "application/json"  # "application/msgpack"を指定するとmsgpackで送信する（受信は常に両方に対応）
+    MESSAGE_SOURCE_SERVICE: str = "user-service"  # エンベロープに記録する送信元サービス
+    MESSAGE_SHARD_KEY_FIELD: str = "username"  # x-shard-keyヘッダーに設定するuser_dataのフィールド（シャードのキューの振り分けに使う）
+
+    # メッセージの再試行・デッドレター関連の設定
+    MESSAGE_RETRY_MAX_ATTEMPTS: int = 5  # デッドレターキューに送るまでの最大再試行回数
+    MESSAGE_RETRY_BASE_DELAY_MS: int = 1000  # 1回目の再試行までの待機時間（以降は回数ごとに倍）
+
+    # メッセージの重複排除（message_id）関連の設定
+    MESSAGE_DEDUP_ENABLED: bool = True
+    MESSAGE_DEDUP_RETENTION_HOURS: float = 168.0  # 処理済みのmessage_idを記録しておく期間（再配信・DLQからの再送を検出できる期間）
+    MESSAGE_DEDUP_PURGE_INTERVAL_SECONDS: float = 3600.0  # 保持期間を過ぎた記録を削除する間隔
+
+    # ユーザー作成リクエストのバッチ処理の設定
+    USER_CREATION_BATCH_ENABLED: bool = True
+    USER_CREATION_BATCH_SIZE: int = 100  # 1回のトランザクションで作成する最大件数
+    USER_CREATION_BATCH_WAIT_MS: float = 10.0  # バッチを確定するまでの最大待機時間
+
+    # ユーザー作成リクエストのシャーディングの設定（consistent-hash exchangeでuser.syncをシャードのキューに振り分ける）
+    USER_CREATION_SHARDS: int = 0  # シャードのキューの数（0で無効: user_creation_queueの1つのキューで受信する。全インスタンスで同じ値にする）
+    USER_CREATION_OWNED_SHARDS: str = ""  # このインスタンスが受信するシャード番号（"0,1"や"0-3"、空文字で全シャード）
+
+    # シャットダウン関連の設定（uvicornのgraceful shutdownの後にコンシューマーを停止する）
+    SHUTDOWN_HTTP_TIMEOUT_SECONDS: int = 10  # 処理中のHTTPリクエストの完了を待つ最大時間（uvicornの--timeout-graceful-shutdown）
+    SHUTDOWN_DRAIN_TIMEOUT_SECONDS: float = 15.0  # 処理中のメッセージと発行の確認を待つ最大時間
+
     # SQLAlchemyのログ出力設定
     SQLALCHEMY_ECHO: bool = True
 
@@ -50,6 +119,12 @@ class Settings(BaseSettings):
             f"{self.USER_POSTGRES_DB}"
         )
     
+    @property
+    def USER_REDIS_URL(self) -> str:
+        if self.USER_REDIS_PASSWORD:
+            return f"redis://:{self.USER_REDIS_PASSWORD}@{self.USER_REDIS_HOST}:{self.USER_REDIS_PORT}/0"
+        return f"redis://{self.USER_REDIS_HOST}:{self.USER_REDIS_PORT}/0"
+    
     @property
     def AUTH_SERVICE_URL(self) -> str:
         """認証サービスのURL"""
@@ -0,0 +1,83 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, List, Optional, Set, TypeVar
+
+from app.core.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class DataLoader(Generic[K, V]):
+    """
+    同じイベントループのティック内に要求されたキーをまとめて1回のバッチ取得で解決する
+
+    load()はキーを保留中のバッチに登録してFutureを返すだけで、実際の取得は
+    loop.call_soonでスケジュールされたディスパッチ時に行う。そのため、並行して
+    実行されている複数のリクエストからの取得も1回のクエリにまとめられる。
+    同じバッチ内で同じキーが要求された場合は1つのFutureを共有する。
+
+    Args:
+        batch_load_fn: キーのリストを受け取り、キーから値への辞書を返す関数（見つからないキーは含めない）
+        max_batch_size: 1回のバッチ取得で処理する最大キー数
+    """
+
+    def __init__(
+            self,
+            batch_load_fn: Callable[[List[K]], Awaitable[Dict[K, V]]],
+            max_batch_size: int = 100
+            ):
+        self._batch_load_fn = batch_load_fn
+        self._max_batch_size = max_batch_size
+        self._pending: Dict[K, "asyncio.Future[Optional[V]]"] = {}
+        self._scheduled = False
+        # 実行中のバッチ取得（完了前にタスクが破棄されないよう参照を保持する）
+        self._loads: Set["asyncio.Task[None]"] = set()
+        # 統計情報
+        self.batches_dispatched = 0
+        self.keys_requested = 0
+
+    async def load(self, key: K) -> Optional[V]:
+        """キーに対応する値を返す（見つからない場合はNone）"""
+        self.keys_requested += 1
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+            if not self._scheduled:
+                self._scheduled = True
+                loop.call_soon(self._dispatch)
+        # 呼び出し元がキャンセルされても、同じキーを待つ他の呼び出し元には影響させない
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: List[K]) -> List[Optional[V]]:
+        """複数のキーに対応する値を入力と同じ順序で返す"""
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self):
+        pending, self._pending = self._pending, {}
+        self._scheduled = False
+        keys = list(pending)
+        for start in range(0, len(keys), self._max_batch_size):
+            batch = {key: pending[key] for key in keys[start:start + self._max_batch_size]}
+            self.batches_dispatched += 1
+            task = asyncio.ensure_future(self._load_batch(batch))
+            self._loads.add(task)
+            task.add_done_callback(self._loads.discard)
+
+    async def _load_batch(self, batch: Dict[K, "asyncio.Future[Optional[V]]"]):
+        logger.debug(f"Dispatching batch load: {len(batch)} keys")
+        try:
+            values = await self._batch_load_fn(list(batch))
+        except Exception as e:
+            logger.error(f"Batch load failed: {str(e)}")
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(values.get(key))
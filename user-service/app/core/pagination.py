@@ -0,0 +1,65 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+import uuid
+
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.exceptions import ValidationError
+
+
+def encode_cursor(created_at: datetime, id: uuid.UUID) -> str:
+    """キーセットページネーションの位置(created_at, id)を不透明なトークンに変換する"""
+    payload = json.dumps([created_at.isoformat(), str(id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """
+    encode_cursorで生成したトークンを(created_at, id)に戻す
+
+    Raises:
+        ValidationError: トークンの形式が不正な場合
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), uuid.UUID(id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValidationError(field="cursor", details="Invalid cursor") from e
+
+
+def after_cursor(stmt: Select, model, cursor: Optional[str]) -> Select:
+    """(created_at, id)の昇順でカーソル位置より後の行に絞り込み、並び順を設定する"""
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        stmt = stmt.filter(or_(
+            model.created_at > created_at,
+            and_(model.created_at == created_at, model.id > id)
+        ))
+    return stmt.order_by(model.created_at, model.id)
+
+
+async def estimate_row_count(session: AsyncSession, stmt: Select) -> Optional[int]:
+    """
+    COUNT(*)を実行せず、プランナーの推定行数を返す
+
+    PostgreSQL以外では推定できないためNoneを返す。
+    検索条件の値はSQLに埋め込まず、コンパイル時のパラメーターとしてドライバーに渡す。
+    """
+    connection = await session.connection()
+    if connection.dialect.name != "postgresql":
+        return None
+    # IN句の展開などを反映したSQLとパラメーターを得る
+    compiled = stmt.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params)
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
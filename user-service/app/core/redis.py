@@ -0,0 +1,25 @@
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.core.logging import app_logger
+
+# Redis接続プール
+_redis = None
+
+async def get_redis_pool():
+    """
+    Redisプールを取得する。まだ接続されていない場合は接続を作成する。
+    """
+    global _redis
+    if _redis is None:
+        try:
+            _redis = Redis.from_url(
+                settings.USER_REDIS_URL,
+                encoding="utf-8",
+                decode_responses=True
+            )
+            app_logger.info(f"Redis接続プール作成: {settings.USER_REDIS_HOST}:{settings.USER_REDIS_PORT}")
+        except Exception as e:
+            app_logger.error(f"Redis接続エラー: {str(e)}", exc_info=True)
+            raise
+    return _redis
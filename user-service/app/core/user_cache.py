@@ -0,0 +1,184 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.redis import get_redis_pool
+
+
+logger = get_logger(__name__)
+
+# バージョンが読み取り時から変わっていない場合のみ書き込む
+# （読み取り後に無効化された場合、古いデータで上書きしない）
+_FILL_SCRIPT = """
+if (redis.call('HGET', KEYS[1], 'ver') or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'data', ARGV[2], 'data_ver', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class LocalLRUCache:
+    """ワーカープロセス内のLRUキャッシュ（有効期限付き）"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        # キー → (ユーザー情報, 有効期限)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._max_size = max_size
+        self._ttl_seconds = ttl_seconds
+        # 無効化のたびに増える世代番号（取得中に無効化された値を書き込まないために使う）
+        self.epoch = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        data, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    def put(self, key: str, data: Dict[str, Any], epoch: int):
+        if epoch != self.epoch:
+            return
+        self._entries[key] = (data, time.monotonic() + self._ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str):
+        self.epoch += 1
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class UserCache:
+    """
+    ユーザー情報の2層キャッシュ（ワーカー内LRU + Redis）
+
+    読み取り時に未登録であればloaderで取得して両方の層に書き込む。
+    Redisの各エントリはハッシュ（ver, data, data_ver）で保持し、無効化のたびにverを増やす。
+    dataはdata_verがverと一致する場合のみ有効とし、書き込みは読み取り時のverから
+    変わっていない場合のみ行うため、遅れて届いた無効化や取得中の無効化によって
+    古いデータが復活することはない。
+    Redisに接続できない場合はキャッシュを使わずにloaderの結果を返す。
+    """
+
+    def __init__(
+            self,
+            local_max_size: int,
+            local_ttl_seconds: float,
+            redis_ttl_seconds: int,
+            redis_factory: Callable[[], Awaitable[Any]] = get_redis_pool,
+            key_prefix: str = "user_cache",
+            enabled: bool = True
+            ):
+        self.local = LocalLRUCache(local_max_size, local_ttl_seconds)
+        self._redis_ttl_seconds = redis_ttl_seconds
+        self._redis_factory = redis_factory
+        self._key_prefix = key_prefix
+        self.enabled = enabled
+        # 統計情報
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self._key_prefix}:{key}"
+
+    async def get_or_load(
+            self,
+            key: str,
+            loader: Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+            ) -> Optional[Dict[str, Any]]:
+        """
+        キャッシュからユーザー情報を取得し、なければloaderで取得して書き込む
+
+        Args:
+            key: ユーザーID
+            loader: データベースから取得する関数（見つからない場合はNoneを返す）
+
+        Returns:
+            ユーザー情報の辞書（見つからない場合はNone、キャッシュしない）
+        """
+        if not self.enabled:
+            return await loader()
+        data = self.local.get(key)
+        if data is not None:
+            self.local_hits += 1
+            return data
+
+        epoch = self.local.epoch
+        version = None
+        try:
+            redis = await self._redis_factory()
+            version, cached, cached_version = await redis.hmget(
+                self._redis_key(key), "ver", "data", "data_ver"
+            )
+            version = version or "0"
+            if cached is not None and cached_version == version:
+                self.redis_hits += 1
+                data = json.loads(cached)
+                self.local.put(key, data, epoch)
+                return data
+        except Exception as e:
+            logger.warning(f"User cache read failed for {key}: {str(e)}")
+
+        self.misses += 1
+        data = await loader()
+        if data is None:
+            return None
+        if version is not None:
+            try:
+                redis = await self._redis_factory()
+                await redis.eval(
+                    _FILL_SCRIPT, 1, self._redis_key(key),
+                    version, json.dumps(data), self._redis_ttl_seconds
+                )
+            except Exception as e:
+                logger.warning(f"User cache fill failed for {key}: {str(e)}")
+        self.local.put(key, data, epoch)
+        return data
+
+    async def invalidate(self, key: str):
+        """両方の層からエントリを無効化する（Redisのバージョンを進める）"""
+        self.local.invalidate(key)
+        if not self.enabled:
+            return
+        try:
+            redis = await self._redis_factory()
+            redis_key = self._redis_key(key)
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.hincrby(redis_key, "ver", 1)
+                pipe.hdel(redis_key, "data", "data_ver")
+                pipe.expire(redis_key, self._redis_ttl_seconds)
+                await pipe.execute()
+            logger.info(f"User cache invalidated: {key}")
+        except Exception as e:
+            logger.error(f"User cache invalidation failed for {key}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        reads = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.local_hits + self.redis_hits) / reads if reads else 0.0,
+            "local_size": len(self.local),
+        }
+
+
+user_cache = UserCache(
+    local_max_size=settings.USER_CACHE_LOCAL_MAX_SIZE,
+    local_ttl_seconds=settings.USER_CACHE_LOCAL_TTL_SECONDS,
+    redis_ttl_seconds=settings.USER_CACHE_REDIS_TTL_SECONDS,
+    enabled=settings.USER_CACHE_ENABLED
+)
@@ -0,0 +1,323 @@
+import codecs
+import csv
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from zoneinfo import ZoneInfo
+import uuid
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.redis import get_redis_pool
+from app.crud.user import user_crud
+from app.schemas.user import (
+    UserBulkCreateStatus,
+    UserCreate,
+    UserImportProgress,
+    UserImportRowError,
+    UserImportState
+)
+
+
+logger = get_logger(__name__)
+
+SUPPORTED_FORMATS = ("csv", "ndjson")
+
+# Content-Typeからインポート形式への対応
+CONTENT_TYPE_FORMATS = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/x-jsonlines": "ndjson",
+}
+
+
+def detect_format(content_type: Optional[str]) -> Optional[str]:
+    """Content-Typeヘッダーからインポート形式を判定する"""
+    if not content_type:
+        return None
+    return CONTENT_TYPE_FORMATS.get(content_type.split(";")[0].strip().lower())
+
+
+async def _iter_lines(stream: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[Optional[str]]:
+    """
+    バイトストリームを行単位の文字列に分割する
+
+    max_line_bytesを超える行は改行まで読み捨ててNoneを返す
+    （改行のないストリームでもメモリに保持するのは上限までとする）。
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    # 上限を超えた行の残りを読み捨てている間はTrue
+    discarding = False
+    async for chunk in stream:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if discarding:
+                discarding = False
+                yield None
+            elif len(line.encode("utf-8")) > max_line_bytes:
+                yield None
+            else:
+                yield line.rstrip("\r")
+        if len(buffer.encode("utf-8")) > max_line_bytes:
+            buffer, discarding = "", True
+    buffer += decoder.decode(b"", final=True)
+    if discarding or len(buffer.encode("utf-8")) > max_line_bytes:
+        yield None
+    elif buffer:
+        yield buffer.rstrip("\r")
+
+
+class _IncompleteRecord(Exception):
+    """CSVのレコードがクォート内の改行で次の行に続いている"""
+
+
+def _parse_csv_record(lines: List[str]) -> List[str]:
+    """
+    1レコード分の行をcsv.readerでパースする
+
+    csv.readerがレコードの途中で次の行を要求した場合（クォート内の改行）は_IncompleteRecordを送出する。
+    """
+    def feed() -> Iterator[str]:
+        for line in lines:
+            yield f"{line}\n"
+        raise _IncompleteRecord()
+
+    return next(csv.reader(feed()))
+
+
+async def iter_import_rows(
+        stream: AsyncIterator[bytes],
+        format: str
+        ) -> AsyncIterator[Tuple[int, Union[Dict[str, Any], str]]]:
+    """
+    アップロードされたストリームを逐次パースし、(行番号, 行データ)を返す
+
+    パースに失敗した行は行データの代わりにエラー内容の文字列を返す。
+    CSVは1行目をヘッダーとして扱う。クォート内の改行を含むレコードはcsv.readerが次の行を
+    要求しなくなるまで行を追加してパースする。USER_IMPORT_MAX_RECORD_BYTESを超える行・レコードは
+    エラーとする。
+
+    Args:
+        stream: リクエストボディのバイトストリーム
+        format: "csv" または "ndjson"
+
+    Yields:
+        (行番号, 行データの辞書またはエラー内容)
+    """
+    max_record_bytes = settings.USER_IMPORT_MAX_RECORD_BYTES
+    too_large = f"Record exceeds {max_record_bytes} bytes"
+    row_number = 0
+    if format == "ndjson":
+        async for line in _iter_lines(stream, max_record_bytes):
+            row_number += 1
+            if line is None:
+                yield row_number, too_large
+                continue
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, f"Invalid JSON: {e.msg}"
+                continue
+            if not isinstance(data, dict):
+                yield row_number, "Row must be a JSON object"
+                continue
+            yield row_number, data
+        return
+
+    header: Optional[List[str]] = None
+    record: List[str] = []
+    record_size = 0
+    async for line in _iter_lines(stream, max_record_bytes):
+        row_number += 1
+        if line is None:
+            record, record_size = [], 0
+            yield row_number, too_large
+            continue
+        if not record and not line.strip():
+            continue
+        record.append(line)
+        record_size += len(line.encode("utf-8")) + 1
+        try:
+            values = _parse_csv_record(record)
+        except _IncompleteRecord:
+            if record_size <= max_record_bytes:
+                continue
+            record, record_size = [], 0
+            yield row_number, too_large
+            continue
+        except csv.Error as e:
+            record, record_size = [], 0
+            yield row_number, f"Invalid CSV: {str(e)}"
+            continue
+        record, record_size = [], 0
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield row_number, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield row_number, dict(zip(header, values))
+    if record:
+        yield row_number, "Unterminated quoted field"
+
+
+class UserImportTracker:
+    """
+    インポートの進捗をRedisに保持する（どのワーカープロセスからも照会できる）
+
+    進捗は開始時・チャンクの処理ごと・終了時に書き込み、最後の書き込みから一定期間で削除される。
+    Redisに書き込めない場合もインポートは続行する（進捗は照会できない）。
+    """
+
+    def __init__(
+            self,
+            ttl_seconds: int,
+            redis_factory: Callable[[], Awaitable[Any]] = get_redis_pool,
+            key_prefix: str = "user_import"
+            ):
+        self._ttl_seconds = ttl_seconds
+        self._redis_factory = redis_factory
+        self._key_prefix = key_prefix
+
+    def _key(self, import_id: uuid.UUID) -> str:
+        return f"{self._key_prefix}:{import_id}"
+
+    async def start(self, import_id: uuid.UUID, format: str) -> Optional[UserImportProgress]:
+        """進捗を登録して返す（同じIDのインポートが実行中の場合はNoneを返す）"""
+        progress = UserImportProgress(
+            import_id=import_id,
+            format=format,
+            started_at=datetime.now(ZoneInfo(settings.TZ))
+        )
+        try:
+            redis = await self._redis_factory()
+            key = self._key(import_id)
+            data = progress.model_dump_json()
+            if not await redis.set(key, data, ex=self._ttl_seconds, nx=True):
+                current = await redis.get(key)
+                if current is not None and \
+                        UserImportProgress.model_validate_json(current).state == UserImportState.RUNNING:
+                    return None
+                await redis.set(key, data, ex=self._ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Failed to register import progress {import_id}: {str(e)}")
+        return progress
+
+    async def save(self, progress: UserImportProgress):
+        """進捗を書き込む"""
+        try:
+            redis = await self._redis_factory()
+            await redis.set(self._key(progress.import_id), progress.model_dump_json(), ex=self._ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Failed to save import progress {progress.import_id}: {str(e)}")
+
+    async def get(self, import_id: uuid.UUID) -> Optional[UserImportProgress]:
+        data = await (await self._redis_factory()).get(self._key(import_id))
+        return UserImportProgress.model_validate_json(data) if data is not None else None
+
+
+user_import_tracker = UserImportTracker(settings.USER_IMPORT_PROGRESS_TTL_SECONDS)
+
+
+def _record_error(progress: UserImportProgress, error: UserImportRowError):
+    if len(progress.errors) < settings.USER_IMPORT_MAX_REPORTED_ERRORS:
+        progress.errors.append(error)
+    else:
+        progress.errors_truncated = True
+
+
+async def _flush_batch(
+        session: AsyncSession,
+        progress: UserImportProgress,
+        batch: List[Tuple[int, UserCreate]]
+        ):
+    """バリデーション済みの行をまとめて作成し、チャンク単位でコミットする"""
+    results = await user_crud.bulk_create(session, [user_in for _, user_in in batch])
+    await session.commit()
+    for (row_number, user_in), result in zip(batch, results):
+        if result.status == UserBulkCreateStatus.CREATED:
+            progress.rows_created += 1
+            continue
+        progress.rows_skipped += 1
+        _record_error(progress, UserImportRowError(
+            row=row_number,
+            reason=result.status.value,
+            username=user_in.username,
+            email=user_in.email
+        ))
+
+
+async def import_users(
+        session: AsyncSession,
+        stream: AsyncIterator[bytes],
+        progress: UserImportProgress,
+        chunk_size: Optional[int] = None
+        ) -> UserImportProgress:
+    """
+    ストリームからユーザーをインポートする
+
+    メモリ上には最大chunk_size行のみを保持し、チャンクごとに一括作成とコミットを行う。
+    進捗はチャンクごとにRedisに書き込まれるため、実行中でもどのワーカープロセスからも照会できる。
+
+    Args:
+        session: データベースセッション
+        stream: リクエストボディのバイトストリーム
+        progress: 進捗を記録するオブジェクト
+        chunk_size: 1回の一括作成で処理する最大行数（省略時は設定値）
+
+    Returns:
+        完了時の進捗
+    """
+    chunk_size = chunk_size or settings.BULK_INSERT_CHUNK_SIZE
+    logger.info(f"Starting user import {progress.import_id} (format={progress.format})")
+    batch: List[Tuple[int, UserCreate]] = []
+    try:
+        async for row_number, row in iter_import_rows(stream, progress.format):
+            progress.rows_received += 1
+            if isinstance(row, str):
+                progress.rows_invalid += 1
+                _record_error(progress, UserImportRowError(row=row_number, reason=row))
+                continue
+            # 空の値は未指定として扱い、スキーマのデフォルト値を適用する
+            data = {key: value for key, value in row.items() if value not in ("", None)}
+            try:
+                user_in = UserCreate(**data)
+            except ValidationError as e:
+                progress.rows_invalid += 1
+                _record_error(progress, UserImportRowError(
+                    row=row_number,
+                    reason="; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()),
+                    username=data.get("username"),
+                    email=data.get("email")
+                ))
+                continue
+            batch.append((row_number, user_in))
+            if len(batch) >= chunk_size:
+                await _flush_batch(session, progress, batch)
+                batch = []
+                await user_import_tracker.save(progress)
+        if batch:
+            await _flush_batch(session, progress, batch)
+        progress.state = UserImportState.COMPLETED
+        logger.info(
+            f"User import {progress.import_id} completed: received={progress.rows_received}, "
+            f"created={progress.rows_created}, skipped={progress.rows_skipped}, invalid={progress.rows_invalid}"
+        )
+    except Exception as e:
+        progress.state = UserImportState.FAILED
+        logger.error(f"User import {progress.import_id} failed: {str(e)}", exc_info=True)
+        raise
+    finally:
+        progress.finished_at = datetime.now(ZoneInfo(settings.TZ))
+        await user_import_tracker.save(progress)
+    return progress
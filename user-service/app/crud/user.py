@@ -1,24 +1,57 @@
 from collections import Counter
-from sqlalchemy import select
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from sqlalchemy import bindparam, inspect, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import Dict, List, Optional, Tuple
 import uuid
 
+from app.core.config import settings
+from app.core.dataloader import DataLoader
 from app.core.logging import get_logger
+from app.core.pagination import after_cursor, encode_cursor, estimate_row_count
+from app.core.singleflight import SingleFlight
+from app.db.session import AsyncSessionLocal
+from app.messaging.outbox import enqueue_user_event
+from app.messaging.rabbitmq import UserEventTypes
 from app.crud.exceptions import (
     UserNotFoundError,
     DuplicateUsernameError,
     DuplicateEmailError,
     DatabaseIntegrityError,
     DatabaseQueryError
-    )
+)
 from app.models.user import User
-from app.schemas.user import UserCreate
+from app.schemas.user import (
+    UserBulkCreateResult,
+    UserBulkCreateStatus,
+    UserCreate,
+    UserUpsert,
+    UserUpsertResult,
+    UserUpsertStatus
+)
+
+
+def _dialect_insert(session: AsyncSession):
+    """セッションの接続先に対応したON CONFLICT対応のinsert関数を返す"""
+    if session.bind.dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+# 頻繁に実行される取得クエリは事前に構築し、値はバインドパラメータで渡す
+# （呼び出しごとの文の構築を省き、コンパイル結果のキャッシュを再利用する）
+_SELECT_BY_ID = select(User).where(User.id == bindparam("id"))
+_SELECT_BY_IDS = select(User).where(User.id.in_(bindparam("ids", expanding=True)))
+
 
 class CRUDUser:
     # クラスレベルのロガーの初期化
     logger = get_logger(__name__)
+    # 同じキーに対する同時実行中の取得を1回のクエリにまとめる
+    _id_flight = SingleFlight("user.get_by_id")
     async def create(self, session: AsyncSession, obj_in: UserCreate) -> User:
         self.logger.info(f"Creating new user: {obj_in.username}")
         try:
@@ -95,7 +128,7 @@ class CRUDUser:
                 full_name=obj_in.full_name,
                 email=obj_in.email,
                 is_active=obj_in.is_active,
-                is_sueruser=obj_in.is_superuser,
+                is_superuser=obj_in.is_superuser,
             )
             db_objs.append(db_obj)
         session.add_all(db_objs)
@@ -104,6 +137,241 @@ class CRUDUser:
         self.logger.info(f"Successfully created {len(db_objs)} users")
         return db_objs
     
+    async def bulk_create(
+            self,
+            session: AsyncSession,
+            obj_in_list: List[UserCreate],
+            chunk_size: Optional[int] = None
+            ) -> List[UserBulkCreateResult]:
+        """
+        大量のユーザーを一括作成し、行ごとの結果を返す
+        
+        重複があっても処理を中断せず、重複した行はスキップして結果に理由を記録する。
+        チャンクごとにキー列のみの重複チェックと複数行のINSERT ... ON CONFLICT DO NOTHINGを行う。
+        
+        Args:
+            session: データベースセッション
+            obj_in_list: ユーザー作成スキーマのリスト
+            chunk_size: 1回のINSERT文で処理する最大行数（省略時は設定値）
+            
+        Returns:
+            入力と同じ順序の行ごとの結果
+        """
+        chunk_size = chunk_size or settings.BULK_INSERT_CHUNK_SIZE
+        self.logger.info(f"Bulk creating users: {len(obj_in_list)} users, chunk_size={chunk_size}")
+        results: List[Optional[UserBulkCreateResult]] = [None] * len(obj_in_list)
+        
+        def _result(index: int, status: UserBulkCreateStatus, id: Optional[uuid.UUID] = None):
+            obj_in = obj_in_list[index]
+            return UserBulkCreateResult(
+                index=index,
+                username=obj_in.username,
+                email=obj_in.email,
+                status=status,
+                id=id
+            )
+        
+        # 1. 入力データ内での重複チェック（最初に出現した行のみを作成対象とする）
+        seen_usernames, seen_emails = set(), set()
+        candidates = []
+        for index, obj_in in enumerate(obj_in_list):
+            if obj_in.username in seen_usernames or obj_in.email in seen_emails:
+                results[index] = _result(index, UserBulkCreateStatus.DUPLICATE_IN_INPUT)
+                continue
+            seen_usernames.add(obj_in.username)
+            seen_emails.add(obj_in.email)
+            candidates.append(index)
+        
+        insert = _dialect_insert(session)
+        created_count = 0
+        try:
+            for start in range(0, len(candidates), chunk_size):
+                chunk = candidates[start:start + chunk_size]
+                
+                # 2. データベースでの重複チェック（キー列のみを1回のクエリで取得）
+                result = await session.execute(
+                    select(User.username, User.email).filter(
+                        or_(
+                            User.username.in_([obj_in_list[i].username for i in chunk]),
+                            User.email.in_([obj_in_list[i].email for i in chunk])
+                        )
+                    )
+                )
+                existing_rows = result.all()
+                existing_usernames = {row.username for row in existing_rows}
+                existing_emails = {row.email for row in existing_rows}
+                
+                rows = []
+                for index in chunk:
+                    obj_in = obj_in_list[index]
+                    if obj_in.username in existing_usernames:
+                        results[index] = _result(index, UserBulkCreateStatus.DUPLICATE_USERNAME)
+                    elif obj_in.email in existing_emails:
+                        results[index] = _result(index, UserBulkCreateStatus.DUPLICATE_EMAIL)
+                    else:
+                        rows.append((index, {
+                            "id": uuid.uuid4(),
+                            "username": obj_in.username,
+                            "full_name": obj_in.full_name,
+                            "email": obj_in.email,
+                            "is_active": obj_in.is_active,
+                            "is_superuser": obj_in.is_superuser,
+                        }))
+                if not rows:
+                    continue
+                
+                # 3. 複数行INSERT（チェック後に並行して作成された行はON CONFLICTでスキップ）
+                now = datetime.now(ZoneInfo(settings.TZ))
+                values = [{**row, "created_at": now, "updated_at": now} for _, row in rows]
+                stmt = insert(User).values(values).on_conflict_do_nothing().returning(User.id)
+                result = await session.execute(stmt)
+                inserted_ids = set(result.scalars().all())
+                
+                for index, row in rows:
+                    if row["id"] in inserted_ids:
+                        results[index] = _result(index, UserBulkCreateStatus.CREATED, row["id"])
+                        created_count += 1
+                    else:
+                        results[index] = _result(index, UserBulkCreateStatus.CONFLICT)
+        except IntegrityError as e:
+            self.logger.error(f"Database integrity error while bulk creating users: {str(e)}")
+            raise DatabaseIntegrityError("Database integrity error") from e
+        # commitはsessionのfinallyで行う
+        self.logger.info(f"Bulk create finished: {created_count} created, {len(obj_in_list) - created_count} skipped")
+        return results
+    
+    async def upsert_many(
+            self,
+            session: AsyncSession,
+            obj_in_list: List[UserUpsert],
+            chunk_size: Optional[int] = None
+            ) -> List[UserUpsertResult]:
+        """
+        同期元のユーザー状態を冪等に適用し、行ごとの結果を返す
+        
+        チャンクごとにINSERT ... ON CONFLICT (id) DO UPDATE ... WHERE version < excluded.versionを
+        1回実行する。適用済みのバージョン以下の行は更新されないため、イベントの再送や重複配信、
+        順序の入れ替わりがあっても結果は変わらない。重複は例外ではなく行ごとの結果として返す。
+        適用した行ごとにuser.updatedイベントをアウトボックスに書き込み（更新と同じトランザクション）、
+        全ワーカーのユーザー情報キャッシュを無効化する。
+        
+        Args:
+            session: データベースセッション
+            obj_in_list: upsertスキーマのリスト
+            chunk_size: 1回のINSERT文で処理する最大行数（省略時は設定値）
+            
+        Returns:
+            入力と同じ順序の行ごとの結果
+        """
+        chunk_size = chunk_size or settings.BULK_INSERT_CHUNK_SIZE
+        self.logger.info(f"Upserting users: {len(obj_in_list)} rows, chunk_size={chunk_size}")
+        results: List[Optional[UserUpsertResult]] = [None] * len(obj_in_list)
+        
+        def _result(index: int, status: UserUpsertStatus):
+            obj_in = obj_in_list[index]
+            return UserUpsertResult(index=index, id=obj_in.id, version=obj_in.version, status=status)
+        
+        # 1. 入力データ内で同じidの行は最も新しいバージョンのみを適用対象とする
+        latest = {}
+        for index, obj_in in enumerate(obj_in_list):
+            current = latest.get(obj_in.id)
+            if current is None or obj_in.version > obj_in_list[current].version:
+                latest[obj_in.id] = index
+        for index, obj_in in enumerate(obj_in_list):
+            if latest[obj_in.id] != index:
+                results[index] = _result(index, UserUpsertStatus.SUPERSEDED_IN_INPUT)
+        
+        # 2. 入力データ内で他のidとusername/emailが重複する行は適用しない
+        seen_usernames, seen_emails = set(), set()
+        candidates = []
+        for index in sorted(latest.values()):
+            obj_in = obj_in_list[index]
+            if obj_in.username in seen_usernames or obj_in.email in seen_emails:
+                results[index] = _result(index, UserUpsertStatus.CONFLICT)
+                continue
+            seen_usernames.add(obj_in.username)
+            seen_emails.add(obj_in.email)
+            candidates.append(index)
+        
+        insert = _dialect_insert(session)
+        applied_count = 0
+        try:
+            for start in range(0, len(candidates), chunk_size):
+                chunk = candidates[start:start + chunk_size]
+                
+                # 3. 他のユーザーが使用しているusername/emailのチェック（キー列のみを1回のクエリで取得）
+                result = await session.execute(
+                    select(User.id, User.username, User.email).filter(
+                        or_(
+                            User.username.in_([obj_in_list[i].username for i in chunk]),
+                            User.email.in_([obj_in_list[i].email for i in chunk])
+                        )
+                    )
+                )
+                username_owners, email_owners = {}, {}
+                for row in result.all():
+                    username_owners[row.username] = row.id
+                    email_owners[row.email] = row.id
+                
+                rows = []
+                now = datetime.now(ZoneInfo(settings.TZ))
+                for index in chunk:
+                    obj_in = obj_in_list[index]
+                    if username_owners.get(obj_in.username, obj_in.id) != obj_in.id \
+                            or email_owners.get(obj_in.email, obj_in.id) != obj_in.id:
+                        results[index] = _result(index, UserUpsertStatus.CONFLICT)
+                        continue
+                    rows.append((index, {
+                        "id": obj_in.id,
+                        "username": obj_in.username,
+                        "full_name": obj_in.full_name,
+                        "email": obj_in.email,
+                        "is_active": obj_in.is_active,
+                        "is_superuser": obj_in.is_superuser,
+                        "version": obj_in.version,
+                        "created_at": now,
+                        "updated_at": now,
+                    }))
+                if not rows:
+                    continue
+                
+                # 4. 複数行のINSERT ... ON CONFLICT DO UPDATE（より新しいバージョンの場合のみ更新）
+                stmt = insert(User).values([row for _, row in rows])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[User.id],
+                    set_={
+                        "username": stmt.excluded.username,
+                        "full_name": stmt.excluded.full_name,
+                        "email": stmt.excluded.email,
+                        "is_active": stmt.excluded.is_active,
+                        "is_superuser": stmt.excluded.is_superuser,
+                        "version": stmt.excluded.version,
+                        "updated_at": stmt.excluded.updated_at,
+                    },
+                    where=User.version < stmt.excluded.version
+                ).returning(User.id)
+                result = await session.execute(stmt)
+                applied = set(result.scalars().all())
+                
+                for index, _ in rows:
+                    if obj_in_list[index].id in applied:
+                        results[index] = _result(index, UserUpsertStatus.APPLIED)
+                        applied_count += 1
+                        enqueue_user_event(session, UserEventTypes.USER_UPDATED, {
+                            "id": obj_in_list[index].id,
+                            "username": obj_in_list[index].username,
+                            "version": obj_in_list[index].version
+                        })
+                    else:
+                        results[index] = _result(index, UserUpsertStatus.STALE)
+        except IntegrityError as e:
+            # チェック後に並行して他のユーザーが同じusername/emailを使用した場合
+            self.logger.error(f"Database integrity error while upserting users: {str(e)}")
+            raise DatabaseIntegrityError("Database integrity error") from e
+        # commitはsessionのfinallyで行う
+        self.logger.info(f"Upsert finished: {applied_count} applied, {len(obj_in_list) - applied_count} skipped")
+        return results
+    
     async def get_all(self, session: AsyncSession) -> List[User]:
         self.logger.info("Retrieving all users")
         try:
@@ -115,9 +383,77 @@ class CRUDUser:
             self.logger.error(f"Error retrieving all users: {str(e)}")
             raise DatabaseQueryError(f"Failed to retrieve all users: {str(e)}") from e
 
+    async def get_page(
+            self,
+            session: AsyncSession,
+            limit: int,
+            cursor: Optional[str] = None,
+            username_prefix: Optional[str] = None,
+            email_domain: Optional[str] = None,
+            is_active: Optional[bool] = None,
+            include_total: bool = False
+            ) -> Tuple[List[User], Optional[str], Optional[int]]:
+        """
+        (created_at, id)のキーセットでユーザーをページ単位に取得する
+        
+        Args:
+            session: データベースセッション
+            limit: 1ページの最大件数
+            cursor: 前ページのnext_cursor（省略時は先頭から）
+            username_prefix: ユーザー名の前方一致条件
+            email_domain: メールアドレスのドメイン条件
+            is_active: 有効/無効の条件
+            include_total: Trueの場合、条件に一致する件数の推定値も返す
+            
+        Returns:
+            (ユーザーのリスト, 次ページのカーソル, 推定件数)
+        """
+        self.logger.info(f"Retrieving user page: limit={limit}, cursor={cursor}")
+        stmt = select(User)
+        if username_prefix:
+            stmt = stmt.filter(User.username.startswith(username_prefix, autoescape=True))
+        if email_domain:
+            stmt = stmt.filter(User.email.endswith(f"@{email_domain.lower()}", autoescape=True))
+        if is_active is not None:
+            stmt = stmt.filter(User.is_active == is_active)
+        page_stmt = after_cursor(stmt, User, cursor).limit(limit + 1)
+        try:
+            estimated_total = await estimate_row_count(session, stmt) if include_total else None
+            result = await session.execute(page_stmt)
+            users = list(result.scalars().all())
+        except Exception as e:
+            self.logger.error(f"Error retrieving user page: {str(e)}")
+            raise DatabaseQueryError(f"Failed to retrieve user page: {str(e)}") from e
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor(users[-1].created_at, users[-1].id)
+        self.logger.info(f"Retrieved {len(users)} users")
+        return users, next_cursor, estimated_total
+
     async def get_by_id(self, session: AsyncSession, id: uuid.UUID) -> User:
+        """
+        IDでユーザーを取得する
+        
+        呼び出し元のセッションに読み込み済みで期限切れでない場合は、クエリを発行せずにそのオブジェクトを返す。
+        同じIDに対する取得が同時に実行中の場合は、そのクエリの結果を共有する。
+        共有するクエリは呼び出し元のセッションではなく専用のセッションで実行し、切り離された結果を
+        クエリを発行せずに呼び出し元のセッションへmergeして返す。
+        """
+        loaded = session.identity_map.get(session.identity_key(User, id))
+        if loaded is not None and not inspect(loaded).expired_attributes:
+            return loaded
+        user = await self._id_flight.do(str(id), lambda: self._load_by_id(session, id))
+        return await session.merge(user, load=False)
+
+    async def _load_by_id(self, session: AsyncSession, id: uuid.UUID) -> User:
+        # 複数のリクエストで共有するため、リクエストのセッションではなく同じエンジンの専用のセッションを使う
+        async with AsyncSessionLocal(bind=session.bind) as flight_session:
+            return await self._get_by_id(flight_session, id)
+
+    async def _get_by_id(self, session: AsyncSession, id: uuid.UUID) -> User:
         self.logger.info(f"Retrieving user by id: {id}")
-        result = await session.execute(select(User).filter(User.id == id))
+        result = await session.execute(_SELECT_BY_ID, {"id": id})
         user = result.scalar_one_or_none()
         if user:
             self.logger.info(f"Found user with id: {id}")
@@ -126,4 +462,33 @@ class CRUDUser:
             raise UserNotFoundError(user_id=id)
         return user
 
+    async def get_by_ids(self, session: AsyncSession, ids: List[uuid.UUID]) -> List[User]:
+        """
+        複数のIDに対応するユーザーを1回のINクエリで取得する
+        
+        見つからないIDは結果に含まれない。結果の順序は保証しない。
+        """
+        self.logger.info(f"Retrieving users by ids: {len(ids)} ids")
+        if not ids:
+            return []
+        try:
+            result = await session.execute(_SELECT_BY_IDS, {"ids": list(set(ids))})
+            users = list(result.scalars().all())
+        except Exception as e:
+            self.logger.error(f"Error retrieving users by ids: {str(e)}")
+            raise DatabaseQueryError(f"Failed to retrieve users by ids: {str(e)}") from e
+        self.logger.info(f"Found {len(users)} of {len(ids)} users")
+        return users
+
 user_crud = CRUDUser()
+
+
+async def _batch_load_users(ids: List[uuid.UUID]) -> Dict[uuid.UUID, User]:
+    # 複数のリクエストからの取得をまとめるため、リクエストのセッションではなく専用のセッションを使う
+    async with AsyncSessionLocal() as session:
+        users = await user_crud.get_by_ids(session, ids)
+    return {user.id: user for user in users}
+
+
+# 同じティック内のget_by_idをまとめて1回のINクエリで解決するローダー（ワーカープロセス単位）
+user_loader: DataLoader[uuid.UUID, User] = DataLoader(_batch_load_users, max_batch_size=settings.USER_BATCH_MAX_IDS)
@@ -11,9 +11,18 @@ from fastapi.responses import JSONResponse
 from app.api.v1.api import api_router
 from app.core.config import settings
 from app.core.logging import app_logger, get_request_logger
+from app.core.singleflight import singleflight_stats
 from app.db.init import Database
-from app.messaging.rabbitmq import rabbitmq_client
-from app.messaging.user_handler import handle_user_creation_request
+from app.core.user_cache import user_cache
+from app.messaging.dedup import message_deduplicator
+from app.messaging.metrics import messaging_metrics
+from app.messaging.outbox import outbox_relay
+from app.messaging.rabbitmq import UserEventTypes, rabbitmq_client
+from app.messaging.user_handler import (
+    handle_user_cache_invalidation,
+    handle_user_creation_batch,
+    handle_user_creation_request
+)
 
 
 # ログディレクトリの作成（ファイルログが有効な場合）
@@ -37,9 +46,28 @@ async def lifespan(app: FastAPI):
         app_logger.info("RabbitMQ initialized successfully")
         
         # ユーザー作成リクエストのコンシューマーをセットアップ
-        await rabbitmq_client.setup_user_creation_consumer(handle_user_creation_request)
+        await rabbitmq_client.setup_user_creation_consumer(
+            handle_user_creation_request,
+            batch_callback=handle_user_creation_batch
+        )
         app_logger.info("User creation consumer setup successfully")
         
+        # ユーザー情報キャッシュを無効化するイベントのコンシューマーをセットアップ
+        await rabbitmq_client.setup_user_event_consumer(
+            handle_user_cache_invalidation,
+            [UserEventTypes.USER_UPDATED, UserEventTypes.USER_DELETED]
+        )
+        app_logger.info("User cache invalidation consumer setup successfully")
+        
+        # アウトボックスのリレーを開始
+        if settings.OUTBOX_RELAY_ENABLED:
+            outbox_relay.start()
+            app_logger.info("Outbox relay started successfully")
+        
+        # 処理済みメッセージの記録（重複排除）の定期的な削除を開始
+        if settings.MESSAGE_DEDUP_ENABLED:
+            message_deduplicator.start()
+        
     except Exception as e:
         app_logger.error(f"Initialization failed: {str(e)}")
         raise
@@ -49,6 +77,17 @@ async def lifespan(app: FastAPI):
     # シャットダウンの処理
     app_logger.info("Shutting down application...")
     
+    # コンシューマーの受信を止め、処理中のメッセージと発行の確認を待つ
+    # （uvicornは処理中のHTTPリクエストを待ってからこの処理を呼び出す）
+    try:
+        await rabbitmq_client.drain(settings.SHUTDOWN_DRAIN_TIMEOUT_SECONDS)
+    except Exception as e:
+        app_logger.error(f"Error draining RabbitMQ consumers: {str(e)}")
+    
+    # アウトボックスのリレーを停止（処理中のバッチの送信を待つ）
+    await outbox_relay.stop()
+    await message_deduplicator.stop()
+    
     # RabbitMQ接続のクローズ
     try:
         await rabbitmq_client.close()
@@ -167,6 +206,53 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+# シングルフライト（同時実行中の取得の共有）の統計情報
+@app.get("/metrics/singleflight")
+async def get_singleflight_metrics():
+    return singleflight_stats()
+
+# ユーザー情報キャッシュの統計情報
+@app.get("/metrics/user-cache")
+async def get_user_cache_metrics():
+    return user_cache.stats()
+
+# アウトボックスのリレーの統計情報（送信数・失敗数・遅延）
+@app.get("/metrics/outbox")
+async def get_outbox_metrics():
+    return outbox_relay.stats()
+
+# メッセージの重複排除の統計情報（処理済みとしてスキップした件数など）
+@app.get("/metrics/dedup")
+async def get_dedup_metrics():
+    return message_deduplicator.stats()
+
+# メッセージ発行の統計情報（確認待ち件数・確認の遅延・nack数）
+@app.get("/metrics/publisher")
+async def get_publisher_metrics():
+    return rabbitmq_client.publisher.stats()
+
+# メッセージ受信の統計情報（処理数・処理中の件数・処理時間）
+@app.get("/metrics/consumers")
+async def get_consumer_metrics():
+    return {name: consumer.stats() for name, consumer in rabbitmq_client.consumers.items()}
+
+# チャネルの統計情報（用途・開き直した回数・エラー数・発行数）
+@app.get("/metrics/channels")
+async def get_channel_metrics():
+    return rabbitmq_client.channels.stats()
+
+# 再試行・デッドレターの統計情報（再試行数・DLQに送った件数）
+@app.get("/metrics/retry")
+async def get_retry_metrics():
+    return {name: policy.stats() for name, policy in rabbitmq_client.retry_policies.items()}
+
+# メッセージングの計測値（exchangeごとの発行レート・確認時間、キューごとの滞留件数・ack/nack数、
+# イベントタイプごとのハンドラーの処理時間）
+@app.get("/metrics/messaging")
+async def get_messaging_metrics():
+    await rabbitmq_client.refresh_queue_depths()
+    return messaging_metrics.stats()
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -176,4 +262,9 @@ if __name__ == "__main__":
         f"(Log level: {settings.LOG_LEVEL})"
     )
     
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8080,
+        timeout_graceful_shutdown=settings.SHUTDOWN_HTTP_TIMEOUT_SECONDS
+    )
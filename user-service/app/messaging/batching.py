@@ -0,0 +1,189 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aio_pika import IncomingMessage
+
+from app.core.logging import get_logger
+from app.messaging.metrics import event_type_of, messaging_metrics
+
+
+logger = get_logger(__name__)
+
+
+class BatchingConsumer:
+    """
+    受信したメッセージをまとめてバッチ単位で処理する
+
+    max_batch_size件に達するか、最初のメッセージの受信からmax_wait_msが経過した時点で
+    バッチを確定し、handlerに渡す。バッチは受信順に1つずつ処理するため、
+    バッチの最後のメッセージをmultiple=Trueでackすればバッチ全体をまとめてackできる
+    （専用のチャネルで受信している場合に限る）。
+    バッチの処理時間は「イベントタイプ[batch]」の処理時間としてmessaging_metricsに記録する。
+    シャットダウン時はdrain()で処理中のバッチの完了を待ってから停止する。
+
+    Args:
+        name: 統計情報に表示するコンシューマー名
+        handler: バッチ（受信順のメッセージのリスト）を処理する関数
+        max_batch_size: 1バッチの最大件数
+        max_wait_ms: バッチを確定するまでの最大待機時間
+    """
+
+    def __init__(
+            self,
+            name: str,
+            handler: Callable[[List[IncomingMessage]], Awaitable[None]],
+            max_batch_size: int,
+            max_wait_ms: float
+            ):
+        self.name = name
+        self._handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._buffer: List[IncomingMessage] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches: Optional["asyncio.Queue[List[IncomingMessage]]"] = None
+        self._worker: Optional["asyncio.Task[None]"] = None
+        self._processing: List[IncomingMessage] = []
+        self._idle: Optional[asyncio.Event] = None
+        self.draining = False
+        # 統計情報
+        self.drained_total = 0  # 停止時に処理中のバッチに含まれ、期限内に処理を終えた件数
+        self.returned_total = 0  # 停止時に未着手のためキューに戻した件数
+        self.aborted_total = 0  # 期限までに処理が終わらず中断した件数
+        self.received_total = 0
+        self.batches_total = 0
+        self.failed_batches_total = 0
+        self.last_batch_size = 0
+        self.batched_messages_total = 0
+        self.handler_ms_total = 0.0
+        self.handler_ms_max = 0.0
+
+    def start(self):
+        """バッチを処理するワーカーを開始する"""
+        if self._worker is not None:
+            return
+        self._batches = asyncio.Queue()
+        self._worker = asyncio.create_task(self._work())
+        logger.info(f"Batching consumer {self.name} started: max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait_ms}")
+
+    async def dispatch(self, message: IncomingMessage):
+        """受信したメッセージをバッファに追加する（queue.consumeのコールバック）"""
+        if self.draining:
+            # 受信の停止（cancel）前に届いたメッセージは処理せずにキューに戻す
+            await self._return(message)
+            return
+        if self._worker is None:
+            self.start()
+        self.received_total += 1
+        self._buffer.append(messaging_metrics.track(self.name, message))
+        if len(self._buffer) >= self.max_batch_size:
+            self._seal()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait_ms / 1000, self._seal)
+
+    def _seal(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        self._batches.put_nowait(batch)
+
+    async def _work(self):
+        while True:
+            batch = await self._batches.get()
+            self._processing = batch
+            started = time.perf_counter()
+            try:
+                async with messaging_metrics.processing(f"{event_type_of(batch[0])}[batch]"):
+                    await self._handler(batch)
+            except Exception as e:
+                self.failed_batches_total += 1
+                logger.error(f"Batching consumer {self.name} handler error: {str(e)}", exc_info=True)
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.batches_total += 1
+                self.last_batch_size = len(batch)
+                self.batched_messages_total += len(batch)
+                self.handler_ms_total += elapsed_ms
+                self.handler_ms_max = max(self.handler_ms_max, elapsed_ms)
+                self._processing = []
+                self._batches.task_done()
+                if self._idle is not None:
+                    self._idle.set()
+
+    async def _return(self, message: IncomingMessage):
+        self.returned_total += 1
+        try:
+            await message.nack(requeue=True)
+        except Exception as e:
+            # チャネルが閉じている場合はブローカーが再配信する
+            logger.warning(f"Batching consumer {self.name} could not return message: {str(e)}")
+
+    async def drain(self, timeout: float) -> Dict[str, int]:
+        """
+        新しいバッチの処理を止め、処理中のバッチの完了をtimeout秒まで待ってからワーカーを停止する
+
+        受信の停止（queue.cancel）は呼び出し元で行う。確定前のバッファと未着手のバッチの
+        メッセージはnack（requeue）して他のインスタンスに処理させる。
+
+        Returns:
+            期限内に処理を終えた件数（drained）、キューに戻した件数（returned）、中断した件数（aborted）
+        """
+        self.draining = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._buffer = self._buffer, []
+        while self._batches is not None and not self._batches.empty():
+            pending.extend(self._batches.get_nowait())
+            self._batches.task_done()
+        for message in pending:
+            await self._return(message)
+
+        in_flight = len(self._processing)
+        self._idle = asyncio.Event()
+        if not self._processing:
+            self._idle.set()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Batching consumer {self.name} drain timed out with a batch of {in_flight} in progress")
+        aborted = len(self._processing)
+        await self.stop()
+
+        drained = in_flight - aborted
+        self.drained_total += drained
+        self.aborted_total += aborted
+        return {"drained": drained, "returned": len(pending), "aborted": aborted}
+
+    async def stop(self):
+        """ワーカーを停止する"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "received_total": self.received_total,
+            "batches_total": self.batches_total,
+            "failed_batches_total": self.failed_batches_total,
+            "avg_batch_size": self.batched_messages_total / self.batches_total if self.batches_total else 0.0,
+            "last_batch_size": self.last_batch_size,
+            "buffered": len(self._buffer),
+            "queued_batches": self._batches.qsize() if self._batches is not None else 0,
+            "draining": self.draining,
+            "drained_total": self.drained_total,
+            "returned_total": self.returned_total,
+            "aborted_total": self.aborted_total,
+            "handler_ms_avg": self.handler_ms_total / self.batches_total if self.batches_total else 0.0,
+            "handler_ms_max": self.handler_ms_max,
+        }
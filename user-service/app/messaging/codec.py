@@ -0,0 +1,140 @@
+from typing import Any, Dict, Optional, Tuple
+
+import aio_pika
+from aio_pika import Message
+from pydantic_core import from_json, to_json, to_jsonable_python
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.schemas.message import MESSAGE_SCHEMA_VERSION, MessageEnvelope
+
+try:
+    import msgpack
+except ImportError:  # msgpackがない環境ではJSONのみを使う
+    msgpack = None
+
+
+logger = get_logger(__name__)
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+# consistent-hash exchangeでシャードのキューを選ぶために使うヘッダー
+SHARD_KEY_HEADER = "x-shard-key"
+
+
+class MessageDecodeError(ValueError):
+    """メッセージ本文を復元できない（不正な形式、未対応のcontent-type・スキーマバージョン）"""
+    pass
+
+
+def supported_content_types() -> Tuple[str, ...]:
+    """この環境で送受信できるcontent-type"""
+    return (JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE) if msgpack is not None else (JSON_CONTENT_TYPE,)
+
+
+def negotiate_content_type(preferred: Optional[str] = None) -> str:
+    """
+    送信に使うcontent-typeを決める
+
+    設定（MESSAGE_CONTENT_TYPE）または指定されたcontent-typeがこの環境で使えない場合はJSONにする。
+    コンシューマーは常にどちらの形式も受信できるため、送信側を切り替えるだけでよい。
+    """
+    content_type = preferred or settings.MESSAGE_CONTENT_TYPE
+    if content_type in supported_content_types():
+        return content_type
+    logger.warning(f"Content type {content_type} is not available, falling back to {JSON_CONTENT_TYPE}")
+    return JSON_CONTENT_TYPE
+
+
+def encode_envelope(envelope: MessageEnvelope, content_type: Optional[str] = None) -> Tuple[bytes, str]:
+    """
+    エンベロープをメッセージ本文に変換する
+
+    UUIDやdatetimeを含むuser_dataも、Pythonでフィールドを1つずつ変換せずに
+    pydantic-core（Rust）のシリアライザでまとめて変換する。
+
+    Returns:
+        (本文, content-type)
+    """
+    content_type = negotiate_content_type(content_type)
+    if content_type == MSGPACK_CONTENT_TYPE:
+        return msgpack.packb(to_jsonable_python(envelope)), content_type
+    return to_json(envelope), content_type
+
+
+def event_message(
+        event_type: str,
+        user_data: Dict[str, Any],
+        message_id: Optional[str] = None,
+        content_type: Optional[str] = None
+        ) -> Message:
+    """
+    イベントタイプとデータからエンベロープを作成し、送信するメッセージを返す
+
+    AMQPのmessage_idにはエンベロープと同じIDを設定する（コンシューマーの重複排除に使う）。
+    AMQPのtypeにはイベントタイプを設定する（本文を復元せずに処理時間をイベントタイプごとに記録するため）。
+    x-shard-keyヘッダーにはuser_dataのMESSAGE_SHARD_KEY_FIELDの値を設定する
+    （同じユーザーのイベントが同じシャードのキューに届くようにするため。値がなければmessage_idで分散させる）。
+    """
+    fields = {"message_id": message_id} if message_id else {}
+    envelope = MessageEnvelope(
+        source_service=settings.MESSAGE_SOURCE_SERVICE,
+        event_type=event_type,
+        user_data=user_data,
+        **fields
+    )
+    body, content_type = encode_envelope(envelope, content_type)
+    shard_key = user_data.get(settings.MESSAGE_SHARD_KEY_FIELD) if settings.MESSAGE_SHARD_KEY_FIELD else None
+    return Message(
+        body=body,
+        headers={SHARD_KEY_HEADER: str(shard_key if shard_key is not None else envelope.message_id)},
+        content_type=content_type,
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        message_id=str(envelope.message_id),
+        type=event_type
+    )
+
+
+def decode_body(body: bytes, content_type: Optional[str] = None) -> Any:
+    """
+    メッセージ本文をcontent-typeに応じて復元する
+
+    エンベロープのほか、schema_versionを持たない従来のメッセージもそのまま返す。
+    スキーマバージョンがこのサービスより新しい場合は、処理せずにDLQに送れるよう例外を送出する。
+    """
+    try:
+        if content_type == MSGPACK_CONTENT_TYPE:
+            if msgpack is None:
+                raise MessageDecodeError(f"Content type {content_type} is not supported")
+            data = msgpack.unpackb(body, raw=False)
+        else:
+            data = from_json(body)
+    except MessageDecodeError:
+        raise
+    except Exception as e:
+        raise MessageDecodeError(f"Invalid message body ({content_type or JSON_CONTENT_TYPE}): {str(e)}") from e
+    if isinstance(data, dict) and data.get("schema_version", MESSAGE_SCHEMA_VERSION) > MESSAGE_SCHEMA_VERSION:
+        raise MessageDecodeError(f"Unsupported schema version: {data['schema_version']}")
+    return data
+
+
+def encode_body(data: Any, content_type: Optional[str] = None) -> bytes:
+    """
+    decode_bodyで復元した本文を同じcontent-typeのメッセージ本文に戻す
+
+    再試行回数を書き換えて再送する場合などに、受信したメッセージの形式を保ったまま送り直すために使う。
+    """
+    if content_type == MSGPACK_CONTENT_TYPE:
+        if msgpack is None:
+            raise MessageDecodeError(f"Content type {content_type} is not supported")
+        return msgpack.packb(to_jsonable_python(data))
+    return to_json(data)
+
+
+def decode_envelope(body: bytes, content_type: Optional[str] = None) -> MessageEnvelope:
+    """メッセージ本文をエンベロープとして復元する"""
+    data = decode_body(body, content_type)
+    try:
+        return MessageEnvelope.model_validate(data)
+    except Exception as e:
+        raise MessageDecodeError(f"Invalid message envelope: {str(e)}") from e
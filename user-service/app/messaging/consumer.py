@@ -0,0 +1,197 @@
+import asyncio
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aio_pika import IncomingMessage
+
+from app.core.logging import get_logger
+from app.messaging.codec import decode_body
+from app.messaging.metrics import event_type_of, messaging_metrics
+
+
+logger = get_logger(__name__)
+
+
+class ConsumerRuntime:
+    """
+    キューから受信したメッセージを上限付きのワーカーで並行処理する
+
+    ブローカーから同時に受け取る件数はチャネルのprefetch（set_qos）で制限し、
+    受け取ったメッセージはconcurrency個のワーカーが処理する。
+    受信・ack/nackの件数とイベントタイプごとの処理時間はmessaging_metricsに記録する。
+    シャットダウン時はdrain()で処理中のメッセージの完了を待ってから停止する。
+    ordering_keyを指定した場合は、同じキーのメッセージを常に同じワーカーに割り当てるため、
+    キーごとの受信順は保たれる（キーが異なるメッセージは並行に処理される）。
+
+    Args:
+        name: 統計情報に表示するコンシューマー名
+        handler: 1件のメッセージを処理する関数（ack/nackはhandler内で行う）
+        concurrency: ワーカー数（同時に処理する最大件数）
+        ordering_key: メッセージから順序を保つキーを取り出す関数（Noneを返した場合は順序を保証しない）
+    """
+
+    def __init__(
+            self,
+            name: str,
+            handler: Callable[[IncomingMessage], Awaitable[None]],
+            concurrency: int,
+            ordering_key: Optional[Callable[[IncomingMessage], Optional[str]]] = None
+            ):
+        self.name = name
+        self._handler = handler
+        self.concurrency = concurrency
+        self._ordering_key = ordering_key
+        self._queues: List["asyncio.Queue[IncomingMessage]"] = []
+        self._workers: List["asyncio.Task[None]"] = []
+        self._next_worker = 0
+        self._idle: Optional[asyncio.Event] = None
+        self.draining = False
+        # 統計情報
+        self.received_total = 0
+        self.processed_total = 0
+        self.failed_total = 0
+        self.in_progress = 0
+        self.drained_total = 0  # 停止時に処理中で、期限内に処理を終えた件数
+        self.returned_total = 0  # 停止時に未着手のためキューに戻した件数
+        self.aborted_total = 0  # 期限までに処理が終わらず中断した件数
+        self.handler_ms_total = 0.0
+        self.handler_ms_max = 0.0
+
+    def start(self):
+        """ワーカーを開始する"""
+        if self._workers:
+            return
+        # 順序を保つ場合はワーカーごとにキューを持ち、そうでなければ1つのキューを共有する
+        queue_count = self.concurrency if self._ordering_key else 1
+        self._queues = [asyncio.Queue() for _ in range(queue_count)]
+        self._workers = [
+            asyncio.create_task(self._work(self._queues[i % queue_count]))
+            for i in range(self.concurrency)
+        ]
+        logger.info(f"Consumer {self.name} started: concurrency={self.concurrency}, ordered={self._ordering_key is not None}")
+
+    async def dispatch(self, message: IncomingMessage):
+        """受信したメッセージをワーカーに割り当てる（queue.consumeのコールバック）"""
+        if self.draining:
+            # 受信の停止（cancel）前に届いたメッセージは処理せずにキューに戻す
+            await self._return(message)
+            return
+        if not self._workers:
+            self.start()
+        self.received_total += 1
+        message = messaging_metrics.track(self.name, message)
+        self._select_queue(message).put_nowait(message)
+
+    def _select_queue(self, message: IncomingMessage) -> "asyncio.Queue[IncomingMessage]":
+        if len(self._queues) == 1:
+            return self._queues[0]
+        key = None
+        try:
+            key = self._ordering_key(message)
+        except Exception as e:
+            logger.warning(f"Consumer {self.name} could not extract ordering key: {str(e)}")
+        if key is None:
+            # キーがないメッセージは順番に割り当てる
+            self._next_worker = (self._next_worker + 1) % len(self._queues)
+            return self._queues[self._next_worker]
+        # プロセス間で同じ割り当てになるよう、hash()ではなくCRC32を使う
+        return self._queues[zlib.crc32(key.encode()) % len(self._queues)]
+
+    async def _work(self, queue: "asyncio.Queue[IncomingMessage]"):
+        while True:
+            message = await queue.get()
+            self.in_progress += 1
+            started = time.perf_counter()
+            try:
+                async with messaging_metrics.processing(event_type_of(message)):
+                    await self._handler(message)
+                self.processed_total += 1
+            except Exception as e:
+                self.failed_total += 1
+                logger.error(f"Consumer {self.name} handler error: {str(e)}", exc_info=True)
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.handler_ms_total += elapsed_ms
+                self.handler_ms_max = max(self.handler_ms_max, elapsed_ms)
+                self.in_progress -= 1
+                queue.task_done()
+                if self._idle is not None and self.in_progress == 0:
+                    self._idle.set()
+
+    async def _return(self, message: IncomingMessage):
+        self.returned_total += 1
+        try:
+            await message.nack(requeue=True)
+        except Exception as e:
+            # チャネルが閉じている場合はブローカーが再配信する
+            logger.warning(f"Consumer {self.name} could not return message: {str(e)}")
+
+    async def drain(self, timeout: float) -> Dict[str, int]:
+        """
+        新しいメッセージの処理を止め、処理中のメッセージの完了をtimeout秒まで待ってからワーカーを停止する
+
+        受信の停止（queue.cancel）は呼び出し元で行う。ワーカーのキューに残っている
+        未着手のメッセージはnack（requeue）して他のインスタンスに処理させる。
+
+        Returns:
+            期限内に処理を終えた件数（drained）、キューに戻した件数（returned）、中断した件数（aborted）
+        """
+        self.draining = True
+        returned = 0
+        for queue in self._queues:
+            while not queue.empty():
+                message = queue.get_nowait()
+                queue.task_done()
+                await self._return(message)
+                returned += 1
+
+        in_flight = self.in_progress
+        self._idle = asyncio.Event()
+        if self.in_progress == 0:
+            self._idle.set()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Consumer {self.name} drain timed out with {self.in_progress} messages in progress")
+        aborted = self.in_progress
+        await self.stop()
+
+        drained = in_flight - aborted
+        self.drained_total += drained
+        self.aborted_total += aborted
+        return {"drained": drained, "returned": returned, "aborted": aborted}
+
+    async def stop(self):
+        """ワーカーを停止する"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queues = []
+
+    def stats(self) -> Dict[str, Any]:
+        handled = self.processed_total + self.failed_total
+        return {
+            "concurrency": self.concurrency,
+            "ordered": self._ordering_key is not None,
+            "received_total": self.received_total,
+            "processed_total": self.processed_total,
+            "failed_total": self.failed_total,
+            "in_progress": self.in_progress,
+            "queued": sum(queue.qsize() for queue in self._queues),
+            "draining": self.draining,
+            "drained_total": self.drained_total,
+            "returned_total": self.returned_total,
+            "aborted_total": self.aborted_total,
+            "handler_ms_avg": self.handler_ms_total / handled if handled else 0.0,
+            "handler_ms_max": self.handler_ms_max,
+        }
+
+
+def user_data_ordering_key(field: str) -> Callable[[IncomingMessage], Optional[str]]:
+    """メッセージのuser_dataの指定したフィールド（usernameなど）を順序キーとする関数を返す"""
+    def ordering_key(message: IncomingMessage) -> Optional[str]:
+        value = decode_body(message.body, message.content_type).get("user_data", {}).get(field)
+        return str(value) if value is not None else None
+    return ordering_key
@@ -0,0 +1,163 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+from aio_pika import IncomingMessage
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.session import AsyncSessionLocal
+from app.messaging.codec import MessageDecodeError, decode_body
+from app.models.processed_message import ProcessedMessage
+
+
+logger = get_logger(__name__)
+
+
+def message_id_of(message: IncomingMessage) -> Optional[str]:
+    """メッセージのmessage_idプロパティ、なければ本文のmessage_idを返す"""
+    if message.message_id:
+        return message.message_id
+    try:
+        body = decode_body(message.body, message.content_type)
+    except MessageDecodeError:
+        return None
+    if isinstance(body, dict) and body.get("message_id"):
+        return str(body["message_id"])
+    return None
+
+
+class MessageDeduplicator:
+    """
+    message_idによるコンシューマーの重複排除
+
+    処理済みのmessage_idをprocessed_messagesテーブルに、メッセージの処理結果と同じ
+    トランザクションで記録する。コミットされたメッセージが再配信された場合は記録から検出して
+    処理をスキップし、処理がロールバックされた場合は記録も残らないため再試行できる。
+    同じメッセージが並行して処理された場合は一意制約によって一方のコミットが失敗する。
+    これによりat-least-onceの配信を実質的にexactly-onceとして処理する。
+    記録は保持期間（MESSAGE_DEDUP_RETENTION_HOURS）を過ぎると定期的に削除する。
+
+    Args:
+        session_factory: 記録の削除に使うセッションファクトリ（省略時はAsyncSessionLocal）
+        retention_hours: 処理済みの記録の保持期間
+        purge_interval: 保持期間を過ぎた記録を削除する間隔（秒）
+    """
+
+    def __init__(
+            self,
+            session_factory: Optional[Callable] = None,
+            retention_hours: Optional[float] = None,
+            purge_interval: Optional[float] = None
+            ):
+        self._session_factory = session_factory
+        self.retention_hours = retention_hours or settings.MESSAGE_DEDUP_RETENTION_HOURS
+        self.purge_interval = purge_interval or settings.MESSAGE_DEDUP_PURGE_INTERVAL_SECONDS
+        self._task: Optional[asyncio.Task] = None
+        # 統計情報
+        self.claimed_total = 0
+        self.duplicates_total = 0
+        self.purged_total = 0
+
+    async def claim(self, session: AsyncSession, consumer: str, message_id: Optional[str]) -> bool:
+        """
+        メッセージを処理済みとして記録する（コミットは呼び出し元のトランザクションで行う）
+
+        Returns:
+            処理すべきメッセージの場合はTrue、処理済みのメッセージの場合はFalse
+        """
+        return (await self.claim_many(session, consumer, [message_id]))[0]
+
+    async def claim_many(
+            self,
+            session: AsyncSession,
+            consumer: str,
+            message_ids: Sequence[Optional[str]]
+            ) -> List[bool]:
+        """
+        複数のメッセージを1回のクエリで確認して処理済みとして記録する
+
+        Returns:
+            message_idsと同じ順序の、処理すべきかどうかのリスト
+            （処理済みのメッセージと、同じ呼び出し内で重複したメッセージはFalse）
+        """
+        if not settings.MESSAGE_DEDUP_ENABLED:
+            return [True] * len(message_ids)
+        keys = {message_id for message_id in message_ids if message_id}
+        processed = set()
+        if keys:
+            result = await session.execute(
+                select(ProcessedMessage.message_id).where(
+                    ProcessedMessage.consumer == consumer,
+                    ProcessedMessage.message_id.in_(keys)
+                )
+            )
+            processed = set(result.scalars().all())
+        claims = []
+        for message_id in message_ids:
+            if not message_id:
+                # message_idのないメッセージは重複を判定できないため、そのまま処理する
+                claims.append(True)
+            elif message_id in processed:
+                self.duplicates_total += 1
+                logger.info(f"Skipping already processed message {message_id} for {consumer}")
+                claims.append(False)
+            else:
+                session.add(ProcessedMessage(consumer=consumer, message_id=message_id))
+                processed.add(message_id)
+                self.claimed_total += 1
+                claims.append(True)
+        return claims
+
+    async def purge_once(self) -> int:
+        """保持期間を過ぎた処理済みの記録を削除する"""
+        cutoff = datetime.now(ZoneInfo(settings.TZ)) - timedelta(hours=self.retention_hours)
+        session_factory = self._session_factory or AsyncSessionLocal
+        async with session_factory() as session:
+            result = await session.execute(
+                delete(ProcessedMessage)
+                .where(ProcessedMessage.created_at < cutoff)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        purged = result.rowcount or 0
+        self.purged_total += purged
+        if purged:
+            logger.info(f"Purged {purged} processed message records older than {cutoff.isoformat()}")
+        return purged
+
+    async def _run(self):
+        while True:
+            try:
+                await self.purge_once()
+            except Exception as e:
+                logger.error(f"Processed message purge error: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.purge_interval)
+
+    def start(self):
+        """保持期間を過ぎた記録の定期的な削除を開始する"""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """定期的な削除を停止する"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.MESSAGE_DEDUP_ENABLED,
+            "claimed_total": self.claimed_total,
+            "duplicates_total": self.duplicates_total,
+            "purged_total": self.purged_total,
+        }
+
+
+message_deduplicator = MessageDeduplicator()
@@ -1,11 +1,25 @@
-import json
-from typing import Dict, Any, Callable, Awaitable
-import uuid
+import asyncio
+from typing import Dict, Any, Callable, Awaitable, List, Optional
 import aio_pika
-from aio_pika import ExchangeType, Message, IncomingMessage
+from aio_pika import ExchangeType, IncomingMessage
 
 from app.core.config import settings
 from app.core.logging import app_logger
+from app.messaging.batching import BatchingConsumer
+from app.messaging.channels import ChannelManager
+from app.messaging.codec import MessageDecodeError, decode_body, event_message
+from app.messaging import memory_broker
+from app.messaging.metrics import messaging_metrics
+from app.messaging.consumer import ConsumerRuntime, user_data_ordering_key
+from app.messaging.dedup import message_id_of
+from app.messaging.publisher import BufferedPublisher
+from app.messaging.retry import PoisonMessageError, RetryPolicy
+from app.messaging.sharding import (
+    SHARD_QUEUE_ARGUMENTS,
+    declare_shard_queues,
+    parse_owned_shards,
+    shard_queue_name,
+)
 
 
 class RabbitMQClient:
@@ -18,7 +32,36 @@ class RabbitMQClient:
         self.auth_events_exchange = None
         self.logger = app_logger
         self.is_initialized = False
-        self.consumer_tags = []
+        self.consumer_tags = []  # 受信中のキューとコンシューマータグ（停止時に受信をcancelする）
+        self.consumers: Dict[str, Any] = {}  # ConsumerRuntimeまたはBatchingConsumer
+        self.last_drain: Optional[Dict[str, Any]] = None
+        # 発行用のチャネルのプールとキューごとの受信用チャネル（channelはexchangeの宣言などに使う）
+        self.channels = ChannelManager(
+            settings.RABBITMQ_PUBLISHER_CHANNELS,
+            settings.RABBITMQ_CHANNEL_HEALTH_CHECK_INTERVAL_SECONDS
+        )
+        self.publisher = BufferedPublisher(
+            max_in_flight=settings.PUBLISHER_MAX_IN_FLIGHT,
+            batch_size=settings.PUBLISHER_BATCH_SIZE,
+            flush_interval_ms=settings.PUBLISHER_FLUSH_INTERVAL_MS
+        )
+        self.user_creation_retry = self._retry_policy("user_creation_queue")
+        # キュー名ごとの再試行ポリシー（統計情報とDLQの操作用）
+        self.retry_policies: Dict[str, RetryPolicy] = {
+            "user_creation_queue": self.user_creation_retry
+        }
+        # シャーディングする場合はシャードのキューごとに再試行キューとDLQを持つ（再試行したメッセージは同じシャードに戻る）
+        for shard in range(settings.USER_CREATION_SHARDS):
+            name = shard_queue_name("user_creation_queue", shard)
+            self.retry_policies[name] = self._retry_policy(name)
+    
+    def _retry_policy(self, queue_name: str) -> RetryPolicy:
+        return RetryPolicy(
+            queue_name,
+            self.publisher,
+            max_retries=settings.MESSAGE_RETRY_MAX_ATTEMPTS,
+            base_delay_ms=settings.MESSAGE_RETRY_BASE_DELAY_MS
+        )
     
     async def initialize(self):
         """RabbitMQへの接続を初期化"""
@@ -26,14 +69,19 @@ class RabbitMQClient:
             return
         
         try:
-            # RabbitMQ接続文字列の構築
-            rabbitmq_url = f"amqp://{settings.RABBITMQ_USER}:{settings.RABBITMQ_PASSWORD}@{settings.RABBITMQ_HOST}:{settings.RABBITMQ_PORT}/"
-            
-            # 接続の確立
-            self.connection = await aio_pika.connect_robust(rabbitmq_url)
+            if settings.RABBITMQ_BROKER == "memory":
+                # プロセス内のブローカーに接続（テスト・ベンチマーク用）
+                self.connection = await memory_broker.connect()
+            else:
+                # RabbitMQ接続文字列の構築
+                rabbitmq_url = f"amqp://{settings.RABBITMQ_USER}:{settings.RABBITMQ_PASSWORD}@{settings.RABBITMQ_HOST}:{settings.RABBITMQ_PORT}/"
+                
+                # 接続の確立
+                self.connection = await aio_pika.connect_robust(rabbitmq_url)
             
-            # チャネルの開設
-            self.channel = await self.connection.channel()
+            # チャネルの開設（発行したメッセージはブローカーの確認を待つ）
+            self.channel = await self.connection.channel(publisher_confirms=True)
+            self.channels.attach(self.connection)
             
             # exchangeの宣言
             self.user_events_exchange = await self.channel.declare_exchange(
@@ -54,64 +102,198 @@ class RabbitMQClient:
             self.logger.error(f"RabbitMQ接続エラー: {str(e)}", exc_info=True)
             raise
     
+    async def drain(self, timeout: float) -> Dict[str, Any]:
+        """
+        シャットダウンの前にコンシューマーを停止し、処理中のメッセージと発行の確認を待つ
+        
+        1. すべてのキューの受信をcancelし、新しいメッセージを受け取らないようにする
+        2. 処理中のメッセージの完了を待つ（未着手のメッセージはキューに戻す）
+        3. 残りの時間で確認待ちの発行（ハンドラーが送った返信など）の確認を待つ
+        
+        いずれもtimeout秒の期限内で行い、期限を過ぎた処理は中断する（メッセージはブローカーが再配信する）。
+        
+        Returns:
+            コンシューマーごとの件数（drained / returned / aborted）と、発行の確認を待ち終えたか
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        
+        # 新しいメッセージの受信を止める
+        for queue, consumer_tag in self.consumer_tags:
+            try:
+                await queue.cancel(consumer_tag)
+            except Exception as e:
+                # 置き換え済みのチャネルのコンシューマーなど
+                self.logger.debug(f"コンシューマーのキャンセルに失敗しました: {consumer_tag}, {str(e)}")
+        self.consumer_tags = []
+        
+        # 処理中のメッセージの完了を待つ
+        results = await asyncio.gather(*(
+            consumer.drain(max(deadline - loop.time(), 0.0)) for consumer in self.consumers.values()
+        ))
+        report: Dict[str, Any] = {"consumers": dict(zip(self.consumers.keys(), results))}
+        
+        # 発行の確認を待つ（期限を過ぎても送信自体は中断しない）
+        try:
+            await asyncio.wait_for(asyncio.shield(self.publisher.flush()), max(deadline - loop.time(), 0.0))
+            report["publisher_flushed"] = True
+        except asyncio.TimeoutError:
+            report["publisher_flushed"] = False
+        report["in_flight_confirms"] = self.publisher.in_flight
+        
+        self.last_drain = report
+        self.logger.info(f"コンシューマーを停止しました: {report}")
+        return report
+    
     async def close(self):
         """接続のクローズ"""
         if self.connection and not self.connection.is_closed:
+            for consumer in self.consumers.values():
+                await consumer.stop()
+            # 未送信・確認待ちのメッセージを処理してから接続を閉じる
+            await self.publisher.close()
+            await self.channels.close()
             await self.connection.close()
             self.is_initialized = False
             self.logger.info("RabbitMQ接続がクローズされました")
     
-    async def publish_user_event(self, event_type: str, user_data: Dict[str, Any]):
-        """ユーザーイベントの発行"""
+    async def publish_user_event(self, event_type: str, user_data: Dict[str, Any]) -> "asyncio.Future[None]":
+        """
+        ユーザーイベントの発行
+        
+        メッセージはバッファ付きパブリッシャーでまとめて送信される。
+        返されたFutureはブローカーの確認で完了するため、永続化を確認する場合はawaitする。
+        """
         if not self.is_initialized:
             await self.initialize()
         
-        try:
-            # メッセージのJSONシリアライズ
-            message_body = {
-                "event_type": event_type,
-                "user_data": self._serialize_user_data(user_data)
-            }
-            
-            # メッセージの発行
-            await self.auth_events_exchange.publish(
-                Message(
-                    body=json.dumps(message_body).encode(),
-                    content_type="application/json",
-                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
-                ),
-                routing_key="user.created"
-            )
-            
-            self.logger.info(f"ユーザーイベントを発行しました: {event_type}, ユーザーID={user_data.get('id', 'unknown')}")
-        except Exception as e:
-            self.logger.error(f"メッセージ発行エラー: {str(e)}", exc_info=True)
+        # メッセージの発行（エンベロープの形式はMESSAGE_CONTENT_TYPEで選択する）
+        future = self.publisher.publish(
+            await self.channels.exchange("auth_events"),
+            event_message(event_type, user_data),
+            event_type
+        )
+        future.add_done_callback(
+            lambda done: self._log_publish_result(done, event_type, user_data.get('id', 'unknown'))
+        )
+        return future
+    
+    def _log_publish_result(self, future: "asyncio.Future[None]", event_type: str, user_id: Any):
+        """確認結果のログを記録する（Futureをawaitしない呼び出し元のエラーもここで記録する）"""
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
             # エラーはログに記録するが例外は再送出しない
             # メッセージングがサービスの主要機能を妨げるべきではない
+            self.logger.error(f"メッセージ発行エラー: {event_type}, ユーザーID={user_id}: {str(error)}")
+        else:
+            self.logger.info(f"ユーザーイベントを発行しました: {event_type}, ユーザーID={user_id}")
     
-    async def setup_user_creation_consumer(self, callback: Callable[[Dict[str, Any]], Awaitable[None]]):
-        """ユーザー作成リクエストのコンシューマーをセットアップ"""
+    async def publish_message(self, exchange_name: str, routing_key: str, body: Dict[str, Any], message_id: str = None):
+        """
+        メッセージを発行し、ブローカーの確認（publisher confirm）を待つ
+        
+        publish_user_eventと異なり、失敗した場合は例外を送出する（アウトボックスからの送信用）
+        """
         if not self.is_initialized:
             await self.initialize()
         
-        # キューの宣言
-        queue = await self.channel.declare_queue(
-            "user_creation_queue",
-            durable=True
+        if exchange_name not in ("user_events", "auth_events"):
+            raise ValueError(f"Unknown exchange: {exchange_name}")
+        
+        # 発行用チャネルのプールで、他のメッセージとまとめて送信し、確認されるまで待機する
+        await self.publisher.publish(
+            await self.channels.exchange(exchange_name),
+            event_message(body.get("event_type"), body.get("user_data", {}), message_id=message_id),
+            routing_key
+        )
+    
+    async def reply(self, request: IncomingMessage, event_type: str, response: Optional[Dict[str, Any]]):
+        """
+        reply_toが設定されたリクエスト（RPC）に処理結果を直接返信する
+        
+        返信はcorrelation_idを引き継いでデフォルトexchange経由でreply_toに送る。
+        送信の確認は待たず、失敗した場合もログに記録するだけにする
+        （呼び出し元はタイムアウト後に通常の非同期の返信で結果を受け取る）。
+        """
+        if not request.reply_to or response is None:
+            return
+        message = event_message(event_type, response)
+        message.correlation_id = request.correlation_id
+        future = self.publisher.publish(await self.channels.exchange(""), message, request.reply_to)
+        future.add_done_callback(
+            lambda done: self._log_publish_result(done, f"{event_type} (reply)", response.get("id", "unknown"))
         )
+    
+    async def refresh_queue_depths(self):
+        """
+        監視対象のキューの滞留件数とコンシューマー数をpassive宣言で取得する
+        
+        メトリクスの取得時に呼び出す。
+        """
+        if not self.is_initialized:
+            return
+        await messaging_metrics.refresh_queue_depths(self.channel)
+    
+    def _consumer_runtime(self, name: str, handler: Callable[[IncomingMessage], Awaitable[None]]) -> ConsumerRuntime:
+        """
+        上限付きのワーカーでメッセージを処理するランタイムを開始する
         
-        # exchangeとキューのバインド
-        await queue.bind(
-            exchange=self.user_events_exchange,
-            routing_key="user.sync"
+        CONSUMER_ORDERING_FIELDを指定した場合、同じ値（ユーザー名など）のメッセージは受信順に処理される。
+        """
+        ordering_key = (
+            user_data_ordering_key(settings.CONSUMER_ORDERING_FIELD)
+            if settings.CONSUMER_ORDERING_FIELD else None
         )
+        runtime = ConsumerRuntime(name, handler, settings.CONSUMER_CONCURRENCY, ordering_key)
+        runtime.start()
+        self.consumers[name] = runtime
+        return runtime
+    
+    async def setup_user_creation_consumer(
+            self,
+            callback: Callable[..., Awaitable[Optional[Dict[str, Any]]]],
+            batch_callback: Optional[Callable[[List[Dict[str, Any]], List[Optional[str]]], Awaitable[List[Optional[Dict[str, Any]]]]]] = None
+            ):
+        """
+        ユーザー作成リクエストのコンシューマーをセットアップ
         
-        # コンシューマーの設定
-        async def process_message(message: IncomingMessage):
-            async with message.process():
+        batch_callbackを指定し、USER_CREATION_BATCH_ENABLEDが有効な場合は、
+        複数のリクエストをまとめてbatch_callbackで処理し、まとめてackする。
+        いずれのコールバックにもメッセージのmessage_id（重複排除用）を渡す。
+        コールバックが返した返信の内容は、reply_toが設定されたリクエスト（RPC）に直接返信する。
+        
+        USER_CREATION_SHARDSを指定した場合は、user.syncのメッセージをconsistent-hash exchangeで
+        シャードのキューに振り分け、USER_CREATION_OWNED_SHARDSのシャードのキューだけを受信する。
+        同じユーザーのメッセージは同じシャードで受信順に処理されるため、インスタンスを増やしても
+        ユーザーごとの順序を保ったまま処理を分散できる。
+        """
+        if not self.is_initialized:
+            await self.initialize()
+        
+        batching = batch_callback is not None and settings.USER_CREATION_BATCH_ENABLED
+        prefetch_count = settings.CONSUMER_PREFETCH_COUNT
+        if batching:
+            # バッチが埋まるまで受け取れるよう、prefetchはバッチサイズより大きくする
+            prefetch_count = max(settings.CONSUMER_PREFETCH_COUNT, settings.USER_CREATION_BATCH_SIZE * 2)
+        
+        def parse_body(message: IncomingMessage) -> Dict[str, Any]:
+            try:
+                body = decode_body(message.body, message.content_type)
+            except MessageDecodeError as e:
+                raise PoisonMessageError(f"デコードエラー: {str(e)}") from e
+            if not isinstance(body, dict):
+                raise PoisonMessageError("メッセージの形式が不正です")
+            return body
+        
+        def create_handlers(retry: RetryPolicy):
+            """キューの再試行ポリシーを使うメッセージとバッチの処理関数を作成する"""
+            # コンシューマーの設定
+            async def process_message(message: IncomingMessage):
                 try:
                     # メッセージボディの解析
-                    body = json.loads(message.body.decode())
+                    body = parse_body(message)
                     
                     # イベントタイプの確認
                     event_type = body.get("event_type")
@@ -119,30 +301,178 @@ class RabbitMQClient:
                         user_data = body.get("user_data", {})
                         self.logger.info(f"ユーザー作成リクエストを受信: {user_data}")
                         
-                        # コールバック関数の呼び出し
-                        await callback(user_data)
+                        # コールバック関数の呼び出し（message_idは重複排除に使う）
+                        response = await callback(user_data, message_id=message_id_of(message))
+                        # RPCのリクエストには処理結果を直接返信する
+                        await self.reply(message, event_type, response)
                     else:
                         self.logger.warning(f"未知のイベントタイプ: {event_type}")
                 
-                except json.JSONDecodeError:
-                    self.logger.error("JSONデコードエラー", exc_info=True)
                 except Exception as e:
                     self.logger.error(f"メッセージ処理エラー: {str(e)}", exc_info=True)
+                    # 遅延再試行キュー（上限に達した場合や処理できない場合はDLQ）に送ってからackする
+                    await retry.reject(message, e)
+                    return
+                await message.ack()
+            
+            async def process_batch(messages: List[IncomingMessage]):
+                user_data_list = []
+                message_ids = []
+                requests = []
+                accepted = []
+                for message in messages:
+                    try:
+                        body = parse_body(message)
+                    except PoisonMessageError as e:
+                        self.logger.error(f"メッセージ処理エラー: {str(e)}")
+                        await retry.reject(message, e)
+                        continue
+                    accepted.append(message)
+                    event_type = body.get("event_type")
+                    if event_type == "user.created":
+                        user_data_list.append(body.get("user_data", {}))
+                        message_ids.append(message_id_of(message))
+                        requests.append(message)
+                    else:
+                        self.logger.warning(f"未知のイベントタイプ: {event_type}")
+                if not accepted:
+                    return
+                
+                try:
+                    responses = await batch_callback(user_data_list, message_ids) if user_data_list else []
+                except Exception as e:
+                    # バッチ全体が失敗した場合は、原因のメッセージを切り分けるため1件ずつ処理する
+                    self.logger.error(f"バッチ処理エラーのため1件ずつ処理します: {str(e)}", exc_info=True)
+                    for message in accepted:
+                        await process_message(message)
+                    return
+                
+                # RPCのリクエストには処理結果を直接返信する
+                for message, response in zip(requests, responses or []):
+                    await self.reply(message, UserEventTypes.USER_CREATED, response)
+                
+                # バッチの最後のメッセージまでをまとめてackする（DLQに送ったメッセージはack済み）
+                await accepted[-1].ack(multiple=True)
+            
+            return process_message, process_batch
         
-        # コンシューマーの開始
-        consumer_tag = await queue.consume(process_message)
-        self.consumer_tags.append(consumer_tag)
-        self.logger.info("ユーザー作成リクエストのコンシューマーを開始しました")
-    
-    def _serialize_user_data(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
-        """ユーザーデータのシリアライズ"""
-        serialized = {}
-        for key, value in user_data.items():
-            if isinstance(value, uuid.UUID):
-                serialized[key] = str(value)
+        async def consume(queue_name: str, arguments: Optional[Dict[str, Any]], routing_key: Optional[str]):
+            """キューのコンシューマーを開始する（routing_keyを指定した場合はuser_eventsにバインドする）"""
+            retry = self.retry_policies[queue_name]
+            process_message, process_batch = create_handlers(retry)
+            
+            # コンシューマーの開始
+            if batching:
+                consumer = BatchingConsumer(
+                    queue_name,
+                    process_batch,
+                    settings.USER_CREATION_BATCH_SIZE,
+                    settings.USER_CREATION_BATCH_WAIT_MS
+                )
+                consumer.start()
+                self.consumers[queue_name] = consumer
             else:
-                serialized[key] = value
-        return serialized
+                consumer = self._consumer_runtime(queue_name, process_message)
+            
+            async def setup(channel):
+                # キューの宣言
+                queue = await channel.declare_queue(
+                    queue_name,
+                    durable=True,
+                    arguments=arguments
+                )
+                
+                # exchangeとキューのバインド
+                if routing_key is not None:
+                    await queue.bind(
+                        exchange=self.user_events_exchange,
+                        routing_key=routing_key
+                    )
+                
+                # 再試行キューとデッドレターキューの宣言
+                await retry.declare(channel)
+                
+                # 滞留件数の監視対象に登録
+                messaging_metrics.watch_queue(queue.name)
+                messaging_metrics.watch_queue(retry.dead_letter_queue_name)
+                
+                consumer_tag = await queue.consume(consumer.dispatch)
+                self.consumer_tags.append((queue, consumer_tag))
+            
+            # キュー専用のチャネルで受信する。まとめてack（multiple=True）する範囲に
+            # 他のコンシューマーのメッセージが含まれないよう、バッチ処理の場合も専用のチャネルが必要
+            await self.channels.open_consumer_channel(queue_name, setup, prefetch_count)
+        
+        if settings.USER_CREATION_SHARDS <= 0:
+            await consume("user_creation_queue", None, "user.sync")
+            self.logger.info("ユーザー作成リクエストのコンシューマーを開始しました")
+            return
+        
+        owned = parse_owned_shards(settings.USER_CREATION_OWNED_SHARDS, settings.USER_CREATION_SHARDS)
+        await declare_shard_queues(
+            self.channel,
+            self.user_events_exchange,
+            "user.sync",
+            "user_creation_queue",
+            settings.USER_CREATION_SHARDS
+        )
+        # シャーディング前のキューにはuser.syncを届けないようにする
+        legacy_queue = await self.channel.declare_queue("user_creation_queue", durable=True)
+        await legacy_queue.unbind(self.user_events_exchange, "user.sync")
+        for shard in owned:
+            await consume(shard_queue_name("user_creation_queue", shard), SHARD_QUEUE_ARGUMENTS, None)
+        if 0 in owned:
+            # 切り替え前にシャーディング前のキューに残ったメッセージは、シャード0を受信するインスタンスが処理する
+            await consume("user_creation_queue", None, None)
+        self.logger.info(
+            f"ユーザー作成リクエストのコンシューマーを開始しました: "
+            f"シャード {owned} / {settings.USER_CREATION_SHARDS}"
+        )
+    
+    async def setup_user_event_consumer(
+            self,
+            callback: Callable[[str, Dict[str, Any]], Awaitable[None]],
+            routing_keys: List[str]
+            ):
+        """
+        ユーザーイベントのコンシューマーをセットアップ
+        
+        ワーカープロセスごとに排他的な一時キューを宣言するため、
+        すべてのワーカーが同じイベントを受信する（ワーカー内キャッシュの無効化用）。
+        """
+        if not self.is_initialized:
+            await self.initialize()
+        
+        async def process_message(message: IncomingMessage):
+            async with message.process():
+                try:
+                    body = decode_body(message.body, message.content_type)
+                    event_type = body.get("event_type")
+                    user_data = body.get("user_data", {})
+                    self.logger.info(f"ユーザーイベントを受信: {event_type}, ユーザーID={user_data.get('id', 'unknown')}")
+                    await callback(event_type, user_data)
+                except MessageDecodeError:
+                    self.logger.error("デコードエラー", exc_info=True)
+                except Exception as e:
+                    self.logger.error(f"メッセージ処理エラー: {str(e)}", exc_info=True)
+        
+        async def setup(channel):
+            # サーバー側で命名される排他キューの宣言（接続終了時に自動削除）
+            queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+            
+            for routing_key in routing_keys:
+                await queue.bind(
+                    exchange=self.auth_events_exchange,
+                    routing_key=routing_key
+                )
+            
+            # 排他キューの名前はサーバーが決めるため、監視上の名前はuser_eventsとする
+            messaging_metrics.watch_queue("user_events", queue.name)
+            consumer_tag = await queue.consume(messaging_metrics.instrument("user_events", process_message))
+            self.consumer_tags.append((queue, consumer_tag))
+        
+        await self.channels.open_consumer_channel("user_events", setup, settings.CONSUMER_PREFETCH_COUNT)
+        self.logger.info(f"ユーザーイベントのコンシューマーを開始しました: {', '.join(routing_keys)}")
 
 
 # シングルトンインスタンス
@@ -159,14 +489,14 @@ class UserEventTypes:
 # ヘルパー関数
 async def publish_user_created(user_data: Dict[str, Any]):
     """ユーザー作成イベントの発行"""
-    await rabbitmq_client.publish_user_event(UserEventTypes.USER_CREATED, user_data)
+    return await rabbitmq_client.publish_user_event(UserEventTypes.USER_CREATED, user_data)
 
 
 async def publish_user_updated(user_data: Dict[str, Any]):
     """ユーザー更新イベントの発行"""
-    await rabbitmq_client.publish_user_event(UserEventTypes.USER_UPDATED, user_data)
+    return await rabbitmq_client.publish_user_event(UserEventTypes.USER_UPDATED, user_data)
 
 
 async def publish_user_deleted(user_data: Dict[str, Any]):
     """ユーザー削除イベントの発行"""
-    await rabbitmq_client.publish_user_event(UserEventTypes.USER_DELETED, user_data)
+    return await rabbitmq_client.publish_user_event(UserEventTypes.USER_DELETED, user_data)
@@ -0,0 +1,78 @@
+from typing import Any, Dict, List
+
+from aio_pika import ExchangeType
+from aio_pika.abc import AbstractChannel, AbstractExchange
+
+from app.messaging.codec import SHARD_KEY_HEADER
+
+
+# user.syncのメッセージをシャードのキューに振り分けるexchange
+USER_CREATION_SHARD_EXCHANGE = "user_creation_shards"
+
+# シャードのキューは同時に1つのコンシューマーだけに配信する
+# （複数のインスタンスが同じシャードを受信しても処理順が保たれ、受信中のインスタンスが停止すると別のインスタンスが引き継ぐ）
+SHARD_QUEUE_ARGUMENTS: Dict[str, Any] = {"x-single-active-consumer": True}
+
+
+def shard_queue_name(queue_name: str, shard: int) -> str:
+    """シャードのキュー名を返す"""
+    return f"{queue_name}.shard.{shard}"
+
+
+def parse_owned_shards(value: str, shards: int) -> List[int]:
+    """
+    インスタンスが受信するシャード番号の指定を解釈する
+
+    カンマ区切りの番号と範囲（"0,2"、"0-3"、"0-1,6"など）を受け付け、空文字の場合は全シャードとする。
+
+    Raises:
+        ValueError: 番号が不正またはシャード数の範囲外の場合
+    """
+    if not value.strip():
+        return list(range(shards))
+    owned = set()
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        start, end = int(first), int(last or first)
+        if start < 0 or end >= shards or start > end:
+            raise ValueError(f"Invalid shard range {part!r} for {shards} shards")
+        owned.update(range(start, end + 1))
+    return sorted(owned)
+
+
+async def declare_shard_queues(
+        channel: AbstractChannel,
+        source: AbstractExchange,
+        routing_key: str,
+        queue_name: str,
+        shards: int
+        ) -> AbstractExchange:
+    """
+    consistent-hash exchangeとシャードのキューを宣言し、sourceのrouting_keyのメッセージを振り分ける
+
+    exchangeはx-shard-keyヘッダー（ユーザー名など）のハッシュでキューを選ぶため、同じユーザーのイベントは
+    常に同じシャードのキューに届く。受信するかどうかに関わらず全シャードのキューを番号順に同じ重みでバインドする
+    （受信するインスタンスがないシャードのメッセージはキューに溜まり、インスタンスの増減で振り分けは変わらない）。
+    シャード数を変更すると一部のユーザーの振り分け先が変わるため、変更前のキューを処理し終えてから切り替える。
+
+    RabbitMQのrabbitmq_consistent_hash_exchangeプラグインが必要。
+    """
+    exchange = await channel.declare_exchange(
+        USER_CREATION_SHARD_EXCHANGE,
+        ExchangeType.X_CONSISTENT_HASH,
+        durable=True,
+        arguments={"hash-header": SHARD_KEY_HEADER}
+    )
+    await exchange.bind(source, routing_key)
+    for shard in range(shards):
+        queue = await channel.declare_queue(
+            shard_queue_name(queue_name, shard),
+            durable=True,
+            arguments=SHARD_QUEUE_ARGUMENTS
+        )
+        # バインディングキーはシャードの重み
+        await queue.bind(exchange, routing_key="1")
+    return exchange
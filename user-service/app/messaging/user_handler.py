@@ -1,92 +1,227 @@
 import uuid
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.logging import app_logger
-from app.db.session import get_async_session
+from app.core.user_cache import user_cache
+from app.db.session import AsyncSessionLocal, get_async_session
 from app.crud.exceptions import (
     DuplicateEmailError,
     DuplicateUsernameError
 )
 from app.crud.user import user_crud
-from app.schemas.user import UserCreate
-from app.messaging.rabbitmq import publish_user_created
+from app.schemas.user import UserBulkCreateStatus, UserCreate
+from app.messaging.dedup import message_deduplicator
+from app.messaging.metrics import processing_time_ms
+from app.messaging.outbox import enqueue_user_event
+from app.messaging.rabbitmq import UserEventTypes
+
+
+# 重複排除の記録に使うコンシューマー名
+USER_CREATION_CONSUMER = "user_creation_queue"
 
 
 # user-service/app/messaging/user_handler.py の修正
-async def handle_user_creation_request(user_data: Dict[str, Any]):
+async def handle_user_creation_request(
+        user_data: Dict[str, Any],
+        message_id: Optional[str] = None
+        ) -> Optional[Dict[str, Any]]:
+    """
+    ユーザー作成リクエストを処理する
+    
+    重複や不正なリクエストにはエラーの返信を送る。データベースの障害などの一時的なエラーは
+    例外を送出し、呼び出し元（コンシューマー）で遅延再試行する。
+    処理済みのmessage_idのリクエスト（再配信）はユーザーを作成せず、返信も送らない。
+    
+    Returns:
+        返信の内容（RPCのリクエストへの直接の返信に使う）。処理済みの場合はNone
+    """
     logger = app_logger
     logger.info(f"ユーザー作成リクエストの処理を開始: {user_data}")
     
-    try:
-        async for session in get_async_session():
-            try:
-                # ユーザー作成スキーマの作成
-                user_create = UserCreate(
-                    username=user_data.get("username"),
-                    email=user_data.get("email")
-                )
-                
-                # ユーザーの作成
-                new_user = await user_crud.create(session, user_create)
-                logger.info(f"ユーザーを作成しました: ID={new_user.id}, username={new_user.username}")
-                
-                # auth-serviceに返信するデータの準備
-                response_data = {
-                    "id": new_user.id,
-                    "username": new_user.username,
-                    "email": new_user.email,
-                    "status": "success",
-                    "original_request": user_data  # 元のリクエストデータも含める
-                }
-                
-                # auth-serviceにユーザー作成完了メッセージを送信
-                await publish_user_created(response_data)
-                logger.info(f"auth-serviceにユーザー作成完了メッセージを送信しました: user_id={new_user.id}")
-                
-            except DuplicateEmailError:
-                logger.error(f"ユーザー作成失敗: メールアドレスが重複しています: {user_data.get('email')}")
-                # エラーレスポンスの送信
-                error_response = {
-                    "status": "error",
-                    "error_type": "duplicate_email",
-                    "message": "メールアドレスが既に使用されています",
-                    "original_request": user_data
-                }
-                await publish_user_created(error_response)
-                
-            except DuplicateUsernameError:
-                logger.error(f"ユーザー作成失敗: ユーザー名が重複しています: {user_data.get('username')}")
-                # エラーレスポンスの送信
-                error_response = {
-                    "status": "error",
-                    "error_type": "duplicate_username",
-                    "message": "ユーザー名が既に使用されています",
-                    "original_request": user_data
-                }
-                await publish_user_created(error_response)
-                
-            except Exception as e:
-                logger.error(f"ユーザー作成処理中にエラーが発生しました: {str(e)}", exc_info=True)
-                # セッションのロールバック
-                await session.rollback()
-                # 一般的なエラーレスポンスの送信
-                error_response = {
-                    "status": "error",
-                    "error_type": "internal_error",
-                    "message": f"ユーザー作成中にエラーが発生しました: {str(e)}",
-                    "original_request": user_data
-                }
-                await publish_user_created(error_response)
-                
-    except Exception as e:
-        logger.error(f"セッション取得中にエラーが発生しました: {str(e)}", exc_info=True)
-        # セッション取得エラーのレスポンス送信
-        error_response = {
-            "status": "error",
-            "error_type": "session_error",
-            "message": "データベース接続エラー",
-            "original_request": user_data
-        }
-        await publish_user_created(error_response)
+    # 返信はセッションの終了（エラーの返信のコミット）後に返す
+    response_data = None
+    async for session in get_async_session():
+        try:
+            # 処理済みの記録はユーザー・返信と同じトランザクションで書き込む
+            if not await message_deduplicator.claim(session, USER_CREATION_CONSUMER, message_id):
+                return
+            
+            # ユーザー作成スキーマの作成
+            user_create = UserCreate(
+                username=user_data.get("username"),
+                email=user_data.get("email")
+            )
+            
+            # ユーザーの作成
+            new_user = await user_crud.create(session, user_create)
+            logger.info(f"ユーザーを作成しました: ID={new_user.id}, username={new_user.username}")
+            
+            # auth-serviceに返信するデータの準備
+            response_data = {
+                "id": new_user.id,
+                "username": new_user.username,
+                "email": new_user.email,
+                "status": "success",
+                "original_request": user_data,  # 元のリクエストデータも含める
+                "processing_time_ms": processing_time_ms()  # メッセージの受信からの処理時間
+            }
+            
+            # auth-serviceへのユーザー作成完了メッセージをユーザーと同じトランザクションで書き込む
+            enqueue_user_event(session, UserEventTypes.USER_CREATED, response_data)
+            await session.commit()
+            logger.info(f"auth-serviceへのユーザー作成完了メッセージを登録しました: user_id={new_user.id}")
+            
+        except ValidationError as e:
+            logger.error(f"ユーザー作成失敗: リクエストが不正です: {str(e)}")
+            # 再試行しても成功しないため、エラーレスポンスを送信する
+            response_data = _creation_error_response(
+                "internal_error", f"ユーザー作成中にエラーが発生しました: {str(e)}", user_data
+            )
+            enqueue_user_event(session, UserEventTypes.USER_CREATED, response_data)
+            
+        except DuplicateEmailError:
+            logger.error(f"ユーザー作成失敗: メールアドレスが重複しています: {user_data.get('email')}")
+            await session.rollback()
+            # ロールバックで処理済みの記録も取り消されるため、エラーの返信とともに記録し直す
+            await message_deduplicator.claim(session, USER_CREATION_CONSUMER, message_id)
+            # エラーレスポンスの送信
+            response_data = _creation_error_response(
+                "duplicate_email", "メールアドレスが既に使用されています", user_data
+            )
+            enqueue_user_event(session, UserEventTypes.USER_CREATED, response_data)
+            
+        except DuplicateUsernameError:
+            logger.error(f"ユーザー作成失敗: ユーザー名が重複しています: {user_data.get('username')}")
+            await session.rollback()
+            await message_deduplicator.claim(session, USER_CREATION_CONSUMER, message_id)
+            # エラーレスポンスの送信
+            response_data = _creation_error_response(
+                "duplicate_username", "ユーザー名が既に使用されています", user_data
+            )
+            enqueue_user_event(session, UserEventTypes.USER_CREATED, response_data)
+            
+        except Exception as e:
+            logger.error(f"ユーザー作成処理中にエラーが発生しました: {str(e)}", exc_info=True)
+            # セッションのロールバック（メッセージは呼び出し元で再試行する）
+            await session.rollback()
+            raise
+    
+    return response_data
+
+
+def _creation_error_response(error_type: str, message: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "status": "error",
+        "error_type": error_type,
+        "message": message,
+        "original_request": user_data,
+        "processing_time_ms": processing_time_ms()
+    }
+
+
+async def handle_user_creation_batch(
+        user_data_list: List[Dict[str, Any]],
+        message_ids: Optional[List[Optional[str]]] = None
+        ) -> List[Optional[Dict[str, Any]]]:
+    """
+    複数のユーザー作成リクエストを1つのトランザクションで処理する
+    
+    ユーザーはbulk_create（複数行INSERT）でまとめて作成し、行ごとの結果（作成・重複）に
+    応じた返信を同じトランザクションでアウトボックスに書き込む。
+    処理済みのmessage_idのリクエストは1回のクエリで判定してスキップする。
+    データベースエラーなどの例外は呼び出し元に送出する（呼び出し元で1件ずつの処理に切り替える）。
+    
+    Returns:
+        リクエストと同じ順番の返信の内容（処理済みのリクエストはNone）
+    """
+    logger = app_logger
+    logger.info(f"ユーザー作成リクエストをまとめて処理します: {len(user_data_list)}件")
+    
+    responses: List[Optional[Dict[str, Any]]] = [None] * len(user_data_list)
+    async with AsyncSessionLocal() as session:
+        try:
+            claims = await message_deduplicator.claim_many(
+                session, USER_CREATION_CONSUMER, message_ids or [None] * len(user_data_list)
+            )
+            
+            user_creates: List[UserCreate] = []
+            positions: List[int] = []
+            for position, user_data in enumerate(user_data_list):
+                if not claims[position]:
+                    continue
+                try:
+                    user_creates.append(UserCreate(
+                        username=user_data.get("username"),
+                        email=user_data.get("email")
+                    ))
+                    positions.append(position)
+                except ValidationError as e:
+                    responses[position] = _creation_error_response(
+                        "internal_error", f"ユーザー作成中にエラーが発生しました: {str(e)}", user_data
+                    )
+            
+            results = await user_crud.bulk_create(session, user_creates) if user_creates else []
+            created_count = 0
+            for result in results:
+                position = positions[result.index]
+                user_data = user_data_list[position]
+                status = result.status
+                if status == UserBulkCreateStatus.DUPLICATE_IN_INPUT:
+                    # 同じバッチ内の先行するリクエストと重複した項目を判定する
+                    earlier = user_creates[:result.index]
+                    status = (
+                        UserBulkCreateStatus.DUPLICATE_USERNAME
+                        if any(obj_in.username == result.username for obj_in in earlier)
+                        else UserBulkCreateStatus.DUPLICATE_EMAIL
+                    )
+                if status == UserBulkCreateStatus.CREATED:
+                    created_count += 1
+                    responses[position] = {
+                        "id": result.id,
+                        "username": result.username,
+                        "email": result.email,
+                        "status": "success",
+                        "original_request": user_data,
+                        "processing_time_ms": processing_time_ms()
+                    }
+                elif status == UserBulkCreateStatus.DUPLICATE_EMAIL:
+                    responses[position] = _creation_error_response(
+                        "duplicate_email", "メールアドレスが既に使用されています", user_data
+                    )
+                elif status == UserBulkCreateStatus.DUPLICATE_USERNAME:
+                    responses[position] = _creation_error_response(
+                        "duplicate_username", "ユーザー名が既に使用されています", user_data
+                    )
+                else:
+                    # 重複チェック後に並行して作成された場合
+                    responses[position] = _creation_error_response(
+                        "conflict", "ユーザー名またはメールアドレスが既に使用されています", user_data
+                    )
+            
+            # 返信をユーザーと同じトランザクションで書き込む（送信はリレーがまとめて行う）
+            for response in responses:
+                if response is not None:
+                    enqueue_user_event(session, UserEventTypes.USER_CREATED, response)
+            await session.commit()
+            skipped_count = claims.count(False)
+            logger.info(
+                f"ユーザー作成リクエストのバッチを処理しました: 作成={created_count}件, "
+                f"失敗={len(user_data_list) - created_count - skipped_count}件, 処理済み={skipped_count}件"
+            )
+        except Exception:
+            # 処理済みの記録を含めて直ちに取り消し、呼び出し元の1件ずつの再処理を待たせない
+            await session.rollback()
+            raise
+    
+    return responses
+
 
+async def handle_user_cache_invalidation(event_type: str, user_data: Dict[str, Any]):
+    """user.updated / user.deleted イベントを受けてユーザー情報のキャッシュを無効化する"""
+    user_id = user_data.get("id")
+    if not user_id:
+        app_logger.warning(f"ユーザーIDを含まないイベントのため無効化をスキップします: {event_type}")
+        return
+    await user_cache.invalidate(str(user_id))
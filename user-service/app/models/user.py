@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, String
+from sqlalchemy import BigInteger, Boolean, Index, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from typing import Optional
 
@@ -7,9 +7,15 @@ from app.db.base import Base
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # キーセットページネーション用
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
     username: Mapped[str] = mapped_column(String, nullable=False, unique=True, index=True)
     full_name: Mapped[Optional[str]] = mapped_column(String, nullable=True, index=True)
     email: Mapped[str] = mapped_column(String, unique=True, nullable=False, index=True)
     is_active: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
     is_superuser: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    # サービス間同期で適用済みのバージョン（upsert_manyでこれより新しい場合のみ更新する）
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, server_default="0")
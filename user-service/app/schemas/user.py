@@ -1,6 +1,8 @@
-from typing import Optional
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
 import uuid
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 class UserBase(BaseModel):
     username: Optional[str] = None
@@ -26,4 +28,94 @@ class UserInDBBase(UserBase):
 
 
 class UserResponse(UserInDBBase):
-    pass
\ No newline at end of file
+    pass
+
+
+class UserPage(BaseModel):
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None  # 次ページがない場合はNone
+    estimated_total: Optional[int] = None  # include_total指定時のみ（プランナーの推定値）
+
+
+# 複数ID一括取得
+class UserBatchRequest(BaseModel):
+    ids: List[uuid.UUID] = Field(..., min_length=1)
+
+
+class UserBatchResponse(BaseModel):
+    items: List[UserResponse]  # 要求されたIDの順序（重複は除く）
+    not_found: List[uuid.UUID] = []
+
+
+# サービス間同期のupsert
+class UserUpsert(BaseModel):
+    """同期元の状態をそのまま適用するためのスキーマ"""
+    id: uuid.UUID
+    username: str
+    email: EmailStr
+    full_name: Optional[str] = None
+    is_active: bool = True
+    is_superuser: bool = False
+    version: int = Field(..., ge=0)  # 同期元で単調増加するバージョン
+
+
+class UserUpsertStatus(str, Enum):
+    """upsertにおける各行の処理結果"""
+    APPLIED = "applied"  # 作成または更新された
+    STALE = "stale"  # 適用済みのバージョン以下のためスキップされた
+    SUPERSEDED_IN_INPUT = "superseded_in_input"  # 入力内に同じIDのより新しい行がある
+    CONFLICT = "conflict"  # usernameまたはemailが他のユーザーで使用されている
+
+
+class UserUpsertResult(BaseModel):
+    index: int  # 入力リスト内の位置
+    id: uuid.UUID
+    version: int
+    status: UserUpsertStatus
+
+
+# 一括作成の行ごとの結果
+class UserBulkCreateStatus(str, Enum):
+    """一括作成における各行の処理結果"""
+    CREATED = "created"
+    DUPLICATE_IN_INPUT = "duplicate_in_input"
+    DUPLICATE_USERNAME = "duplicate_username"
+    DUPLICATE_EMAIL = "duplicate_email"
+    CONFLICT = "conflict"  # 事前チェック後に並行して作成された場合
+
+
+class UserBulkCreateResult(BaseModel):
+    index: int  # 入力リスト内の位置
+    username: str
+    email: EmailStr
+    status: UserBulkCreateStatus
+    id: Optional[uuid.UUID] = None  # 作成された場合のみ
+
+
+# 一括インポート関連
+class UserImportState(str, Enum):
+    """インポート処理の状態"""
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class UserImportRowError(BaseModel):
+    row: int  # ファイル内の行番号（CSVはヘッダーを1行目とする）
+    reason: str
+    username: Optional[str] = None
+    email: Optional[str] = None
+
+
+class UserImportProgress(BaseModel):
+    import_id: uuid.UUID
+    format: str
+    state: UserImportState = UserImportState.RUNNING
+    rows_received: int = 0
+    rows_created: int = 0
+    rows_skipped: int = 0  # 重複によりスキップされた行
+    rows_invalid: int = 0  # パースまたはバリデーションに失敗した行
+    errors: List[UserImportRowError] = Field(default_factory=list)  # 先頭から上限件数まで保持
+    errors_truncated: bool = False
+    started_at: datetime
+    finished_at: Optional[datetime] = None
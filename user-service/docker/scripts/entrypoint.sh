@@ -5,4 +5,6 @@ set -e
 PORT=${USER_SERVICE_INTERNAL_PORT:-"8080"}
 
 # 直接uvicornを実行（すべてのインターフェースでリッスン）
-exec uvicorn app.main:app --host 0.0.0.0 --port $PORT --workers 2
\ No newline at end of file
+# 停止時は処理中のHTTPリクエストを待ってから、アプリケーションがコンシューマーを停止する
+exec uvicorn app.main:app --host 0.0.0.0 --port $PORT --workers 2 \
+    --timeout-graceful-shutdown ${SHUTDOWN_HTTP_TIMEOUT_SECONDS:-10}
\ No newline at end of file
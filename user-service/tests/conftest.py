@@ -0,0 +1,33 @@
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+# テーブルをメタデータに登録する
+from app.models import outbox_event, processed_message, user  # noqa: F401
+
+
+# テスト用のインメモリSQLiteデータベース
+@pytest_asyncio.fixture(scope="function")
+async def db_engine():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+@pytest_asyncio.fixture(scope="function")
+async def db_session(db_engine):
+    AsyncSessionLocal = sessionmaker(
+        bind=db_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+    )
+    async with AsyncSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.rollback() # 常にトランザクションをロールバックして状態を元に戻す
+            await session.close()
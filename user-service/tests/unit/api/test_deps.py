@@ -0,0 +1,52 @@
+import pytest
+import uuid
+from fastapi import HTTPException, status
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.api.deps import get_current_admin_user, get_current_user
+from app.schemas.user import UserResponse
+
+
+def _user(is_superuser: bool) -> UserResponse:
+    return UserResponse(id=uuid.uuid4(), username="user", email="user@example.com", is_superuser=is_superuser)
+
+
+class TestGetCurrentAdminUser:
+    """get_current_admin_user 依存関数のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_superuser_allowed(self):
+        """is_superuserのユーザーは通過する"""
+        user = _user(True)
+
+        assert await get_current_admin_user(current_user=user) == user
+
+    @pytest.mark.asyncio
+    async def test_non_superuser_forbidden(self):
+        """is_superuserでないユーザーは403になる"""
+        with pytest.raises(HTTPException) as excinfo:
+            await get_current_admin_user(current_user=_user(False))
+
+        assert excinfo.value.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.parametrize("method, path, target", [
+    ("GET", "/api/v1/user/users/export", "app.api.v1.user.stream_export"),
+    ("POST", "/api/v1/user/import?format=ndjson", "app.api.v1.user.import_users"),
+])
+def test_admin_endpoints_require_admin(method, path, target):
+    """エクスポート・インポートのエンドポイントは認証が必要で、管理者以外は403になる"""
+    with patch(target) as mock_target:
+        from app.main import app
+        client = TestClient(app)
+        unauthenticated = client.request(method, path, content=b"")
+        app.dependency_overrides[get_current_user] = lambda: _user(False)
+        try:
+            forbidden = client.request(method, path, content=b"")
+        finally:
+            app.dependency_overrides = {}
+
+    assert unauthenticated.status_code == 401
+    assert forbidden.status_code == 403
+    mock_target.assert_not_called()
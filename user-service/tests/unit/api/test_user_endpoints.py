@@ -0,0 +1,54 @@
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.db.session import get_async_session
+from app.main import app
+from app.models.user import User
+
+
+@pytest.fixture
+def client(db_session):
+    app.dependency_overrides[get_async_session] = lambda: db_session
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides = {}
+
+
+async def create_users(db_session, count):
+    users = [User(username=f"user{i}", email=f"user{i}@example.com") for i in range(count)]
+    db_session.add_all(users)
+    await db_session.flush()
+    return users
+
+
+@pytest.mark.asyncio
+async def test_get_users_batch_keeps_requested_order(client, db_session):
+    """一括取得は要求されたIDの順序で返し、重複を除いて見つからなかったIDをnot_foundに含める"""
+    users = await create_users(db_session, 3)
+    missing = uuid.uuid4()
+    ids = [users[2].id, missing, users[0].id, users[2].id]
+
+    response = client.post("/api/v1/user/users/batch", json={"ids": [str(id) for id in ids]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["username"] for item in body["items"]] == ["user2", "user0"]
+    assert body["not_found"] == [str(missing)]
+
+
+def test_get_users_batch_rejects_too_many_ids(client):
+    """一括取得のID数が上限を超える場合は400を返す"""
+    with patch("app.api.v1.user.settings.USER_BATCH_MAX_IDS", 2):
+        response = client.post("/api/v1/user/users/batch", json={"ids": [str(uuid.uuid4()) for _ in range(3)]})
+
+    assert response.status_code == 400
+
+
+def test_get_user_rejects_invalid_id(client):
+    """UUIDでないIDの取得は422を返す"""
+    response = client.get("/api/v1/user/users/not-a-uuid")
+
+    assert response.status_code == 422
@@ -0,0 +1,68 @@
+import asyncio
+import gc
+import pytest
+
+from app.core.dataloader import DataLoader
+
+
+# 非同期テスト用のマーカーを追加
+pytestmark = pytest.mark.asyncio
+
+
+def make_loader(max_batch_size=100, fail=False):
+    batches = []
+
+    async def batch_load(keys):
+        batches.append(list(keys))
+        await asyncio.sleep(0)
+        if fail:
+            raise RuntimeError("database unavailable")
+        return {key: f"value-{key}" for key in keys if key != "missing"}
+
+    return DataLoader(batch_load, max_batch_size=max_batch_size), batches
+
+
+async def test_concurrent_loads_share_one_batch():
+    """同じティック内の取得が1回のバッチにまとめられ、重複したキーは1回だけ取得する"""
+    loader, batches = make_loader()
+
+    values = await asyncio.gather(loader.load("a"), loader.load("b"), loader.load("a"), loader.load("missing"))
+
+    assert values == ["value-a", "value-b", "value-a", None]
+    assert batches == [["a", "b", "missing"]]
+    assert loader.batches_dispatched == 1
+    assert loader.keys_requested == 4
+
+
+async def test_batches_are_split_by_max_batch_size():
+    """max_batch_sizeを超えるキーは複数のバッチに分けて取得する"""
+    loader, batches = make_loader(max_batch_size=2)
+
+    values = await loader.load_many(["a", "b", "c"])
+
+    assert values == ["value-a", "value-b", "value-c"]
+    assert batches == [["a", "b"], ["c"]]
+
+
+async def test_batch_failure_is_raised_to_every_caller():
+    """バッチ取得の失敗はバッチ内のすべての呼び出し元に送出される"""
+    loader, _ = make_loader(fail=True)
+
+    results = await asyncio.gather(loader.load("a"), loader.load("b"), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_running_batches_are_kept_until_done():
+    """実行中のバッチ取得のタスクは完了まで参照が保持され、ガベージコレクションされない"""
+    loader, _ = make_loader()
+
+    load = asyncio.ensure_future(loader.load("a"))
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    gc.collect()
+    assert len(loader._loads) == 1
+
+    assert await load == "value-a"
+    await asyncio.sleep(0)
+    assert not loader._loads
@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+import uuid
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.crud.exceptions import UserNotFoundError
+from app.crud.user import user_crud
+from app.schemas.user import UserCreate
+
+
+async def _create_user(session_factory):
+    unique_id = uuid.uuid4().hex[:8]
+    async with session_factory() as session:
+        user = await user_crud.create(
+            session, UserCreate(username=f"flight{unique_id}", email=f"flight_{unique_id}@example.com")
+        )
+        await session.commit()
+    return user
+
+
+@pytest.mark.asyncio
+async def test_get_by_id_coalesces_across_sessions(db_engine):
+    """異なるセッションからの同時取得が専用のセッションでの1回のクエリにまとめられることをテストする"""
+    session_factory = sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    created = await _create_user(session_factory)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        async with session_factory() as session_a, session_factory() as session_b:
+            user_a, user_b = await asyncio.gather(
+                user_crud.get_by_id(session_a, created.id),
+                user_crud.get_by_id(session_b, created.id)
+            )
+            # 切り離された結果がそれぞれのセッションへmergeされる
+            assert user_a in session_a
+            assert user_b in session_b
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
+    assert user_a.id == user_b.id == created.id
+
+
+@pytest.mark.asyncio
+async def test_get_by_id_runs_query_on_dedicated_session(db_engine, monkeypatch):
+    """共有するクエリは呼び出し元のセッションではなく専用のセッションで実行されることをテストする"""
+    session_factory = sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    created = await _create_user(session_factory)
+    flight_sessions = []
+
+    def dedicated_session(**kwargs):
+        session = session_factory(**kwargs)
+        flight_sessions.append(session)
+        return session
+
+    monkeypatch.setattr("app.crud.user.AsyncSessionLocal", dedicated_session)
+    async with session_factory() as session:
+        user = await user_crud.get_by_id(session, created.id)
+
+        assert len(flight_sessions) == 1
+        assert flight_sessions[0] is not session
+        assert user in session
+
+
+@pytest.mark.asyncio
+async def test_get_by_id_returns_instance_loaded_in_session(db_engine, db_session):
+    """呼び出し元のセッションに読み込み済みのユーザーはクエリを発行せずに返すことをテストする"""
+    user = await user_crud.create(db_session, UserCreate(username="loaded", email="loaded@example.com"))
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        assert await user_crud.get_by_id(db_session, user.id) is user
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+    assert statements == []
+
+
+@pytest.mark.asyncio
+async def test_get_by_id_not_found_is_shared(db_session):
+    """該当なしの例外が同時に取得した全ての呼び出し元に伝播することをテストする"""
+    user_id = uuid.uuid4()
+
+    results = await asyncio.gather(
+        user_crud.get_by_id(db_session, user_id),
+        user_crud.get_by_id(db_session, user_id),
+        return_exceptions=True
+    )
+
+    assert all(isinstance(result, UserNotFoundError) for result in results)
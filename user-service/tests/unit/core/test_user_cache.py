@@ -0,0 +1,192 @@
+import asyncio
+import json
+import pytest
+
+from app.core.user_cache import LocalLRUCache, UserCache
+from app.messaging.user_handler import handle_user_cache_invalidation
+
+
+# 非同期テスト用のマーカーを追加
+pytestmark = pytest.mark.asyncio
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def hincrby(self, key, field, amount):
+        self._commands.append(("hincrby", key, field, amount))
+
+    def hdel(self, key, *fields):
+        self._commands.append(("hdel", key, fields))
+
+    def expire(self, key, ttl):
+        self._commands.append(("expire", key, ttl))
+
+    async def execute(self):
+        for command in self._commands:
+            if command[0] == "hincrby":
+                _, key, field, amount = command
+                entry = self._redis.hashes.setdefault(key, {})
+                entry[field] = str(int(entry.get(field, "0")) + amount)
+            elif command[0] == "hdel":
+                _, key, fields = command
+                for field in fields:
+                    self._redis.hashes.get(key, {}).pop(field, None)
+
+
+class FakeRedis:
+    """テストに必要な操作だけを実装したRedis（_FILL_SCRIPTはPythonで同じ処理を行う）"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.fail = False
+
+    async def hmget(self, key, *fields):
+        if self.fail:
+            raise ConnectionError("redis unavailable")
+        entry = self.hashes.get(key, {})
+        return [entry.get(field) for field in fields]
+
+    async def eval(self, script, numkeys, key, version, data, ttl):
+        if self.fail:
+            raise ConnectionError("redis unavailable")
+        entry = self.hashes.setdefault(key, {})
+        if entry.get("ver", "0") != version:
+            return 0
+        entry["data"] = data
+        entry["data_ver"] = version
+        return 1
+
+    def pipeline(self, transaction=True):
+        if self.fail:
+            raise ConnectionError("redis unavailable")
+        return FakePipeline(self)
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def cache(fake_redis):
+    async def redis_factory():
+        return fake_redis
+    return UserCache(local_max_size=10, local_ttl_seconds=60, redis_ttl_seconds=300, redis_factory=redis_factory)
+
+
+def counting_loader(data):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return data
+    return loader, calls
+
+
+async def test_read_through_fills_both_tiers(cache, fake_redis):
+    """未登録の場合はloaderで取得し、ワーカー内LRUとRedisの両方に書き込む"""
+    loader, calls = counting_loader({"id": "u1", "username": "alice"})
+
+    assert await cache.get_or_load("u1", loader) == {"id": "u1", "username": "alice"}
+    assert await cache.get_or_load("u1", loader) == {"id": "u1", "username": "alice"}
+
+    assert len(calls) == 1
+    assert cache.stats()["local_hits"] == 1
+    assert json.loads(fake_redis.hashes["user_cache:u1"]["data"]) == {"id": "u1", "username": "alice"}
+
+
+async def test_redis_tier_serves_other_workers(cache, fake_redis):
+    """別のワーカー（ワーカー内LRUが空）はRedisの値を使う"""
+    loader, calls = counting_loader({"id": "u1"})
+    await cache.get_or_load("u1", loader)
+
+    other_worker = UserCache(10, 60, 300, redis_factory=cache._redis_factory)
+    assert await other_worker.get_or_load("u1", loader) == {"id": "u1"}
+
+    assert len(calls) == 1
+    assert other_worker.redis_hits == 1
+
+
+async def test_invalidate_clears_both_tiers(cache, fake_redis):
+    """無効化するとワーカー内LRUとRedisの値が使われなくなる"""
+    await cache.get_or_load("u1", counting_loader({"id": "u1", "username": "old"})[0])
+
+    await cache.invalidate("u1")
+    loader, calls = counting_loader({"id": "u1", "username": "new"})
+
+    assert await cache.get_or_load("u1", loader) == {"id": "u1", "username": "new"}
+    assert len(calls) == 1
+
+
+async def test_invalidation_during_load_does_not_resurrect_stale_data(cache, fake_redis):
+    """取得中に無効化された場合、取得した古い値はどちらの層にも書き込まない"""
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_loader():
+        started.set()
+        await release.wait()
+        return {"id": "u1", "username": "stale"}
+
+    task = asyncio.create_task(cache.get_or_load("u1", slow_loader))
+    await started.wait()
+    await cache.invalidate("u1")
+    release.set()
+    assert (await task)["username"] == "stale"
+
+    # 古い値はキャッシュされていないため、次の読み取りは再取得する
+    assert "data" not in fake_redis.hashes["user_cache:u1"]
+    assert cache.local.get("u1") is None
+    loader, calls = counting_loader({"id": "u1", "username": "fresh"})
+    assert (await cache.get_or_load("u1", loader))["username"] == "fresh"
+    assert len(calls) == 1
+
+
+async def test_missing_user_is_not_cached(cache):
+    """見つからないユーザーはキャッシュしない"""
+    loader, calls = counting_loader(None)
+
+    assert await cache.get_or_load("u1", loader) is None
+    assert await cache.get_or_load("u1", loader) is None
+    assert len(calls) == 2
+
+
+async def test_redis_failure_falls_back_to_loader(cache, fake_redis):
+    """Redisに接続できない場合はloaderの結果を返す"""
+    fake_redis.fail = True
+    loader, calls = counting_loader({"id": "u1"})
+
+    assert await cache.get_or_load("u1", loader) == {"id": "u1"}
+    await cache.invalidate("u1")
+    assert len(calls) == 1
+
+
+async def test_local_lru_evicts_least_recently_used():
+    """ワーカー内LRUは上限を超えると最も使われていないエントリを削除する"""
+    local = LocalLRUCache(max_size=2, ttl_seconds=60)
+    local.put("a", {"id": "a"}, local.epoch)
+    local.put("b", {"id": "b"}, local.epoch)
+    local.get("a")
+    local.put("c", {"id": "c"}, local.epoch)
+
+    assert local.get("a") is not None
+    assert local.get("b") is None
+    assert len(local) == 2
+
+
+async def test_handle_user_cache_invalidation(cache, monkeypatch):
+    """user.updated / user.deletedイベントのidでキャッシュを無効化する"""
+    monkeypatch.setattr("app.messaging.user_handler.user_cache", cache)
+    await cache.get_or_load("11111111-1111-1111-1111-111111111111", counting_loader({"username": "old"})[0])
+
+    await handle_user_cache_invalidation("user.updated", {"id": "11111111-1111-1111-1111-111111111111"})
+
+    assert cache.local.get("11111111-1111-1111-1111-111111111111") is None
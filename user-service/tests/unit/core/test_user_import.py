@@ -0,0 +1,179 @@
+import uuid
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.user_import import UserImportTracker, import_users, iter_import_rows
+from app.models.user import User
+from app.schemas.user import UserImportState
+
+
+# 非同期テスト用のマーカーを追加
+pytestmark = pytest.mark.asyncio
+
+
+async def stream_of(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def rows_of(*chunks: bytes, format: str = "csv"):
+    return [row async for row in iter_import_rows(stream_of(*chunks), format)]
+
+
+class FakeRedis:
+    """テストに必要な操作だけを実装したRedis"""
+
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def tracker(fake_redis, monkeypatch):
+    async def redis_factory():
+        return fake_redis
+    tracker = UserImportTracker(ttl_seconds=60, redis_factory=redis_factory)
+    monkeypatch.setattr("app.core.user_import.user_import_tracker", tracker)
+    return tracker
+
+
+async def test_csv_quote_inside_unquoted_field():
+    """クォートで始まらないフィールド内の引用符は文字として扱い、後続の行を連結しない"""
+    rows = await rows_of(b'username,email,full_name\nbob,b@x.com,Bo"b\nalice,a@x.com,Alice\n')
+
+    assert rows == [
+        (2, {"username": "bob", "email": "b@x.com", "full_name": 'Bo"b'}),
+        (3, {"username": "alice", "email": "a@x.com", "full_name": "Alice"}),
+    ]
+
+
+async def test_csv_quoted_field_with_newline_across_chunks():
+    """クォート内の改行を含むレコードは、チャンクの境界をまたいでも1行として扱う"""
+    data = 'username,email,full_name\nbob,b@x.com,"Bob\nSmith, ""Jr"""\nアリス,a@x.com,\n'.encode("utf-8")
+    chunks = [data[i:i + 7] for i in range(0, len(data), 7)]
+
+    rows = await rows_of(*chunks)
+
+    assert rows == [
+        (3, {"username": "bob", "email": "b@x.com", "full_name": 'Bob\nSmith, "Jr"'}),
+        (4, {"username": "アリス", "email": "a@x.com", "full_name": ""}),
+    ]
+
+
+async def test_csv_skips_blank_lines_and_bom():
+    rows = await rows_of("﻿username,email\r\n\r\nbob,b@x.com\r\n".encode("utf-8"))
+
+    assert rows == [(3, {"username": "bob", "email": "b@x.com"})]
+
+
+async def test_csv_column_count_mismatch():
+    rows = await rows_of(b"username,email\nbob\n")
+
+    assert rows == [(2, "Expected 2 columns, got 1")]
+
+
+async def test_csv_unterminated_quoted_field():
+    rows = await rows_of(b'username,email\nbob,"b@x.com\n')
+
+    assert rows == [(2, "Unterminated quoted field")]
+
+
+async def test_csv_record_size_is_capped(monkeypatch):
+    """クォートが閉じないまま上限を超えたレコードはエラーとし、以降の行のパースを続ける"""
+    monkeypatch.setattr(settings, "USER_IMPORT_MAX_RECORD_BYTES", 32)
+    lines = [b"username,email", b'bob,"b@x.com'] + [b"x" * 10] * 3 + [b"alice,a@x.com"]
+
+    rows = await rows_of(b"\n".join(lines) + b"\n")
+
+    assert rows[0] == (4, "Record exceeds 32 bytes")
+    assert rows[-1] == (6, {"username": "alice", "email": "a@x.com"})
+
+
+async def test_ndjson_line_size_is_capped(monkeypatch):
+    """改行のないまま上限を超えた行は保持せずに読み捨ててエラーとし、次の行からパースを続ける"""
+    monkeypatch.setattr(settings, "USER_IMPORT_MAX_RECORD_BYTES", 32)
+    chunks = [b'{"username": "bob"}\n{"username": "'] + [b"x" * 16] * 100 + [b'"}\n{"username": "alice"}\n']
+
+    rows = await rows_of(*chunks, format="ndjson")
+
+    assert rows == [
+        (1, {"username": "bob"}),
+        (2, "Record exceeds 32 bytes"),
+        (3, {"username": "alice"}),
+    ]
+
+
+async def test_ndjson_oversized_last_line(monkeypatch):
+    """改行で終わらない最後の行が上限を超えた場合もエラーとする"""
+    monkeypatch.setattr(settings, "USER_IMPORT_MAX_RECORD_BYTES", 32)
+
+    rows = await rows_of(b'{"username": "bob"}\n', b"x" * 40, format="ndjson")
+
+    assert rows == [(1, {"username": "bob"}), (2, "Record exceeds 32 bytes")]
+
+
+async def test_ndjson_rows():
+    rows = await rows_of(b'{"username": "bob"}\n\nnot json\n[1]\n', format="ndjson")
+
+    assert rows[0] == (1, {"username": "bob"})
+    assert rows[1][0] == 3 and rows[1][1].startswith("Invalid JSON")
+    assert rows[2] == (4, "Row must be a JSON object")
+
+
+async def test_tracker_rejects_running_import(tracker):
+    """同じIDのインポートが実行中の場合は開始できない（完了後は再実行できる）"""
+    import_id = uuid.uuid4()
+    progress = await tracker.start(import_id, "csv")
+
+    assert await tracker.start(import_id, "csv") is None
+
+    progress.state = UserImportState.COMPLETED
+    await tracker.save(progress)
+    assert (await tracker.start(import_id, "csv")).state == UserImportState.RUNNING
+
+
+async def test_import_progress_is_visible_to_other_workers(db_session, fake_redis, tracker):
+    """インポートの進捗はRedisに書き込まれ、別のワーカーのトラッカーから照会できる"""
+    import_id = uuid.uuid4()
+    progress = await tracker.start(import_id, "csv")
+    data = b"username,email\nbob,b@x.com\nalice,a@x.com\nbob,b@x.com\nbroken\n"
+
+    await import_users(db_session, stream_of(data), progress, chunk_size=2)
+
+    async def redis_factory():
+        return fake_redis
+    other_worker = UserImportTracker(ttl_seconds=60, redis_factory=redis_factory)
+    stored = await other_worker.get(import_id)
+    assert stored.state == UserImportState.COMPLETED
+    assert (stored.rows_received, stored.rows_created, stored.rows_skipped, stored.rows_invalid) == (4, 2, 1, 1)
+    assert stored.finished_at is not None
+    usernames = (await db_session.execute(select(User.username))).scalars().all()
+    assert sorted(usernames) == ["alice", "bob"]
+
+
+async def test_import_continues_without_redis(db_session, monkeypatch):
+    """Redisに接続できない場合もインポートは続行する"""
+    async def unavailable():
+        raise ConnectionError("redis unavailable")
+    tracker = UserImportTracker(ttl_seconds=60, redis_factory=unavailable)
+    monkeypatch.setattr("app.core.user_import.user_import_tracker", tracker)
+
+    progress = await tracker.start(uuid.uuid4(), "csv")
+    await import_users(db_session, stream_of(b"username,email\nbob,b@x.com\n"), progress)
+
+    assert progress.state == UserImportState.COMPLETED
+    assert progress.rows_created == 1
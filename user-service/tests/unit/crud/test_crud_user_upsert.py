@@ -0,0 +1,45 @@
+import uuid
+import pytest
+from sqlalchemy import select
+
+from app.crud.user import user_crud
+from app.models.outbox_event import OutboxEvent
+from app.schemas.user import UserUpsert, UserUpsertStatus
+
+
+# 非同期テスト用のマーカーを追加
+pytestmark = pytest.mark.asyncio
+
+
+def upsert(user_id, version, username="alice"):
+    return UserUpsert(id=user_id, username=username, email=f"{username}@example.com", version=version)
+
+
+async def test_upsert_many_enqueues_user_updated_for_applied_rows(db_session):
+    """適用した行ごとにキャッシュ無効化用のuser.updatedイベントをアウトボックスに書き込む"""
+    user_id = uuid.uuid4()
+    await user_crud.upsert_many(db_session, [upsert(user_id, 1)])
+    await db_session.commit()
+
+    results = await user_crud.upsert_many(db_session, [upsert(user_id, 2, "alice2"), upsert(user_id, 1)])
+    await db_session.commit()
+
+    assert [result.status for result in results] == [UserUpsertStatus.APPLIED, UserUpsertStatus.SUPERSEDED_IN_INPUT]
+    events = (await db_session.execute(select(OutboxEvent).order_by(OutboxEvent.created_at))).scalars().all()
+    assert [event.routing_key for event in events] == ["user.updated", "user.updated"]
+    assert [event.body["user_data"]["id"] for event in events] == [str(user_id), str(user_id)]
+    assert events[-1].body["user_data"]["version"] == 2
+
+
+async def test_upsert_many_stale_rows_enqueue_nothing(db_session):
+    """適用されなかった（古いバージョンの）行はイベントを書き込まない"""
+    user_id = uuid.uuid4()
+    await user_crud.upsert_many(db_session, [upsert(user_id, 5)])
+    await db_session.commit()
+
+    results = await user_crud.upsert_many(db_session, [upsert(user_id, 3)])
+    await db_session.commit()
+
+    assert results[0].status == UserUpsertStatus.STALE
+    events = (await db_session.execute(select(OutboxEvent))).scalars().all()
+    assert len(events) == 1
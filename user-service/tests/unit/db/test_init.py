@@ -0,0 +1,27 @@
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from app.db.init import Database
+
+
+# 非同期テスト用のマーカーを追加
+pytestmark = pytest.mark.asyncio
+
+
+class TestDatabase:
+    """Databaseクラスのテスト"""
+    
+    async def test_init_only_creates_tables(self):
+        """起動時はcreate_allのみを行い、既存のテーブルの変更はAlembicのマイグレーションに任せる"""
+        with patch("app.db.init.async_engine") as mock_engine:
+            mock_context = AsyncMock()
+            mock_conn = AsyncMock()
+            mock_conn.dialect = MagicMock()
+            mock_conn.dialect.name = "postgresql"
+            mock_context.__aenter__.return_value = mock_conn
+            mock_engine.begin.return_value = mock_context
+            
+            await Database().init()
+            
+            mock_conn.run_sync.assert_called_once()
+            mock_conn.execute.assert_not_called()
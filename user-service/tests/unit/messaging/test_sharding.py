@@ -0,0 +1,140 @@
+import asyncio
+import uuid
+import pytest
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, patch
+
+from aio_pika import ExchangeType
+
+from app.core.config import settings
+from app.messaging import memory_broker
+from app.messaging.codec import event_message
+from app.messaging.memory_broker import MemoryBroker, MemoryIncomingMessage, connect
+from app.messaging.rabbitmq import RabbitMQClient
+from app.messaging.sharding import parse_owned_shards, shard_queue_name
+
+
+async def _wait_for(condition, timeout: float = 2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condition not met"
+        await asyncio.sleep(0.005)
+
+
+def test_parse_owned_shards():
+    """番号と範囲の指定を解釈し、重複した範囲は1つにまとめる"""
+    assert parse_owned_shards("", 4) == [0, 1, 2, 3]
+    assert parse_owned_shards("2,0", 4) == [0, 2]
+    assert parse_owned_shards(" 0-1 , 3 ", 4) == [0, 1, 3]
+    assert parse_owned_shards("0-2,1-3,2", 4) == [0, 1, 2, 3]
+
+
+@pytest.mark.parametrize("value", ["4", "2-1", "-1", "0-4", "a", "1-b"])
+def test_parse_owned_shards_rejects_invalid_ranges(value):
+    """シャード数の範囲外・逆順・数値でない指定はValueErrorになる"""
+    with pytest.raises(ValueError):
+        parse_owned_shards(value, 4)
+
+
+def message_count(broker, queue_name):
+    return broker.stats()["queues"][queue_name]["messages"]
+
+
+@asynccontextmanager
+async def sharded_consumer(broker, callback, owned):
+    """インメモリのブローカーで2つのシャードのうちownedを受信するコンシューマーを開始する"""
+    acks = []
+    original_ack = MemoryIncomingMessage.ack
+
+    async def record_ack(message, multiple=False):
+        acks.append((message.message_id, message.routing_key))
+        await original_ack(message, multiple=multiple)
+
+    with patch.object(settings, "RABBITMQ_BROKER", "memory"), \
+         patch.object(settings, "USER_CREATION_BATCH_ENABLED", False), \
+         patch.object(settings, "USER_CREATION_SHARDS", 2), \
+         patch.object(settings, "USER_CREATION_OWNED_SHARDS", owned), \
+         patch.object(settings, "MESSAGE_RETRY_BASE_DELAY_MS", 10), \
+         patch.object(memory_broker, "default_broker", broker), \
+         patch.object(MemoryIncomingMessage, "ack", record_ack):
+        client = RabbitMQClient()
+        await client.setup_user_creation_consumer(callback)
+        try:
+            yield client, acks
+        finally:
+            await client.close()
+
+
+async def legacy_backlog(broker, count):
+    """シャーディング前のuser_creation_queue（user.syncにバインド済み）に残ったメッセージを用意する"""
+    channel = await (await connect(broker)).channel()
+    exchange = await channel.declare_exchange("user_events", ExchangeType.TOPIC, durable=True)
+    queue = await channel.declare_queue("user_creation_queue", durable=True)
+    await queue.bind(exchange, routing_key="user.sync")
+    message_ids = [str(uuid.uuid4()) for _ in range(count)]
+    for i, message_id in enumerate(message_ids):
+        await exchange.publish(
+            event_message("user.created", {"username": f"legacy{i}"}, message_id=message_id),
+            routing_key="user.sync"
+        )
+    await channel.close()
+    return message_ids
+
+
+@pytest.mark.asyncio
+async def test_shard_zero_drains_legacy_queue():
+    """シャード0を受信するインスタンスは切り替え前のキューに残ったメッセージを処理する"""
+    broker = MemoryBroker()
+    message_ids = await legacy_backlog(broker, 2)
+    callback = AsyncMock(return_value=None)
+
+    async with sharded_consumer(broker, callback, "0"):
+        await _wait_for(lambda: callback.await_count == 2)
+
+    assert [call.kwargs["message_id"] for call in callback.await_args_list] == message_ids
+    assert message_count(broker, "user_creation_queue") == 0
+
+
+@pytest.mark.asyncio
+async def test_other_shards_leave_legacy_queue_and_unbind_it():
+    """シャード0以外のインスタンスは切り替え前のキューを受信せず、新しいuser.syncはシャードのキューにだけ届く"""
+    broker = MemoryBroker()
+    await legacy_backlog(broker, 2)
+    callback = AsyncMock(return_value=None)
+
+    async with sharded_consumer(broker, callback, "1") as (client, _):
+        for i in range(10):
+            await client.user_events_exchange.publish(
+                event_message("user.created", {"username": f"user{i}"}), routing_key="user.sync"
+            )
+        await _wait_for(lambda: callback.await_count + message_count(broker, shard_queue_name("user_creation_queue", 0)) == 10)
+
+    assert message_count(broker, "user_creation_queue") == 2
+    assert all(call.args[0]["username"].startswith("user") for call in callback.await_args_list)
+
+
+@pytest.mark.asyncio
+async def test_retry_returns_to_same_shard():
+    """シャードのキューで失敗したメッセージは、そのシャードの再試行キューを経由して同じシャードのキューに戻る"""
+    broker = MemoryBroker()
+    attempts = []
+
+    async def callback(user_data, message_id=None):
+        attempts.append(message_id)
+        if len(attempts) == 1:
+            raise RuntimeError("db down")
+
+    message_id = str(uuid.uuid4())
+    async with sharded_consumer(broker, callback, "") as (client, acks):
+        await client.user_events_exchange.publish(
+            event_message("user.created", {"username": "alice"}, message_id=message_id), routing_key="user.sync"
+        )
+        await _wait_for(lambda: len(acks) == 2)
+        retried = [policy for policy in client.retry_policies.values() if policy.retried_total]
+
+    assert attempts == [message_id, message_id]
+    assert len(retried) == 1
+    assert retried[0].queue_name.startswith("user_creation_queue.shard.")
+    # 再試行キューのTTLが切れたメッセージはシャードのキュー名をルーティングキーとして戻る
+    assert acks[-1] == (message_id, retried[0].queue_name)
@@ -0,0 +1,210 @@
+import asyncio
+import uuid
+import pytest
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, patch
+
+from aio_pika import Message
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.messaging import memory_broker
+from app.messaging.codec import event_message
+from app.messaging.memory_broker import MemoryBroker, MemoryIncomingMessage
+from app.messaging.rabbitmq import RabbitMQClient
+from app.messaging.user_handler import handle_user_creation_batch, handle_user_creation_request
+from app.models.outbox_event import OutboxEvent
+from app.models.processed_message import ProcessedMessage
+from app.models.user import User
+
+
+# 非同期テスト用のマーカーを追加
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    """ハンドラーが開くセッションをテスト用のデータベースに向ける"""
+    factory = sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+    with patch("app.messaging.user_handler.AsyncSessionLocal", factory), \
+         patch("app.db.session.AsyncSessionLocal", factory):
+        yield factory
+
+
+async def _scalars(session_factory, stmt):
+    async with session_factory() as session:
+        return (await session.execute(stmt)).scalars().all()
+
+
+async def _wait_for(condition, timeout: float = 2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condition not met"
+        await asyncio.sleep(0.005)
+
+
+def request(username, email=None):
+    return {"username": username, "email": email or f"{username}@example.com"}
+
+
+async def test_batch_classifies_each_row(session_factory):
+    """既存ユーザー・バッチ内の先行リクエストとの重複と不正なリクエストを行ごとに判定して返信する"""
+    async with session_factory() as session:
+        session.add(User(username="taken", email="taken@example.com"))
+        await session.commit()
+    user_data_list = [
+        request("alice"),
+        request("taken", "other@example.com"),
+        request("bob", "taken@example.com"),
+        request("carol", "not-an-email"),
+        # バッチ内で先行するaliceと重複する
+        request("alice", "alice2@example.com"),
+        request("alice2", "alice@example.com"),
+    ]
+
+    responses = await handle_user_creation_batch(user_data_list, [f"m{i}" for i in range(6)])
+
+    assert [response["status"] for response in responses] == ["success"] + ["error"] * 5
+    assert [response.get("error_type") for response in responses[1:]] == [
+        "duplicate_username",
+        "duplicate_email",
+        "internal_error",
+        "duplicate_username",
+        "duplicate_email",
+    ]
+    assert all(response["original_request"] == data for response, data in zip(responses, user_data_list))
+    # 返信は行ごとにアウトボックスへ書き込まれる
+    assert await _scalars(session_factory, select(func.count()).select_from(OutboxEvent)) == [6]
+    usernames = await _scalars(session_factory, select(User.username))
+    assert sorted(usernames) == ["alice", "taken"]
+
+
+async def test_batch_skips_processed_messages(session_factory):
+    """処理済みのmessage_idのリクエストはユーザーを作成せず、返信もしない"""
+    first = await handle_user_creation_batch([request("alice"), request("bob")], ["m1", "m2"])
+    second = await handle_user_creation_batch([request("alice"), request("carol")], ["m1", "m3"])
+
+    assert [response["status"] for response in first] == ["success", "success"]
+    assert second[0] is None
+    assert second[1]["status"] == "success"
+    usernames = await _scalars(session_factory, select(User.username))
+    assert sorted(usernames) == ["alice", "bob", "carol"]
+
+
+async def test_failed_batch_rolls_back_before_one_by_one_fallback(session_factory):
+    """バッチの処理が失敗した場合は処理済みの記録を直ちに取り消し、1件ずつの処理で同じメッセージを作成できる"""
+    message_ids = ["m1", "m2"]
+    user_data_list = [request("alice"), request("bob")]
+
+    with patch("app.messaging.user_handler.user_crud.bulk_create", AsyncMock(side_effect=RuntimeError("db down"))):
+        with pytest.raises(RuntimeError):
+            await handle_user_creation_batch(user_data_list, message_ids)
+
+    assert await _scalars(session_factory, select(ProcessedMessage.message_id)) == []
+
+    responses = [
+        await handle_user_creation_request(user_data, message_id=message_id)
+        for user_data, message_id in zip(user_data_list, message_ids)
+    ]
+
+    assert [response["status"] for response in responses] == ["success", "success"]
+    assert sorted(await _scalars(session_factory, select(ProcessedMessage.message_id))) == message_ids
+    assert sorted(await _scalars(session_factory, select(User.username))) == ["alice", "bob"]
+
+
+@asynccontextmanager
+async def batch_consumer(callback, batch_callback):
+    """インメモリのブローカーでバッチ処理のコンシューマーを開始する"""
+    broker = MemoryBroker()
+    acks = []
+    original_ack = MemoryIncomingMessage.ack
+
+    async def record_ack(message, multiple=False):
+        acks.append((message.message_id, multiple))
+        await original_ack(message, multiple=multiple)
+
+    with patch.object(settings, "RABBITMQ_BROKER", "memory"), \
+         patch.object(settings, "USER_CREATION_BATCH_ENABLED", True), \
+         patch.object(settings, "USER_CREATION_BATCH_SIZE", 10), \
+         patch.object(settings, "USER_CREATION_BATCH_WAIT_MS", 20.0), \
+         patch.object(memory_broker, "default_broker", broker), \
+         patch.object(MemoryIncomingMessage, "ack", record_ack):
+        client = RabbitMQClient()
+        await client.setup_user_creation_consumer(callback, batch_callback)
+        try:
+            yield client, broker, acks
+        finally:
+            await client.close()
+
+
+async def publish(client, *messages):
+    for message in messages:
+        await client.user_events_exchange.publish(message, routing_key="user.sync")
+
+
+def creation_requests(count):
+    message_ids = [str(uuid.uuid4()) for _ in range(count)]
+    messages = [
+        event_message("user.created", request(f"user{i}"), message_id=message_id)
+        for i, message_id in enumerate(message_ids)
+    ]
+    return messages, message_ids
+
+
+async def test_process_batch_acks_batch_with_one_multiple_ack():
+    """バッチのリクエストをまとめてbatch_callbackに渡し、最後のメッセージまでを1回のackで確定する"""
+    callback = AsyncMock()
+    batch_callback = AsyncMock(side_effect=lambda data, ids: [None] * len(data))
+
+    messages, message_ids = creation_requests(3)
+
+    async with batch_consumer(callback, batch_callback) as (client, broker, acks):
+        await publish(client, *messages)
+        await _wait_for(lambda: broker.acked_total == 3)
+
+    batch_callback.assert_awaited_once()
+    user_data_list, batch_message_ids = batch_callback.await_args.args
+    assert [data["username"] for data in user_data_list] == ["user0", "user1", "user2"]
+    assert batch_message_ids == message_ids
+    callback.assert_not_awaited()
+    assert acks == [(message_ids[-1], True)]
+
+
+async def test_process_batch_sends_poison_message_to_dlq():
+    """復元できないメッセージはDLQに送り、残りのリクエストだけをバッチで処理する"""
+    callback = AsyncMock()
+    batch_callback = AsyncMock(side_effect=lambda data, ids: [None] * len(data))
+
+    messages, message_ids = creation_requests(2)
+
+    async with batch_consumer(callback, batch_callback) as (client, broker, acks):
+        await publish(
+            client,
+            messages[0],
+            Message(b"not json", content_type="application/json", message_id=str(uuid.uuid4())),
+            messages[1],
+        )
+        await _wait_for(lambda: broker.stats()["queues"]["user_creation_queue.dlq"]["messages"] == 1)
+        await _wait_for(lambda: broker.acked_total == 3)
+
+    user_data_list, _ = batch_callback.await_args.args
+    assert [data["username"] for data in user_data_list] == ["user0", "user1"]
+    assert acks[-1] == (message_ids[-1], True)
+
+
+async def test_process_batch_falls_back_to_one_by_one():
+    """バッチ全体の処理が失敗した場合は1件ずつcallbackで処理し、それぞれackする"""
+    callback = AsyncMock(return_value=None)
+    batch_callback = AsyncMock(side_effect=RuntimeError("database unavailable"))
+
+    messages, message_ids = creation_requests(3)
+
+    async with batch_consumer(callback, batch_callback) as (client, broker, acks):
+        await publish(client, *messages)
+        await _wait_for(lambda: broker.acked_total == 3)
+
+    assert [call.kwargs["message_id"] for call in callback.await_args_list] == message_ids
+    assert acks == [(message_id, False) for message_id in message_ids]